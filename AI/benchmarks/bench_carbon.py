@@ -0,0 +1,81 @@
+"""One /forecast/carbon pass versus a /predict call per resource per building.
+
+Seeds a synthetic campus with all four resources (the same generator as
+loadtest.py), trains a Holt-Winters state for every building and resource, then
+projects a year of emissions two ways:
+  per-call   run_prediction for each (resource, building), then the client-side
+             (usage / 1000) * factor that callers do today
+  carbon     run_carbon_forecast: one panel read per resource, one vectorized
+             forecast onto a shared month axis, emissions as array operations
+and reports wall time for each, and checks that both give the same campus totals.
+
+Usage: python benchmarks/bench_carbon.py [--buildings 50] [--months 48]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+AI_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from loadtest import seed_database  # noqa: E402
+
+RESOURCES = ['electricity', 'water', 'naturalgas', 'paper']
+MONTHS_AHEAD = 12
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buildings', type=int, default=50)
+    parser.add_argument('--months', type=int, default=48)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench-carbon-') as workdir:
+        db_path = os.path.join(workdir, 'campus.sqlite3')
+        buildings = seed_database(db_path, {'resources': RESOURCES, 'buildings': args.buildings,
+                                            'months': args.months}, seed=5)
+        # main reads its settings at import time
+        os.environ.update({
+            'DB_ENGINE': 'sqlite',
+            'SQLITE_PATH': db_path,
+            'MODELS_DIR': os.path.join(workdir, 'models'),
+            'LOGS_DIR': os.path.join(workdir, 'logs'),
+            'ROLLUPS_ENABLED': 'false',
+            'TRACE_EXPORTER': 'none'
+        })
+        sys.path.insert(0, str(AI_DIR))
+        import main as service
+        service.logger.setLevel('ERROR')
+
+        for resource_type in RESOURCES:
+            service.run_batch_training(service.TrainBatchRequest(
+                resource_type=resource_type, building_ids=buildings, model_types=['hw'], ensemble_types=[]))
+
+        started = time.perf_counter()
+        per_call = np.zeros(MONTHS_AHEAD)
+        for resource_type in RESOURCES:
+            factor = service.EMISSION_FACTORS[resource_type]
+            for building_id in buildings:
+                response = service.run_prediction(service.PredictRequest(
+                    resource_type=resource_type, building_id=building_id, model_type='hw', months_ahead=MONTHS_AHEAD))
+                per_call += np.array([p['predicted_usage'] for p in response.predictions]) / 1000 * factor
+        per_call_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        report = service.run_carbon_forecast(service.CarbonForecastRequest(months_ahead=MONTHS_AHEAD))
+        carbon_seconds = time.perf_counter() - started
+
+        assert np.allclose(per_call, report['campus']['total'], rtol=1e-6), 'campus totals differ'
+        calls = len(RESOURCES) * len(buildings)
+        print(f"{len(buildings)} buildings x {len(RESOURCES)} resources, {MONTHS_AHEAD} months ahead")
+        print(f"{'per-call':<9} {calls:>5} calls {per_call_seconds:>8.2f} s")
+        print(f"{'carbon':<9} {1:>5} call  {carbon_seconds:>8.2f} s ({per_call_seconds / carbon_seconds:.0f}x)")
+        print(f"campus total {sum(report['campus']['total']):.1f} {report['unit']}, same as per-call")
+
+
+if __name__ == '__main__':
+    main()
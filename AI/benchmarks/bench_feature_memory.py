@@ -0,0 +1,114 @@
+"""Peak memory of preparing model inputs for a large panel.
+
+Featurizes a synthetic panel once, then in a fresh subprocess per mode prepares
+the train/test inputs the way each pipeline does and reports peak RSS growth
+and the tracemalloc peak of that step:
+  legacy   frame slices + astype(float) + replace(inf) + fillna, an XGB rename
+           copy and a GB scaler copy, for train and test
+  matrix   FeatureEngineer.to_matrix once, row views for the split, a
+           zero-copy named view for XGB and the GB scaler copy
+
+Usage: python benchmarks/bench_feature_memory.py [--buildings 2000] [--months 96]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import RobustScaler
+
+AI_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AI_DIR))
+os.environ.setdefault('FEATURE_STORE_ENABLED', 'false')
+from main import FeatureEngineer, clean_feature_names  # noqa: E402
+
+RESOURCE = 'electricity'
+
+
+def build_panel(buildings, months, path):
+    rng = np.random.RandomState(0)
+    dates = pd.date_range('2015-01-01', periods=months, freq='MS')
+    frames = []
+    for building in range(buildings):
+        usage = rng.rand(months) * 1000 * (building % 50 + 1) + 100
+        frames.append(FeatureEngineer.create_features(pd.DataFrame({'Date': dates, 'Usage': usage}), RESOURCE))
+    panel = pd.concat(frames, ignore_index=True)
+    panel.to_pickle(path)
+    return len(panel)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def prepare_legacy(df, feature_cols, n_train):
+    train_data, test_data = df.iloc[:n_train].copy(), df.iloc[n_train:].copy()
+    X_train, X_test = train_data[feature_cols], test_data[feature_cols]
+    X_train, X_test = X_train.astype(float), X_test.astype(float)
+    X_train, X_test = X_train.replace([np.inf, -np.inf], 0), X_test.replace([np.inf, -np.inf], 0)
+    X_train, X_test = X_train.fillna(0), X_test.fillna(0)
+    X_train_clean, X_test_clean = X_train.copy(), X_test.copy()
+    X_train_clean.columns = X_test_clean.columns = clean_feature_names(feature_cols)
+    scaled = RobustScaler().fit_transform(X_train)
+    return X_train, X_test, X_train_clean, X_test_clean, scaled
+
+
+def prepare_matrix(df, feature_cols, n_train):
+    X = FeatureEngineer.to_matrix(df, feature_cols)
+    X_train, X_test = X[:n_train], X[n_train:]
+    X_train_clean = pd.DataFrame(X_train, columns=clean_feature_names(feature_cols), copy=False)
+    scaled = RobustScaler().fit_transform(X_train)
+    return X_train, X_test, X_train_clean, scaled
+
+
+def child(mode, path):
+    df = pd.read_pickle(path)
+    feature_cols = FeatureEngineer.get_feature_columns(df, RESOURCE)
+    n_train = int(len(df) * 0.8)
+    before = peak_rss_mb()
+    tracemalloc.start()
+    prepared = (prepare_legacy if mode == 'legacy' else prepare_matrix)(df, feature_cols, n_train)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(json.dumps({
+        'mode': mode,
+        'frame_mb': df.memory_usage(deep=False).sum() / 2 ** 20,
+        'rss_growth_mb': peak_rss_mb() - before,
+        'traced_peak_mb': traced_peak / 2 ** 20,
+        'held': len(prepared)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buildings', type=int, default=2000)
+    parser.add_argument('--months', type=int, default=96)
+    parser.add_argument('--child', choices=['legacy', 'matrix'], help=argparse.SUPPRESS)
+    parser.add_argument('--panel', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.panel)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'panel.pkl')
+        rows = build_panel(args.buildings, args.months, path)
+        print(f"panel: {args.buildings} buildings x {args.months} months = {rows} rows")
+        print(f"{'mode':<8} {'frame MB':>9} {'peak RSS +MB':>13} {'traced peak MB':>15}")
+        for mode in ('legacy', 'matrix'):
+            out = subprocess.run([sys.executable, __file__, '--child', mode, '--panel', path],
+                                 capture_output=True, text=True, check=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f"{mode:<8} {result['frame_mb']:>9.1f} {result['rss_growth_mb']:>13.1f} {result['traced_peak_mb']:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Monthly, weekly and daily pipelines over a multi-year daily campus.
+
+Seeds a fresh SQLite stand-in with one meter reading per building per day (weekday
+and annual cycles, noise, a few missing days) and runs each granularity through
+the stages a fleet retrain and forecast touch:
+  load       DataLoader.load_panel: aggregation in the database, one query
+  features   FeatureEngineer.create_features for every building's series
+  future     Predictor.create_future_features for every building (12 months,
+             13 weeks or 91 days ahead)
+and reports wall time and rows per second. The daily panel has about 30x the rows
+of the monthly one; per-row cost is what has to stay flat.
+
+Usage: python benchmarks/bench_granularity.py [--buildings 200] [--years 3]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+AI_DIR = Path(__file__).resolve().parent.parent
+RESOURCE = 'electricity'
+HORIZONS = {'month': 12, 'week': 13, 'day': 91}
+
+
+def seed_daily(path, buildings, years, seed):
+    """One reading per building per day ending 2025-06-30; about 1% of days missing"""
+    rng = np.random.RandomState(seed)
+    days = pd.date_range(end='2025-06-30', periods=years * 365, freq='D')
+    stamps = days.strftime('%Y-%m-%d 00:00:00').to_numpy()
+    building_ids = [str(uuid.UUID(int=rng.randint(1, 2 ** 62))) for _ in range(buildings)]
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE Electrics (Id TEXT PRIMARY KEY, BuildingId TEXT NOT NULL, `Date` TEXT, `Usage` REAL)")
+    connection.execute("CREATE INDEX IX_Electrics_BuildingId_Date ON Electrics (BuildingId, `Date`)")
+    for i, building_id in enumerate(building_ids):
+        usage = (rng.lognormal(6, 1) * (1 + 0.3 * np.sin(2 * np.pi * days.dayofyear / 365 + rng.uniform(0, np.pi)))
+                 * np.where(days.dayofweek >= 5, 0.6, 1.0) * rng.normal(1, 0.05, len(days)))
+        kept = rng.uniform(size=len(days)) > 0.01
+        connection.executemany("INSERT INTO Electrics VALUES (?, ?, ?, ?)",
+                               ((f'{i}-{j}', building_id, stamp, float(value))
+                                for j, (stamp, value) in enumerate(zip(stamps[kept], usage[kept]))))
+    connection.commit()
+    connection.close()
+    return building_ids
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buildings', type=int, default=200)
+    parser.add_argument('--years', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench-granularity-') as workdir:
+        db_path = os.path.join(workdir, 'campus.sqlite3')
+        _, seed_seconds = timed(lambda: seed_daily(db_path, args.buildings, args.years, seed=7))
+        print(f"seeded {args.buildings} buildings x {args.years} years of daily readings in {seed_seconds:.1f}s")
+        # main reads its settings at import time
+        os.environ.update({
+            'DB_ENGINE': 'sqlite',
+            'SQLITE_PATH': db_path,
+            'MODELS_DIR': os.path.join(workdir, 'models'),
+            'LOGS_DIR': os.path.join(workdir, 'logs'),
+            'ROLLUPS_ENABLED': 'false',
+            'TRACE_EXPORTER': 'none'
+        })
+        sys.path.insert(0, str(AI_DIR))
+        import main as service
+        service.logger.setLevel('WARNING')
+
+        print(f"{'granularity':<11} {'stage':<9} {'rows':>9} {'seconds':>8} {'rows/s':>10} {'us/row':>7}")
+        for granularity in service.GRANULARITIES:
+            panel, load_seconds = timed(lambda: service.DataLoader.load_panel(RESOURCE, granularity))
+            groups = [group.reset_index(drop=True) for _, group in panel.groupby('BuildingId', sort=True)]
+            featured, feature_seconds = timed(lambda: [
+                service.FeatureEngineer.create_features(group, RESOURCE, granularity) for group in groups
+            ])
+            horizon = HORIZONS[granularity]
+            _, future_seconds = timed(lambda: [
+                service.Predictor.create_future_features(frame, horizon, RESOURCE, granularity) for frame in featured
+            ])
+            for stage, rows, seconds in [('load', len(panel), load_seconds),
+                                         ('features', len(panel), feature_seconds),
+                                         ('future', horizon * len(groups), future_seconds)]:
+                print(f"{granularity:<11} {stage:<9} {rows:>9} {seconds:>8.2f} {rows / seconds:>10.0f} "
+                      f"{seconds * 1e6 / rows:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
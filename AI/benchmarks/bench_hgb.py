@@ -0,0 +1,89 @@
+"""Fit time and holdout accuracy of the boosting model types across panel sizes.
+
+Builds synthetic monthly panels (seasonal usage with trend and noise, a different
+scale per building), featurizes them the way global training does, applies the
+same per-building chronological holdout, and fits each model type with
+ModelTrainer.train_single_model:
+  gb         GradientBoostingRegressor, 400 stages of depth 6 (scaled inputs)
+  hgb        HistGradientBoostingRegressor, 63 bins, early stopping
+  xgb        XGBoost, exact split finding
+  xgb_hist   XGBoost, histogram split finding
+Reports the median fit time and the holdout MAPE in usage units per panel size.
+
+Usage: python benchmarks/bench_hgb.py [--buildings 1,10,50,200] [--months 48] [--repeat 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# main reads its settings at import time
+os.environ.setdefault('FEATURE_STORE_ENABLED', 'false')
+os.environ.setdefault('TRACE_EXPORTER', 'none')
+os.environ.setdefault('LOGS_DIR', tempfile.mkdtemp(prefix='bench-hgb-'))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import main as service  # noqa: E402
+
+RESOURCE = 'electricity'
+MODEL_TYPES = ['gb', 'hgb', 'xgb', 'xgb_hist']
+
+
+def synthetic_panel(buildings, months, seed):
+    rng = np.random.RandomState(seed)
+    dates = pd.date_range(end='2025-06-01', periods=months, freq='MS')
+    frames = []
+    for i in range(buildings):
+        scale = rng.lognormal(10, 1)
+        season = 1 + 0.25 * np.sin(2 * np.pi * (dates.month - 1) / 12 + rng.uniform(0, np.pi))
+        trend = 1 + rng.normal(0, 0.002) * np.arange(months)
+        usage = scale * season * trend * rng.normal(1, 0.05, months)
+        frames.append(pd.DataFrame({'BuildingId': f'{i:08d}-0000-0000-0000-000000000000', 'Year': dates.year,
+                                    'Month': dates.month, 'Usage': usage, 'Date': dates}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def holdout(panel):
+    df, _ = service.FeatureEngineer.create_panel_features(panel, RESOURCE)
+    feature_cols = service.FeatureEngineer.get_feature_columns(df, RESOURCE) + service.GLOBAL_BUILDING_FEATURES
+    splits = [service.ModelTrainer.split_train_test(group) for _, group in df.groupby('BuildingId', sort=False)]
+    train = pd.concat([s[0] for s in splits], ignore_index=True)
+    test = pd.concat([s[1] for s in splits], ignore_index=True)
+    return (service.FeatureEngineer.to_matrix(train, feature_cols), train['Usage'] / train['BuildingScale'],
+            service.FeatureEngineer.to_matrix(test, feature_cols), test['Usage'] / test['BuildingScale'],
+            test['Usage'].values, test['BuildingScale'].values, feature_cols)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buildings', default='1,10,50,200')
+    parser.add_argument('--months', type=int, default=48)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    service.logger.setLevel('WARNING')
+
+    print(f"{'buildings':>9} {'train rows':>10} {'model':<9} {'fit ms':>9} {'MAPE %':>7} {'vs gb':>7}")
+    for buildings in [int(b) for b in args.buildings.split(',')]:
+        X_train, y_train, X_test, y_test, actual, scale, feature_cols = holdout(
+            synthetic_panel(buildings, args.months, seed=buildings))
+        gb_ms = None
+        for model_type in MODEL_TYPES:
+            samples = []
+            for _ in range(args.repeat):
+                trainer = service.ModelTrainer(compact=False)
+                started = time.perf_counter()
+                _, _, y_pred = trainer.train_single_model(X_train, y_train, X_test, y_test, model_type, feature_cols)
+                samples.append((time.perf_counter() - started) * 1000)
+            fit_ms = statistics.median(samples)
+            gb_ms = gb_ms or fit_ms
+            mape = service.ModelTrainer.evaluate(actual, np.asarray(y_pred) * scale)['MAPE']
+            print(f"{buildings:>9} {len(X_train):>10} {model_type:<9} {fit_ms:>9.1f} {mape:>7.2f} {gb_ms / fit_ms:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
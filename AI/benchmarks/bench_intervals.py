@@ -0,0 +1,73 @@
+"""Latency of RF prediction intervals versus the point forecast.
+
+Fits a forest with the production RandomForestRegressor settings on synthetic
+monthly features, then times for a months_ahead-sized batch:
+  point      model.predict (what /predict runs without intervals)
+  per-tree   one estimator.predict call per tree, then quantiles
+  flat       FlatForest build + one batched pass over all trees, then quantiles
+
+Usage: python benchmarks/bench_intervals.py [--rows 12] [--features 45] [--repeat 50]
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import FlatForest  # noqa: E402
+
+QUANTILES = [0.1, 0.9]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--train-rows', type=int, default=120)
+    parser.add_argument('--rows', type=int, default=12, help='rows per prediction (months_ahead)')
+    parser.add_argument('--features', type=int, default=45)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    X_train = rng.rand(args.train_rows, args.features) * 1000
+    y_train = X_train[:, :5].sum(axis=1) + rng.randn(args.train_rows) * 50
+    X = rng.rand(args.rows, args.features) * 1000
+
+    model = RandomForestRegressor(n_estimators=300, max_depth=15, min_samples_split=2, min_samples_leaf=1,
+                                  max_features='sqrt', random_state=42, n_jobs=None)
+    model.fit(X_train, y_train)
+
+    def per_tree():
+        trees = np.vstack([estimator.predict(X.astype(np.float32)) for estimator in model.estimators_])
+        return np.quantile(trees, QUANTILES, axis=1)
+
+    def flat():
+        trees = FlatForest.from_forest(model).predict_trees(X)
+        return trees.mean(axis=0), np.quantile(trees, QUANTILES, axis=0)
+
+    flat_trees = FlatForest.from_forest(model).predict_trees(X)
+    assert np.allclose(flat_trees.mean(axis=0), model.predict(X)), 'flat forest disagrees with sklearn'
+
+    point_ms = timed(lambda: model.predict(X), args.repeat)
+    per_tree_ms = timed(per_tree, args.repeat)
+    flat_ms = timed(flat, args.repeat)
+
+    print(f"{'method':<10} {'median ms':>10} {'vs point':>9}")
+    for name, ms in (('point', point_ms), ('per-tree', per_tree_ms), ('flat', flat_ms)):
+        print(f"{name:<10} {ms:>10.2f} {ms / point_ms:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Cost of encoding large responses: FastAPI's default path versus the fast path.
+
+Builds a batch forecast (PredictResponse with intervals) and a fleet listing
+(List[ModelInfo]) the way the service does, then times for each:
+  default   response_model validation + serialization + json.dumps (JSONResponse)
+  fast      safe_float_array on the arrays, model_dump + FastJSONResponse (orjson)
+and checks that both produce the same bytes. The last case carries a few floats
+orjson formats differently from json.dumps, which sends the whole body through
+the json.dumps fallback.
+
+Usage: python benchmarks/bench_serialization.py [--months 120] [--models 2000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import (FastJSONResponse, ModelInfo, PredictResponse, response_content,  # noqa: E402
+                  safe_dict_conversion, safe_float_array, safe_float_conversion)
+
+
+def forecast(values, bands, safe_floats):
+    predictions = []
+    for i, value in enumerate(values):
+        predictions.append({
+            'date': f"{2030 + i // 12}-{i % 12 + 1:02d}",
+            'predicted_usage': safe_floats[0][i] if safe_floats else safe_float_conversion(value),
+            'month': i % 12 + 1,
+            'year': 2030 + i // 12,
+            'intervals': {
+                'p10': safe_floats[1][i] if safe_floats else safe_float_conversion(bands[0, i]),
+                'p90': safe_floats[2][i] if safe_floats else safe_float_conversion(bands[1, i])
+            }
+        })
+    return PredictResponse(success=True, predictions=predictions, model_info=safe_dict_conversion({
+        'model_type': 'rf_gb_xgb', 'resource_type': 'electricity', 'building_id': 'b1', 'scope': 'building',
+        'metrics': {'MAPE': 12.5, 'RMSE': 1e-05, 'R2': 0.91}, 'months_predicted': len(values),
+        'interval_quantiles': [0.1, 0.9]
+    }))
+
+
+def fleet(n, divergent_every=0):
+    rng = np.random.RandomState(1)
+    return [ModelInfo(resource_type='electricity', building_id=f'{i:08d}-0000-0000-0000-000000000000',
+                      model_type=['rf', 'xgb', 'gb', 'rf_gb'][i % 4], trained_at='2025-06-01T00:00:00',
+                      metrics=safe_dict_conversion({'MSE': float(rng.rand() * 1e8) if not divergent_every or i % divergent_every
+                                                    else 2.5e16,
+                                                    'RMSE': float(rng.rand() * 1e4),
+                                                    'MAE': float(rng.rand() * 1e3), 'MAPE': float(rng.rand() * 40),
+                                                    'R2': float(rng.rand())}),
+                      data_points=48) for i in range(n)]
+
+
+def default_path(model, response_model):
+    field = create_response_field(name='response', type_=response_model)
+    content = asyncio.run(serialize_response(field=field, response_content=model))
+    return JSONResponse(content).body
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--months', type=int, default=120)
+    parser.add_argument('--models', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    values = rng.rand(args.months) * 50000
+    values[::17] = np.nan
+    bands = np.vstack([values * 0.9, values * 1.1])
+    if args.months > 3:
+        values[3] = 3e-05
+
+    models = fleet(args.models)
+    divergent = fleet(args.models, divergent_every=100)
+    cases = {
+        'forecast': (
+            lambda: default_path(forecast(values, bands, None), PredictResponse),
+            lambda: FastJSONResponse(response_content(forecast(
+                values, bands, [safe_float_array(values).tolist()] + safe_float_array(bands).tolist()))).body
+        ),
+        'fleet listing': (
+            lambda: default_path(models, List[ModelInfo]),
+            lambda: FastJSONResponse(response_content(models)).body
+        ),
+        'fleet, 1% >=1e16': (
+            lambda: default_path(divergent, List[ModelInfo]),
+            lambda: FastJSONResponse(response_content(divergent)).body
+        )
+    }
+
+    print(f"{'payload':<18} {'bytes':>9} {'default ms':>11} {'fast ms':>8} {'speedup':>8}")
+    for name, (default, fast) in cases.items():
+        expected = default()
+        assert fast() == expected, f'{name}: fast path output differs'
+        default_ms = timed(default, args.repeat)
+        fast_ms = timed(fast, args.repeat)
+        print(f"{name:<18} {len(expected):>9} {default_ms:>11.2f} {fast_ms:>8.2f} {default_ms / fast_ms:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
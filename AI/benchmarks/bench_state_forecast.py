@@ -0,0 +1,67 @@
+"""Cost of the snaive/Holt-Winters state models at fleet scale.
+
+Fits one SeasonalState per synthetic building, then times:
+  fit          SeasonalState.fit over each building's history (grid search for hw)
+  update       folding one newly observed month into every state
+  per-state    state.forecast(h) called building by building
+  vectorized   SeasonalState.forecast_many over all states in one call
+and checks that the vectorized forecasts equal the per-state ones. A pickled
+state's size is reported for comparison with tree artifacts.
+
+Usage: python benchmarks/bench_state_forecast.py [--buildings 5000] [--months 48] [--horizon 12] [--kind hw]
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# main reads its settings at import time
+os.environ.setdefault('TRACE_EXPORTER', 'none')
+os.environ.setdefault('LOGS_DIR', tempfile.mkdtemp(prefix='bench-state-'))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main import SeasonalState  # noqa: E402
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buildings', type=int, default=5000)
+    parser.add_argument('--months', type=int, default=48)
+    parser.add_argument('--horizon', type=int, default=12)
+    parser.add_argument('--kind', default='hw', choices=['snaive', 'hw'])
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    periods = np.arange(2021 * 12, 2021 * 12 + args.months)
+    scale = rng.lognormal(10, 1, (args.buildings, 1))
+    phase = rng.uniform(0, np.pi, (args.buildings, 1))
+    values = scale * (1 + 0.25 * np.sin(2 * np.pi * (periods % 12) / 12 + phase)) * rng.normal(1, 0.05, (args.buildings, args.months))
+
+    states, fit_ms = timed(lambda: [SeasonalState.fit(args.kind, periods, row) for row in values])
+    new_month = periods[-1] + 1
+    _, update_ms = timed(lambda: [state.update(np.array([new_month]), row[-1:]) for state, row in zip(states, values)])
+    loop, loop_ms = timed(lambda: np.array([state.forecast(args.horizon) for state in states]))
+    batch, batch_ms = timed(lambda: SeasonalState.forecast_many(states, args.horizon))
+    assert np.allclose(loop, batch), 'vectorized forecasts differ from per-state forecasts'
+
+    n = args.buildings
+    print(f"{n} {args.kind} states, {args.months} months of history, {args.horizon}-month horizon")
+    print(f"{'fit':<12} {fit_ms:>10.1f} ms {fit_ms * 1000 / n:>9.1f} us/building")
+    print(f"{'update':<12} {update_ms:>10.1f} ms {update_ms * 1000 / n:>9.1f} us/building")
+    print(f"{'per-state':<12} {loop_ms:>10.1f} ms {loop_ms * 1000 / n:>9.1f} us/building")
+    print(f"{'vectorized':<12} {batch_ms:>10.1f} ms {batch_ms * 1000 / n:>9.1f} us/building ({loop_ms / batch_ms:.0f}x)")
+    print(f"pickled state: {len(pickle.dumps(states[0]))} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Fleet retrain with threaded fits one after another versus the fit planner.
+
+Seeds a synthetic campus into a fresh SQLite stand-in (the same generator as
+loadtest.py) and retrains every building through run_batch_training twice:
+  threaded   each fit in turn with as many threads as the scheduler allows (what a
+             loop over /train did before the planner)
+  planner    the default plan: single-threaded fits spread over pinned worker
+             processes when the batch is large enough
+and reports wall time, CPU seconds and achieved core utilization for each, and
+checks that both runs produced the same holdout metrics.
+
+Usage: python benchmarks/fit_planner.py [--buildings 24] [--months 48] [--model-types rf,xgb,gb]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+AI_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from loadtest import seed_database  # noqa: E402
+
+RESOURCE = 'electricity'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buildings', type=int, default=24)
+    parser.add_argument('--months', type=int, default=48)
+    parser.add_argument('--model-types', default='rf,xgb,gb')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='fit-planner-') as workdir:
+        db_path = os.path.join(workdir, 'campus.sqlite3')
+        buildings = seed_database(db_path, {'resources': [RESOURCE], 'buildings': args.buildings,
+                                            'months': args.months}, seed=11)
+        # main reads its settings at import time
+        os.environ.update({
+            'DB_ENGINE': 'sqlite',
+            'SQLITE_PATH': db_path,
+            'MODELS_DIR': os.path.join(workdir, 'models'),
+            'LOGS_DIR': os.path.join(workdir, 'logs'),
+            'TRACE_EXPORTER': 'none'
+        })
+        sys.path.insert(0, str(AI_DIR))
+        import main as service
+
+        request = service.TrainBatchRequest(resource_type=RESOURCE, building_ids=buildings,
+                                            model_types=args.model_types.split(','), ensemble_types=[])
+        settings = {
+            'threaded': {'FIT_ROWS_PER_THREAD': 1, 'FIT_PROCESS_MIN_FITS': 10 ** 9},
+            'planner': {}
+        }
+        defaults = {name: getattr(service, name) for name in ('FIT_ROWS_PER_THREAD', 'FIT_PROCESS_MIN_FITS')}
+        reports = {}
+        print(f"{'mode':<10} {'fits':>5} {'plan':>18} {'wall s':>8} {'cpu s':>8} {'utilization':>12}")
+        for mode, overrides in settings.items():
+            for name, value in {**defaults, **overrides}.items():
+                setattr(service, name, value)
+            reports[mode] = service.run_batch_training(request)
+            plan = reports[mode]['fit_plan']
+            layout = f"{plan['mode']} {plan['processes']}x{plan['threads_per_fit']}"
+            print(f"{mode:<10} {plan['fits']:>5} {layout:>18} {plan['wall_seconds']:>8.2f} {plan['cpu_seconds']:>8.2f} "
+                  f"{plan['utilization']:>11.0%}")
+
+        metrics = {mode: {b: r.get('metrics') for b, r in report['buildings'].items()} for mode, report in reports.items()}
+        assert metrics['threaded'] == metrics['planner'], 'planned fits produced different models'
+        speedup = reports['threaded']['fit_plan']['wall_seconds'] / reports['planner']['fit_plan']['wall_seconds']
+        print(f"{reports['planner']['buildings_trained']}/{len(buildings)} buildings trained, same metrics, "
+              f"{speedup:.2f}x on {reports['planner']['fit_plan']['cores']} cores")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+"""HTTP load test of one in-process API worker against a seeded SQLite stand-in.
+
+Seeds a synthetic campus (deterministic per scenario seed) into a fresh SQLite
+database, starts main.app under uvicorn in this process, trains the warmup
+buildings, then drives the scenario's workloads as open-loop Poisson arrivals
+at their configured rates and reports per-workload throughput and latency
+percentiles. Requests that start while a /train is in flight are also reported
+separately, which is where lane and core contention shows up.
+
+Scenarios live in benchmarks/scenarios/*.json:
+  name, description, seed, duration, warmup_seconds, max_in_flight
+  env          service settings applied before main is imported
+  dataset      resources, buildings, months, readings_per_month, end_month (YYYY-MM)
+  warmup       train: request body trained for the first `buildings` buildings
+  workloads    name, method, path, rate (req/s), optional body and choose;
+               "{building}" picks a trained building, "{field}" picks from choose[field]
+
+Usage: python benchmarks/loadtest.py benchmarks/scenarios/predict_during_train.json
+           [--duration 60] [--output report.json] [--compare previous_report.json]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+AI_DIR = Path(__file__).resolve().parent.parent
+TABLES = {'electricity': 'Electrics', 'water': 'Waters', 'naturalgas': 'NaturalGas', 'paper': 'Papers'}
+# Seasonal usage multiplier by month (index 0 unused)
+SEASONALITY = {
+    'electricity': [0, 1.25, 1.2, 1.05, 0.9, 0.85, 0.95, 1.1, 1.1, 0.9, 0.95, 1.05, 1.2],
+    'water': [0, 0.85, 0.85, 0.9, 1.0, 1.1, 1.25, 1.3, 1.3, 1.15, 1.0, 0.9, 0.85],
+    'naturalgas': [0, 1.8, 1.6, 1.2, 0.7, 0.4, 0.3, 0.3, 0.3, 0.4, 0.8, 1.3, 1.7],
+    'paper': [0, 1.1, 1.0, 1.1, 1.1, 1.2, 0.8, 0.3, 0.3, 1.1, 1.2, 1.2, 1.1]
+}
+PERCENTILES = [50, 90, 95, 99]
+
+
+def seed_database(path, dataset, seed):
+    """Write a deterministic synthetic campus; returns the building ids"""
+    rng = random.Random(seed)
+    buildings = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(dataset.get('buildings', 20))]
+    months = dataset.get('months', 48)
+    readings = dataset.get('readings_per_month', 2)
+    # A fixed last month keeps the data identical between runs on different days
+    end_year, end_month = (int(part) for part in dataset.get('end_month', '2025-06').split('-'))
+    start_year, start_month = divmod(end_year * 12 + end_month - months, 12)
+
+    connection = sqlite3.connect(path)
+    for resource_type in dataset.get('resources', ['electricity']):
+        table = TABLES[resource_type]
+        connection.execute(f"CREATE TABLE {table} (Id TEXT PRIMARY KEY, BuildingId TEXT NOT NULL, `Date` TEXT, `Usage` REAL)")
+        connection.execute(f"CREATE INDEX IX_{table}_BuildingId_Date ON {table} (BuildingId, `Date`)")
+        rows = []
+        for building_id in buildings:
+            base = math.exp(rng.gauss(8, 1))
+            growth = rng.uniform(-0.002, 0.006)
+            for m in range(months):
+                year, month = divmod(start_year * 12 + start_month + m, 12)
+                level = base * SEASONALITY[resource_type][month + 1] * (1 + growth) ** m / readings
+                for r in range(readings):
+                    day = 1 + r * 28 // readings
+                    usage = max(1.0, level * rng.gauss(1, 0.08))
+                    rows.append((str(uuid.UUID(int=rng.getrandbits(128))), building_id,
+                                 f"{year}-{month + 1:02d}-{day:02d} 00:00:00", usage))
+        connection.executemany(f"INSERT INTO {table} VALUES (?, ?, ?, ?)", rows)
+    connection.commit()
+    connection.close()
+    return buildings
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(app, port):
+    """Serve app from a background thread of this process"""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning', access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError('uvicorn exited during startup')
+        time.sleep(0.05)
+    return server, thread
+
+
+def fill(template, values):
+    """Substitute "{key}" placeholders in strings of a (nested) request template"""
+    if isinstance(template, str):
+        for key, value in values.items():
+            if template == f'{{{key}}}':
+                return value
+            template = template.replace(f'{{{key}}}', str(value))
+        return template
+    if isinstance(template, dict):
+        return {k: fill(v, values) for k, v in template.items()}
+    if isinstance(template, list):
+        return [fill(v, values) for v in template]
+    return template
+
+
+class LoadRun:
+    """Open-loop driver: arrivals are scheduled by rate, not by completions, so slow
+    responses cannot hide queueing (no coordinated omission)"""
+
+    def __init__(self, client, workloads, buildings, rng, max_in_flight):
+        self.client = client
+        self.workloads = workloads
+        self.buildings = buildings
+        self.rng = rng
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.trains_in_flight = 0
+        self.samples = []
+        self.dropped = {}
+        self.record = False
+
+    async def request(self, workload):
+        values = {'building': self.rng.choice(self.buildings)}
+        values.update({field: self.rng.choice(options) for field, options in workload.get('choose', {}).items()})
+        path = fill(workload['path'], values)
+        body = fill(workload.get('body'), values)
+        is_train = workload['path'].startswith('/train')
+        during_train = self.trains_in_flight > 0
+        self.in_flight += 1
+        self.trains_in_flight += is_train
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(workload.get('method', 'GET'), path, json=body)
+            status = response.status_code
+        except Exception as e:
+            status = type(e).__name__
+        finally:
+            self.in_flight -= 1
+            self.trains_in_flight -= is_train
+        if self.record:
+            self.samples.append((workload['name'], time.perf_counter() - started, status, during_train))
+
+    async def arrivals(self, workload, until, tasks):
+        rate = float(workload['rate'])
+        if rate <= 0:
+            return
+        next_at = time.perf_counter() + self.rng.expovariate(rate)
+        while next_at < until:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            if self.in_flight >= self.max_in_flight:
+                if self.record:
+                    self.dropped[workload['name']] = self.dropped.get(workload['name'], 0) + 1
+            else:
+                tasks.add(asyncio.ensure_future(self.request(workload)))
+            next_at += self.rng.expovariate(rate)
+
+    async def phase(self, seconds, record):
+        """Run every workload for seconds; returns the wall time including the drain"""
+        self.record = record
+        tasks = set()
+        started = time.perf_counter()
+        await asyncio.gather(*(self.arrivals(w, started + seconds, tasks) for w in self.workloads))
+        if tasks:
+            await asyncio.wait(tasks)
+        return time.perf_counter() - started
+
+
+def latency_stats(latencies):
+    if not latencies:
+        return {}
+    ms = np.asarray(latencies) * 1000
+    stats = {f'p{p}_ms': float(np.percentile(ms, p)) for p in PERCENTILES}
+    stats.update({'mean_ms': float(ms.mean()), 'max_ms': float(ms.max())})
+    return stats
+
+
+def summarize(run, seconds, measured):
+    workloads = {}
+    for workload in run.workloads:
+        name = workload['name']
+        samples = [s for s in run.samples if s[0] == name]
+        ok = [s for s in samples if s[2] == 200]
+        statuses = {}
+        for s in samples:
+            statuses[str(s[2])] = statuses.get(str(s[2]), 0) + 1
+        workloads[name] = {
+            'target_rate': float(workload['rate']),
+            'requests': len(samples),
+            'ok': len(ok),
+            'throughput_rps': len(ok) / measured,
+            'statuses': statuses,
+            'dropped': run.dropped.get(name, 0),
+            'latency': latency_stats([s[1] for s in ok]),
+            'latency_during_train': latency_stats([s[1] for s in ok if s[3]]),
+            'latency_idle': latency_stats([s[1] for s in ok if not s[3]])
+        }
+    ok = [s for s in run.samples if s[2] == 200]
+    return {
+        'duration_s': seconds,
+        'measured_s': measured,
+        'total_throughput_rps': len(ok) / measured,
+        'workloads': workloads
+    }
+
+
+def print_report(report, baseline=None):
+    print(f"scenario {report['scenario']}: {report['results']['duration_s']}s, "
+          f"{report['results']['total_throughput_rps']:.1f} ok req/s total")
+    header = f"{'workload':<14} {'rate':>6} {'ok/s':>7} {'ok':>6} {'non-200':>8} {'drop':>5}" + \
+             ''.join(f"{f'p{p} ms':>9}" for p in PERCENTILES) + f"{'p99 train':>10}"
+    print(header)
+    for name, w in report['results']['workloads'].items():
+        bad = w['requests'] - w['ok']
+        cells = ''.join(f"{w['latency'].get(f'p{p}_ms', float('nan')):>9.1f}" for p in PERCENTILES)
+        during = w['latency_during_train'].get('p99_ms', float('nan'))
+        print(f"{name:<14} {w['target_rate']:>6.2f} {w['throughput_rps']:>7.2f} {w['ok']:>6} {bad:>8} {w['dropped']:>5}"
+              f"{cells}{during:>10.1f}")
+        previous = (baseline or {}).get('results', {}).get('workloads', {}).get(name)
+        if previous and previous['latency'] and w['latency']:
+            deltas = []
+            for key in ('p50_ms', 'p99_ms'):
+                deltas.append(f"{key} {100 * (w['latency'][key] / previous['latency'][key] - 1):+.1f}%")
+            deltas.append(f"ok/s {100 * (w['throughput_rps'] / max(previous['throughput_rps'], 1e-9) - 1):+.1f}%")
+            print(f"{'':<14} vs baseline: " + ', '.join(deltas))
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=AI_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenario', help='scenario JSON file')
+    parser.add_argument('--duration', type=float, help='override the measured duration in seconds')
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--compare', help='earlier JSON report to print deltas against')
+    args = parser.parse_args()
+
+    scenario = json.loads(Path(args.scenario).read_text())
+    duration = args.duration or scenario.get('duration', 60)
+    seed = scenario.get('seed', 0)
+
+    with tempfile.TemporaryDirectory(prefix='loadtest-') as workdir:
+        db_path = os.path.join(workdir, 'campus.sqlite3')
+        buildings = seed_database(db_path, scenario.get('dataset', {}), seed)
+
+        # main reads its settings at import time
+        os.environ.update({
+            'DB_ENGINE': 'sqlite',
+            'SQLITE_PATH': db_path,
+            'MODELS_DIR': os.path.join(workdir, 'models'),
+            'LOGS_DIR': os.path.join(workdir, 'logs')
+        })
+        os.environ.update({key: str(value) for key, value in scenario.get('env', {}).items()})
+        sys.path.insert(0, str(AI_DIR))
+        import main as service
+        import httpx
+
+        port = free_port()
+        server, thread = start_server(service.app, port)
+
+        async def drive():
+            limits = httpx.Limits(max_connections=scenario.get('max_in_flight', 256))
+            async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=600, limits=limits) as client:
+                warmup = scenario.get('warmup', {})
+                trained = buildings[:warmup.get('buildings', len(buildings))]
+                if warmup.get('train'):
+                    started = time.perf_counter()
+                    for building_id in trained:
+                        response = await client.post('/train', json=fill(warmup['train'], {'building': building_id}))
+                        response.raise_for_status()
+                    print(f"trained {len(trained)} buildings in {time.perf_counter() - started:.1f}s")
+
+                run = LoadRun(client, scenario['workloads'], trained, random.Random(seed),
+                              scenario.get('max_in_flight', 256))
+                if scenario.get('warmup_seconds', 0) > 0:
+                    await run.phase(scenario['warmup_seconds'], record=False)
+                measured = await run.phase(duration, record=True)
+                return summarize(run, duration, measured)
+
+        try:
+            results = asyncio.run(drive())
+        finally:
+            server.should_exit = True
+            thread.join(timeout=10)
+
+    report = {
+        'scenario': scenario.get('name', Path(args.scenario).stem),
+        'revision': git_revision(),
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'config': {**scenario, 'duration': duration},
+        'results': results
+    }
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(report, baseline)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Run N worker processes against a temp directory and drain a work queue.
+
+Seeds a synthetic campus into a fresh SQLite stand-in (the same generator as
+loadtest.py), enqueues one training task per building and optionally a distributed
+backtest, then starts N `worker.py` processes sharing that database and a temp
+MODELS_DIR and waits until the queue is drained. --kill-after SIGKILLs one worker
+mid-run so its task has to be taken over once its lease expires.
+
+Reports wall time, tasks per worker, attempts, and checks that every building ended
+up with a published model version.
+
+Usage: python benchmarks/queue_workers.py [--workers 3] [--buildings 12] [--kill-after 5] [--backtest]
+"""
+import argparse
+import collections
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+AI_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from loadtest import seed_database  # noqa: E402
+
+RESOURCE = 'electricity'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--buildings', type=int, default=12)
+    parser.add_argument('--months', type=int, default=48)
+    parser.add_argument('--model-types', default='rf,xgb')
+    parser.add_argument('--kill-after', type=float, help='SIGKILL one worker this many seconds in')
+    parser.add_argument('--backtest', action='store_true', help='also enqueue a distributed backtest')
+    parser.add_argument('--lease', type=float, default=10, help='WORK_LEASE_SECONDS for the run')
+    parser.add_argument('--timeout', type=float, default=900)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='queue-workers-') as workdir:
+        db_path = os.path.join(workdir, 'campus.sqlite3')
+        buildings = seed_database(db_path, {'resources': [RESOURCE], 'buildings': args.buildings,
+                                            'months': args.months}, seed=7)
+        env = {
+            **os.environ,
+            'DB_ENGINE': 'sqlite',
+            'SQLITE_PATH': db_path,
+            'MODELS_DIR': os.path.join(workdir, 'models'),
+            'LOGS_DIR': os.path.join(workdir, 'logs'),
+            'TRACE_EXPORTER': 'none',
+            'WORK_LEASE_SECONDS': str(args.lease),
+            'WORK_HEARTBEAT_SECONDS': str(max(0.5, args.lease / 4)),
+            'WORK_POLL_SECONDS': '0.5',
+            'WORK_RETRY_BACKOFF_SECONDS': '1'
+        }
+        # main reads its settings at import time
+        os.environ.update(env)
+        sys.path.insert(0, str(AI_DIR))
+        import main as service
+
+        service.WorkQueue.bootstrap()
+        service.Backtester.bootstrap()
+        model_types = args.model_types.split(',')
+        for building_id in buildings:
+            body = service.TrainRequest(resource_type=RESOURCE, building_id=building_id, model_types=model_types,
+                                        ensemble_types=[])
+            service.WorkQueue.enqueue('train', body.model_dump(), dedupe_key=f'train:{RESOURCE}:{building_id}')
+        run_id = None
+        if args.backtest:
+            request = service.BacktestRequest(resource_type=RESOURCE, model_types=model_types, origins=2,
+                                              distributed=True)
+            run_id = service.Backtester.start(request)
+            service.Backtester.enqueue(run_id, request)
+
+        started = time.perf_counter()
+        workers = []
+        for i in range(args.workers):
+            log = open(os.path.join(workdir, f'worker-{i}.log'), 'w')
+            workers.append(subprocess.Popen([sys.executable, str(AI_DIR / 'worker.py')], cwd=workdir, env=env,
+                                            stdout=log, stderr=subprocess.STDOUT))
+        killed = None
+        try:
+            while True:
+                counts = service.WorkQueue.list_tasks(limit=1)['counts']
+                if not counts['queued'] and not counts['running']:
+                    break
+                elapsed = time.perf_counter() - started
+                if args.kill_after is not None and killed is None and elapsed >= args.kill_after:
+                    killed = workers[0].pid
+                    workers[0].send_signal(signal.SIGKILL)
+                    print(f"{elapsed:6.1f}s killed worker pid {killed}")
+                if elapsed > args.timeout:
+                    raise SystemExit(f'queue not drained after {args.timeout:.0f}s: {counts}')
+                time.sleep(0.5)
+            wall = time.perf_counter() - started
+        finally:
+            for worker in workers:
+                if worker.poll() is None:
+                    worker.terminate()
+            for worker in workers:
+                worker.wait()
+
+        tasks = service.WorkQueue.list_tasks(limit=500)['tasks']
+        per_worker = collections.Counter(task['lease_owner'] for task in tasks if task['status'] == 'done')
+        retried = [task for task in tasks if task['attempts'] > 1]
+        published = sum(service.ModelManager.current_version(service.ModelManager.get_building_dir(RESOURCE, b))
+                        is not None for b in buildings)
+
+        print(f"{len(tasks)} tasks drained by {args.workers} workers in {wall:.1f}s: {counts}")
+        for owner, done in sorted(per_worker.items()):
+            print(f"  {owner:<40} {done:>3} done")
+        print(f"tasks run more than once: {len(retried)}")
+        print(f"buildings with a published version: {published}/{len(buildings)}")
+        if run_id:
+            connection = service.get_db_connection()
+            try:
+                cursor = connection.cursor()
+                cursor.execute(f"SELECT status, buildings, origins_done, origins_failed, result_rows "
+                               f"FROM {service.BACKTEST_RUNS_TABLE} WHERE run_id = %s", (run_id,))
+                print(f"backtest {run_id}: {cursor.fetchone()}")
+            finally:
+                connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,43 +1,172 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 import pandas as pd
 import numpy as np
+import orjson
 import pymysql
 import pickle
 import os
 import json
 from datetime import datetime, timedelta
 import xgboost as xgb
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, HistGradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler, RobustScaler
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from scipy.optimize import nnls
+from threadpoolctl import ThreadpoolController, threadpool_limits
 import logging
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
 import asyncio
-from contextlib import asynccontextmanager
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+import multiprocessing
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager, nullcontext
 from dotenv import load_dotenv
 import math
+import sqlite3
+import time
+from collections import OrderedDict, deque
+from decimal import Decimal
 import warnings
 import re
+import hashlib
+import shutil
+import inspect
+import threading
+import functools
+import uuid
+import socket
+import fcntl
+import email.utils
 warnings.filterwarnings('ignore')
 
 # Load environment variables
 load_dotenv()
 
+# Correlation ID of the request being served (X-Correlation-ID), stamped on every log line
+correlation_id_var: contextvars.ContextVar = contextvars.ContextVar('correlation_id', default='-')
+
+class CorrelationIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id_var.get()
+        return True
+
 # Logging setup
 logging.basicConfig(
     level=logging.INFO if os.getenv('DEBUG', 'false').lower() == 'true' else logging.WARNING,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s'
 )
+for handler in logging.getLogger().handlers:
+    handler.addFilter(CorrelationIdFilter())
 logger = logging.getLogger(__name__)
 
+# Response encoding
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson, byte-identical to Starlette's json.dumps rendering.
+    
+    orjson writes floats below 1e-4 and from 1e16 up differently from Python's repr
+    (0.00001 vs 1e-05, 1e16 vs 1e+16), so those number tokens are respelled with repr.
+    Number tokens are looked for only outside strings (the body split on quotes);
+    bodies with escaped quotes, and content orjson rejects, go through json.dumps.
+    NaN/inf are written as null, which pydantic already does for response models.
+    """
+    # Number tokens orjson may spell differently contain an exponent or four leading fractional zeros
+    DIVERGENT_MARKERS = (b'e', b'.0000')
+    NUMBER_BYTES = frozenset(b'0123456789.-+e')
+    
+    @staticmethod
+    def respell_numbers(outside: bytes) -> bytes:
+        """Respell the divergent number tokens of the out-of-string text with repr"""
+        spans = set()
+        for marker in FastJSONResponse.DIVERGENT_MARKERS:
+            pos = outside.find(marker)
+            while pos != -1:
+                start, end = pos, pos + len(marker)
+                while start and outside[start - 1] in FastJSONResponse.NUMBER_BYTES:
+                    start -= 1
+                while end < len(outside) and outside[end] in FastJSONResponse.NUMBER_BYTES:
+                    end += 1
+                # An 'e' of true/false expands to itself
+                if outside[start] in b'-0123456789':
+                    spans.add((start, end))
+                pos = outside.find(marker, end)
+        chunks, last = [], 0
+        for start, end in sorted(spans):
+            chunks += [outside[last:start], repr(float(outside[start:end])).encode()]
+            last = end
+        chunks.append(outside[last:])
+        return b''.join(chunks)
+    
+    def render(self, content: Any) -> bytes:
+        try:
+            body = orjson.dumps(content)
+        except TypeError:
+            return super().render(content)
+        if b'\\"' in body:
+            return super().render(content)
+        pieces = body.split(b'"')
+        outside = b'"'.join(pieces[0::2])
+        # Outside strings an 'e' is either in true/false or in an exponent
+        if (outside.count(b'e') == outside.count(b'true') + outside.count(b'false')
+                and b'.0000' not in outside):
+            return body
+        pieces[0::2] = FastJSONResponse.respell_numbers(outside).split(b'"')
+        return b'"'.join(pieces)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Bootstrap rollup, backtest and work queue tables and the model index, collect retired model
+    versions, and run the rollup refresh job, anomaly pulls and any in-process queue workers for the lifetime of the app"""
+    refresh_task = None
+    pull_task = None
+    if ROLLUPS_ENABLED:
+        try:
+            report = await asyncio.get_running_loop().run_in_executor(None, RollupManager.bootstrap)
+            logger.info(f"Rollup bootstrap: {report}")
+            refresh_task = asyncio.create_task(RollupManager.refresh_loop())
+        except Exception as e:
+            logger.warning(f"Rollup bootstrap failed, loaders will read raw tables: {e}")
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, Backtester.bootstrap)
+        await asyncio.get_running_loop().run_in_executor(None, WorkQueue.bootstrap)
+    except Exception as e:
+        logger.warning(f"Backtest or work queue table bootstrap failed: {e}")
+    # Fit worker processes would not yield to queued predictions, so they stay off the inference lane's cores
+    FitPlanner.reserved_cores = min(INFERENCE_CONCURRENCY, FitPlanner.cores())
+    for _ in range(WORK_QUEUE_WORKERS):
+        worker = Worker()
+        Worker.local.append(worker)
+        threading.Thread(target=worker.run, name=f'queue-worker-{len(Worker.local)}', daemon=True).start()
+    try:
+        removed = await asyncio.get_running_loop().run_in_executor(None, ModelManager.gc_all)
+        logger.info(f"Model version GC: removed {removed} retired versions")
+    except Exception as e:
+        logger.warning(f"Model version GC failed: {e}")
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, ModelIndex.build)
+    except Exception as e:
+        logger.warning(f"Model index build failed, it will be built on first use: {e}")
+    if ANOMALY_PULL_INTERVAL > 0:
+        pull_task = asyncio.create_task(AnomalyService.pull_loop())
+    yield
+    if refresh_task is not None:
+        refresh_task.cancel()
+    if pull_task is not None:
+        pull_task.cancel()
+    for worker in Worker.local:
+        worker.stop()
+
 # FastAPI app initialization
 app = FastAPI(
     title="Energy Consumption Prediction API",
     description="Machine Learning API for predicting energy consumption (Electricity, Water, Natural Gas, Paper)",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # CORS middleware
@@ -60,20 +189,288 @@ DB_CONFIG = {
     'cursorclass': pymysql.cursors.DictCursor
 }
 
+# DB_ENGINE=sqlite swaps MySQL for a local file-backed stand-in (development and load testing)
+DB_ENGINE = os.getenv('DB_ENGINE', 'mysql').lower()
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'carbonwise.sqlite3')
+
+# Async read path: bounded pool for blocking pymysql calls and per-query timeout (seconds)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 4))
+DB_QUERY_TIMEOUT = float(os.getenv('DB_QUERY_TIMEOUT', 30))
+# Seconds to connect the side connection that kills a timed-out or abandoned query
+DB_KILL_CONNECT_TIMEOUT = int(os.getenv('DB_KILL_CONNECT_TIMEOUT', 5))
+HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', 5))
+DATA_INFO_CACHE_SIZE = int(os.getenv('DATA_INFO_CACHE_SIZE', 256))
+# Seconds a data watermark (what ETags of /data-info and /predict hash) is reused before it is read again
+DATA_WATERMARK_TTL = float(os.getenv('DATA_WATERMARK_TTL', 5))
+DISCONNECT_POLL_INTERVAL = float(os.getenv('DISCONNECT_POLL_INTERVAL', 0.25))
+
+# Monthly rollup tables maintained by this service (seconds for interval and max age)
+ROLLUPS_ENABLED = os.getenv('ROLLUPS_ENABLED', 'true').lower() == 'true'
+ROLLUP_REFRESH_INTERVAL = float(os.getenv('ROLLUP_REFRESH_INTERVAL', 300))
+ROLLUP_MAX_AGE = float(os.getenv('ROLLUP_MAX_AGE', 900))
+ROLLUP_LOOKBACK_MONTHS = int(os.getenv('ROLLUP_LOOKBACK_MONTHS', 2))
+# Months before the lookback window checked against the source per refresh
+ROLLUP_VERIFY_MONTHS = int(os.getenv('ROLLUP_VERIFY_MONTHS', 6))
+ROLLUP_CREATE_INDEXES = os.getenv('ROLLUP_CREATE_INDEXES', 'false').lower() == 'true'
+
+# Scheduler lanes: interactive inference vs batch training
+INFERENCE_CONCURRENCY = int(os.getenv('INFERENCE_CONCURRENCY', os.cpu_count() or 1))
+INFERENCE_MAX_QUEUE = int(os.getenv('INFERENCE_MAX_QUEUE', 64))
+TRAINING_CONCURRENCY = int(os.getenv('TRAINING_CONCURRENCY', 1))
+TRAINING_MAX_QUEUE = int(os.getenv('TRAINING_MAX_QUEUE', 8))
+LANE_REJECT_STATUS = int(os.getenv('LANE_REJECT_STATUS', 429))
+RF_FIT_CHUNK = int(os.getenv('RF_FIT_CHUNK', 50))
+
+# Fit planner: a fit gets one more thread per this many training rows; batches of at least
+# FIT_PROCESS_MIN_FITS fits spread over up to FIT_PROCESSES worker processes (0: one per core;
+# in the API process, one per core left after INFERENCE_CONCURRENCY)
+FIT_ROWS_PER_THREAD = int(os.getenv('FIT_ROWS_PER_THREAD', 2000))
+FIT_PROCESS_MIN_FITS = int(os.getenv('FIT_PROCESS_MIN_FITS', 8))
+FIT_PROCESSES = int(os.getenv('FIT_PROCESSES', 0))
+
+# Post-training random forest compaction
+RF_COMPACTION = os.getenv('RF_COMPACTION', 'true').lower() == 'true'
+# Sibling leaves merge when the subtree's leaf values span at most this fraction of the mean target
+RF_LEAF_TOLERANCE = float(os.getenv('RF_LEAF_TOLERANCE', 0.001))
+# Keep the shortest tree prefix whose holdout RMSE is within this fraction of the full forest (0 keeps all)
+RF_PREFIX_EPSILON = float(os.getenv('RF_PREFIX_EPSILON', 0.0))
+# Floor on the prefix so per-tree prediction intervals keep enough trees
+RF_PREFIX_MIN_TREES = int(os.getenv('RF_PREFIX_MIN_TREES', 50))
+
+# Rolling-origin backtests: origins per building, months forecast from each, worker processes
+BACKTEST_ORIGINS = int(os.getenv('BACKTEST_ORIGINS', 6))
+BACKTEST_HORIZON = int(os.getenv('BACKTEST_HORIZON', 3))
+BACKTEST_WORKERS = int(os.getenv('BACKTEST_WORKERS', os.cpu_count() or 1))
+# A run still going after this many seconds stops submitting origins and is marked partial
+BACKTEST_DEADLINE_SECONDS = float(os.getenv('BACKTEST_DEADLINE_SECONDS', 6 * 3600))
+
+# Shared work queue: lease length and heartbeat period, attempts before a task fails, first retry delay (doubles)
+WORK_LEASE_SECONDS = float(os.getenv('WORK_LEASE_SECONDS', 120))
+WORK_HEARTBEAT_SECONDS = float(os.getenv('WORK_HEARTBEAT_SECONDS', 30))
+WORK_MAX_ATTEMPTS = int(os.getenv('WORK_MAX_ATTEMPTS', 3))
+WORK_RETRY_BACKOFF_SECONDS = float(os.getenv('WORK_RETRY_BACKOFF_SECONDS', 30))
+# Idle workers poll this often; queue workers run inside the API process (0: only worker.py consumes)
+WORK_POLL_SECONDS = float(os.getenv('WORK_POLL_SECONDS', 2))
+WORK_QUEUE_WORKERS = int(os.getenv('WORK_QUEUE_WORKERS', 0))
+# Seconds a training run waits for another process (API replica or worker) training the same target
+TRAINING_LOCK_TIMEOUT = float(os.getenv('TRAINING_LOCK_TIMEOUT', 3600))
+
+# model_type='auto': models within this many MAPE points of the best are tied and the cheapest wins
+AUTO_MAPE_TIE = float(os.getenv('AUTO_MAPE_TIE', 0.1))
+
+# Prediction bands from holdout residuals: fewest residuals a split-conformal band is computed from
+# (a building model with fewer borrows the pooled relative residuals of its resource's other buildings)
+BAND_MIN_RESIDUALS = int(os.getenv('BAND_MIN_RESIDUALS', 20))
+
+# Re-validate response models the service builds itself before encoding them (off: encode directly)
+VALIDATE_RESPONSES = os.getenv('VALIDATE_RESPONSES', 'false').lower() == 'true'
+
+# Global-vs-building report: global wins a model type if its mean MAPE is within this many points
+GLOBAL_SCOPE_MAPE_TOLERANCE = float(os.getenv('GLOBAL_SCOPE_MAPE_TOLERANCE', 1.0))
+
+# Streaming anomaly detection: a reading, or a month's total against its forecast, beyond this many standard deviations
+ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', 4.0))
+# Readings and closed months a building's statistics need before their z-scores flag anything
+ANOMALY_MIN_READINGS = int(os.getenv('ANOMALY_MIN_READINGS', 30))
+ANOMALY_MIN_RESIDUALS = int(os.getenv('ANOMALY_MIN_RESIDUALS', 3))
+# Relative deviation from a month's forecast that flags a running total, and closed months until residuals are known
+ANOMALY_FORECAST_TOLERANCE = float(os.getenv('ANOMALY_FORECAST_TOLERANCE', 0.25))
+# Months forecast for a building first seen without a recorded /predict forecast
+ANOMALY_FORECAST_MONTHS = int(os.getenv('ANOMALY_FORECAST_MONTHS', 12))
+# Seconds between pulls of new table rows (0: only on POST /anomalies/pull), and rows read per pull
+ANOMALY_PULL_INTERVAL = float(os.getenv('ANOMALY_PULL_INTERVAL', 0))
+ANOMALY_PULL_BATCH = int(os.getenv('ANOMALY_PULL_BATCH', 50000))
+# Most recent anomalies kept for GET /anomalies
+ANOMALY_HISTORY = int(os.getenv('ANOMALY_HISTORY', 1000))
+
+# Emission factors in tonnes CO2e per 1000 usage units, applied as (usage / 1000) * factor.
+# Only electricity (0.84 per MWh) matches the backend's CarbonFootprint; the backend has no
+# water, natural gas or paper factor, so those defaults are placeholders to configure per deployment
+EMISSION_FACTORS = {
+    'electricity': float(os.getenv('EMISSION_FACTOR_ELECTRICITY', 0.84)),
+    'water': float(os.getenv('EMISSION_FACTOR_WATER', 0.344)),
+    'naturalgas': float(os.getenv('EMISSION_FACTOR_NATURALGAS', 2.0)),
+    'paper': float(os.getenv('EMISSION_FACTOR_PAPER', 0.92))
+}
+# Where each configured factor comes from, reported with every carbon forecast
+EMISSION_FACTOR_SOURCES = {
+    resource_type: 'environment' if os.getenv(f'EMISSION_FACTOR_{resource_type.upper()}') is not None
+    else 'backend' if resource_type == 'electricity' else 'placeholder'
+    for resource_type in EMISSION_FACTORS
+}
+# Carbon forecasts leave out buildings whose data ends more than this many months before the newest
+CARBON_MAX_STALE_MONTHS = int(os.getenv('CARBON_MAX_STALE_MONTHS', 3))
+
 # Model storage paths from environment
 MODELS_DIR = Path(os.getenv('MODELS_DIR', 'models'))
 MODELS_DIR.mkdir(exist_ok=True)
 LOGS_DIR = Path(os.getenv('LOGS_DIR', 'logs'))
 LOGS_DIR.mkdir(exist_ok=True)
+# Rewritten with a fresh token on every train/delete; the registry's version for indexes and ETags
+REGISTRY_VERSION_FILE = MODELS_DIR / '.registry_version'
+# Artifact versions: a replaced version is kept this many seconds for readers that pinned it, then removed
+MODEL_VERSION_GRACE_SECONDS = float(os.getenv('MODEL_VERSION_GRACE_SECONDS', 600))
+# Loaded models kept in memory, keyed by their immutable version path
+MODEL_CACHE_SIZE = int(os.getenv('MODEL_CACHE_SIZE', 16))
+
+# Persisted engineered feature matrices
+FEATURE_STORE_ENABLED = os.getenv('FEATURE_STORE_ENABLED', 'true').lower() == 'true'
+FEATURE_STORE_DIR = Path(os.getenv('FEATURE_STORE_DIR', str(MODELS_DIR / '_features')))
+# Dtype of the model input matrix; recorded with every artifact
+FEATURE_DTYPE = 'float32'
+
+# Tracing: spans exported as OTLP/JSON lines to a file, stdout, or nowhere (the default)
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'none').lower()
+TRACE_FILE = Path(os.getenv('TRACE_FILE', str(LOGS_DIR / 'traces.jsonl')))
+# The trace file rolls over at this size, keeping this many old files
+TRACE_FILE_MAX_BYTES = int(os.getenv('TRACE_FILE_MAX_BYTES', 50 * 1024 * 1024))
+TRACE_FILE_BACKUPS = int(os.getenv('TRACE_FILE_BACKUPS', 3))
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'energy-ai')
 
 # Environment info
 ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')
 DEBUG = os.getenv('DEBUG', 'false').lower() == 'true'
 
 logger.info(f"Starting API in {ENVIRONMENT} mode, Debug: {DEBUG}")
-logger.info(f"Database Host: {DB_CONFIG['host']}:{DB_CONFIG['port']}")
+if DB_ENGINE == 'sqlite':
+    logger.info(f"Database: SQLite stand-in at {SQLITE_PATH}")
+else:
+    logger.info(f"Database Host: {DB_CONFIG['host']}:{DB_CONFIG['port']}")
 logger.info(f"Models Directory: {MODELS_DIR}")
 
+# Span-based tracing
+class Tracer:
+    """Minimal span tracer with an OTLP/JSON line exporter.
+    
+    The trace id comes from an incoming W3C traceparent header, else from the
+    X-Correlation-ID (the .NET side sends GUIDs, which are valid trace ids), so
+    spans from both services line up under one trace. The current span lives in a
+    ContextVar, which the scheduler lanes copy into their worker threads.
+    """
+    SPAN_KIND_INTERNAL = 1
+    SPAN_KIND_SERVER = 2
+    STATUS_OK = 1
+    STATUS_ERROR = 2
+    current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+    _lock = threading.Lock()
+    _file = None
+    
+    @staticmethod
+    def trace_id_for(correlation_id: str) -> str:
+        try:
+            return uuid.UUID(correlation_id).hex
+        except ValueError:
+            return hashlib.md5(correlation_id.encode()).hexdigest()
+    
+    @staticmethod
+    def root_trace_id() -> str:
+        """Trace id for a span without a parent: the request's correlation ID, else random"""
+        correlation_id = correlation_id_var.get()
+        return Tracer.trace_id_for(correlation_id) if correlation_id != '-' else os.urandom(16).hex()
+    
+    @staticmethod
+    def parse_traceparent(header: Optional[str]) -> Optional[tuple]:
+        """(trace_id, parent_span_id) from a W3C traceparent header, if well formed"""
+        match = re.fullmatch(r'[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}', (header or '').strip())
+        return (match.group(1), match.group(2)) if match else None
+    
+    @staticmethod
+    def attribute(key: str, value: Any) -> Dict:
+        if isinstance(value, bool):
+            return {'key': key, 'value': {'boolValue': value}}
+        if isinstance(value, (int, np.integer)):
+            return {'key': key, 'value': {'intValue': str(int(value))}}
+        if isinstance(value, (float, np.floating)):
+            return {'key': key, 'value': {'doubleValue': float(value)}}
+        return {'key': key, 'value': {'stringValue': str(value)}}
+    
+    @staticmethod
+    def export(span: Dict) -> None:
+        record = json.dumps({'resourceSpans': [{
+            'resource': {'attributes': [Tracer.attribute('service.name', TRACE_SERVICE_NAME)]},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': [span]}]
+        }]})
+        with Tracer._lock:
+            if TRACE_EXPORTER == 'stdout':
+                print(record, flush=True)
+            elif TRACE_EXPORTER == 'file':
+                if Tracer._file is None:
+                    TRACE_FILE.parent.mkdir(parents=True, exist_ok=True)
+                    Tracer._file = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES,
+                                                       backupCount=TRACE_FILE_BACKUPS, encoding='utf-8')
+                Tracer._file.emit(logging.makeLogRecord({'msg': record}))
+    
+    @staticmethod
+    @contextmanager
+    def span(name: str, kind: int = SPAN_KIND_INTERNAL, trace_id: Optional[str] = None,
+             parent_id: Optional[str] = None, **attributes):
+        """Record a span around the block; yields its mutable attribute dict"""
+        if TRACE_EXPORTER == 'none':
+            yield attributes
+            return
+        parent = Tracer.current_span.get()
+        span = {
+            'traceId': trace_id or (parent['traceId'] if parent else Tracer.root_trace_id()),
+            'spanId': os.urandom(8).hex(),
+            'parentSpanId': parent_id or (parent['spanId'] if parent else ''),
+            'name': name,
+            'kind': kind,
+            'startTimeUnixNano': str(time.time_ns())
+        }
+        token = Tracer.current_span.set(span)
+        status = {'code': Tracer.STATUS_OK}
+        try:
+            yield attributes
+        except Exception as e:
+            status = {'code': Tracer.STATUS_ERROR, 'message': str(e)[:500]}
+            raise
+        finally:
+            Tracer.current_span.reset(token)
+            span['endTimeUnixNano'] = str(time.time_ns())
+            span['attributes'] = [Tracer.attribute(k, v) for k, v in attributes.items() if v is not None]
+            span['status'] = status
+            Tracer.export(span)
+    
+    @staticmethod
+    def traced(name: str, *attribute_args: str):
+        """Decorator: run the function inside a span carrying the named arguments as attributes"""
+        def decorator(fn):
+            signature = inspect.signature(fn)
+            
+            def attributes_for(args, kwargs) -> Dict:
+                bound = signature.bind_partial(*args, **kwargs).arguments
+                return {arg: bound[arg] for arg in attribute_args if arg in bound}
+            
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with Tracer.span(name, **attributes_for(args, kwargs)):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+            
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with Tracer.span(name, **attributes_for(args, kwargs)):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Adopt or mint the correlation ID, wrap the request in a server span and echo the ID back"""
+    correlation_id = request.headers.get('X-Correlation-ID') or str(uuid.uuid4())
+    correlation_id_var.set(correlation_id)
+    trace_id, parent_id = Tracer.parse_traceparent(request.headers.get('traceparent')) or (None, None)
+    
+    with Tracer.span(f"{request.method} {request.url.path}", kind=Tracer.SPAN_KIND_SERVER,
+                     trace_id=trace_id, parent_id=parent_id,
+                     **{'http.method': request.method, 'http.target': request.url.path,
+                        'correlation.id': correlation_id}) as attributes:
+        response = await call_next(request)
+        attributes['http.status_code'] = response.status_code
+    response.headers['X-Correlation-ID'] = correlation_id
+    return response
+
 # Resource types and their database tables
 RESOURCE_MAPPING = {
     'electricity': 'Electrics',
@@ -82,9 +479,56 @@ RESOURCE_MAPPING = {
     'paper': 'Papers'
 }
 
+# Sections of the /data-info response that clients can select via ?fields=
+DATA_INFO_FIELDS = ['total_records', 'date_range', 'usage_stats', 'sufficient_for_training', 'monthly_data']
+
 # Model types
-MODEL_TYPES = ['rf', 'xgb', 'gb']
-ENSEMBLE_TYPES = ['rf_gb', 'rf_xgb', 'gb_xgb', 'rf_gb_xgb']
+MODEL_TYPES = ['rf', 'xgb', 'gb', 'hgb', 'xgb_hist', 'snaive', 'hw']
+# Per-building statistical forecasters persisted as a SeasonalState instead of an estimator
+STATE_MODEL_TYPES = ['snaive', 'hw']
+# XGBoost variants by split finding: exact enumeration or binned histograms
+XGB_TREE_METHODS = {'xgb': 'exact', 'xgb_hist': 'hist'}
+ENSEMBLE_TYPES = ['rf_gb', 'rf_xgb', 'gb_xgb', 'rf_gb_xgb', 'rf_hgb', 'hgb_xgb', 'rf_hgb_xgb', 'rf_hw', 'hw_xgb',
+                  'rf_xgb_hist', 'hgb_xgb_hist']
+ENSEMBLE_COMPONENTS = {
+    'rf_gb': ['rf', 'gb'],
+    'rf_xgb': ['rf', 'xgb'],
+    'gb_xgb': ['gb', 'xgb'],
+    'rf_gb_xgb': ['rf', 'gb', 'xgb'],
+    'rf_hgb': ['rf', 'hgb'],
+    'hgb_xgb': ['hgb', 'xgb'],
+    'rf_hgb_xgb': ['rf', 'hgb', 'xgb'],
+    'rf_hw': ['rf', 'hw'],
+    'hw_xgb': ['hw', 'xgb'],
+    'rf_xgb_hist': ['rf', 'xgb_hist'],
+    'hgb_xgb_hist': ['hgb', 'xgb_hist']
+}
+ENSEMBLE_WEIGHTS = {
+    'rf_gb': [0.6, 0.4],
+    'rf_xgb': [0.5, 0.5],
+    'gb_xgb': [0.4, 0.6],
+    'rf_gb_xgb': [0.4, 0.3, 0.3],
+    'rf_hgb': [0.6, 0.4],
+    'hgb_xgb': [0.4, 0.6],
+    'rf_hgb_xgb': [0.4, 0.3, 0.3],
+    'rf_hw': [0.5, 0.5],
+    'hw_xgb': [0.5, 0.5],
+    'rf_xgb_hist': [0.5, 0.5],
+    'hgb_xgb_hist': [0.4, 0.6]
+}
+# What requests that name no types train; the other model types and their ensembles are opt-in
+DEFAULT_MODEL_TYPES = ['rf', 'xgb', 'gb']
+DEFAULT_ENSEMBLE_TYPES = ['rf_gb', 'rf_xgb', 'gb_xgb', 'rf_gb_xgb']
+ENSEMBLE_WEIGHTING = ['fixed', 'nnls']
+
+# Training scopes: one model per building, or one panel model per resource over all buildings
+AUTO_MODEL_TYPE = 'auto'
+MODEL_SCOPES = ['building', 'global']
+GLOBAL_BUILDING_ID = 'global'
+GLOBAL_BUILDING_FEATURES = ['BuildingCode', 'BuildingLogScale']
+
+# Forecast step: month is the default pipeline (and the only one rollups serve); week and day aggregate raw readings
+GRANULARITIES = ['month', 'week', 'day']
 
 # Utility functions
 def safe_float_conversion(value):
@@ -108,6 +552,19 @@ def safe_float_conversion(value):
     except (ValueError, TypeError):
         return 0.0
 
+def safe_float_array(values) -> np.ndarray:
+    """safe_float_conversion over a whole array at once: non-finite and |x| < 1e-10 become 0.0"""
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isfinite(values) & (np.abs(values) >= 1e-10), values, 0.0)
+
+def response_content(model: Any) -> Any:
+    """JSON-ready content of response model(s) built by the service, skipping FastAPI's re-validation"""
+    if isinstance(model, list):
+        return [response_content(item) for item in model]
+    if VALIDATE_RESPONSES:
+        model = type(model).model_validate(model.model_dump())
+    return model.model_dump(mode='json')
+
 def safe_dict_conversion(data_dict):
     """Safely convert dictionary values for JSON serialization"""
     safe_dict = {}
@@ -150,17 +607,72 @@ class TrainRequest(BaseModel):
     model_config = {"protected_namespaces": ()}
     resource_type: str = Field(..., description="Resource type: electricity, water, naturalgas, paper")
     building_id: Optional[str] = Field("0", description="Building ID (0 for all buildings, or UUID string)")
-    model_types: Optional[List[str]] = Field(default_factory=lambda: MODEL_TYPES,
+    model_types: Optional[List[str]] = Field(default_factory=lambda: DEFAULT_MODEL_TYPES,
                                            description="Model types to train")
-    ensemble_types: Optional[List[str]] = Field(default_factory=lambda: ENSEMBLE_TYPES,
+    ensemble_types: Optional[List[str]] = Field(default_factory=lambda: DEFAULT_ENSEMBLE_TYPES,
                                               description="Ensemble types to create")
+    scope: Optional[str] = Field("building", description="building: per-building models, global: one model per resource over all buildings")
+    ensemble_weighting: Optional[str] = Field("fixed", description="fixed: preset ensemble weights, nnls: non-negative least squares fit on the last training rows, ahead of the holdout")
+    granularity: Optional[str] = Field("month", description="Forecast step: month, week or day (week and day: building scope, non-state model types)")
 
 class PredictRequest(BaseModel):
     model_config = {"protected_namespaces": ()}
     resource_type: str = Field(..., description="Resource type")
     building_id: Optional[str] = Field("0", description="Building ID (0 for all buildings, or UUID string)")
-    model_type: str = Field(..., description="Model type or ensemble type")
+    model_type: str = Field(..., description="Model type, ensemble type, or 'auto' for the stored model with the lowest holdout MAPE")
+    months_ahead: Optional[int] = Field(12, description="Number of months to predict (weeks or days at those granularities)")
+    scope: Optional[str] = Field("building", description="building: the building's own model, global: the resource-wide panel model")
+    granularity: Optional[str] = Field("month", description="Forecast step of the models to use: month, week or day")
+    intervals: Optional[bool] = Field(False, description="Add prediction intervals at the requested quantiles")
+    quantiles: Optional[List[float]] = Field(default_factory=lambda: [0.1, 0.9],
+                                            description="Interval quantiles in (0, 1), used when intervals is true")
+
+class BatchForecastRequest(BaseModel):
+    model_config = {"protected_namespaces": ()}
+    resource_type: str = Field(..., description="Resource type")
+    model_type: str = Field('hw', description="State model type: snaive or hw")
+    building_ids: Optional[List[str]] = Field(None, description="Buildings to forecast (default: every building with a model_type model)")
     months_ahead: Optional[int] = Field(12, description="Number of months to predict")
+    catch_up: Optional[bool] = Field(True, description="Fold in months observed since training before forecasting")
+
+class CarbonForecastRequest(BaseModel):
+    model_config = {"protected_namespaces": ()}
+    building_ids: Optional[List[str]] = Field(None, description="Buildings to project (default: every building with usage data)")
+    resource_types: Optional[List[str]] = Field(None, description="Resources to include (default: all four)")
+    model_type: str = Field('hw', description="State model type: snaive or hw")
+    months_ahead: Optional[int] = Field(12, description="Number of months to project")
+    max_stale_months: Optional[int] = Field(CARBON_MAX_STALE_MONTHS, description="Buildings whose data ends more than this many months before the newest are reported as missing")
+    emission_factors: Optional[Dict[str, float]] = Field(None, description="Per-resource overrides of EMISSION_FACTORS (tCO2e per 1000 usage units)")
+
+class AnomalyReading(BaseModel):
+    building_id: str = Field(..., description="Building ID")
+    date: datetime = Field(..., description="Reading timestamp")
+    usage: float = Field(..., description="Reading value in the resource's usage units")
+
+class AnomalyIngestRequest(BaseModel):
+    resource_type: str = Field(..., description="Resource type")
+    readings: List[AnomalyReading] = Field(..., description="New readings, oldest first per building")
+
+class BacktestRequest(BaseModel):
+    model_config = {"protected_namespaces": ()}
+    resource_type: str = Field(..., description="Resource type")
+    building_ids: Optional[List[str]] = Field(None, description="Buildings to replay (default: every building with enough history)")
+    model_types: Optional[List[str]] = Field(default_factory=lambda: DEFAULT_MODEL_TYPES + DEFAULT_ENSEMBLE_TYPES,
+                                           description="Model and ensemble types to replay")
+    origins: Optional[int] = Field(BACKTEST_ORIGINS, description="Forecast origins per building, ending at the latest month that leaves a full horizon")
+    horizon: Optional[int] = Field(BACKTEST_HORIZON, description="Months forecast from each origin")
+    step: Optional[int] = Field(1, description="Months between consecutive origins")
+    distributed: Optional[bool] = Field(False, description="Run as one work queue task per building instead of in this process")
+
+class TrainBatchRequest(BaseModel):
+    model_config = {"protected_namespaces": ()}
+    resource_type: str = Field(..., description="Resource type")
+    building_ids: Optional[List[str]] = Field(None, description="Buildings to train (default: every building with data)")
+    model_types: Optional[List[str]] = Field(default_factory=lambda: DEFAULT_MODEL_TYPES, description="Model types to train")
+    ensemble_types: Optional[List[str]] = Field(default_factory=lambda: DEFAULT_ENSEMBLE_TYPES, description="Ensemble types to create")
+    ensemble_weighting: Optional[str] = Field("fixed", description="fixed or nnls, as for /train")
+    granularity: Optional[str] = Field("month", description="month, week or day, as for /train")
+    priority: Optional[int] = Field(0, description="/tasks/train only: higher priority tasks are claimed first")
 
 class TrainResponse(BaseModel):
     model_config = {"protected_namespaces": ()}
@@ -184,148 +696,400 @@ class ModelInfo(BaseModel):
     trained_at: str
     metrics: Dict[str, float]
     data_points: int
+    scope: str = 'building'
+    granularity: str = 'month'
+
+# SQLite stand-in exposing the small pymysql surface the service uses
+class SQLiteCursor:
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+    
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+    
+    def execute(self, query: str, params: Optional[tuple] = None) -> int:
+        # pymysql uses %s placeholders; sqlite3 uses ?
+        self._cursor.execute(query.replace('%s', '?'), tuple(params or ()))
+        return self._cursor.rowcount
+    
+    def fetchone(self) -> Optional[Dict]:
+        row = self._cursor.fetchone()
+        return dict(row) if row is not None else None
+    
+    def fetchall(self) -> List[Dict]:
+        return [dict(row) for row in self._cursor.fetchall()]
+
+class SQLiteConnection:
+    def __init__(self, path: str):
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        # MySQL date functions used by the aggregation queries; YEARWEEK only in mode 3 (ISO weeks)
+        self._connection.create_function('YEAR', 1, lambda value: int(str(value)[:4]) if value else None)
+        self._connection.create_function('MONTH', 1, lambda value: int(str(value)[5:7]) if value else None)
+        self._connection.create_function('YEARWEEK', 2, SQLiteConnection.iso_yearweek)
+    
+    @staticmethod
+    def iso_yearweek(value: Any, mode: int) -> Optional[int]:
+        if not value:
+            return None
+        iso = datetime.fromisoformat(str(value)[:10]).isocalendar()
+        return iso[0] * 100 + iso[1]
+    
+    def cursor(self) -> SQLiteCursor:
+        return SQLiteCursor(self._connection.cursor())
+    
+    def commit(self) -> None:
+        self._connection.commit()
+    
+    def rollback(self) -> None:
+        self._connection.rollback()
+    
+    def interrupt(self) -> None:
+        self._connection.interrupt()
+    
+    def close(self) -> None:
+        self._connection.close()
 
 # Database connection helper
-def get_db_connection():
+def get_db_connection(**overrides):
     try:
-        connection = pymysql.connect(**DB_CONFIG)
+        if DB_ENGINE == 'sqlite':
+            return SQLiteConnection(SQLITE_PATH)
+        connection = pymysql.connect(**{**DB_CONFIG, **overrides})
         return connection
     except Exception as e:
         logger.error(f"Database connection error: {e}")
         raise HTTPException(status_code=500, detail="Database connection failed")
 
+# Async data access for read-only endpoints
+class AsyncDB:
+    """Run blocking pymysql queries on a bounded thread pool so the event loop stays responsive"""
+    _executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix='db-read')
+
+    @staticmethod
+    def _execute(query: str, params: Optional[tuple], fetch: str, timeout: float, active: Dict) -> Any:
+        # A query abandoned while it waited for a pool thread is skipped, not run for nobody
+        if active['cancelled']:
+            return None
+        active['on_start']()
+        # read_timeout bounds how long a worker thread can stay blocked if KILL QUERY never lands
+        connection = get_db_connection(read_timeout=int(math.ceil(timeout)) + 5)
+        active['connection'] = connection
+        try:
+            if active['cancelled']:
+                return None
+            cursor = connection.cursor()
+            cursor.execute(query, params)
+            return cursor.fetchone() if fetch == 'one' else cursor.fetchall()
+        finally:
+            active.pop('connection', None)
+            connection.close()
+
+    @staticmethod
+    def _kill_query(connection) -> None:
+        """Abort the statement running on connection from a side connection"""
+        if isinstance(connection, SQLiteConnection):
+            connection.interrupt()
+            return
+        try:
+            thread_id = connection.thread_id()
+            killer = pymysql.connect(**{**DB_CONFIG, 'connect_timeout': DB_KILL_CONNECT_TIMEOUT})
+            try:
+                killer.cursor().execute(f"KILL QUERY {int(thread_id)}")
+            finally:
+                killer.close()
+            logger.info(f"Cancelled database query on connection {thread_id}")
+        except Exception as e:
+            logger.warning(f"Could not cancel database query: {e}")
+
+    @staticmethod
+    def _abandon(query_future: asyncio.Future, active: Dict) -> None:
+        """Drop a query still queued for a pool thread, or kill it server-side if it is running"""
+        active['cancelled'] = True
+        query_future.cancel()
+        connection = active.get('connection')
+        if connection is not None:
+            # The side connection must not wait behind the bounded pool
+            asyncio.get_running_loop().run_in_executor(None, AsyncDB._kill_query, connection)
+
+    @staticmethod
+    async def _wait_for_disconnect(request: Request) -> None:
+        while not await request.is_disconnected():
+            await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+    @staticmethod
+    @Tracer.traced('db.query')
+    async def query(query: str, params: Optional[tuple] = None, fetch: str = 'all',
+                    request: Optional[Request] = None, timeout: Optional[float] = None) -> Any:
+        """Execute a read-only query off the event loop, cancelling it on timeout or client disconnect
+        
+        The timeout runs from when a pool thread picks the query up; time queued behind other
+        queries only ends on disconnect.
+        """
+        timeout = DB_QUERY_TIMEOUT if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+        active = {'cancelled': False, 'on_start': lambda: loop.call_soon_threadsafe(started.set)}
+        query_future = loop.run_in_executor(
+            AsyncDB._executor, AsyncDB._execute, query, params, fetch, timeout, active
+        )
+        start_task = asyncio.ensure_future(started.wait())
+        waiters = {query_future, start_task}
+        disconnect_task = None
+        if request is not None:
+            disconnect_task = asyncio.ensure_future(AsyncDB._wait_for_disconnect(request))
+            waiters.add(disconnect_task)
+        
+        try:
+            done, _ = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            if done == {start_task}:
+                waiters.discard(start_task)
+                done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            AsyncDB._abandon(query_future, active)
+            raise
+        finally:
+            start_task.cancel()
+            if disconnect_task is not None:
+                disconnect_task.cancel()
+        
+        if query_future in done:
+            return query_future.result()
+        AsyncDB._abandon(query_future, active)
+        
+        if disconnect_task is not None and disconnect_task in done:
+            logger.warning("Client disconnected, database query cancelled")
+            raise HTTPException(status_code=499, detail="Client closed request")
+        
+        logger.error(f"Database query exceeded {timeout}s timeout")
+        raise HTTPException(status_code=504, detail=f"Database query timed out after {timeout}s")
+
 # Feature engineering functions
 class FeatureEngineer:
+    # Month-of-year indicator columns per resource type
+    MONTH_FLAGS = {
+        'electricity': {
+            'IsHeatingMonth': [1, 2, 3, 11, 12],
+            'IsCoolingMonth': [6, 7, 8, 9],
+            'IsHolidayMonth': [7, 8],
+            'IsPeakMonth': [1, 2, 7, 8, 12]
+        },
+        'naturalgas': {
+            'IsHeatingMonth': [1, 2, 3, 10, 11, 12],
+            'IsNonHeatingMonth': [5, 6, 7, 8, 9],
+            'IsTransitionMonth': [4, 10],
+            'IsPeakHeatingMonth': [1, 2, 12]
+        },
+        'paper': {
+            'IsAcademicMonth': [9, 10, 11, 12, 1, 2, 3, 4, 5],
+            'IsHolidayMonth': [6, 7, 8],
+            'IsExamMonth': [1, 5, 6],
+            'IsStartSemester': [9, 2]
+        },
+        'water': {
+            'IsHolidayMonth': [7, 8],
+            'IsSummerMonth': [6, 7, 8, 9]
+        }
+    }
+    # Season by month number (index 0 unused): winter 0, spring 1, summer 2, autumn 3
+    SEASON_OF_MONTH = np.array([0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0])
+    # Lags, rolling windows and change rates in steps of each granularity, spanning about the
+    # same stretches of time; a day year is 364 steps so yearly lags land on the same weekday
+    PERIODS = {
+        'month': {'freq': 'MS', 'per_year': 12, 'lags': [1, 2, 3, 6, 12, 24], 'windows': [3, 6, 12],
+                  'changes': {'MonthlyChange': 1, 'YearlyChange': 12, 'QuarterlyChange': 3}},
+        'week': {'freq': 'W-MON', 'per_year': 52, 'lags': [1, 2, 4, 13, 26, 52], 'windows': [4, 13, 52],
+                 'changes': {'WeeklyChange': 1, 'MonthlyChange': 4, 'YearlyChange': 52, 'QuarterlyChange': 13}},
+        'day': {'freq': 'D', 'per_year': 364, 'lags': [1, 2, 7, 28, 91, 364], 'windows': [7, 28, 91],
+                'changes': {'DailyChange': 1, 'WeeklyChange': 7, 'MonthlyChange': 28, 'YearlyChange': 364}}
+    }
+    # Calendar columns below a month; the monthly pipeline has none
+    CALENDAR_FEATURES = ['WeekOfYear', 'SinWeek', 'CosWeek', 'DayOfWeek', 'IsWeekend',
+                         'SinDayOfWeek', 'CosDayOfWeek', 'SinDayOfYear', 'CosDayOfYear']
+    
     @staticmethod
-    def create_features(df: pd.DataFrame, resource_type: str) -> pd.DataFrame:
-        """Create enhanced features specific to resource type"""
-        df = df.copy()
+    def min_rows(granularity: str = 'month') -> int:
+        """Shortest series worth training on: a year and one step"""
+        return FeatureEngineer.PERIODS[granularity]['per_year'] + 1
+    
+    @staticmethod
+    def context_rows(granularity: str = 'month') -> int:
+        """History needed to featurize an appended row: the longest lag"""
+        return max(FeatureEngineer.PERIODS[granularity]['lags'])
+    
+    @staticmethod
+    def year_month(dates: Any) -> np.ndarray:
+        """'YYYY-MM' labels, formatted once per distinct month rather than once per row"""
+        dates = pd.DatetimeIndex(dates)
+        codes, months = pd.factorize(dates.year * 100 + dates.month)
+        return np.array([f'{m // 100:04d}-{m % 100:02d}' for m in months], dtype=object)[codes]
+    
+    @staticmethod
+    def create_features(df: pd.DataFrame, resource_type: str, granularity: str = 'month') -> pd.DataFrame:
+        """Create enhanced features specific to resource type.
         
+        Every column is computed as a whole-series operation and the frame is assembled
+        once at the end, instead of copying the input and inserting columns one by one.
+        Lag, window and change spans are counted in granularity steps.
+        """
+        periods = FeatureEngineer.PERIODS[granularity]
         # Ensure Date column exists and is datetime
         if 'Date' not in df.columns:
             logger.error("Date column missing in create_features input")
             raise ValueError("Date column required for feature creation")
         
-        # Convert Date to datetime if it's not already
-        if not pd.api.types.is_datetime64_any_dtype(df['Date']):
-            df['Date'] = pd.to_datetime(df['Date'])
+        dates = df['Date']
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates)
         
         # Basic time features
-        df['Year'] = df['Date'].dt.year
-        df['Month'] = df['Date'].dt.month
-        df['Quarter'] = df['Date'].dt.quarter
-        df['YearMonth'] = df['Date'].dt.strftime('%Y-%m')
+        year = dates.dt.year
+        month = dates.dt.month
+        quarter = dates.dt.quarter
+        columns = {
+            'Date': dates,
+            'Year': year,
+            'Month': month,
+            'Quarter': quarter,
+            'YearMonth': pd.Series(FeatureEngineer.year_month(dates), index=df.index)
+        }
         
         # Enhanced seasonal features based on resource type
-        if resource_type == 'electricity':
-            df['IsHeatingMonth'] = df['Month'].apply(lambda x: 1 if x in [1, 2, 3, 11, 12] else 0)
-            df['IsCoolingMonth'] = df['Month'].apply(lambda x: 1 if x in [6, 7, 8, 9] else 0)
-            df['IsHolidayMonth'] = df['Month'].apply(lambda x: 1 if x in [7, 8] else 0)
-            df['IsPeakMonth'] = df['Month'].apply(lambda x: 1 if x in [1, 2, 7, 8, 12] else 0)
-        elif resource_type == 'naturalgas':
-            df['IsHeatingMonth'] = df['Month'].apply(lambda x: 1 if x in [1, 2, 3, 10, 11, 12] else 0)
-            df['IsNonHeatingMonth'] = df['Month'].apply(lambda x: 1 if x in [5, 6, 7, 8, 9] else 0)
-            df['IsTransitionMonth'] = df['Month'].apply(lambda x: 1 if x in [4, 10] else 0)
-            df['IsPeakHeatingMonth'] = df['Month'].apply(lambda x: 1 if x in [1, 2, 12] else 0)
-        elif resource_type == 'paper':
-            df['IsAcademicMonth'] = df['Month'].apply(lambda x: 1 if x in [9, 10, 11, 12, 1, 2, 3, 4, 5] else 0)
-            df['IsHolidayMonth'] = df['Month'].apply(lambda x: 1 if x in [6, 7, 8] else 0)
-            df['IsExamMonth'] = df['Month'].apply(lambda x: 1 if x in [1, 5, 6] else 0)
-            df['IsStartSemester'] = df['Month'].apply(lambda x: 1 if x in [9, 2] else 0)
-        elif resource_type == 'water':
-            df['IsHolidayMonth'] = df['Month'].apply(lambda x: 1 if x in [7, 8] else 0)
-            df['IsSummerMonth'] = df['Month'].apply(lambda x: 1 if x in [6, 7, 8, 9] else 0)
+        for name, months in FeatureEngineer.MONTH_FLAGS.get(resource_type, {}).items():
+            columns[name] = month.isin(months).astype(int)
         
         # Enhanced common features
-        df['Season'] = df['Month'].apply(
-            lambda x: 0 if x in [12, 1, 2] else 1 if x in [3, 4, 5] else 2 if x in [6, 7, 8] else 3
-        )
+        columns['Season'] = pd.Series(FeatureEngineer.SEASON_OF_MONTH[month.to_numpy()], index=df.index)
         
         # Enhanced Fourier features for better seasonality capture
-        df['SinMonth'] = np.sin(2 * np.pi * df['Month'] / 12)
-        df['CosMonth'] = np.cos(2 * np.pi * df['Month'] / 12)
-        df['SinQuarter'] = np.sin(2 * np.pi * df['Quarter'] / 4)
-        df['CosQuarter'] = np.cos(2 * np.pi * df['Quarter'] / 4)
-        df['SinSemester'] = np.sin(2 * np.pi * df['Month'] / 6)
-        df['CosSemester'] = np.cos(2 * np.pi * df['Month'] / 6)
+        columns['SinMonth'] = np.sin(2 * np.pi * month / 12)
+        columns['CosMonth'] = np.cos(2 * np.pi * month / 12)
+        columns['SinQuarter'] = np.sin(2 * np.pi * quarter / 4)
+        columns['CosQuarter'] = np.cos(2 * np.pi * quarter / 4)
+        columns['SinSemester'] = np.sin(2 * np.pi * month / 6)
+        columns['CosSemester'] = np.cos(2 * np.pi * month / 6)
+        
+        # Week- and day-of-year cycles for sub-monthly steps
+        if granularity == 'week':
+            week = dates.dt.isocalendar().week.astype(int)
+            columns['WeekOfYear'] = week
+            columns['SinWeek'] = np.sin(2 * np.pi * week / 52)
+            columns['CosWeek'] = np.cos(2 * np.pi * week / 52)
+        elif granularity == 'day':
+            weekday = dates.dt.dayofweek
+            day_of_year = dates.dt.dayofyear
+            columns['DayOfWeek'] = weekday
+            columns['IsWeekend'] = (weekday >= 5).astype(int)
+            columns['SinDayOfWeek'] = np.sin(2 * np.pi * weekday / 7)
+            columns['CosDayOfWeek'] = np.cos(2 * np.pi * weekday / 7)
+            columns['SinDayOfYear'] = np.sin(2 * np.pi * day_of_year / 365.25)
+            columns['CosDayOfYear'] = np.cos(2 * np.pi * day_of_year / 365.25)
         
         # Enhanced trend features
-        min_year = df['Year'].min()
-        df['YearTrend'] = df['Year'] - min_year
-        df['YearTrendSq'] = df['YearTrend'] ** 2
-        df['MonthsFromStart'] = (df['Year'] - min_year) * 12 + df['Month'] - df['Month'].iloc[0]
+        columns.update(FeatureEngineer.trend_features(year, month))
         
         # Only create lag and rolling features if Usage column has values
         if 'Usage' in df.columns and not df['Usage'].isna().all():
-            # Enhanced lag features
-            for lag in [1, 2, 3, 6, 12, 24]:
+            usage = df['Usage']
+            values = usage.to_numpy(dtype=float)
+            
+            # Enhanced lag features; leading gaps take the first observed value (backfill)
+            for lag in periods['lags']:
                 if len(df) > lag:
-                    df[f'Usage_Lag{lag}'] = df['Usage'].shift(lag)
+                    columns[f'Usage_Lag{lag}'] = pd.Series(
+                        np.concatenate([np.full(lag, values[0]), values[:-lag]]), index=df.index
+                    )
             
             # Enhanced rolling statistics
-            for window in [3, 6, 12]:
+            for window in periods['windows']:
                 if len(df) >= window:
-                    df[f'RollingMean{window}'] = df['Usage'].rolling(window=window, min_periods=1).mean()
-                    df[f'RollingStd{window}'] = df['Usage'].rolling(window=window, min_periods=1).std()
-                    df[f'RollingMin{window}'] = df['Usage'].rolling(window=window, min_periods=1).min()
-                    df[f'RollingMax{window}'] = df['Usage'].rolling(window=window, min_periods=1).max()
+                    rolling = usage.rolling(window=window, min_periods=1)
+                    columns[f'RollingMean{window}'] = rolling.mean()
+                    # A single observation has no std; backfill like the other leading gaps
+                    columns[f'RollingStd{window}'] = rolling.std().bfill().fillna(0)
+                    columns[f'RollingMin{window}'] = rolling.min()
+                    columns[f'RollingMax{window}'] = rolling.max()
             
             # Enhanced change rates
-            df['MonthlyChange'] = df['Usage'].pct_change(1).fillna(0)
-            df['YearlyChange'] = df['Usage'].pct_change(12).fillna(0)
-            df['QuarterlyChange'] = df['Usage'].pct_change(3).fillna(0)
+            for name, span in periods['changes'].items():
+                columns[name] = usage.pct_change(span).fillna(0)
             
             # Seasonal decomposition features
-            monthly_avg = df.groupby('Month')['Usage'].mean()
-            overall_avg = df['Usage'].mean()
-            if overall_avg > 0:
-                month_indexes = monthly_avg / overall_avg
-                df['SeasonalIndex'] = df['Month'].map(month_indexes)
-                df['SeasonalStrength'] = np.abs(df['SeasonalIndex'] - 1.0)
-            else:
-                df['SeasonalIndex'] = 1.0
-                df['SeasonalStrength'] = 0.0
+            columns.update(FeatureEngineer.seasonal_index(month, usage))
             
             # Moving averages for trend detection
-            df['MA_Short'] = df['Usage'].rolling(window=3, min_periods=1).mean()
-            df['MA_Long'] = df['Usage'].rolling(window=12, min_periods=1).mean()
-            df['TrendIndicator'] = (df['MA_Short'] - df['MA_Long']) / df['MA_Long'].replace(0, 1)
-            
-            # Fill NaN values in lag and rolling features
-            numeric_cols = df.select_dtypes(include=[np.number]).columns
-            for col in numeric_cols:
-                if col != 'Usage':
-                    df[col] = df[col].fillna(method='ffill').fillna(method='bfill').fillna(0)
+            columns['MA_Short'] = usage.rolling(window=periods['windows'][0], min_periods=1).mean()
+            columns['MA_Long'] = usage.rolling(window=periods['per_year'], min_periods=1).mean()
+            columns['TrendIndicator'] = (columns['MA_Short'] - columns['MA_Long']) / columns['MA_Long'].replace(0, 1)
         else:
             # Initialize features with zeros for future predictions
-            for lag in [1, 2, 3, 6, 12, 24]:
-                df[f'Usage_Lag{lag}'] = 0
-            
-            for window in [3, 6, 12]:
-                df[f'RollingMean{window}'] = 0
-                df[f'RollingStd{window}'] = 0
-                df[f'RollingMin{window}'] = 0
-                df[f'RollingMax{window}'] = 0
-            
-            df['MonthlyChange'] = 0
-            df['YearlyChange'] = 0
-            df['QuarterlyChange'] = 0
-            df['SeasonalIndex'] = 1.0
-            df['SeasonalStrength'] = 0.0
-            df['MA_Short'] = 0
-            df['MA_Long'] = 0
-            df['TrendIndicator'] = 0
+            for lag in periods['lags']:
+                columns[f'Usage_Lag{lag}'] = 0
+            
+            for window in periods['windows']:
+                columns[f'RollingMean{window}'] = 0
+                columns[f'RollingStd{window}'] = 0
+                columns[f'RollingMin{window}'] = 0
+                columns[f'RollingMax{window}'] = 0
+            
+            for name in periods['changes']:
+                columns[name] = 0
+            columns['SeasonalIndex'] = 1.0
+            columns['SeasonalStrength'] = 0.0
+            columns['MA_Short'] = 0
+            columns['MA_Long'] = 0
+            columns['TrendIndicator'] = 0
         
-        # Ensure no NaN values remain
-        df = df.fillna(0)
+        # Input columns keep their position (recomputed ones are replaced), new ones follow
+        assembled = {col: columns.pop(col, df[col]) for col in df.columns}
+        assembled.update(columns)
+        df = pd.DataFrame(assembled, index=df.index)
         
-        # Verify Date column is still present
-        if 'Date' not in df.columns:
-            logger.error("Date column lost during feature creation")
-            raise ValueError("Date column lost during feature creation")
+        # Ensure no NaN values remain
+        if df.isna().to_numpy().any():
+            df = df.fillna(0)
         
         return df
     
+    @staticmethod
+    def trend_features(year: pd.Series, month: pd.Series) -> Dict[str, pd.Series]:
+        """Trend columns measured from the start of the series"""
+        min_year = year.min()
+        year_trend = year - min_year
+        return {
+            'YearTrend': year_trend,
+            'YearTrendSq': year_trend ** 2,
+            'MonthsFromStart': (year - min_year) * 12 + month - month.iloc[0]
+        }
+    
+    @staticmethod
+    def seasonal_index(month: pd.Series, usage: pd.Series) -> Dict[str, Any]:
+        """Month-of-year usage index over the whole series"""
+        monthly_avg = usage.groupby(month).mean()
+        overall_avg = usage.mean()
+        if overall_avg > 0:
+            month_indexes = monthly_avg / overall_avg
+            seasonal_index = month.map(month_indexes)
+            return {'SeasonalIndex': seasonal_index, 'SeasonalStrength': np.abs(seasonal_index - 1.0)}
+        return {'SeasonalIndex': 1.0, 'SeasonalStrength': 0.0}
+    
+    @staticmethod
+    def to_matrix(df: pd.DataFrame, feature_cols: List[str], missing: Optional[Any] = None) -> np.ndarray:
+        """Model input as one C-contiguous FEATURE_DTYPE matrix in feature_cols order.
+        
+        Filled column by column into a single allocation; non-finite values become 0 and
+        columns absent from df take missing(col), or 0.
+        """
+        matrix = np.empty((len(df), len(feature_cols)), dtype=FEATURE_DTYPE)
+        for j, col in enumerate(feature_cols):
+            if col in df.columns:
+                matrix[:, j] = df[col].to_numpy()
+            else:
+                matrix[:, j] = missing(col) if missing else 0.0
+        np.nan_to_num(matrix, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+        return matrix
+    
     @staticmethod
     def get_feature_columns(df: pd.DataFrame, resource_type: str) -> List[str]:
         """Get relevant feature columns for the resource type (excluding Date and Usage)"""
@@ -334,6 +1098,8 @@ class FeatureEngineer:
                         'YearTrend', 'YearTrendSq', 'MonthsFromStart', 'SeasonalIndex', 
                         'SeasonalStrength', 'TrendIndicator']
         
+        base_features.extend(FeatureEngineer.CALENDAR_FEATURES)
+        
         # Add resource-specific features
         if resource_type == 'electricity':
             base_features.extend(['IsHeatingMonth', 'IsCoolingMonth', 'IsHolidayMonth', 'IsPeakMonth'])
@@ -352,123 +1118,1000 @@ class FeatureEngineer:
         
         # Return only features that actually exist in the dataframe, excluding Date and Usage
         return [col for col in base_features if col in df.columns and col not in ['Date', 'Usage']]
+    
+    @staticmethod
+    def add_building_features(df: pd.DataFrame, building_code: int, building_scale: float) -> pd.DataFrame:
+        """Add building identity/scale features and normalize usage-derived columns for panel models"""
+        df = df.copy()
+        scale = building_scale if building_scale and building_scale > 0 else 1.0
+        
+        # Lags, rolling stats and moving averages are in usage units; divide them out so
+        # buildings of very different size share one feature space
+        usage_cols = [col for col in df.columns
+                      if any(pattern in col for pattern in ['Lag', 'Rolling', 'MA_']) and col != 'Usage']
+        df[usage_cols] = df[usage_cols].astype(float) / scale
+        
+        df['BuildingCode'] = building_code
+        df['BuildingLogScale'] = np.log1p(scale)
+        df['BuildingScale'] = scale
+        return df
+    
+    @staticmethod
+    def create_panel_features(panel: pd.DataFrame, resource_type: str,
+                              min_months: int = 13) -> tuple:
+        """Featurize every building's monthly series for a global model.
+        
+        Returns the stacked frame and {building_id: {'code', 'scale'}}; buildings with
+        fewer than min_months records are skipped.
+        """
+        frames = []
+        building_stats = {}
+        for code, (building_id, group) in enumerate(panel.groupby('BuildingId', sort=True)):
+            if len(group) < min_months:
+                continue
+            group = group.sort_values('Date').reset_index(drop=True)
+            scale = float(group['Usage'].mean())
+            featured = FeatureStore.features(group, resource_type, str(building_id))
+            featured = FeatureEngineer.add_building_features(featured, code, scale)
+            featured['BuildingId'] = building_id
+            frames.append(featured)
+            building_stats[str(building_id)] = {'code': code, 'scale': scale}
+        
+        if not frames:
+            raise ValueError(f"No building has at least {min_months} months of {resource_type} data")
+        
+        # Lag columns only exist for long enough series; missing ones are zero like in create_features
+        df = pd.concat(frames, ignore_index=True).fillna(0)
+        return df, building_stats
 
-# Data loader with improved error handling
-class DataLoader:
+# Persistent feature store
+class FeatureStore:
+    """Engineered per-building feature frames persisted as float32 column-major matrices.
+    
+    Layout: FEATURE_STORE_DIR/{resource}/building_{id}/{schema}/ with features.npy
+    (memory-mapped on read), usage.npy, dates.npy and columns.json, written last;
+    {resource} is ModelManager.model_resource, so each granularity has its own store.
+    The schema hash covers the FeatureEngineer source, so editing a feature definition
+    starts a fresh store. Appended rows are featurized from the longest lag's worth of
+    history and only the series-wide columns are recomputed for older rows.
+    """
+    SERIES_COLUMNS = ['YearTrend', 'YearTrendSq', 'MonthsFromStart', 'SeasonalIndex', 'SeasonalStrength']
+    SPECIAL_COLUMNS = ['Date', 'Usage', 'YearMonth']
+    _schema_version: Optional[str] = None
+    
     @staticmethod
-    def load_data(resource_type: str, building_id: str = "0") -> pd.DataFrame:
-        """Load data from database with improved error handling"""
+    def schema_version() -> str:
+        if FeatureStore._schema_version is None:
+            source = inspect.getsource(FeatureEngineer)
+            FeatureStore._schema_version = hashlib.sha1(source.encode()).hexdigest()[:12]
+        return FeatureStore._schema_version
+    
+    @staticmethod
+    def store_dir(resource_type: str, building_id: str, granularity: str = 'month') -> Path:
+        building_dir = ModelManager.get_building_dir(resource_type, building_id).name
+        return (FEATURE_STORE_DIR / ModelManager.model_resource(resource_type, granularity) / building_dir
+                / FeatureStore.schema_version())
+    
+    @staticmethod
+    def read(path: Path) -> Optional[Dict]:
+        """Stored arrays and layout, or None when absent or caught mid-write"""
+        try:
+            with open(path / 'columns.json', 'r') as f:
+                layout = json.load(f)
+            stored = {
+                **layout,
+                'matrix': np.load(path / 'features.npy', mmap_mode='r'),
+                'usage': np.load(path / 'usage.npy'),
+                'dates': np.load(path / 'dates.npy')
+            }
+        except (OSError, ValueError):
+            return None
+        rows = layout['rows']
+        if stored['matrix'].shape != (rows, len(layout['columns'])) or len(stored['usage']) != rows or len(stored['dates']) != rows:
+            return None
+        return stored
+    
+    @staticmethod
+    def write(path: Path, matrix: np.ndarray, usage: np.ndarray, dates: np.ndarray, layout: Dict) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        arrays = {'features.npy': np.asfortranarray(matrix, dtype=np.float32), 'usage.npy': usage, 'dates.npy': dates}
+        for name, array in arrays.items():
+            with open(path / (name + suffix), 'wb') as f:
+                np.save(f, array)
+            os.replace(path / (name + suffix), path / name)
+        with open(path / ('columns.json' + suffix), 'w') as f:
+            json.dump({**layout, 'rows': len(usage)}, f)
+        os.replace(path / ('columns.json' + suffix), path / 'columns.json')
+    
+    @staticmethod
+    def layout_of(featured: pd.DataFrame) -> Optional[Dict]:
+        """Column layout of a create_features frame; None if it holds unstorable columns"""
+        columns, labels = [], {}
+        for col in featured.columns:
+            if col in FeatureStore.SPECIAL_COLUMNS:
+                continue
+            if pd.api.types.is_numeric_dtype(featured[col]):
+                columns.append(col)
+            elif featured[col].nunique(dropna=False) == 1:
+                labels[col] = featured[col].iloc[0]
+            else:
+                return None
+        return {'order': featured.columns.tolist(), 'columns': columns, 'labels': labels}
+    
+    @staticmethod
+    def to_frame(stored: Dict) -> pd.DataFrame:
+        """Rebuild the create_features frame around the float32 matrix without copying it"""
+        frame = pd.DataFrame(stored['matrix'], columns=stored['columns'], copy=False)
+        dates = pd.to_datetime(stored['dates'])
+        extra = {
+            'Date': dates,
+            'Usage': stored['usage'],
+            'YearMonth': FeatureEngineer.year_month(dates),
+            **stored['labels']
+        }
+        for position, col in enumerate(stored['order']):
+            if col in extra:
+                frame.insert(position, col, extra[col])
+        return frame
+    
+    @staticmethod
+    def append(stored: Dict, df: pd.DataFrame, resource_type: str, granularity: str = 'month') -> Optional[np.ndarray]:
+        """Matrix for df given a stored prefix of it, or None if the layout would change"""
+        rows = stored['rows']
+        context = FeatureEngineer.context_rows(granularity)
+        tail = FeatureEngineer.create_features(
+            df.iloc[rows - context:].reset_index(drop=True), resource_type, granularity
+        ).iloc[context:]
+        layout = FeatureStore.layout_of(tail)
+        if layout is None or layout['order'] != stored['order'] or layout['labels'] != stored['labels']:
+            return None
+        
+        matrix = np.vstack([stored['matrix'], tail[stored['columns']].to_numpy(dtype=np.float32)])
+        
+        dates = pd.to_datetime(df['Date'])
+        series = {
+            **FeatureEngineer.trend_features(dates.dt.year, dates.dt.month),
+            **FeatureEngineer.seasonal_index(dates.dt.month, df['Usage'])
+        }
+        for col in FeatureStore.SERIES_COLUMNS:
+            if col in stored['columns']:
+                matrix[:, stored['columns'].index(col)] = np.nan_to_num(np.asarray(series[col], dtype=np.float32), nan=0.0)
+        return matrix
+    
+    @staticmethod
+    @Tracer.traced('features', 'resource_type', 'building_id')
+    def features(df: pd.DataFrame, resource_type: str, building_id: str, granularity: str = 'month') -> pd.DataFrame:
+        """create_features for one building's series, served from the store"""
+        if not FEATURE_STORE_ENABLED:
+            return FeatureEngineer.create_features(df, resource_type, granularity)
+        
+        df = df.reset_index(drop=True)
+        dates = pd.to_datetime(df['Date']).values.astype('datetime64[ns]')
+        usage = df['Usage'].to_numpy(dtype=float)
+        path = FeatureStore.store_dir(resource_type, building_id, granularity)
+        stored = FeatureStore.read(path)
+        
+        if stored is not None:
+            rows = stored['rows']
+            is_prefix = (rows <= len(df)
+                         and np.array_equal(stored['dates'], dates[:rows])
+                         and np.array_equal(stored['usage'], usage[:rows]))
+            if is_prefix and rows == len(df):
+                return FeatureStore.to_frame(stored)
+            if is_prefix and rows > FeatureEngineer.context_rows(granularity):
+                matrix = FeatureStore.append(stored, df, resource_type, granularity)
+                if matrix is not None:
+                    layout = {key: stored[key] for key in ('order', 'columns', 'labels')}
+                    FeatureStore.write(path, matrix, usage, dates, layout)
+                    logger.info(f"Feature store: appended {len(df) - rows} {granularity}s for {resource_type}/{building_id}")
+                    return FeatureStore.to_frame(FeatureStore.read(path))
+        
+        featured = FeatureEngineer.create_features(df, resource_type, granularity)
+        layout = FeatureStore.layout_of(featured)
+        if layout is None:
+            return featured
+        FeatureStore.write(path, featured[layout['columns']].to_numpy(dtype=np.float32), usage, dates, layout)
+        # Matrices from older feature definitions are never read again
+        for old_schema in path.parent.iterdir():
+            if old_schema != path:
+                shutil.rmtree(old_schema, ignore_errors=True)
+        logger.info(f"Feature store: rebuilt {len(df)} {granularity}s for {resource_type}/{building_id}")
+        return FeatureStore.to_frame(FeatureStore.read(path))
+
+# Service-maintained monthly rollups
+ROLLUP_TABLE = 'ai_monthly_rollups'
+ROLLUP_STATE_TABLE = 'ai_rollup_state'
+
+class RollupManager:
+    """Owns the monthly rollup tables and decides when loaders may read from them"""
+    # resource_type -> wall-clock time of the last refresh known to this process
+    _refreshed_at: Dict[str, float] = {}
+    # resource_type -> first month (year * 12 + month - 1) of the next prefix chunk to verify
+    _verify_cursor: Dict[str, int] = {}
+    
+    @staticmethod
+    def bootstrap() -> Dict:
+        """Create rollup tables if missing and check the supporting source indexes"""
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+                    resource VARCHAR(32) NOT NULL,
+                    BuildingId CHAR(36) NOT NULL,
+                    year INT NOT NULL,
+                    month INT NOT NULL,
+                    usage_sum DOUBLE NOT NULL,
+                    row_count INT NOT NULL,
+                    min_date DATETIME NULL,
+                    max_date DATETIME NULL,
+                    PRIMARY KEY (resource, BuildingId, year, month)
+                )
+            """)
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {ROLLUP_STATE_TABLE} (
+                    resource VARCHAR(32) NOT NULL PRIMARY KEY,
+                    refreshed_at DOUBLE NOT NULL,
+                    source_max_date DATETIME NULL,
+                    source_rows BIGINT NOT NULL
+                )
+            """)
+            connection.commit()
+            
+            indexes = {}
+            for resource_type, table_name in RESOURCE_MAPPING.items():
+                indexes[table_name] = RollupManager._ensure_building_date_index(connection, table_name)
+            return {'tables': [ROLLUP_TABLE, ROLLUP_STATE_TABLE], 'indexes': indexes}
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def _index_columns(connection, table_name: str) -> Dict[str, List[str]]:
+        """Map index name to its ordered column list for a source table"""
+        cursor = connection.cursor()
+        indexes = {}
+        if DB_ENGINE == 'sqlite':
+            cursor.execute(f"PRAGMA index_list({table_name})")
+            for index in cursor.fetchall():
+                cursor.execute(f"PRAGMA index_info({index['name']})")
+                columns = sorted(cursor.fetchall(), key=lambda column: column['seqno'])
+                indexes[index['name']] = [column['name'] for column in columns]
+        else:
+            cursor.execute("""
+                SELECT INDEX_NAME, COLUMN_NAME
+                FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                ORDER BY INDEX_NAME, SEQ_IN_INDEX
+            """, (table_name,))
+            for row in cursor.fetchall():
+                indexes.setdefault(row['INDEX_NAME'], []).append(row['COLUMN_NAME'])
+        return indexes
+    
+    @staticmethod
+    def _ensure_building_date_index(connection, table_name: str) -> str:
+        """Report (and optionally create) a composite (BuildingId, Date) index"""
+        indexes = RollupManager._index_columns(connection, table_name)
+        if any([column.lower() for column in columns[:2]] == ['buildingid', 'date'] for columns in indexes.values()):
+            return 'present'
+        
+        if not ROLLUP_CREATE_INDEXES:
+            logger.warning(f"{table_name} has no (BuildingId, Date) index; rollup refreshes will scan more rows")
+            return 'missing'
+        
+        cursor = connection.cursor()
+        cursor.execute(f"CREATE INDEX IX_{table_name}_BuildingId_Date ON {table_name} (BuildingId, `Date`)")
+        connection.commit()
+        logger.info(f"Created (BuildingId, Date) index on {table_name}")
+        return 'created'
+    
+    @staticmethod
+    def _rebuild(cursor, resource_type: str, table_name: str, start: Optional[pd.Timestamp] = None,
+                 end: Optional[pd.Timestamp] = None) -> int:
+        """Replace the rollup months in [start, end) (open-ended when None) with fresh source aggregates"""
+        month_filter, date_filter, params = "", "", []
+        if start is not None:
+            month_filter += " AND year * 100 + month >= %s"
+            date_filter += " AND `Date` >= %s"
+            params.append((start.year * 100 + start.month, start.strftime('%Y-%m-%d 00:00:00')))
+        if end is not None:
+            month_filter += " AND year * 100 + month < %s"
+            date_filter += " AND `Date` < %s"
+            params.append((end.year * 100 + end.month, end.strftime('%Y-%m-%d 00:00:00')))
+        cursor.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE resource = %s {month_filter}",
+                       (resource_type, *[month for month, _ in params]))
+        # Range predicate on Date (not YEAR()/MONTH()) keeps the refresh index-friendly
+        cursor.execute(f"""
+            INSERT INTO {ROLLUP_TABLE} (resource, BuildingId, year, month, usage_sum, row_count, min_date, max_date)
+            SELECT
+                %s,
+                BuildingId,
+                YEAR(`Date`),
+                MONTH(`Date`),
+                SUM(`Usage`),
+                COUNT(*),
+                MIN(`Date`),
+                MAX(`Date`)
+            FROM {table_name}
+            WHERE `Usage` > 0 AND `Date` IS NOT NULL {date_filter}
+            GROUP BY BuildingId, YEAR(`Date`), MONTH(`Date`)
+        """, (resource_type, *[date for _, date in params]))
+        return cursor.rowcount
+    
+    @staticmethod
+    def _stale_prefix_months(cursor, resource_type: str, table_name: str, window_start: pd.Timestamp) -> List[pd.Timestamp]:
+        """Compare the next ROLLUP_VERIFY_MONTHS months before the window with the source, month by month.
+        
+        Each refresh checks one bounded chunk, resuming where the previous one stopped and wrapping
+        to the earliest rolled-up month, so edits to old months are found within a few cycles
+        without aggregating the whole table. Returns the months whose counts or sums differ.
+        """
+        cursor.execute(f"SELECT MIN(year * 12 + month - 1) as first_period FROM {ROLLUP_TABLE} WHERE resource = %s",
+                       (resource_type,))
+        first = (cursor.fetchone() or {}).get('first_period')
+        window = window_start.year * 12 + window_start.month - 1
+        if first is None or int(first) >= window:
+            return []
+        chunk_start = RollupManager._verify_cursor.get(resource_type)
+        if chunk_start is None or not int(first) <= chunk_start < window:
+            chunk_start = int(first)
+        chunk_end = min(chunk_start + ROLLUP_VERIFY_MONTHS, window)
+        RollupManager._verify_cursor[resource_type] = chunk_end if chunk_end < window else None
+        
+        as_month = lambda period: pd.Timestamp(year=period // 12, month=period % 12 + 1, day=1)
+        cursor.execute(f"""
+            SELECT YEAR(`Date`) as year, MONTH(`Date`) as month, COUNT(*) as row_count, SUM(`Usage`) as usage_sum
+            FROM {table_name}
+            WHERE `Usage` > 0 AND `Date` IS NOT NULL AND `Date` >= %s AND `Date` < %s
+            GROUP BY YEAR(`Date`), MONTH(`Date`)
+        """, (as_month(chunk_start).strftime('%Y-%m-%d 00:00:00'), as_month(chunk_end).strftime('%Y-%m-%d 00:00:00')))
+        source = {(int(r['year']), int(r['month'])): r for r in cursor.fetchall()}
+        cursor.execute(f"""
+            SELECT year, month, SUM(row_count) as row_count, SUM(usage_sum) as usage_sum
+            FROM {ROLLUP_TABLE}
+            WHERE resource = %s AND year * 12 + month - 1 >= %s AND year * 12 + month - 1 < %s
+            GROUP BY year, month
+        """, (resource_type, chunk_start, chunk_end))
+        rollup = {(int(r['year']), int(r['month'])): r for r in cursor.fetchall()}
+        
+        stale = []
+        for year, month in sorted(set(source) | set(rollup)):
+            ours, theirs = source.get((year, month), {}), rollup.get((year, month), {})
+            if int(ours.get('row_count') or 0) != int(theirs.get('row_count') or 0) or not math.isclose(
+                    float(ours.get('usage_sum') or 0), float(theirs.get('usage_sum') or 0), rel_tol=1e-9):
+                stale.append(pd.Timestamp(year=year, month=month, day=1))
+        return stale
+    
+    @staticmethod
+    def refresh(resource_type: str, full: bool = False) -> Dict:
+        """Recompute rollup rows for recently touched months and any stale earlier months (or everything when full)"""
         table_name = RESOURCE_MAPPING.get(resource_type)
         if not table_name:
             raise ValueError(f"Invalid resource type: {resource_type}")
         
         connection = get_db_connection()
-        
         try:
             cursor = connection.cursor()
+            cursor.execute(f"SELECT * FROM {ROLLUP_STATE_TABLE} WHERE resource = %s", (resource_type,))
+            state = cursor.fetchone()
             
-            if building_id == "0":
-                # All buildings - FIXED SQL query with proper GROUP BY
-                query = f"""
-                    SELECT
-                        YEAR(`Date`) as Year,
-                        MONTH(`Date`) as Month,
-                        SUM(`Usage`) as `Usage`
-                    FROM {table_name}
-                    WHERE `Usage` > 0 
-                        AND `Date` IS NOT NULL
-                        AND `Usage` IS NOT NULL
-                    GROUP BY YEAR(`Date`), MONTH(`Date`)
-                    HAVING SUM(`Usage`) > 0
-                    ORDER BY YEAR(`Date`), MONTH(`Date`)
-                """
-                logger.info(f"Executing aggregation query for all buildings: {query}")
-                cursor.execute(query)
-                logger.info(f"Loading aggregated data for all buildings from {table_name}")
-            else:
-                # Specific building - FIXED SQL query with proper GROUP BY
-                query = f"""
-                    SELECT 
-                        BuildingId,
-                        YEAR(`Date`) as Year,
-                        MONTH(`Date`) as Month,
-                        SUM(`Usage`) as `Usage`
-                    FROM {table_name}
-                    WHERE BuildingId = %s 
-                        AND `Usage` > 0
-                        AND `Date` IS NOT NULL
-                        AND `Usage` IS NOT NULL
-                    GROUP BY BuildingId, YEAR(`Date`), MONTH(`Date`)
-                    HAVING SUM(`Usage`) > 0
-                    ORDER BY YEAR(`Date`), MONTH(`Date`)
-                """
-                logger.info(f"Executing building-specific query: {query} with building_id: {building_id}")
-                cursor.execute(query, (building_id,))
-                logger.info(f"Loading data for building {building_id} from {table_name}")
-            
-            data = cursor.fetchall()
-            logger.info(f"Raw data fetched: {len(data)} records")
-            
-            if not data:
-                logger.error(f"No data found for resource_type: {resource_type}, building_id: {building_id}")
-                raise ValueError(f"No data found for resource_type: {resource_type}, building_id: {building_id}")
+            start, stale = None, []
+            if state is not None and state['source_max_date'] is not None and not full:
+                last = pd.Timestamp(state['source_max_date'])
+                start = (last - pd.DateOffset(months=ROLLUP_LOOKBACK_MONTHS)).replace(day=1).normalize()
+                # Months before the window are trusted only if their totals still match the source
+                stale = RollupManager._stale_prefix_months(cursor, resource_type, table_name, start)
             
-            df = pd.DataFrame(data)
-            logger.info(f"DataFrame created with {len(df)} rows and columns: {df.columns.tolist()}")
+            months_refreshed = RollupManager._rebuild(cursor, resource_type, table_name, start)
+            for month_start in stale:
+                logger.info(f"Rollup month {month_start:%Y-%m} for {resource_type} changed, rebuilding it")
+                months_refreshed += RollupManager._rebuild(cursor, resource_type, table_name, month_start,
+                                                           month_start + pd.DateOffset(months=1))
             
-            # Data cleaning and conversion
-            df['Usage'] = pd.to_numeric(df['Usage'], errors='coerce')
+            cursor.execute(f"SELECT COUNT(*) as row_count, MAX(`Date`) as max_date FROM {table_name}")
+            source = cursor.fetchone()
+            refreshed_at = time.time()
+            cursor.execute(f"DELETE FROM {ROLLUP_STATE_TABLE} WHERE resource = %s", (resource_type,))
+            cursor.execute(
+                f"INSERT INTO {ROLLUP_STATE_TABLE} (resource, refreshed_at, source_max_date, source_rows) VALUES (%s, %s, %s, %s)",
+                (resource_type, refreshed_at, source['max_date'], int(source['row_count'] or 0))
+            )
+            connection.commit()
+            RollupManager._refreshed_at[resource_type] = refreshed_at
             
-            # Create Date column from Year and Month
-            df['Date'] = pd.to_datetime(df[['Year', 'Month']].assign(day=1))
-            
-            # Remove invalid data
-            df = df.dropna(subset=['Usage', 'Date'])
-            df = df[df['Usage'] > 0]  # Remove zero or negative usage
-            
-            logger.info(f"After cleaning: {len(df)} records")
-            
-            if df.empty:
-                raise ValueError(f"No valid data after cleaning for resource_type: {resource_type}, building_id: {building_id}")
-            
-            # Sort by date
-            df = df.sort_values('Date').reset_index(drop=True)
-            
-            logger.info(f"Loaded {len(df)} monthly records")
-            logger.info(f"Date range: {df['Date'].min()} to {df['Date'].max()}")
-            logger.info(f"Usage range: {df['Usage'].min()} to {df['Usage'].max()}")
+            start_date = start.strftime('%Y-%m-%d 00:00:00') if start is not None else None
+            logger.info(f"Refreshed {months_refreshed} rollup months for {resource_type} from {start_date or 'the beginning'}")
+            return {
+                'resource_type': resource_type,
+                'mode': 'full' if start is None else 'incremental',
+                'from': start_date,
+                'stale_months': [f"{month_start:%Y-%m}" for month_start in stale],
+                'months_refreshed': months_refreshed
+            }
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def sync_state() -> None:
+        """Adopt refresh times recorded by other processes sharing the database"""
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT resource, refreshed_at FROM {ROLLUP_STATE_TABLE}")
+            for row in cursor.fetchall():
+                RollupManager._refreshed_at[row['resource']] = float(row['refreshed_at'])
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def refresh_all(full: bool = False) -> List[Dict]:
+        """Refresh every resource whose rollups are older than half the refresh interval"""
+        RollupManager.sync_state()
+        results = []
+        for resource_type in RESOURCE_MAPPING:
+            age = time.time() - RollupManager._refreshed_at.get(resource_type, 0)
+            if not full and age < ROLLUP_REFRESH_INTERVAL / 2:
+                continue
+            try:
+                results.append(RollupManager.refresh(resource_type, full=full))
+            except Exception as e:
+                logger.warning(f"Rollup refresh failed for {resource_type}: {e}")
+                results.append({'resource_type': resource_type, 'error': str(e)})
+        return results
+    
+    @staticmethod
+    def is_fresh(resource_type: str) -> bool:
+        if not ROLLUPS_ENABLED:
+            return False
+        return time.time() - RollupManager._refreshed_at.get(resource_type, 0) <= ROLLUP_MAX_AGE
+    
+    @staticmethod
+    def source_for(resource_type: str) -> str:
+        return 'rollup' if RollupManager.is_fresh(resource_type) else 'raw'
+    
+    @staticmethod
+    async def refresh_loop() -> None:
+        """Periodic incremental refresh, run off the event loop"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, RollupManager.refresh_all)
+            except Exception as e:
+                logger.warning(f"Rollup refresh cycle failed: {e}")
+            await asyncio.sleep(ROLLUP_REFRESH_INTERVAL)
+
+# Data loader with improved error handling
+class DataLoader:
+    # Period each sub-monthly row is summed into: ISO year*100+week, or the calendar date
+    PERIOD_KEYS = {
+        'week': 'YEARWEEK(`Date`, 3)',
+        'day': 'DATE(`Date`)'
+    }
+    
+    @staticmethod
+    def build_period_query(table_name: str, granularity: str, building_id: Optional[str] = None) -> tuple:
+        """Weekly or daily aggregation of the raw table (all buildings if building_id is None).
+        
+        Rows carry the number of distinct days with readings, so frame_from_rows can scale
+        a partial week up to seven days.
+        """
+        period = DataLoader.PERIOD_KEYS[granularity]
+        building_filter = "BuildingId = %s AND" if building_id is not None else ""
+        query = f"""
+            SELECT
+                BuildingId,
+                {period} as Period,
+                SUM(`Usage`) as `Usage`,
+                COUNT(DISTINCT DATE(`Date`)) as Days
+            FROM {table_name}
+            WHERE {building_filter} `Usage` > 0
+                AND `Date` IS NOT NULL
+            GROUP BY BuildingId, {period}
+            HAVING SUM(`Usage`) > 0
+            ORDER BY BuildingId, {period}
+        """
+        return query, (building_id,) if building_id is not None else None
+    
+    @staticmethod
+    def build_query(resource_type: str, building_id: str = "0", source: Optional[str] = None,
+                    granularity: str = 'month') -> tuple:
+        """Build the monthly (or weekly/daily) aggregation query and its parameters"""
+        table_name = RESOURCE_MAPPING.get(resource_type)
+        if not table_name:
+            raise ValueError(f"Invalid resource type: {resource_type}")
+        if granularity != 'month':
+            if building_id == "0":
+                # Campus totals: sum the buildings' periods
+                query, params = DataLoader.build_period_query(table_name, granularity)
+                query = f"""
+                    SELECT Period, SUM(`Usage`) as `Usage`, MAX(Days) as Days
+                    FROM ({query[:query.rindex('ORDER BY')]}) periods
+                    GROUP BY Period
+                    ORDER BY Period
+                """
+                return query, params
+            return DataLoader.build_period_query(table_name, granularity, building_id)
+        source = source or RollupManager.source_for(resource_type)
+        
+        if source == 'rollup':
+            if building_id == "0":
+                query = f"""
+                    SELECT
+                        year as Year,
+                        month as Month,
+                        SUM(usage_sum) as `Usage`
+                    FROM {ROLLUP_TABLE}
+                    WHERE resource = %s
+                    GROUP BY year, month
+                    HAVING SUM(usage_sum) > 0
+                    ORDER BY year, month
+                """
+                return query, (resource_type,)
             
+            query = f"""
+                SELECT
+                    BuildingId,
+                    year as Year,
+                    month as Month,
+                    usage_sum as `Usage`
+                FROM {ROLLUP_TABLE}
+                WHERE resource = %s
+                    AND BuildingId = %s
+                    AND usage_sum > 0
+                ORDER BY year, month
+            """
+            return query, (resource_type, building_id)
+        
+        if building_id == "0":
+            # All buildings - FIXED SQL query with proper GROUP BY
+            query = f"""
+                SELECT
+                    YEAR(`Date`) as Year,
+                    MONTH(`Date`) as Month,
+                    SUM(`Usage`) as `Usage`
+                FROM {table_name}
+                WHERE `Usage` > 0 
+                    AND `Date` IS NOT NULL
+                    AND `Usage` IS NOT NULL
+                GROUP BY YEAR(`Date`), MONTH(`Date`)
+                HAVING SUM(`Usage`) > 0
+                ORDER BY YEAR(`Date`), MONTH(`Date`)
+            """
+            return query, None
+        
+        # Specific building - FIXED SQL query with proper GROUP BY
+        query = f"""
+            SELECT 
+                BuildingId,
+                YEAR(`Date`) as Year,
+                MONTH(`Date`) as Month,
+                SUM(`Usage`) as `Usage`
+            FROM {table_name}
+            WHERE BuildingId = %s 
+                AND `Usage` > 0
+                AND `Date` IS NOT NULL
+                AND `Usage` IS NOT NULL
+            GROUP BY BuildingId, YEAR(`Date`), MONTH(`Date`)
+            HAVING SUM(`Usage`) > 0
+            ORDER BY YEAR(`Date`), MONTH(`Date`)
+        """
+        return query, (building_id,)
+    
+    @staticmethod
+    def build_panel_query(resource_type: str, source: Optional[str] = None, granularity: str = 'month') -> tuple:
+        """Build a query returning every building's monthly (or weekly/daily) series in one pass"""
+        table_name = RESOURCE_MAPPING.get(resource_type)
+        if not table_name:
+            raise ValueError(f"Invalid resource type: {resource_type}")
+        if granularity != 'month':
+            return DataLoader.build_period_query(table_name, granularity)
+        source = source or RollupManager.source_for(resource_type)
+        
+        if source == 'rollup':
+            query = f"""
+                SELECT
+                    BuildingId,
+                    year as Year,
+                    month as Month,
+                    usage_sum as `Usage`
+                FROM {ROLLUP_TABLE}
+                WHERE resource = %s AND usage_sum > 0
+                ORDER BY BuildingId, year, month
+            """
+            return query, (resource_type,)
+        
+        query = f"""
+            SELECT
+                BuildingId,
+                YEAR(`Date`) as Year,
+                MONTH(`Date`) as Month,
+                SUM(`Usage`) as `Usage`
+            FROM {table_name}
+            WHERE `Usage` > 0 AND `Date` IS NOT NULL
+            GROUP BY BuildingId, YEAR(`Date`), MONTH(`Date`)
+            HAVING SUM(`Usage`) > 0
+            ORDER BY BuildingId, YEAR(`Date`), MONTH(`Date`)
+        """
+        return query, None
+    
+    @staticmethod
+    def build_buildings_query(resource_type: str, source: Optional[str] = None) -> tuple:
+        """Build the per-building coverage query used by /available-buildings"""
+        table_name = RESOURCE_MAPPING.get(resource_type)
+        if not table_name:
+            raise ValueError(f"Invalid resource type: {resource_type}")
+        source = source or RollupManager.source_for(resource_type)
+        
+        if source == 'rollup':
+            monthly, params = f"""
+                SELECT BuildingId, row_count, usage_sum, min_date, max_date
+                FROM {ROLLUP_TABLE}
+                WHERE resource = %s
+            """, (resource_type,)
+        else:
+            monthly, params = f"""
+                SELECT
+                    BuildingId,
+                    COUNT(*) as row_count,
+                    SUM(`Usage`) as usage_sum,
+                    MIN(`Date`) as min_date,
+                    MAX(`Date`) as max_date
+                FROM {table_name}
+                WHERE `Usage` > 0 AND `Date` IS NOT NULL
+                GROUP BY BuildingId, YEAR(`Date`), MONTH(`Date`)
+            """, None
+        
+        query = f"""
+            SELECT
+                BuildingId,
+                COUNT(*) as monthly_records,
+                SUM(row_count) as non_zero_records,
+                SUM(usage_sum) / SUM(row_count) as avg_usage,
+                MIN(min_date) as min_date,
+                MAX(max_date) as max_date
+            FROM ({monthly}) monthly
+            GROUP BY BuildingId
+            HAVING COUNT(*) >= 13
+            ORDER BY COUNT(*) DESC
+        """
+        return query, params
+    
+    @staticmethod
+    def frame_from_rows(data: List[Dict], resource_type: str, building_id: str = "0",
+                        granularity: str = 'month') -> pd.DataFrame:
+        """Turn fetched monthly (or weekly/daily Period) rows into a cleaned, date-sorted DataFrame"""
+        logger.info(f"Raw data fetched: {len(data)} records")
+        
+        if not data:
+            logger.error(f"No data found for resource_type: {resource_type}, building_id: {building_id}")
+            raise ValueError(f"No data found for resource_type: {resource_type}, building_id: {building_id}")
+        
+        df = pd.DataFrame(data)
+        logger.info(f"DataFrame created with {len(df)} rows and columns: {df.columns.tolist()}")
+        
+        # Data cleaning and conversion
+        df['Usage'] = pd.to_numeric(df['Usage'], errors='coerce')
+        
+        # Create Date column from Year and Month, or from the period key: the Monday of an ISO week or the day
+        if granularity == 'month':
+            df['Date'] = pd.to_datetime(df[['Year', 'Month']].assign(day=1))
+        else:
+            if granularity == 'week':
+                df['Date'] = pd.to_datetime(df.pop('Period').astype(int).astype(str) + '1', format='%G%V%u')
+            else:
+                df['Date'] = pd.to_datetime(df.pop('Period'))
+            df['Year'] = df['Date'].dt.year
+            df['Month'] = df['Date'].dt.month
+            # A week with fewer than 7 days of readings, anywhere in the series, would read as a
+            # drop in usage; it is scaled up to a full week from its daily mean
+            days = pd.to_numeric(df.pop('Days'))
+            if granularity == 'week':
+                df['Usage'] = df['Usage'] * (7 / days.clip(lower=1, upper=7))
+        
+        # Remove invalid data
+        df = df.dropna(subset=['Usage', 'Date'])
+        df = df[df['Usage'] > 0]  # Remove zero or negative usage
+        
+        logger.info(f"After cleaning: {len(df)} records")
+        
+        if df.empty:
+            raise ValueError(f"No valid data after cleaning for resource_type: {resource_type}, building_id: {building_id}")
+        
+        # Sort by date
+        df = df.sort_values('Date').reset_index(drop=True)
+        if granularity != 'month':
+            df = DataLoader.regularize(df, granularity)
+        
+        logger.info(f"Loaded {len(df)} {granularity} records")
+        logger.info(f"Date range: {df['Date'].min()} to {df['Date'].max()}")
+        logger.info(f"Usage range: {df['Usage'].min()} to {df['Usage'].max()}")
+        
+        return df
+    
+    @staticmethod
+    def regularize(df: pd.DataFrame, granularity: str) -> pd.DataFrame:
+        """Put each building's week or day series on a gapless calendar, so lags count periods, not rows.
+        
+        Periods missing between a series' first and last one (no readings, or dropped as
+        non-positive) are filled by linear interpolation between their neighbours.
+        """
+        freq = FeatureEngineer.PERIODS[granularity]['freq']
+        groups = df.groupby('BuildingId', sort=False) if 'BuildingId' in df.columns else [(None, df)]
+        frames, filled = [], 0
+        for building_id, group in groups:
+            calendar = pd.date_range(group['Date'].iloc[0], group['Date'].iloc[-1], freq=freq, name='Date')
+            usage = group.set_index('Date')['Usage'].reindex(calendar)
+            filled += int(usage.isna().sum())
+            frame = usage.interpolate(method='linear').reset_index()
+            if building_id is not None:
+                frame.insert(0, 'BuildingId', building_id)
+            frames.append(frame)
+        if not filled:
             return df
+        logger.info(f"Filled {filled} missing {granularity} periods by interpolation")
+        df = pd.concat(frames, ignore_index=True)
+        df['Year'] = df['Date'].dt.year
+        df['Month'] = df['Date'].dt.month
+        return df.sort_values('Date', kind='stable').reset_index(drop=True)
+    
+    @staticmethod
+    def build_summary_query(resource_type: str, building_id: str = "0", source: Optional[str] = None) -> tuple:
+        """Build a query computing monthly usage statistics entirely in the database"""
+        monthly_query, params = DataLoader.build_query(resource_type, building_id, source)
+        # Drop the ORDER BY; the outer aggregate does not need sorted input
+        monthly_query = monthly_query[:monthly_query.rindex('ORDER BY')]
+        query = f"""
+            SELECT
+                COUNT(*) as months,
+                MIN(monthly.`Usage`) as usage_min,
+                MAX(monthly.`Usage`) as usage_max,
+                SUM(monthly.`Usage`) as usage_sum,
+                SUM(monthly.`Usage` * monthly.`Usage`) as usage_sum_sq,
+                MIN(monthly.Year * 100 + monthly.Month) as first_period,
+                MAX(monthly.Year * 100 + monthly.Month) as last_period
+            FROM ({monthly_query}) monthly
+        """
+        return query, params
+    
+    @staticmethod
+    def build_watermark_query(resource_type: str, building_id: str = "0", source: Optional[str] = None) -> tuple:
+        """Build a query whose result changes whenever the rows a monthly read from source change.
+        
+        On rollups it reads the building's rollup rows (a primary key range), which change
+        only when a refresh changes them. On the raw table it aggregates every reading in
+        scope, so callers reuse its result for DATA_WATERMARK_TTL seconds.
+        """
+        table_name = RESOURCE_MAPPING.get(resource_type)
+        if not table_name:
+            raise ValueError(f"Invalid resource type: {resource_type}")
+        source = source or RollupManager.source_for(resource_type)
+        
+        if source == 'rollup':
+            query = f"""
+                SELECT
+                    SUM(row_count) as row_count,
+                    MAX(max_date) as max_date,
+                    SUM(usage_sum) as usage_total,
+                    COUNT(*) as months
+                FROM {ROLLUP_TABLE}
+                WHERE resource = %s
+            """
+            if building_id == "0":
+                return query, (resource_type,)
+            return query + " AND BuildingId = %s", (resource_type, building_id)
+        
+        query = f"""
+            SELECT
+                COUNT(*) as row_count,
+                MAX(`Date`) as max_date,
+                SUM(`Usage`) as usage_total
+            FROM {table_name}
+        """
+        if building_id == "0":
+            return query, None
+        return query + " WHERE BuildingId = %s", (building_id,)
+    
+    @staticmethod
+    @Tracer.traced('db.load', 'resource_type', 'building_id', 'granularity')
+    def load_data(resource_type: str, building_id: str = "0", granularity: str = 'month') -> pd.DataFrame:
+        """Load data from database with improved error handling"""
+        query, params = DataLoader.build_query(resource_type, building_id, granularity=granularity)
+        connection = get_db_connection()
+        
+        try:
+            cursor = connection.cursor()
+            logger.info(f"Executing {granularity} aggregation query for building {building_id}: {query}")
+            cursor.execute(query, params)
+            data = cursor.fetchall()
+            return DataLoader.frame_from_rows(data, resource_type, building_id, granularity)
             
         except Exception as e:
             logger.error(f"Error in load_data: {e}")
             raise
         finally:
             connection.close()
+    
+    @staticmethod
+    @Tracer.traced('db.load_panel', 'resource_type', 'granularity')
+    def load_panel(resource_type: str, granularity: str = 'month') -> pd.DataFrame:
+        """Load monthly (or weekly/daily) usage for all buildings, sorted by building then date"""
+        query, params = DataLoader.build_panel_query(resource_type, granularity=granularity)
+        connection = get_db_connection()
+        
+        try:
+            cursor = connection.cursor()
+            cursor.execute(query, params)
+            df = DataLoader.frame_from_rows(cursor.fetchall(), resource_type, "all", granularity)
+            df['BuildingId'] = df['BuildingId'].astype(str)
+            return df.sort_values(['BuildingId', 'Date'], kind='stable').reset_index(drop=True)
+        finally:
+            connection.close()
+    
+    @staticmethod
+    async def load_data_async(resource_type: str, building_id: str = "0",
+                              request: Optional[Request] = None) -> pd.DataFrame:
+        """Non-blocking variant of load_data for read-only endpoints"""
+        query, params = DataLoader.build_query(resource_type, building_id)
+        data = await AsyncDB.query(query, params, request=request)
+        return DataLoader.frame_from_rows(data, resource_type, building_id)
 
 # Model trainer with FIXED XGBoost implementation
 class ModelTrainer:
-    def __init__(self):
+    # Finding the loaded OpenMP/BLAS libraries takes ~15ms, so they are looked up once
+    _threadpools: Optional[ThreadpoolController] = None
+    # Held for the whole of a fit that runs under openmp_limit
+    _openmp_lock = threading.Lock()
+    
+    def __init__(self, n_jobs: Optional[int] = None, compact: bool = RF_COMPACTION):
         self.scalers = {}
         self.feature_importance = {}
+        self.compaction = {}
+        # None lets the scheduler decide per chunk how many cores training may take; FitPlanner passes its plan
+        self.n_jobs = n_jobs
+        self.compact = compact
+    
+    def fit_threads(self) -> int:
+        """Threads the next fit (or forest chunk) may use; a fixed n_jobs is a ceiling queued inference can lower"""
+        if self.n_jobs is None:
+            return Scheduler.training_n_jobs()
+        return min(self.n_jobs, Scheduler.training_n_jobs())
+    
+    @contextmanager
+    def openmp_limit(self):
+        """Cap OpenMP threads at fit_threads for one fit of an estimator without a thread parameter.
+        
+        Only hgb needs this: HistGradientBoostingRegressor (scikit-learn 1.3) has no n_jobs
+        and sizes its pool from the OpenMP runtime. That setting belongs to the process, so
+        fits under it take turns; a concurrent fit would otherwise restore, or inherit, the
+        other's cap. rf and xgb are capped through their n_jobs instead.
+        """
+        with ModelTrainer._openmp_lock:
+            if ModelTrainer._threadpools is None:
+                ModelTrainer._threadpools = ThreadpoolController()
+            with ModelTrainer._threadpools.limit(limits=self.fit_threads(), user_api='openmp'):
+                yield
+    
+    def fit_forest(self, model: RandomForestRegressor, X_train, y_train) -> None:
+        """Grow the forest in chunks, re-checking the core budget between chunks.
+        
+        warm_start draws the same per-tree seeds as a single fit, so the forest is
+        identical; it only yields cores to inference when predictions are queued.
+        """
+        total_estimators = model.n_estimators
+        grown = 0
+        model.set_params(warm_start=True)
+        while grown < total_estimators:
+            grown = min(total_estimators, grown + RF_FIT_CHUNK)
+            model.set_params(n_estimators=grown, n_jobs=self.fit_threads())
+            model.fit(X_train, y_train)
+        # Persisted forests predict a handful of rows; threading there is pure overhead
+        model.set_params(warm_start=False, n_jobs=None)
+    
+    def compact_forest(self, model: RandomForestRegressor, X_test: np.ndarray, y_test: pd.Series) -> tuple:
+        """Swap a fitted forest for its CompactForest and report size, latency and error changes"""
+        full_trees = FlatForest.from_forest(model).predict_trees(X_test)
+        y_true = np.asarray(y_test, dtype=float)
+        
+        # Shortest prefix of trees whose holdout RMSE stays within RF_PREFIX_EPSILON of the full forest
+        n_trees = len(model.estimators_)
+        prefix_rmse = np.sqrt(((np.cumsum(full_trees, axis=0) / np.arange(1, n_trees + 1)[:, None] - y_true) ** 2).mean(axis=1))
+        if RF_PREFIX_EPSILON > 0:
+            within = prefix_rmse <= prefix_rmse[-1] * (1 + RF_PREFIX_EPSILON)
+            within[:min(RF_PREFIX_MIN_TREES, n_trees) - 1] = False
+            n_trees = int(np.argmax(within)) + 1
+        
+        tolerance = RF_LEAF_TOLERANCE * abs(float(np.mean([e.tree_.value[0, 0, 0] for e in model.estimators_])))
+        compact = CompactForest.from_forest(model, n_trees=n_trees, tolerance=tolerance)
+        
+        def median_ms(fn) -> float:
+            samples = []
+            for _ in range(5):
+                started = time.perf_counter()
+                fn(X_test)
+                samples.append((time.perf_counter() - started) * 1000)
+            return float(np.median(samples))
+        
+        compact_pred = compact.predict(X_test)
+        report = {
+            'trees_total': len(model.estimators_),
+            'trees_kept': n_trees,
+            'nodes_original': int(sum(e.tree_.node_count for e in model.estimators_)),
+            'nodes_compact': int(len(compact.value)),
+            'bytes_original': len(pickle.dumps(model)),
+            'bytes_compact': len(pickle.dumps(compact)),
+            'predict_ms_original': median_ms(model.predict),
+            'predict_ms_compact': median_ms(compact.predict),
+            'holdout_rmse_original': float(prefix_rmse[-1]),
+            'holdout_rmse_compact': float(np.sqrt(np.mean((compact_pred - y_true) ** 2))),
+            'max_abs_prediction_change': float(np.max(np.abs(compact_pred - full_trees.mean(axis=0)))),
+            'leaf_tolerance': tolerance,
+            'prefix_epsilon': RF_PREFIX_EPSILON
+        }
+        logger.info(f"RF compacted: {report['nodes_original']} -> {report['nodes_compact']} nodes, "
+                    f"{report['bytes_original']} -> {report['bytes_compact']} bytes, {n_trees} trees kept")
+        return compact, report
+    
+    @staticmethod
+    def relative_residuals(y_true, y_pred) -> List[float]:
+        """(y - y_hat) / y_hat per holdout row, stored so bands can be pooled across buildings of any scale"""
+        y_true = np.asarray(y_true, dtype=float)
+        y_pred = np.maximum(np.asarray(y_pred, dtype=float), 1e-9)
+        return safe_float_array((y_true - y_pred) / y_pred).tolist()
+    
+    @staticmethod
+    def evaluate(y_true, y_pred) -> Dict[str, float]:
+        """Holdout metrics with safe conversion"""
+        y_true = np.asarray(y_true, dtype=float)
+        y_pred = np.asarray(y_pred, dtype=float)
+        mse = mean_squared_error(y_true, y_pred)
+        rmse = np.sqrt(mse)
+        mae = mean_absolute_error(y_true, y_pred)
+        
+        # Safe MAPE calculation
+        mask = y_true != 0
+        if mask.sum() > 0:
+            mape = np.mean(np.abs((y_true[mask] - y_pred[mask]) / y_true[mask])) * 100
+        else:
+            mape = 0.0
+        
+        r2 = r2_score(y_true, y_pred) if len(y_true) > 1 else 0.0
+        
+        return {
+            'MSE': safe_float_conversion(mse),
+            'RMSE': safe_float_conversion(rmse),
+            'MAE': safe_float_conversion(mae),
+            'MAPE': safe_float_conversion(mape),
+            'R2': safe_float_conversion(r2)
+        }
+    
+    @staticmethod
+    def split_train_test(df: pd.DataFrame, granularity: str = 'month') -> tuple:
+        """Chronological holdout: last year for 3+ years, last half year for 2+ years, else about a fifth"""
+        per_year = FeatureEngineer.PERIODS[granularity]['per_year']
+        if len(df) >= 3 * per_year:
+            test_size = per_year
+        elif len(df) >= 2 * per_year:
+            test_size = per_year // 2
+        else:
+            test_size = max(1, min(per_year // 2, len(df) // 5))
+        return df.iloc[:-test_size], df.iloc[-test_size:]
     
-    def train_single_model(self, X_train: pd.DataFrame, y_train: pd.Series,
-                          X_test: pd.DataFrame, y_test: pd.Series,
-                          model_type: str) -> tuple:
-        """Train a single model with FIXED XGBoost handling"""
+    @Tracer.traced('model.fit', 'model_type')
+    def train_single_model(self, X_train: np.ndarray, y_train: pd.Series,
+                          X_test: np.ndarray, y_test: pd.Series,
+                          model_type: str, feature_names: List[str]) -> tuple:
+        """Train a single model with FIXED XGBoost handling
+        
+        X_train/X_test come from FeatureEngineer.to_matrix (float32, finite) and are
+        handed to the estimators as-is; feature_names gives their column order.
+        """
         try:
-            # Ensure all features are numeric and finite
-            X_train = X_train.astype(float)
-            X_test = X_test.astype(float)
             y_train = y_train.astype(float)
             y_test = y_test.astype(float)
             
-            # Replace any remaining infinite values
-            X_train = X_train.replace([np.inf, -np.inf], 0)
-            X_test = X_test.replace([np.inf, -np.inf], 0)
-            X_train = X_train.fillna(0)
-            X_test = X_test.fillna(0)
-            
             # Ensure positive values for target
             y_train = y_train.clip(lower=0.001)
             y_test = y_test.clip(lower=0.001)
@@ -480,26 +2123,25 @@ class ModelTrainer:
                     min_samples_split=2,
                     min_samples_leaf=1,
                     max_features='sqrt',
-                    random_state=42,
-                    n_jobs=-1
+                    random_state=42
                 )
-                model.fit(X_train, y_train)
+                self.fit_forest(model, X_train, y_train)
+                self.feature_importance[model_type] = dict(zip(feature_names, model.feature_importances_))
+                if self.compact and len(X_test) > 0:
+                    model, self.compaction[model_type] = self.compact_forest(model, X_test, y_test)
                 y_pred = model.predict(X_test)
-                self.feature_importance[model_type] = dict(zip(X_train.columns, model.feature_importances_))
                 
-            elif model_type == 'xgb':
+            elif model_type in XGB_TREE_METHODS:
                 # CRITICAL FIX: Simple XGBoost for small dataset
-                original_columns = X_train.columns.tolist()
+                original_columns = list(feature_names)
                 cleaned_columns = clean_feature_names(original_columns)
                 
                 # Create mapping for later use
                 feature_mapping = dict(zip(original_columns, cleaned_columns))
                 
-                # Create cleaned DataFrames with consistent column names
-                X_train_clean = X_train.copy()
-                X_test_clean = X_test.copy()
-                X_train_clean.columns = cleaned_columns
-                X_test_clean.columns = cleaned_columns
+                # Named views over the same matrices, so XGBoost keeps consistent column names
+                X_train_clean = pd.DataFrame(X_train, columns=cleaned_columns, copy=False)
+                X_test_clean = pd.DataFrame(X_test, columns=cleaned_columns, copy=False)
                 
                 # Log data statistics
                 logger.info(f"XGBoost training data shape: {X_train_clean.shape}")
@@ -519,9 +2161,9 @@ class ModelTrainer:
                     gamma=0,                 # NO gamma
                     min_child_weight=1,      # DEFAULT
                     objective='reg:squarederror',
-                    tree_method='exact',     # More precise for small data
+                    tree_method=XGB_TREE_METHODS[model_type],  # exact: more precise for small data
                     random_state=42,
-                    n_jobs=1,                # Single thread for reproducibility
+                    n_jobs=self.n_jobs or 1, # Single thread unless the fit planner grants more
                     verbosity=1,             # Show training progress
                     enable_categorical=False,
                     validate_parameters=True
@@ -579,7 +2221,8 @@ class ModelTrainer:
                         reg_alpha=0,
                         reg_lambda=0.01,
                         random_state=42,
-                        objective='reg:squarederror'
+                        objective='reg:squarederror',
+                        n_jobs=self.n_jobs or 1
                     )
                     
                     alt_model.fit(X_train_clean, y_train)
@@ -638,7 +2281,35 @@ class ModelTrainer:
                 )
                 model.fit(X_train_scaled, y_train)
                 y_pred = model.predict(X_test_scaled)
-                self.feature_importance[model_type] = dict(zip(X_train.columns, model.feature_importances_))
+                self.feature_importance[model_type] = dict(zip(feature_names, model.feature_importances_))
+                
+            elif model_type == 'hgb':
+                # Binned splits with early stopping on an internal validation split; no scaling needed.
+                # 63 bins resolve a few thousand rows as well as 255 at half the per-iteration cost
+                model = HistGradientBoostingRegressor(
+                    max_iter=400,
+                    learning_rate=0.1,
+                    max_leaf_nodes=31,
+                    min_samples_leaf=2,   # the default 20 leaves monthly series almost unsplit
+                    max_bins=63,
+                    random_state=42,
+                    early_stopping=True,
+                    validation_fraction=0.2,
+                    n_iter_no_change=10
+                )
+                # HGB threads over OpenMP rather than n_jobs
+                with self.openmp_limit():
+                    model.fit(X_train, y_train)
+                y_pred = model.predict(X_test)
+                
+            elif model_type in STATE_MODEL_TYPES:
+                # Fitted on the target series alone; the Year and Month columns place rows in the calendar
+                year_col, month_col = feature_names.index('Year'), feature_names.index('Month')
+                model = SeasonalState.fit(model_type, SeasonalState.periods_of(X_train, year_col, month_col),
+                                          y_train.values, year_col, month_col)
+                y_pred = model.predict(X_test)
+                # Persist the state as of the latest month, holdout included, so forecasts start from there
+                model = model.update(SeasonalState.periods_of(X_test, year_col, month_col), y_test.values)
                 
             else:
                 raise ValueError(f"Unknown model type: {model_type}")
@@ -651,29 +2322,9 @@ class ModelTrainer:
                 logger.warning(f"{model_type} produced problematic predictions, using fallback")
                 y_pred = np.full_like(y_test, y_train.mean())
             
-            # Calculate metrics with safe conversion
-            mse = mean_squared_error(y_test, y_pred)
-            rmse = np.sqrt(mse)
-            mae = mean_absolute_error(y_test, y_pred)
-            
-            # Safe MAPE calculation
-            mask = y_test != 0
-            if mask.sum() > 0:
-                mape = np.mean(np.abs((y_test[mask] - y_pred[mask]) / y_test[mask])) * 100
-            else:
-                mape = 0.0
-            
-            r2 = r2_score(y_test, y_pred)
+            metrics = ModelTrainer.evaluate(y_test, y_pred)
             
-            metrics = {
-                'MSE': safe_float_conversion(mse),
-                'RMSE': safe_float_conversion(rmse),
-                'MAE': safe_float_conversion(mae),
-                'MAPE': safe_float_conversion(mape),
-                'R2': safe_float_conversion(r2)
-            }
-            
-            logger.info(f"{model_type} model trained - R2: {r2:.3f}, RMSE: {rmse:.3f}, MAPE: {mape:.1f}%")
+            logger.info(f"{model_type} model trained - R2: {metrics['R2']:.3f}, RMSE: {metrics['RMSE']:.3f}, MAPE: {metrics['MAPE']:.1f}%")
             
             return model, metrics, y_pred
             
@@ -681,145 +2332,969 @@ class ModelTrainer:
             logger.error(f"Error training {model_type} model: {e}")
             raise
     
-    def create_ensemble(self, models: Dict, X_test: pd.DataFrame, y_test: pd.Series,
-                       ensemble_type: str) -> tuple:
-        """Create ensemble predictions with improved error handling"""
+    @staticmethod
+    @Tracer.traced('model.ensemble', 'ensemble_type', 'weighting')
+    def create_ensemble(component_predictions: Dict[str, np.ndarray], y_test: pd.Series,
+                        ensemble_type: str, weighting: str = 'fixed', validation: Optional[tuple] = None) -> tuple:
+        """Blend cached holdout predictions of the component models.
+        
+        nnls weights are fit on validation, the (predictions by model type, y) pair from
+        validation_predictions, so the holdout metrics stay out of sample. Without it they
+        fall back to the fixed weights.
+        
+        Returns (ensemble_pred, metrics, weights) where weights maps component to weight
+        and is what prediction applies later.
+        """
         try:
-            predictions = []
-            weights = []
-            
-            if ensemble_type == 'rf_gb':
-                model_types = ['rf', 'gb']
-                type_weights = [0.6, 0.4]
-            elif ensemble_type == 'rf_xgb':
-                model_types = ['rf', 'xgb']
-                type_weights = [0.5, 0.5]
-            elif ensemble_type == 'gb_xgb':
-                model_types = ['gb', 'xgb']
-                type_weights = [0.4, 0.6]
-            elif ensemble_type == 'rf_gb_xgb':
-                model_types = ['rf', 'gb', 'xgb']
-                type_weights = [0.4, 0.3, 0.3]
-            else:
+            if ensemble_type not in ENSEMBLE_COMPONENTS:
                 raise ValueError(f"Unknown ensemble type: {ensemble_type}")
             
-            for i, model_type in enumerate(model_types):
-                if model_type in models:
-                    if model_type == 'gb' and model_type in self.scalers:
-                        X_test_scaled = self.scalers[model_type].transform(X_test)
-                        pred = models[model_type].predict(X_test_scaled)
-                    elif model_type == 'xgb':
-                        # Handle XGBoost with feature mapping
-                        if hasattr(models[model_type], 'feature_mapping'):
-                            feature_mapping = models[model_type].feature_mapping
-                            X_test_clean = X_test.copy()
-                            original_cols = X_test.columns.tolist()
-                            cleaned_cols = [feature_mapping.get(col, col) for col in original_cols]
-                            X_test_clean.columns = cleaned_cols
-                            pred = models[model_type].predict(X_test_clean)
-                        else:
-                            # Fallback: clean feature names again
-                            X_test_clean = X_test.copy()
-                            cleaned_cols = clean_feature_names(X_test.columns.tolist())
-                            X_test_clean.columns = cleaned_cols
-                            pred = models[model_type].predict(X_test_clean)
-                    else:
-                        pred = models[model_type].predict(X_test)
-                    
-                    # Ensure predictions are positive
-                    pred = np.maximum(pred, 0)
-                    predictions.append(pred)
-                    weights.append(type_weights[i])
-            
-            if not predictions:
+            components = [c for c in ENSEMBLE_COMPONENTS[ensemble_type] if c in component_predictions]
+            if not components:
                 raise ValueError(f"No models available for ensemble {ensemble_type}")
             
-            # Weighted average predictions
-            weights = np.array(weights) / np.sum(weights)
-            ensemble_pred = np.average(predictions, axis=0, weights=weights)
-            
-            # Calculate metrics
-            mse = mean_squared_error(y_test, ensemble_pred)
-            rmse = np.sqrt(mse)
-            mae = mean_absolute_error(y_test, ensemble_pred)
+            predictions = np.column_stack([np.asarray(component_predictions[c], dtype=float) for c in components])
             
-            # Safe MAPE calculation
-            mask = y_test != 0
-            if mask.sum() > 0:
-                mape = np.mean(np.abs((y_test[mask] - ensemble_pred[mask]) / y_test[mask])) * 100
-            else:
-                mape = 0.0
-            
-            r2 = r2_score(y_test, ensemble_pred)
+            weights = None
+            if weighting == 'nnls':
+                if validation is not None and all(c in validation[0] for c in components):
+                    fitted, _ = nnls(
+                        np.column_stack([np.asarray(validation[0][c], dtype=float) for c in components]),
+                        np.asarray(validation[1], dtype=float)
+                    )
+                    if fitted.sum() > 0:
+                        weights = fitted
+                    else:
+                        logger.warning(f"NNLS weights for {ensemble_type} are all zero, using fixed weights")
+                else:
+                    logger.warning(f"No validation predictions for {ensemble_type} components, using fixed weights")
+            if weights is None:
+                preset = dict(zip(ENSEMBLE_COMPONENTS[ensemble_type], ENSEMBLE_WEIGHTS[ensemble_type]))
+                weights = np.array([preset[c] for c in components])
+                weights = weights / weights.sum()
             
-            metrics = {
-                'MSE': safe_float_conversion(mse),
-                'RMSE': safe_float_conversion(rmse),
-                'MAE': safe_float_conversion(mae),
-                'MAPE': safe_float_conversion(mape),
-                'R2': safe_float_conversion(r2)
-            }
+            ensemble_pred = predictions @ weights
+            metrics = ModelTrainer.evaluate(y_test, ensemble_pred)
             
-            logger.info(f"{ensemble_type} ensemble created - R2: {r2:.3f}, RMSE: {rmse:.3f}, MAPE: {mape:.1f}%")
+            logger.info(f"{ensemble_type} ensemble created - R2: {metrics['R2']:.3f}, RMSE: {metrics['RMSE']:.3f}, MAPE: {metrics['MAPE']:.1f}%")
             
-            return ensemble_pred, metrics
+            return ensemble_pred, metrics, dict(zip(components, weights.tolist()))
             
         except Exception as e:
             logger.error(f"Error creating ensemble {ensemble_type}: {e}")
             raise
 
+    def validation_predictions(self, X_train: np.ndarray, y_train: pd.Series, model_types: List[str],
+                               feature_names: List[str], validation_rows: int,
+                               groups: Optional[np.ndarray] = None) -> tuple:
+        """Predictions for fitting ensemble weights without touching the holdout.
+        
+        Each model is refit without the last validation_rows training rows (of each group,
+        at most a third of them) and predicts those rows. Returns ({model_type: predictions},
+        y_validation); model types whose inner fit fails are left out.
+        """
+        groups = np.zeros(len(X_train)) if groups is None else np.asarray(groups)
+        validation = np.zeros(len(X_train), dtype=bool)
+        for index in pd.Series(groups).groupby(groups, sort=False).indices.values():
+            take = min(validation_rows, len(index) // 3)
+            if take:
+                validation[index[-take:]] = True
+        
+        y_train = pd.Series(np.asarray(y_train, dtype=float))
+        predictions = {}
+        if validation.any():
+            for model_type in model_types:
+                try:
+                    _, _, y_pred = self.train_single_model(
+                        X_train[~validation], y_train[~validation].reset_index(drop=True),
+                        X_train[validation], y_train[validation].reset_index(drop=True), model_type, feature_names
+                    )
+                    predictions[model_type] = np.asarray(y_pred, dtype=float)
+                except Exception as e:
+                    logger.warning(f"Validation fit of {model_type} for ensemble weights failed: {e}")
+        return predictions, y_train[validation].to_numpy()
+
+def fit_model(X_train: np.ndarray, y_train: pd.Series, X_test: np.ndarray, y_test: pd.Series,
+              model_type: str, feature_cols: List[str], n_jobs: Optional[int] = None) -> Dict[str, Any]:
+    """One train_single_model call with what run_training persists (may run in a FitPlanner process)"""
+    trainer = ModelTrainer(n_jobs=n_jobs)
+    started, cpu_started = time.perf_counter(), time.process_time()
+    model, metrics, y_pred = trainer.train_single_model(X_train, y_train, X_test, y_test, model_type, feature_cols)
+    return {
+        'model': model,
+        'metrics': metrics,
+        'y_pred': y_pred,
+        'scaler': trainer.scalers.get(model_type),
+        'compaction': trainer.compaction.get(model_type),
+        'fit_seconds': time.perf_counter() - started,
+        # The whole process's CPU time, so every thread of the fit counts
+        'cpu_seconds': time.process_time() - cpu_started
+    }
+
+class FitPlanner:
+    """Run a batch of (building, model_type) fits with threads inside fits or processes across them.
+    
+    Monthly series give fits of a few dozen rows, where threads inside a fit cost more
+    than they save. Such batches run single-threaded fits side by side in worker processes
+    pinned to their share of the cores; only fits large enough to scale get threads.
+    
+    Worker processes cannot hear the scheduler, so in the API process they only get the
+    cores not reserved for the inference lane; in-process fits keep yielding to inference
+    chunk by chunk. worker.py and scripts reserve nothing.
+    """
+    # Cores process-mode batches leave to inference; the API sets it at startup
+    reserved_cores = 0
+    _last: Optional[Dict[str, Any]] = None
+    _totals = {'batches': 0, 'fits': 0, 'fits_failed': 0, 'cpu_seconds': 0.0, 'core_seconds': 0.0}
+    
+    @staticmethod
+    def cores() -> int:
+        """Cores this process may run on (the affinity mask, as containers limit it)"""
+        try:
+            return len(os.sched_getaffinity(0))
+        except AttributeError:
+            return os.cpu_count() or 1
+    
+    @staticmethod
+    def plan(rows: List[int], cores: Optional[int] = None) -> Dict[str, Any]:
+        """Threads per fit from the largest fit's training rows, then processes for the unreserved cores left over"""
+        cores = cores or FitPlanner.cores()
+        available = max(1, cores - FitPlanner.reserved_cores)
+        largest = max(rows, default=0)
+        threads = max(1, min(cores, largest // FIT_ROWS_PER_THREAD))
+        processes = 1
+        # Each spawned worker imports the service before its first fit, which only a batch earns back
+        if len(rows) >= FIT_PROCESS_MIN_FITS:
+            processes = max(1, min(len(rows), FIT_PROCESSES or available, available // threads))
+        return {
+            'cores': cores,
+            'reserved_cores': min(FitPlanner.reserved_cores, cores),
+            'fits': len(rows),
+            'largest_fit_rows': largest,
+            'mode': 'processes' if processes > 1 else 'in_process',
+            'processes': processes,
+            'threads_per_fit': threads
+        }
+    
+    @staticmethod
+    def pin_threads(threads: int) -> None:
+        """Cap this process's OpenMP and BLAS pools (FitPlanner pool initializer, worker.py)"""
+        for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+            os.environ[var] = str(threads)
+        # numpy, scipy and sklearn are imported by now, so resize the pools they already started
+        threadpool_limits(threads)
+    
+    @staticmethod
+    def run(fits: List[tuple]) -> tuple:
+        """fit_model over fits, each (X_train, y_train, X_test, y_test, model_type, feature_cols).
+        
+        Returns (results, report): results line up with fits and hold the fit_model dict or the
+        exception the fit raised; the report carries the plan and the achieved core utilization.
+        """
+        plan = FitPlanner.plan([len(fit[0]) for fit in fits])
+        started = time.perf_counter()
+        results: List[Any] = []
+        if plan['mode'] == 'in_process':
+            # One thread is pinned; more is left to the scheduler so queued inference can take cores back
+            n_jobs = 1 if plan['threads_per_fit'] == 1 else None
+            for fit in fits:
+                try:
+                    results.append(fit_model(*fit, n_jobs=n_jobs))
+                except Exception as e:
+                    results.append(e)
+        else:
+            # spawn: forking a process that runs event-loop and pool threads can inherit held locks
+            with ProcessPoolExecutor(max_workers=plan['processes'], mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=FitPlanner.pin_threads, initargs=(plan['threads_per_fit'],)) as pool:
+                futures = [pool.submit(fit_model, *fit, n_jobs=plan['threads_per_fit']) for fit in fits]
+                for future in futures:
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        results.append(e)
+        
+        wall = time.perf_counter() - started
+        cpu = sum(result['cpu_seconds'] for result in results if isinstance(result, dict))
+        failed = sum(isinstance(result, Exception) for result in results)
+        report = {
+            **plan,
+            'fits_failed': failed,
+            'wall_seconds': wall,
+            'cpu_seconds': cpu,
+            # Share of the machine's core-seconds spent fitting, worker start-up included
+            'utilization': cpu / (wall * plan['cores']) if wall > 0 else 0.0
+        }
+        FitPlanner._last = report
+        totals = FitPlanner._totals
+        totals['batches'] += 1
+        totals['fits'] += len(fits)
+        totals['fits_failed'] += failed
+        totals['cpu_seconds'] += cpu
+        totals['core_seconds'] += wall * plan['cores']
+        if len(fits) > 1:
+            logger.info(f"Fit plan: {len(fits)} fits {plan['mode']} x{plan['processes']}, {plan['threads_per_fit']} threads "
+                        f"each, {wall:.1f}s wall, {report['utilization']:.0%} of {plan['cores']} cores")
+        return results, report
+    
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        totals = FitPlanner._totals
+        return {
+            **totals,
+            'utilization': totals['cpu_seconds'] / totals['core_seconds'] if totals['core_seconds'] else None,
+            'last': FitPlanner._last
+        }
+
 # Model manager
+class ModelCache:
+    """LRU of loaded (model, metadata) pairs for artifacts inside version directories.
+    
+    A version directory never changes once published, so its path is the whole cache key:
+    a retrain publishes a new path and the old entries simply age out.
+    """
+    _lock = threading.Lock()
+    _entries: "OrderedDict[Path, tuple]" = OrderedDict()
+    _counters = {'hits': 0, 'misses': 0}
+    
+    @staticmethod
+    def get(model_path: Path) -> Optional[tuple]:
+        with ModelCache._lock:
+            entry = ModelCache._entries.get(model_path)
+            if entry is None:
+                ModelCache._counters['misses'] += 1
+                return None
+            ModelCache._entries.move_to_end(model_path)
+            ModelCache._counters['hits'] += 1
+            return entry
+    
+    @staticmethod
+    def put(model_path: Path, entry: tuple) -> None:
+        with ModelCache._lock:
+            ModelCache._entries[model_path] = entry
+            ModelCache._entries.move_to_end(model_path)
+            while len(ModelCache._entries) > MODEL_CACHE_SIZE:
+                ModelCache._entries.popitem(last=False)
+    
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        return {**ModelCache._counters, 'entries': len(ModelCache._entries), 'capacity': MODEL_CACHE_SIZE}
+
 class ModelManager:
+    """Artifacts of a building live in immutable version directories.
+    
+    {building_dir}/versions/v{time_ns}/ holds every *_model.pkl, *_metadata.json and
+    *_scaler.pkl of one training run, and {building_dir}/current names the live one.
+    Training stages a new version (unchanged artifacts hard-linked from the live one),
+    writes into it and swaps the pointer with an atomic rename, so a reader that
+    resolved the pointer once sees one consistent version without locking. Directories
+    from before versioning have their artifacts directly in building_dir and are read
+    in place until their first retrain.
+    """
+    VERSIONS_DIR = 'versions'
+    CURRENT_POINTER = 'current'
+    # Written when legacy artifacts are first replaced; their grace period runs from its mtime
+    LEGACY_RETIRED = '.legacy_retired'
+    
+    @staticmethod
+    def metadata_path(model_path: Path) -> Path:
+        """Per-model metadata file ({model_type}_metadata.json) next to the artifact"""
+        model_type = model_path.name[:-len('_model.pkl')]
+        return model_path.parent / f'{model_type}_metadata.json'
+    
     @staticmethod
+    @contextmanager
+    def open_atomic(path: Path, mode: str = 'wb'):
+        """Write under a temporary name and rename into place, never through a hard-linked file"""
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, mode) as f:
+                yield f
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    
+    @staticmethod
+    @Tracer.traced('model.save', 'model_path')
     def save_model(model: Any, model_path: Path, metadata: Dict) -> None:
         """Save model and metadata"""
         model_path.parent.mkdir(parents=True, exist_ok=True)
         
         # Save model
-        with open(model_path, 'wb') as f:
+        with ModelManager.open_atomic(model_path) as f:
             pickle.dump(model, f)
+        metadata['artifact_bytes'] = model_path.stat().st_size
         
         # Safe metadata conversion
         safe_metadata = safe_dict_conversion(metadata)
         
-        # Save metadata
-        metadata_path = model_path.parent / 'metadata.json'
-        with open(metadata_path, 'w') as f:
+        # Save metadata per model so model types trained together don't overwrite each other
+        with ModelManager.open_atomic(ModelManager.metadata_path(model_path), 'w') as f:
             json.dump(safe_metadata, f, indent=2, default=str)
     
     @staticmethod
-    def load_model(model_path: Path) -> tuple:
-        """Load model and metadata"""
-        if not model_path.exists():
-            raise FileNotFoundError(f"Model not found: {model_path}")
-        
-        # Load model
+    def load_metadata(model_path: Path) -> Dict:
+        """Load per-model metadata, falling back to the legacy shared metadata.json"""
+        for metadata_path in (ModelManager.metadata_path(model_path), model_path.parent / 'metadata.json'):
+            if metadata_path.exists():
+                with open(metadata_path, 'r') as f:
+                    return json.load(f)
+        return {}
+    
+    @staticmethod
+    @Tracer.traced('model.load', 'model_path')
+    def load_model(model_path: Path, cache: bool = True) -> tuple:
+        """Load model and metadata; artifacts of published versions come from ModelCache.
+        
+        cache=False still reads a cached entry but does not add one, for bulk reads that
+        would otherwise evict the models serving /predict.
+        """
+        versioned = ModelManager.is_version_dir(model_path.parent)
+        if versioned:
+            cached = ModelCache.get(model_path)
+            if cached is not None:
+                return cached
+        
+        if not model_path.exists():
+            raise FileNotFoundError(f"Model not found: {model_path}")
+        
+        # Load model
         with open(model_path, 'rb') as f:
             model = pickle.load(f)
         
-        # Load metadata
-        metadata_path = model_path.parent / 'metadata.json'
-        metadata = {}
-        if metadata_path.exists():
-            with open(metadata_path, 'r') as f:
-                metadata = json.load(f)
-        
-        return model, metadata
+        loaded = (model, ModelManager.load_metadata(model_path))
+        if versioned and cache:
+            ModelCache.put(model_path, loaded)
+        return loaded
     
     @staticmethod
-    def get_model_path(resource_type: str, building_id: str, model_type: str) -> Path:
-        """Get model file path"""
+    def model_resource(resource_type: str, granularity: str = 'month') -> str:
+        """Resource segment of a model's paths and index key: monthly models keep the bare resource type"""
+        return resource_type if granularity == 'month' else f"{resource_type}_{granularity}"
+    
+    @staticmethod
+    def get_building_dir(resource_type: str, building_id: str) -> Path:
+        """Directory holding a building's artifacts; building_id 'global' is the panel model scope"""
+        if building_id == GLOBAL_BUILDING_ID:
+            return MODELS_DIR / resource_type / GLOBAL_BUILDING_ID
         safe_building_id = building_id.replace("-", "_") if building_id != "0" else "0"
-        return MODELS_DIR / resource_type / f"building_{safe_building_id}" / f"{model_type}_model.pkl"
+        return MODELS_DIR / resource_type / f"building_{safe_building_id}"
+    
+    @staticmethod
+    def building_id_of(dir_name: str) -> Optional[str]:
+        """Inverse of get_building_dir for a directory name; None for anything else"""
+        if dir_name.startswith('building_'):
+            building_id_part = dir_name[9:]
+            return "0" if building_id_part == "0" else building_id_part.replace("_", "-")
+        if dir_name == GLOBAL_BUILDING_ID:
+            return GLOBAL_BUILDING_ID
+        return None
+    
+    @staticmethod
+    def is_version_dir(directory: Path) -> bool:
+        return directory.parent.name == ModelManager.VERSIONS_DIR
+    
+    @staticmethod
+    def current_version(building_dir: Path) -> Optional[str]:
+        try:
+            return (building_dir / ModelManager.CURRENT_POINTER).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+    
+    @staticmethod
+    def resolve(building_dir: Path) -> Path:
+        """Directory to read a building's artifacts from: its current version, else building_dir itself"""
+        version = ModelManager.current_version(building_dir)
+        if version is None:
+            return building_dir
+        return building_dir / ModelManager.VERSIONS_DIR / version
+    
+    @staticmethod
+    def get_model_dir(resource_type: str, building_id: str, scope: str = 'building') -> Path:
+        """Pinned artifact directory; paths built from it stay consistent however long the reader takes"""
+        if scope == 'global':
+            building_id = GLOBAL_BUILDING_ID
+        return ModelManager.resolve(ModelManager.get_building_dir(resource_type, building_id))
+    
+    @staticmethod
+    def get_model_path(resource_type: str, building_id: str, model_type: str, scope: str = 'building') -> Path:
+        """Get model file path"""
+        return ModelManager.get_model_dir(resource_type, building_id, scope) / f"{model_type}_model.pkl"
+    
+    @staticmethod
+    def artifacts(directory: Path) -> List[Path]:
+        """Artifact files of a version or legacy building directory"""
+        if not directory.is_dir():
+            return []
+        return [path for path in directory.iterdir()
+                if path.is_file() and not path.name.startswith('.') and path.name != ModelManager.CURRENT_POINTER]
+    
+    @staticmethod
+    def stage(resource_type: str, building_id: str, seed: bool = True) -> Path:
+        """New unpublished version directory, holding links to the live artifacts unless seed is False"""
+        building_dir = ModelManager.get_building_dir(resource_type, building_id)
+        version_dir = building_dir / ModelManager.VERSIONS_DIR / f"v{time.time_ns():020d}"
+        version_dir.mkdir(parents=True)
+        if seed:
+            for path in ModelManager.artifacts(ModelManager.resolve(building_dir)):
+                try:
+                    os.link(path, version_dir / path.name)
+                except OSError:
+                    shutil.copy2(path, version_dir / path.name)
+        return version_dir
+    
+    @staticmethod
+    def publish(version_dir: Path) -> None:
+        """Make a staged version the current one, then collect versions past their grace period"""
+        building_dir = version_dir.parent.parent
+        previous = ModelManager.resolve(building_dir)
+        # The grace period of the replaced version runs from now
+        if ModelManager.is_version_dir(previous) and previous.exists():
+            os.utime(previous)
+        elif ModelManager.artifacts(previous):
+            (building_dir / ModelManager.LEGACY_RETIRED).touch()
+        with ModelManager.open_atomic(building_dir / ModelManager.CURRENT_POINTER, 'w') as f:
+            f.write(version_dir.name)
+        logger.info(f"Published {version_dir.relative_to(MODELS_DIR)}")
+        ModelManager.gc(building_dir)
+    
+    @staticmethod
+    def discard(version_dir: Path) -> None:
+        """Drop a staged version that was never published"""
+        if ModelManager.current_version(version_dir.parent.parent) != version_dir.name:
+            shutil.rmtree(version_dir, ignore_errors=True)
+    
+    @staticmethod
+    def retire(resource_type: str, building_id: str) -> None:
+        """Delete a building's models by publishing an empty version; readers already pinned keep theirs"""
+        ModelManager.publish(ModelManager.stage(resource_type, building_id, seed=False))
+    
+    @staticmethod
+    def gc(building_dir: Path) -> int:
+        """Remove versions replaced more than MODEL_VERSION_GRACE_SECONDS ago; returns how many.
+        
+        Only versions older than the current one are candidates, so a version still being
+        staged is never touched. Legacy artifacts directly in building_dir go the same way
+        once a version has been current for the grace period.
+        """
+        current = ModelManager.current_version(building_dir)
+        if current is None:
+            return 0
+        cutoff = time.time() - MODEL_VERSION_GRACE_SECONDS
+        removed = 0
+        versions_dir = building_dir / ModelManager.VERSIONS_DIR
+        for version_dir in sorted(versions_dir.iterdir()) if versions_dir.is_dir() else []:
+            if version_dir.name >= current:
+                break
+            try:
+                if version_dir.stat().st_mtime < cutoff:
+                    shutil.rmtree(version_dir)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        legacy_marker = building_dir / ModelManager.LEGACY_RETIRED
+        try:
+            if legacy_marker.stat().st_mtime < cutoff:
+                for path in ModelManager.artifacts(building_dir):
+                    path.unlink(missing_ok=True)
+                legacy_marker.unlink()
+        except FileNotFoundError:
+            pass
+        if removed:
+            logger.info(f"Removed {removed} retired versions from {building_dir}")
+        return removed
+    
+    @staticmethod
+    def gc_all() -> int:
+        removed = 0
+        for resource_type, granularity in [(r, g) for r in RESOURCE_MAPPING for g in GRANULARITIES]:
+            resource_dir = MODELS_DIR / ModelManager.model_resource(resource_type, granularity)
+            if resource_dir.is_dir():
+                for building_dir in resource_dir.iterdir():
+                    if ModelManager.building_id_of(building_dir.name) is not None:
+                        removed += ModelManager.gc(building_dir)
+        return removed
+
+class ModelIndex:
+    """Holdout MAPE and inference cost of every stored model, kept in memory for model_type='auto'.
+    
+    Built from the metadata files once, then refreshed per building directory whenever
+    /train or DELETE /models changes it, so selecting a model reads no files. Each change
+    also rewrites the registry version file, which lets other processes sharing MODELS_DIR
+    notice that their index (and any ETag derived from the registry) is stale.
+    """
+    _lock = threading.Lock()
+    # (model_resource, building_id) -> {model_type: {'MAPE', 'cost', 'relative_residuals'}}
+    _entries: Dict[tuple, Dict[str, Dict[str, Any]]] = {}
+    # (model_resource, model_type) -> every building's relative holdout residuals, dropped on any change
+    _pooled: Dict[tuple, np.ndarray] = {}
+    _built = False
+    # Registry version the entries reflect
+    _version: Optional[str] = None
+    
+    @staticmethod
+    def registry_version() -> tuple:
+        """(version, last change time) of the model registry; ('0', 0.0) before any change"""
+        try:
+            stat = REGISTRY_VERSION_FILE.stat()
+            return REGISTRY_VERSION_FILE.read_text().strip(), stat.st_mtime
+        except FileNotFoundError:
+            return '0', 0.0
+    
+    @staticmethod
+    def bump() -> str:
+        version = uuid.uuid4().hex
+        tmp_path = REGISTRY_VERSION_FILE.with_name(f"{REGISTRY_VERSION_FILE.name}.{version}.tmp")
+        tmp_path.write_text(version)
+        os.replace(tmp_path, REGISTRY_VERSION_FILE)
+        return version
+    
+    @staticmethod
+    def scan(building_dir: Path) -> Dict[str, Dict[str, float]]:
+        """Selectable models of one artifact directory; cost is the number of estimators a prediction runs.
+        
+        State models are a handful of arithmetic operations and cost nothing.
+        """
+        entries = {}
+        if not building_dir.is_dir():
+            return entries
+        for model_type in MODEL_TYPES:
+            model_path = building_dir / f"{model_type}_model.pkl"
+            if not model_path.exists():
+                continue
+            try:
+                metadata = ModelManager.load_metadata(model_path)
+            except Exception as e:
+                logger.warning(f"Unreadable metadata for {model_path}: {e}")
+                continue
+            mape = metadata.get('metrics', {}).get('MAPE')
+            if mape is not None:
+                entries[model_type] = {
+                    'MAPE': float(mape),
+                    'cost': int(model_type not in STATE_MODEL_TYPES),
+                    'relative_residuals': np.asarray(metadata.get('holdout_relative_residuals') or [], dtype=np.float32)
+                }
+        
+        for ensemble_type in ENSEMBLE_TYPES:
+            metadata_path = building_dir / f'{ensemble_type}_metadata.json'
+            if not metadata_path.exists():
+                continue
+            try:
+                with open(metadata_path, 'r') as f:
+                    metadata = json.load(f)
+            except Exception as e:
+                logger.warning(f"Unreadable metadata for {metadata_path}: {e}")
+                continue
+            components = metadata.get('ensemble_components') or ENSEMBLE_COMPONENTS[ensemble_type]
+            present = [c for c in components if (building_dir / f"{c}_model.pkl").exists()]
+            mape = metadata.get('metrics', {}).get('MAPE')
+            if present and mape is not None:
+                entries[ensemble_type] = {'MAPE': float(mape), 'cost': sum(c not in STATE_MODEL_TYPES for c in present)}
+        return entries
+    
+    @staticmethod
+    def build() -> None:
+        version, _ = ModelIndex.registry_version()
+        entries = {}
+        for resource_type in RESOURCE_MAPPING:
+            for granularity in GRANULARITIES:
+                model_resource = ModelManager.model_resource(resource_type, granularity)
+                resource_dir = MODELS_DIR / model_resource
+                if not resource_dir.exists():
+                    continue
+                for building_dir in resource_dir.iterdir():
+                    building_id = ModelManager.building_id_of(building_dir.name)
+                    if building_id is None:
+                        continue
+                    scanned = ModelIndex.scan(ModelManager.resolve(building_dir))
+                    if scanned:
+                        entries[(model_resource, building_id)] = scanned
+        with ModelIndex._lock:
+            ModelIndex._entries = entries
+            ModelIndex._pooled = {}
+            ModelIndex._built = True
+            ModelIndex._version = version
+        logger.info(f"Model index built: {sum(len(e) for e in entries.values())} models in {len(entries)} directories")
+    
+    @staticmethod
+    def refresh(resource_type: str, building_id: str) -> None:
+        """Re-read one building directory after its artifacts changed"""
+        previous, _ = ModelIndex.registry_version()
+        version = ModelIndex.bump()
+        scanned = ModelIndex.scan(ModelManager.get_model_dir(resource_type, building_id))
+        with ModelIndex._lock:
+            if scanned:
+                ModelIndex._entries[(resource_type, building_id)] = scanned
+            else:
+                ModelIndex._entries.pop((resource_type, building_id), None)
+            ModelIndex._pooled = {}
+            # Only adopt the new version if nothing else changed the registry since our entries were read
+            if ModelIndex._version == previous:
+                ModelIndex._version = version
+    
+    @staticmethod
+    def ensure_current() -> None:
+        if not ModelIndex._built or ModelIndex._version != ModelIndex.registry_version()[0]:
+            ModelIndex.build()
+    
+    @staticmethod
+    def buildings(resource_type: str, model_type: str) -> List[str]:
+        """Buildings with a current model_type artifact, sorted"""
+        ModelIndex.ensure_current()
+        return sorted(building_id for (resource, building_id), entries in ModelIndex._entries.items()
+                      if resource == resource_type and building_id != GLOBAL_BUILDING_ID and model_type in entries)
+    
+    @staticmethod
+    def pooled_residuals(resource_type: str, model_type: str) -> np.ndarray:
+        """Relative holdout residuals of every building's model_type model, for bands of models with too few"""
+        ModelIndex.ensure_current()
+        key = (resource_type, model_type)
+        with ModelIndex._lock:
+            pooled = ModelIndex._pooled.get(key)
+            if pooled is None:
+                parts = [entries[model_type]['relative_residuals']
+                         for (resource, building_id), entries in ModelIndex._entries.items()
+                         if resource == resource_type and building_id != GLOBAL_BUILDING_ID and model_type in entries
+                         and 'relative_residuals' in entries[model_type]]
+                pooled = np.concatenate(parts).astype(float) if parts else np.zeros(0)
+                ModelIndex._pooled[key] = pooled
+        return pooled
+    
+    @staticmethod
+    def select(resource_type: str, building_id: str, scope: str = 'building') -> Optional[Dict[str, Any]]:
+        """Lowest holdout MAPE, ties within AUTO_MAPE_TIE going to the cheapest model"""
+        ModelIndex.ensure_current()
+        if scope == 'global':
+            building_id = GLOBAL_BUILDING_ID
+        entries = ModelIndex._entries.get((resource_type, building_id))
+        if not entries:
+            return None
+        
+        order = MODEL_TYPES + ENSEMBLE_TYPES
+        best_mape = min(entry['MAPE'] for entry in entries.values())
+        tied = sorted((entry['cost'], order.index(model_type), model_type)
+                      for model_type, entry in entries.items() if entry['MAPE'] <= best_mape + AUTO_MAPE_TIE)
+        model_type = tied[0][2]
+        return {
+            'requested': AUTO_MODEL_TYPE,
+            'model_type': model_type,
+            'MAPE': entries[model_type]['MAPE'],
+            'candidates': len(entries),
+            'tied': [t[2] for t in tied]
+        }
+    
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        return {
+            'built': ModelIndex._built,
+            'registry_version': ModelIndex._version,
+            'directories': len(ModelIndex._entries),
+            'models': sum(len(entries) for entries in ModelIndex._entries.values())
+        }
 
 # Prediction helper with FIXED XGBoost handling
+# Vectorized forest evaluation
+class FlatForest:
+    """Every tree of a fitted forest packed into flat node arrays.
+    
+    Leaves point at themselves, so descending all trees for all rows a fixed
+    max_depth steps lands each (tree, row) pair on its leaf in one batched pass.
+    """
+    
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray,
+                 right: np.ndarray, value: np.ndarray, roots: np.ndarray, depth: int):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.depth = depth
+    
+    @staticmethod
+    def from_forest(model: Any) -> 'FlatForest':
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        sizes = np.array([tree.node_count for tree in trees])
+        roots = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        
+        features, lefts, rights = [], [], []
+        for tree, root in zip(trees, roots):
+            own = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            features.append(np.where(is_leaf, 0, tree.feature))
+            lefts.append(np.where(is_leaf, own, tree.children_left) + root)
+            rights.append(np.where(is_leaf, own, tree.children_right) + root)
+        
+        return FlatForest(
+            feature=np.concatenate(features),
+            threshold=np.concatenate([tree.threshold for tree in trees]),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            value=np.concatenate([tree.value[:, 0, 0] for tree in trees]),
+            roots=roots,
+            depth=max(tree.max_depth for tree in trees)
+        )
+    
+    def predict_trees(self, X: Any) -> np.ndarray:
+        """Per-tree predictions, shape (n_trees, n_rows)"""
+        # sklearn compares float32 inputs against float64 thresholds; do the same
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[None, :]
+        nodes = np.repeat(self.roots[:, None], X.shape[0], axis=1)
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes]
+
+class CompactForest(FlatForest):
+    """Served replacement for a fitted RandomForestRegressor.
+    
+    Thresholds are stored as float32 rounded down, which is exact for float32 inputs
+    (x <= t64 iff x <= largest float32 <= t64); leaf values are float32. Identical
+    subtrees are stored once across all trees, and sibling leaves whose values span
+    less than the tolerance are merged into their parent.
+    """
+    
+    def __init__(self, feature, threshold, left, right, value, roots, depth,
+                 n_features_in: int, feature_importances: np.ndarray):
+        super().__init__(feature, threshold, left, right, value, roots, depth)
+        self.n_features_in_ = n_features_in
+        self.feature_importances_ = feature_importances
+    
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+    
+    def predict(self, X: Any) -> np.ndarray:
+        return self.predict_trees(X).mean(axis=0, dtype=np.float64)
+    
+    @staticmethod
+    def from_forest(model: RandomForestRegressor, n_trees: Optional[int] = None,
+                    tolerance: float = 0.0) -> 'CompactForest':
+        """Compact the first n_trees trees; leaves merge while their value range stays within tolerance"""
+        nodes = {}
+        feature, threshold, left, right, value = [], [], [], [], []
+        
+        def intern(key, node_feature, node_threshold, node_left, node_right, node_value) -> int:
+            if key not in nodes:
+                nodes[key] = len(value)
+                feature.append(node_feature)
+                threshold.append(node_threshold)
+                left.append(node_left)
+                right.append(node_right)
+                value.append(node_value)
+            return nodes[key]
+        
+        roots, depth = [], 0
+        for estimator in model.estimators_[:n_trees]:
+            tree = estimator.tree_
+            thresholds = tree.threshold.astype(np.float32)
+            rounded_up = thresholds.astype(np.float64) > tree.threshold
+            thresholds[rounded_up] = np.nextafter(thresholds[rounded_up], np.float32(-np.inf))
+            values = tree.value[:, 0, 0]
+            weights = tree.weighted_n_node_samples
+            
+            # Post-order walk; each node yields (canonical id, is_leaf, value, weight, min, max, height)
+            def walk(node: int) -> tuple:
+                if tree.children_left[node] == -1:
+                    leaf_value = np.float32(values[node])
+                    leaf_id = intern(('leaf', leaf_value), 0, np.float32(0), -1, -1, leaf_value)
+                    return leaf_id, True, values[node], weights[node], values[node], values[node], 0
+                l = walk(tree.children_left[node])
+                r = walk(tree.children_right[node])
+                low, high = min(l[4], r[4]), max(l[5], r[5])
+                if l[1] and r[1] and high - low <= tolerance:
+                    merged = (l[2] * l[3] + r[2] * r[3]) / (l[3] + r[3])
+                    leaf_value = np.float32(merged)
+                    leaf_id = intern(('leaf', leaf_value), 0, np.float32(0), -1, -1, leaf_value)
+                    return leaf_id, True, merged, l[3] + r[3], low, high, 0
+                if l[0] == r[0]:
+                    # Both branches lead to the same subtree; the split is redundant
+                    return l
+                node_id = intern(('node', tree.feature[node], thresholds[node], l[0], r[0]),
+                                 tree.feature[node], thresholds[node], l[0], r[0], np.float32(0))
+                return node_id, False, None, weights[node], low, high, max(l[6], r[6]) + 1
+            
+            root = walk(0)
+            roots.append(root[0])
+            depth = max(depth, root[6])
+        
+        # Leaves point at themselves so a fixed-depth descent settles on them
+        own = np.arange(len(value), dtype=np.int32)
+        left_arr = np.array(left, dtype=np.int32)
+        right_arr = np.array(right, dtype=np.int32)
+        is_leaf = left_arr == -1
+        return CompactForest(
+            feature=np.array(feature, dtype=np.int32),
+            threshold=np.array(threshold, dtype=np.float32),
+            left=np.where(is_leaf, own, left_arr),
+            right=np.where(is_leaf, own, right_arr),
+            value=np.array(value, dtype=np.float32),
+            roots=np.array(roots, dtype=np.int32),
+            depth=depth,
+            n_features_in=model.n_features_in_,
+            feature_importances=model.feature_importances_
+        )
+
+class SeasonalState:
+    """Seasonal naive and damped additive Holt-Winters forecasters kept as a compact state.
+    
+    The state is a level, a trend and 12 monthly seasonal terms as of the month
+    `period` (year * 12 + month - 1). Folding in a newly observed month is O(1), so newer
+    data is absorbed without refitting. snaive is the same recursion with the level and
+    trend pinned at zero and each month's term replaced by its latest value.
+    """
+    # (alpha, beta, gamma) candidates for Holt-Winters, searched by one-step-ahead SSE
+    GRID = [(a, b, g) for a in (0.1, 0.2, 0.3, 0.5, 0.7) for b in (0.0, 0.05, 0.1, 0.2)
+            for g in (0.05, 0.1, 0.2, 0.3, 0.5)]
+    DAMPING = 0.98
+    
+    def __init__(self, kind: str, level: float, trend: float, season: np.ndarray, period: int,
+                 params: tuple, year_col: Optional[int] = None, month_col: Optional[int] = None):
+        self.kind = kind
+        self.level = float(level)
+        self.trend = float(trend)
+        self.season = np.asarray(season, dtype=float)
+        self.period = int(period)
+        self.alpha, self.beta, self.gamma, self.phi = params
+        # Where predict finds the calendar in a feature matrix
+        self.year_col = year_col
+        self.month_col = month_col
+    
+    @staticmethod
+    def series(frame: pd.DataFrame) -> tuple:
+        """(periods, values) of a monthly frame with Date and Usage"""
+        dates = pd.to_datetime(frame['Date'])
+        return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy(), frame['Usage'].to_numpy(dtype=float)
+    
+    @staticmethod
+    def fold(level: np.ndarray, trend: np.ndarray, season: np.ndarray, period: int, periods: np.ndarray,
+             values: np.ndarray, alpha, beta, gamma, phi) -> tuple:
+        """Fold observations after period into G states at once; returns (level, trend, season, period, sse)"""
+        level, trend, season = level.copy(), trend.copy(), season.copy()
+        sse = np.zeros(len(level))
+        keep = periods > period
+        for p, y in zip(periods[keep].tolist(), values[keep].tolist()):
+            # Months with no data carry the damped trend forward
+            for _ in range(p - period - 1):
+                level = level + phi * trend
+                trend = phi * trend
+            m = p % 12
+            error = y - (level + phi * trend + season[:, m])
+            sse += error * error
+            previous = level
+            level = alpha * (y - season[:, m]) + (1 - alpha) * (level + phi * trend)
+            trend = beta * (level - previous) + (1 - beta) * phi * trend
+            season[:, m] = gamma * (y - level) + (1 - gamma) * season[:, m]
+            period = p
+        return level, trend, season, period, sse
+    
+    @staticmethod
+    def fit(kind: str, periods: np.ndarray, values: np.ndarray,
+            year_col: Optional[int] = None, month_col: Optional[int] = None) -> 'SeasonalState':
+        periods = np.asarray(periods, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        order = np.argsort(periods, kind='stable')
+        periods, values = periods[order], values[order]
+        start = int(periods[0]) - 1
+        
+        if kind == 'snaive':
+            # Months not seen yet forecast the series mean
+            season = np.full((1, 12), values.mean())
+            _, _, season, period, _ = SeasonalState.fold(np.zeros(1), np.zeros(1), season, start, periods, values,
+                                                         0.0, 0.0, 1.0, 1.0)
+            return SeasonalState(kind, 0.0, 0.0, season[0], period, (0.0, 0.0, 1.0, 1.0), year_col, month_col)
+        
+        # Level from the first year, trend from the change to the second, seasonal terms as first-year deviations
+        first = values[periods < periods[0] + 12]
+        second = values[(periods >= periods[0] + 12) & (periods < periods[0] + 24)]
+        level = first.mean()
+        trend = (second.mean() - level) / 12 if len(second) else 0.0
+        season = np.zeros(12)
+        for p, y in zip(periods[:len(first)], first):
+            season[p % 12] = y - level
+        
+        grid = np.array(SeasonalState.GRID)
+        g = len(grid)
+        levels, trends, seasons, period, sse = SeasonalState.fold(
+            np.full(g, level), np.full(g, trend), np.tile(season, (g, 1)), start, periods, values,
+            grid[:, 0], grid[:, 1], grid[:, 2], SeasonalState.DAMPING
+        )
+        best = int(np.argmin(sse))
+        return SeasonalState(kind, levels[best], trends[best], seasons[best], period,
+                             (*grid[best], SeasonalState.DAMPING), year_col, month_col)
+    
+    def update(self, periods: np.ndarray, values: np.ndarray) -> 'SeasonalState':
+        """A new state with the months after self.period folded in; the cached original is left alone"""
+        level, trend, season, period, _ = SeasonalState.fold(
+            np.array([self.level]), np.array([self.trend]), self.season[None, :], self.period,
+            np.asarray(periods, dtype=np.int64), np.asarray(values, dtype=float),
+            self.alpha, self.beta, self.gamma, self.phi
+        )
+        return SeasonalState(self.kind, level[0], trend[0], season[0], period,
+                             (self.alpha, self.beta, self.gamma, self.phi), self.year_col, self.month_col)
+    
+    @staticmethod
+    def forecast_at(level: np.ndarray, trend: np.ndarray, season: np.ndarray, phi: np.ndarray,
+                    period: np.ndarray, steps: np.ndarray) -> np.ndarray:
+        """Forecasts steps months after each state's period; steps is (n_states, n_steps)"""
+        phi = phi[:, None]
+        ahead = np.maximum(steps, 0)
+        # phi + phi^2 + ... + phi^h, which is h for an undamped trend
+        damping = np.where(phi == 1, ahead, phi * (1 - phi ** ahead) / np.where(phi == 1, 1, 1 - phi))
+        months = (period[:, None] + steps) % 12
+        return level[:, None] + damping * trend[:, None] + np.take_along_axis(season, months, axis=1)
+    
+    @staticmethod
+    def forecast_many(states: List['SeasonalState'], horizon: int) -> np.ndarray:
+        """The next horizon months of every state in one vectorized pass, shape (len(states), horizon)"""
+        return SeasonalState.forecast_at(
+            np.array([s.level for s in states]), np.array([s.trend for s in states]),
+            np.stack([s.season for s in states]), np.array([s.phi for s in states]),
+            np.array([s.period for s in states]), np.tile(np.arange(1, horizon + 1), (len(states), 1))
+        )
+    
+    @staticmethod
+    def forecast_periods(states: List['SeasonalState'], periods: np.ndarray) -> np.ndarray:
+        """Every state's forecasts for the same calendar months (year * 12 + month - 1), shape (len(states), len(periods))"""
+        origins = np.array([s.period for s in states])
+        return SeasonalState.forecast_at(
+            np.array([s.level for s in states]), np.array([s.trend for s in states]),
+            np.stack([s.season for s in states]), np.array([s.phi for s in states]),
+            origins, np.asarray(periods)[None, :] - origins[:, None]
+        )
+    
+    def forecast(self, horizon: int) -> np.ndarray:
+        return SeasonalState.forecast_many([self], horizon)[0]
+    
+    @staticmethod
+    def periods_of(X: Any, year_col: int, month_col: int) -> np.ndarray:
+        X = np.asarray(X)
+        return X[:, year_col].astype(np.int64) * 12 + X[:, month_col].astype(np.int64) - 1
+    
+    def predict(self, X: Any) -> np.ndarray:
+        """Forecasts for the calendar months in the Year and Month columns of a feature matrix"""
+        periods = SeasonalState.periods_of(X, self.year_col, self.month_col)
+        return SeasonalState.forecast_at(
+            np.array([self.level]), np.array([self.trend]), self.season[None, :], np.array([self.phi]),
+            np.array([self.period]), (periods - self.period)[None, :]
+        )[0]
+
 class Predictor:
+    # Bounds on the change rates carried into future rows
+    CHANGE_LIMITS = {'DailyChange': 0.5, 'WeeklyChange': 0.5, 'MonthlyChange': 0.5,
+                     'QuarterlyChange': 0.4, 'YearlyChange': 0.3}
+    
     @staticmethod
+    @Tracer.traced('features.future', 'months_ahead', 'granularity')
     def create_future_features(last_data: pd.DataFrame, months_ahead: int,
-                             resource_type: str) -> pd.DataFrame:
-        """Create features for future months"""
+                             resource_type: str, granularity: str = 'month') -> pd.DataFrame:
+        """Create features for the next months_ahead steps (months, weeks or days)
+        
+        Usage-derived columns repeat the latest history scaled by each step's month-of-year
+        index, computed for all future rows at once.
+        """
         try:
-            logger.info(f"Creating future features for {months_ahead} months")
+            logger.info(f"Creating future features for {months_ahead} {granularity}s")
             logger.info(f"Last data shape: {last_data.shape}")
             logger.info(f"Last data columns: {last_data.columns.tolist()}")
             
@@ -827,20 +3302,12 @@ class Predictor:
                 logger.error("'Date' column not found in last_data")
                 raise ValueError("'Date' column not found in historical data")
             
-            future_dates = []
+            periods = FeatureEngineer.PERIODS[granularity]
             last_date = last_data['Date'].max()
             logger.info(f"Last date in data: {last_date}")
             
-            for i in range(1, months_ahead + 1):
-                # Calculate next month properly
-                next_month = last_date.month + i
-                next_year = last_date.year
-                
-                while next_month > 12:
-                    next_month -= 12
-                    next_year += 1
-                
-                future_dates.append(pd.Timestamp(year=next_year, month=next_month, day=1))
+            # Month starts, ISO week Mondays or days following the last observed one
+            future_dates = pd.date_range(start=last_date, periods=months_ahead + 1, freq=periods['freq'])[1:]
             
             logger.info(f"Generated {len(future_dates)} future dates")
             logger.info(f"First future date: {future_dates[0]}")
@@ -849,8 +3316,6 @@ class Predictor:
             # Create future dataframe
             future_df = pd.DataFrame({'Date': future_dates})
             logger.info(f"Future df created with shape: {future_df.shape}")
-            logger.info(f"Future df Date column type: {future_df['Date'].dtype}")
-            logger.info(f"Sample future dates: {future_df['Date'].head().tolist()}")
             
             # Verify Date column
             if future_df['Date'].isna().any():
@@ -859,9 +3324,8 @@ class Predictor:
             
             # Add basic features
             try:
-                future_df = FeatureEngineer.create_features(future_df, resource_type)
+                future_df = FeatureEngineer.create_features(future_df, resource_type, granularity)
                 logger.info(f"After feature engineering: {future_df.shape}")
-                logger.info(f"Columns after feature engineering: {future_df.columns.tolist()}")
                 
                 # Verify Date column still exists after feature engineering
                 if 'Date' not in future_df.columns:
@@ -874,8 +3338,9 @@ class Predictor:
             
             # Fill future features with meaningful values based on historical data
             if len(last_data) > 0 and 'Usage' in last_data.columns:
-                last_usage_values = last_data['Usage'].tail(24).values
+                last_usage_values = last_data['Usage'].tail(FeatureEngineer.context_rows(granularity)).values
                 logger.info(f"Using {len(last_usage_values)} historical usage values")
+                per_year = periods['per_year']
                 
                 # Calculate seasonal patterns
                 historical_monthly_avg = last_data.groupby(last_data['Date'].dt.month)['Usage'].mean()
@@ -886,78 +3351,64 @@ class Predictor:
                 else:
                     seasonal_indexes = pd.Series(index=range(1, 13), data=1.0)
                 
-                logger.info(f"Seasonal indexes calculated: {seasonal_indexes.head()}")
-                
-                # Calculate trend
-                if len(last_data) >= 12:
-                    recent_trend = (last_data['Usage'].tail(6).mean() - last_data['Usage'].head(6).mean()) / len(last_data)
+                # Calculate trend: the last half year against the first, per step of history
+                half_year = per_year // 2
+                if len(last_data) >= per_year:
+                    recent_trend = (last_data['Usage'].tail(half_year).mean() - last_data['Usage'].head(half_year).mean()) / len(last_data)
                 else:
                     recent_trend = 0
                 
-                # Fill features for each future month
-                for i, row_idx in enumerate(future_df.index):
-                    current_month = future_df.loc[row_idx, 'Month']
-                    base_seasonal = seasonal_indexes.get(current_month, 1.0)
-                    
-                    # Lag features with seasonal adjustment
-                    for lag in [1, 2, 3, 6, 12, 24]:
-                        if lag <= len(last_usage_values):
-                            lag_value = last_usage_values[-lag] * base_seasonal
-                            future_df.loc[row_idx, f'Usage_Lag{lag}'] = max(0, lag_value)
-                        else:
-                            avg_value = np.mean(last_usage_values) if len(last_usage_values) > 0 else 0
-                            future_df.loc[row_idx, f'Usage_Lag{lag}'] = max(0, avg_value * base_seasonal)
-                    
-                    # Rolling features
-                    for window in [3, 6, 12]:
-                        if len(last_usage_values) >= window:
-                            rolling_base = np.mean(last_usage_values[-window:])
-                            future_df.loc[row_idx, f'RollingMean{window}'] = max(0, rolling_base * base_seasonal)
-                            future_df.loc[row_idx, f'RollingStd{window}'] = np.std(last_usage_values[-window:])
-                            future_df.loc[row_idx, f'RollingMin{window}'] = np.min(last_usage_values[-window:]) * base_seasonal
-                            future_df.loc[row_idx, f'RollingMax{window}'] = np.max(last_usage_values[-window:]) * base_seasonal
-                        else:
-                            avg_value = np.mean(last_usage_values) if len(last_usage_values) > 0 else 0
-                            future_df.loc[row_idx, f'RollingMean{window}'] = max(0, avg_value * base_seasonal)
-                            future_df.loc[row_idx, f'RollingStd{window}'] = np.std(last_usage_values) if len(last_usage_values) > 0 else 0
-                            future_df.loc[row_idx, f'RollingMin{window}'] = max(0, avg_value * base_seasonal * 0.8)
-                            future_df.loc[row_idx, f'RollingMax{window}'] = max(0, avg_value * base_seasonal * 1.2)
-                    
-                    # Other features
-                    future_df.loc[row_idx, 'SeasonalIndex'] = float(base_seasonal)
-                    future_df.loc[row_idx, 'SeasonalStrength'] = abs(base_seasonal - 1.0)
-                    
-                    # Moving averages with trend
-                    base_ma = np.mean(last_usage_values[-3:]) if len(last_usage_values) >= 3 else historical_overall_avg
-                    future_df.loc[row_idx, 'MA_Short'] = max(0, base_ma * base_seasonal + recent_trend * i)
-                    
-                    base_ma_long = np.mean(last_usage_values[-12:]) if len(last_usage_values) >= 12 else historical_overall_avg
-                    future_df.loc[row_idx, 'MA_Long'] = max(0, base_ma_long * base_seasonal)
-                    
-                    # Trend indicator
-                    if future_df.loc[row_idx, 'MA_Long'] > 0:
-                        future_df.loc[row_idx, 'TrendIndicator'] = (future_df.loc[row_idx, 'MA_Short'] - future_df.loc[row_idx, 'MA_Long']) / future_df.loc[row_idx, 'MA_Long']
-                    else:
-                        future_df.loc[row_idx, 'TrendIndicator'] = 0.0
-                    
-                    # Change rates (conservative estimates)
-                    if len(last_usage_values) >= 2:
-                        recent_monthly_change = (last_usage_values[-1] - last_usage_values[-2]) / max(last_usage_values[-2], 1)
-                        future_df.loc[row_idx, 'MonthlyChange'] = max(-0.5, min(0.5, recent_monthly_change))
+                # Month-of-year index and position of every future row
+                base_seasonal = future_df['Month'].map(seasonal_indexes).fillna(1.0).to_numpy(dtype=float)
+                step = np.arange(len(future_df))
+                avg_value = np.mean(last_usage_values) if len(last_usage_values) > 0 else 0
+                
+                # Lag features with seasonal adjustment
+                for lag in periods['lags']:
+                    if lag <= len(last_usage_values):
+                        future_df[f'Usage_Lag{lag}'] = np.maximum(0, last_usage_values[-lag] * base_seasonal)
                     else:
-                        future_df.loc[row_idx, 'MonthlyChange'] = 0.0
-                    
-                    if len(last_usage_values) >= 12:
-                        recent_yearly_change = (last_usage_values[-1] - last_usage_values[-12]) / max(last_usage_values[-12], 1)
-                        future_df.loc[row_idx, 'YearlyChange'] = max(-0.3, min(0.3, recent_yearly_change))
+                        future_df[f'Usage_Lag{lag}'] = np.maximum(0, avg_value * base_seasonal)
+                
+                # Rolling features
+                for window in periods['windows']:
+                    if len(last_usage_values) >= window:
+                        recent = last_usage_values[-window:]
+                        future_df[f'RollingMean{window}'] = np.maximum(0, np.mean(recent) * base_seasonal)
+                        future_df[f'RollingStd{window}'] = float(np.std(recent))
+                        future_df[f'RollingMin{window}'] = np.min(recent) * base_seasonal
+                        future_df[f'RollingMax{window}'] = np.max(recent) * base_seasonal
                     else:
-                        future_df.loc[row_idx, 'YearlyChange'] = 0.0
-                    
-                    if len(last_usage_values) >= 3:
-                        recent_quarterly_change = (last_usage_values[-1] - last_usage_values[-3]) / max(last_usage_values[-3], 1)
-                        future_df.loc[row_idx, 'QuarterlyChange'] = max(-0.4, min(0.4, recent_quarterly_change))
+                        future_df[f'RollingMean{window}'] = np.maximum(0, avg_value * base_seasonal)
+                        future_df[f'RollingStd{window}'] = float(np.std(last_usage_values)) if len(last_usage_values) > 0 else 0.0
+                        future_df[f'RollingMin{window}'] = np.maximum(0, avg_value * base_seasonal * 0.8)
+                        future_df[f'RollingMax{window}'] = np.maximum(0, avg_value * base_seasonal * 1.2)
+                
+                # Other features
+                future_df['SeasonalIndex'] = base_seasonal
+                future_df['SeasonalStrength'] = np.abs(base_seasonal - 1.0)
+                
+                # Moving averages with trend
+                short_window = periods['windows'][0]
+                base_ma = np.mean(last_usage_values[-short_window:]) if len(last_usage_values) >= short_window else historical_overall_avg
+                ma_short = np.maximum(0, base_ma * base_seasonal + recent_trend * step)
+                base_ma_long = np.mean(last_usage_values[-per_year:]) if len(last_usage_values) >= per_year else historical_overall_avg
+                ma_long = np.maximum(0, base_ma_long * base_seasonal)
+                future_df['MA_Short'] = ma_short
+                future_df['MA_Long'] = ma_long
+                
+                # Trend indicator
+                future_df['TrendIndicator'] = np.where(ma_long > 0, (ma_short - ma_long) / np.where(ma_long > 0, ma_long, 1), 0.0)
+                
+                # Change rates (conservative estimates): the latest value against the one span back
+                for name, span in periods['changes'].items():
+                    reference = max(span, 2)
+                    if len(last_usage_values) >= reference:
+                        change = (last_usage_values[-1] - last_usage_values[-reference]) / max(last_usage_values[-reference], 1)
+                        limit = Predictor.CHANGE_LIMITS[name]
+                        future_df[name] = max(-limit, min(limit, change))
                     else:
-                        future_df.loc[row_idx, 'QuarterlyChange'] = 0.0
+                        future_df[name] = 0.0
             
             # Final cleanup
             future_df = future_df.replace([np.inf, -np.inf], 0)
@@ -965,9 +3416,7 @@ class Predictor:
             
             # Ensure non-negative values for usage-related features
             usage_related_cols = [col for col in future_df.columns if 'Usage' in col or 'Rolling' in col or 'MA_' in col]
-            for col in usage_related_cols:
-                if col in future_df.columns:
-                    future_df[col] = future_df[col].clip(lower=0)
+            future_df[usage_related_cols] = future_df[usage_related_cols].clip(lower=0)
             
             logger.info(f"Successfully created future features. Final shape: {future_df.shape}")
             logger.info(f"Final columns: {future_df.columns.tolist()}")
@@ -979,75 +3428,146 @@ class Predictor:
             logger.error(f"Last data info: {last_data.info() if hasattr(last_data, 'info') else 'No info available'}")
             raise
     
+    @staticmethod
+    def missing_feature_default(col: str) -> float:
+        """Value for a trained feature the prediction frame lacks"""
+        if 'Lag' in col or 'Rolling' in col or 'MA_' in col or 'Change' in col:
+            return 0.0
+        if 'Seasonal' in col:
+            return 1.0
+        return 0.0
+    
+    @staticmethod
+    def model_input(estimator: Any, X: np.ndarray, columns: List[str]) -> Any:
+        """X as-is, or a zero-copy named view for estimators fitted on DataFrames (older artifacts)"""
+        if hasattr(estimator, 'feature_names_in_'):
+            return pd.DataFrame(X, columns=columns, copy=False)
+        return X
+    
     @staticmethod
     def predict_with_model(model_path: Path, X_test: pd.DataFrame,
-                          model_type: str, scaler: Any = None) -> np.ndarray:
-        """Make predictions with a single model - FIXED for XGBoost"""
+                          model_type: str, scaler: Any = None, scale: float = 1.0) -> np.ndarray:
+        """Make predictions with a single model - FIXED for XGBoost
+        
+        scale converts scale-normalized outputs of global models back to usage units.
+        """
+        predictions, _, _ = Predictor.predict_with_bands(model_path, X_test, model_type, scaler, scale)
+        return predictions
+    
+    @staticmethod
+    def conformal_quantile(residuals: np.ndarray, q: float) -> Optional[float]:
+        """Split-conformal quantile: the order statistic expected to bound a share q of new residuals,
+        or None when there are too few residuals to reach that far into the tail"""
+        n = len(residuals)
+        rank = math.ceil((n + 1) * q) if q >= 0.5 else math.floor((n + 1) * q)
+        if not 1 <= rank <= n:
+            return None
+        return float(np.partition(residuals, rank - 1)[rank - 1])
+    
+    @staticmethod
+    def residual_offsets(predictions: np.ndarray, metadata: Dict[str, Any], model_type: str,
+                         quantiles: List[float]) -> tuple:
+        """(offsets, method) for models without per-tree outputs, from holdout residuals.
+        
+        Relative residuals (y - y_hat) / y_hat scale with the forecast, so a building model with
+        fewer than BAND_MIN_RESIDUALS of its own uses those of every building's model_type model
+        for the resource. Artifacts from before relative residuals were stored use their absolute
+        ones if there are enough. Otherwise offsets is None and method says why.
+        """
+        own = np.asarray(metadata.get('holdout_relative_residuals') or [], dtype=float)
+        absolute = np.asarray(metadata.get('holdout_residuals') or [], dtype=float)
+        pooled = np.zeros(0)
+        if len(own) < BAND_MIN_RESIDUALS and metadata.get('scope', 'building') == 'building' \
+                and metadata.get('resource_type') in RESOURCE_MAPPING:
+            model_resource = ModelManager.model_resource(metadata['resource_type'], metadata.get('granularity', 'month'))
+            pooled = ModelIndex.pooled_residuals(model_resource, model_type)
+        
+        if len(own) >= BAND_MIN_RESIDUALS:
+            residuals, method = own, 'conformal'
+        elif len(pooled) >= BAND_MIN_RESIDUALS:
+            residuals, method = pooled, 'conformal_pooled'
+        elif not len(own) and len(absolute) >= BAND_MIN_RESIDUALS:
+            residuals, method = absolute, 'conformal_absolute'
+        else:
+            return None, 'insufficient_residuals'
+        
+        bounds = {q: Predictor.conformal_quantile(residuals, q) for q in quantiles}
+        if any(bound is None for bound in bounds.values()):
+            return None, 'insufficient_residuals'
+        if method == 'conformal_absolute':
+            return {q: np.full(len(predictions), bound) for q, bound in bounds.items()}, method
+        base = np.maximum(predictions, 0)
+        return {q: base * bound for q, bound in bounds.items()}, method
+    
+    @staticmethod
+    @Tracer.traced('model.predict', 'model_type')
+    def predict_with_bands(model_path: Path, X_test: pd.DataFrame, model_type: str,
+                           scaler: Any = None, scale: float = 1.0, quantiles: List[float] = (),
+                           history: Optional[pd.DataFrame] = None) -> tuple:
+        """Point predictions plus per-quantile offsets from the point forecast.
+        
+        Random forests take quantiles over their per-tree outputs; other models use split-
+        conformal quantiles of holdout residuals (residual_offsets). Returns (predictions,
+        offsets, method): offsets are None when no quantiles are requested or there is
+        nothing sound to derive them from, and method names the source or why there is none.
+        history (Date, Usage) lets state models fold in months observed since training.
+        """
+        offsets, band_method = None, None
         try:
             model, metadata = ModelManager.load_model(model_path)
+            if isinstance(model, SeasonalState) and history is not None:
+                model = model.update(*SeasonalState.series(history))
             
-            # Get trained feature columns
-            trained_features = metadata.get('feature_columns', [])
+            # Get trained feature columns, in the order recorded with the artifact
+            trained_features = metadata.get('feature_columns', []) or X_test.columns.tolist()
             
-            if trained_features:
-                # Handle missing features
-                missing_features = [col for col in trained_features if col not in X_test.columns]
-                if missing_features:
-                    logger.warning(f"Missing features for {model_type}: {missing_features[:5]}...")
-                    for col in missing_features:
-                        # Add missing features with appropriate defaults
-                        if 'Lag' in col or 'Rolling' in col or 'MA_' in col:
-                            X_test[col] = 0
-                        elif 'Change' in col:
-                            X_test[col] = 0.0
-                        elif 'Seasonal' in col:
-                            X_test[col] = 1.0
-                        elif 'Trend' in col:
-                            X_test[col] = 0.0
-                        elif 'Is' in col:
-                            X_test[col] = 0.0
-                        else:
-                            X_test[col] = 0.0
-                
-                # Remove extra features
-                extra_features = [col for col in X_test.columns if col not in trained_features]
-                if extra_features:
-                    logger.warning(f"Removing extra features for {model_type}: {len(extra_features)} features")
-                    X_test = X_test.drop(columns=extra_features)
-                
-                # Ensure correct column order
-                X_test = X_test[trained_features]
+            missing_features = [col for col in trained_features if col not in X_test.columns]
+            if missing_features:
+                logger.warning(f"Missing features for {model_type}: {missing_features[:5]}...")
+            extra_features = [col for col in X_test.columns if col not in trained_features]
+            if extra_features:
+                logger.warning(f"Removing extra features for {model_type}: {len(extra_features)} features")
             
-            # Clean data
-            X_test = X_test.astype(float)
-            X_test = X_test.replace([np.inf, -np.inf], 0)
-            X_test = X_test.fillna(0)
+            # One float32 matrix in trained order; missing columns get their defaults
+            X = FeatureEngineer.to_matrix(X_test, trained_features, missing=Predictor.missing_feature_default)
             
             # Model-specific prediction handling
-            if model_type == 'xgb':
+            if model_type in XGB_TREE_METHODS:
                 # FIXED: Handle XGBoost feature names consistently
                 if hasattr(model, 'feature_mapping'):
                     # Use stored feature mapping
                     feature_mapping = model.feature_mapping
-                    original_cols = X_test.columns.tolist()
-                    cleaned_cols = [feature_mapping.get(col, col) for col in original_cols]
+                    cleaned_cols = [feature_mapping.get(col, col) for col in trained_features]
                 else:
                     # Fallback: recreate mapping
-                    original_cols = X_test.columns.tolist()
-                    cleaned_cols = clean_feature_names(original_cols)
-                
-                X_test_clean = X_test.copy()
-                X_test_clean.columns = cleaned_cols
+                    cleaned_cols = clean_feature_names(trained_features)
                 
                 logger.info(f"XGBoost prediction with {len(cleaned_cols)} features")
-                predictions = model.predict(X_test_clean)
+                predictions = model.predict(pd.DataFrame(X, columns=cleaned_cols, copy=False))
                 
             elif model_type == 'gb' and scaler is not None:
-                X_test_scaled = scaler.transform(X_test)
-                predictions = model.predict(X_test_scaled)
+                X_scaled = scaler.transform(Predictor.model_input(scaler, X, trained_features))
+                predictions = model.predict(X_scaled)
+                
+            elif quantiles and isinstance(model, (RandomForestRegressor, CompactForest)):
+                forest = model if isinstance(model, CompactForest) else FlatForest.from_forest(model)
+                tree_predictions = forest.predict_trees(X)
+                predictions = tree_predictions.mean(axis=0)
+                offsets = {
+                    q: (np.quantile(tree_predictions, q, axis=0) - predictions) * scale
+                    for q in quantiles
+                }
+                band_method = 'tree_quantiles'
                 
             else:
-                predictions = model.predict(X_test)
+                predictions = model.predict(Predictor.model_input(model, X, trained_features))
+            
+            if quantiles and offsets is None:
+                offsets, band_method = Predictor.residual_offsets(predictions, metadata, model_type, quantiles)
+                if offsets is not None:
+                    offsets = {q: offset * scale for q, offset in offsets.items()}
+            
+            predictions = predictions * scale
             
             # Ensure non-negative predictions
             predictions = np.maximum(predictions, 0)
@@ -1055,20 +3575,25 @@ class Predictor:
             # Validate predictions
             if np.all(predictions == 0) or np.isnan(predictions).any():
                 logger.warning(f"{model_type} produced problematic predictions, using smart fallback")
-                # Use a reasonable fallback based on feature statistics and historical data
-                if 'Usage_Lag1' in X_test.columns and X_test['Usage_Lag1'].mean() > 0:
-                    fallback_value = X_test['Usage_Lag1'].mean()
-                    logger.info(f"Using lag1 mean as fallback: {fallback_value}")
-                elif 'RollingMean3' in X_test.columns and X_test['RollingMean3'].mean() > 0:
-                    fallback_value = X_test['RollingMean3'].mean()
-                    logger.info(f"Using rolling mean as fallback: {fallback_value}")
+                if history is not None:
+                    # Same month of the latest year from the building's own history
+                    predictions = SeasonalState.fit('snaive', *SeasonalState.series(history)).forecast(len(X))
                 else:
-                    fallback_value = 100000.0  # Reasonable default for electricity usage
-                    logger.info(f"Using default fallback: {fallback_value}")
-                
-                # Create predictions with some seasonal variation
-                seasonal_factors = [1.2, 1.1, 0.9, 0.8, 0.7, 0.8, 1.3, 1.4, 1.0, 0.9, 1.0, 1.1]
-                predictions = np.array([fallback_value * seasonal_factors[i % 12] for i in range(len(X_test))])
+                    # Use a reasonable fallback based on feature statistics
+                    column_means = dict(zip(trained_features, X.mean(axis=0, dtype=float)))
+                    if column_means.get('Usage_Lag1', 0) > 0:
+                        fallback_value = column_means['Usage_Lag1'] * scale
+                        logger.info(f"Using lag1 mean as fallback: {fallback_value}")
+                    elif column_means.get('RollingMean3', 0) > 0:
+                        fallback_value = column_means['RollingMean3'] * scale
+                        logger.info(f"Using rolling mean as fallback: {fallback_value}")
+                    else:
+                        fallback_value = 100000.0  # Reasonable default for electricity usage
+                        logger.info(f"Using default fallback: {fallback_value}")
+                    
+                    # Create predictions with some seasonal variation
+                    seasonal_factors = [1.2, 1.1, 0.9, 0.8, 0.7, 0.8, 1.3, 1.4, 1.0, 0.9, 1.0, 1.1]
+                    predictions = np.array([fallback_value * seasonal_factors[i % 12] for i in range(len(X))])
                 logger.info(f"Generated fallback predictions: {predictions}")
             
             # Ensure minimum reasonable values
@@ -1076,11 +3601,1539 @@ class Predictor:
             
             logger.info(f"{model_type} final predictions: min={predictions.min():.2f}, max={predictions.max():.2f}, mean={predictions.mean():.2f}")
             
-            return predictions
+            return predictions, offsets, band_method
+            
+        except Exception as e:
+            logger.error(f"Error making predictions with {model_type}: {e}")
+            raise
+
+# Global (panel) training: one model per resource over all buildings
+def train_global_models(request: TrainRequest, version_dir: Path) -> TrainResponse:
+    """Fit each requested model type once over every building's featurized series.
+    
+    Targets and usage-derived features are divided by each building's historical mean,
+    so one artifact can serve any building; metrics are reported in real usage units.
+    Artifacts go into the staged version_dir, published once any model is trained.
+    """
+    panel = DataLoader.load_panel(request.resource_type)
+    df, building_stats = FeatureEngineer.create_panel_features(panel, request.resource_type)
+    feature_cols = FeatureEngineer.get_feature_columns(df, request.resource_type) + GLOBAL_BUILDING_FEATURES
+    
+    # Same chronological holdout rule as per-building training, applied per building
+    train_parts, test_parts = [], []
+    for _, group in df.groupby('BuildingId', sort=False):
+        train_part, test_part = ModelTrainer.split_train_test(group)
+        train_parts.append(train_part)
+        test_parts.append(test_part)
+    train_data = pd.concat(train_parts, ignore_index=True)
+    test_data = pd.concat(test_parts, ignore_index=True)
+    
+    X_train = FeatureEngineer.to_matrix(train_data, feature_cols)
+    y_train = train_data['Usage'] / train_data['BuildingScale']
+    X_test = FeatureEngineer.to_matrix(test_data, feature_cols)
+    y_test = test_data['Usage'] / test_data['BuildingScale']
+    test_scale = test_data['BuildingScale'].values
+    
+    logger.info(f"Global training over {len(building_stats)} buildings: {len(train_data)} train, {len(test_data)} test rows")
+    
+    def per_building_metrics(y_pred_real: np.ndarray) -> Dict[str, Dict]:
+        results = {}
+        for building_id, index in test_data.groupby('BuildingId', sort=False).indices.items():
+            results[str(building_id)] = ModelTrainer.evaluate(test_data['Usage'].values[index], y_pred_real[index])
+        return results
+    
+    trainer = ModelTrainer()
+    models_trained = []
+    all_metrics = {}
+    component_predictions = {}
+    base_metadata = {
+        'resource_type': request.resource_type,
+        'building_id': GLOBAL_BUILDING_ID,
+        'scope': 'global',
+        'data_points': len(df),
+        'buildings': len(building_stats),
+        'building_stats': building_stats,
+        'feature_columns': feature_cols,
+        'feature_dtype': FEATURE_DTYPE,
+        'train_size': len(train_data),
+        'test_size': len(test_data)
+    }
+    
+    for model_type in request.model_types:
+        if model_type not in MODEL_TYPES:
+            continue
+        if model_type in STATE_MODEL_TYPES:
+            logger.warning(f"Skipping {model_type}: state models forecast one building's series, not a panel")
+            continue
+        try:
+            fit_started = time.perf_counter()
+            model, _, y_pred = trainer.train_single_model(X_train, y_train, X_test, y_test, model_type, feature_cols)
+            fit_seconds = time.perf_counter() - fit_started
+            y_pred_real = np.asarray(y_pred) * test_scale
+            metrics = ModelTrainer.evaluate(test_data['Usage'].values, y_pred_real)
+            
+            model_path = version_dir / f"{model_type}_model.pkl"
+            metadata = {
+                **base_metadata,
+                'model_type': model_type,
+                'trained_at': datetime.now().isoformat(),
+                'metrics': metrics,
+                'per_building_metrics': per_building_metrics(y_pred_real),
+                'fit_seconds': fit_seconds,
+                'holdout_residuals': (y_test.values - np.asarray(y_pred)).tolist(),
+                'holdout_relative_residuals': ModelTrainer.relative_residuals(y_test.values, y_pred)
+            }
+            if model_type in trainer.scalers:
+                with ModelManager.open_atomic(version_dir / f"{model_type}_scaler.pkl") as f:
+                    pickle.dump(trainer.scalers[model_type], f)
+                metadata['has_scaler'] = True
+            if model_type in trainer.compaction:
+                metadata['compaction'] = trainer.compaction[model_type]
+            
+            ModelManager.save_model(model, model_path, metadata)
+            models_trained.append(model_type)
+            all_metrics[model_type] = metrics
+            component_predictions[model_type] = y_pred
+            logger.info(f"✓ global {model_type} trained: MAPE={metrics['MAPE']:.1f}%")
+        except Exception as e:
+            logger.error(f"✗ Failed to train global {model_type}: {e}")
+    
+    # nnls weights come from refits that hold out each building's last training rows
+    validation = None
+    if request.ensemble_weighting == 'nnls':
+        components = sorted({c for e in request.ensemble_types if e in ENSEMBLE_TYPES for c in ENSEMBLE_COMPONENTS[e]}
+                            & set(component_predictions))
+        if components:
+            validation = ModelTrainer().validation_predictions(
+                X_train, y_train, components, feature_cols,
+                int(math.ceil(len(test_data) / max(1, len(building_stats)))), train_data['BuildingId'].values
+            )
+    for ensemble_type in request.ensemble_types:
+        if ensemble_type not in ENSEMBLE_TYPES:
+            continue
+        try:
+            ensemble_pred, _, ensemble_weights = ModelTrainer.create_ensemble(
+                component_predictions, y_test, ensemble_type, request.ensemble_weighting, validation
+            )
+            y_pred_real = np.asarray(ensemble_pred) * test_scale
+            metrics = ModelTrainer.evaluate(test_data['Usage'].values, y_pred_real)
+            
+            ensemble_metadata = {
+                **base_metadata,
+                'model_type': ensemble_type,
+                'ensemble_components': list(ensemble_weights),
+                'ensemble_weights': ensemble_weights,
+                'ensemble_weighting': request.ensemble_weighting,
+                'trained_at': datetime.now().isoformat(),
+                'metrics': metrics,
+                'per_building_metrics': per_building_metrics(y_pred_real)
+            }
+            with ModelManager.open_atomic(version_dir / f'{ensemble_type}_metadata.json', 'w') as f:
+                json.dump(safe_dict_conversion(ensemble_metadata), f, indent=2, default=str)
+            
+            models_trained.append(ensemble_type)
+            all_metrics[ensemble_type] = metrics
+        except Exception as e:
+            logger.warning(f"✗ Failed to create global {ensemble_type} ensemble: {e}")
+    
+    if not models_trained:
+        raise HTTPException(status_code=500, detail="No models were successfully trained")
+    ModelManager.publish(version_dir)
+    
+    return TrainResponse(
+        success=True,
+        message=f"Successfully trained {len(models_trained)} global models over {len(building_stats)} buildings",
+        models_trained=models_trained,
+        metrics=safe_dict_conversion(all_metrics),
+        data_info=safe_dict_conversion({
+            'total_records': len(df),
+            'training_records': len(train_data),
+            'test_records': len(test_data),
+            'features_count': len(feature_cols),
+            'buildings': len(building_stats),
+            'date_range': f"{df['Date'].min()} to {df['Date'].max()}"
+        })
+    )
+
+# Rolling-origin backtests
+BACKTEST_RUNS_TABLE = 'ai_backtest_runs'
+BACKTEST_RESULTS_TABLE = 'ai_backtest_results'
+BACKTEST_GROUP_COLUMNS = {'model_type': 'model_type', 'horizon': 'horizon', 'origin': 'origin', 'building': 'BuildingId'}
+
+def backtest_origin(featured: pd.DataFrame, resource_type: str, building_id: str, origin: int,
+                    horizon: int, model_types: List[str]) -> List[tuple]:
+    """Refit at one forecast origin and score the following horizon months (runs in a worker process).
+    
+    featured is the building's whole featurized series and only its first origin rows are
+    used. The seasonal index (the one whole-series feature) is recomputed on that prefix and
+    lags longer than it are dropped, so the fit sees what training at that month would have;
+    the horizon is featurized the way /predict does it.
+    """
+    history = featured.iloc[:origin].copy()
+    for col, values in FeatureEngineer.seasonal_index(history['Month'], history['Usage']).items():
+        history[col] = values
+    feature_cols = [col for col in FeatureEngineer.get_feature_columns(history, resource_type)
+                    if not (col.startswith('Usage_Lag') and int(col[len('Usage_Lag'):]) >= origin)]
+    
+    future = Predictor.create_future_features(history, horizon, resource_type)
+    X_train = FeatureEngineer.to_matrix(history, feature_cols)
+    X_future = FeatureEngineer.to_matrix(future, feature_cols, missing=Predictor.missing_feature_default)
+    actual = featured['Usage'].iloc[origin:origin + horizon].reset_index(drop=True)
+    
+    # Ensembles are blended from their components' forecasts with the preset weights
+    fit_types = [m for m in MODEL_TYPES
+                 if m in model_types or any(m in ENSEMBLE_COMPONENTS[e] for e in model_types if e in ENSEMBLE_TYPES)]
+    trainer = ModelTrainer(n_jobs=1, compact=False)
+    predictions = {}
+    for model_type in fit_types:
+        try:
+            _, _, predictions[model_type] = trainer.train_single_model(
+                X_train, history['Usage'], X_future, actual, model_type, feature_cols
+            )
+        except Exception as e:
+            logger.warning(f"Backtest fit failed for {building_id} {model_type} at origin {origin}: {e}")
+    for ensemble_type in model_types:
+        if ensemble_type in ENSEMBLE_TYPES and all(c in predictions for c in ENSEMBLE_COMPONENTS[ensemble_type]):
+            predictions[ensemble_type], _, _ = ModelTrainer.create_ensemble(predictions, actual, ensemble_type)
+    
+    origin_date = featured['Date'].iloc[origin - 1].strftime('%Y-%m-%d')
+    return [
+        (building_id, model_type, origin_date, h + 1, float(actual.iloc[h]), float(predictions[model_type][h]))
+        for model_type in model_types if model_type in predictions
+        for h in range(len(actual))
+    ]
+
+class Backtester:
+    """Replay rolling forecast origins for every building and model type into a queryable table.
+    
+    One row per (run, building, model, origin, horizon) holds the actual and forecast usage;
+    MAPE and RMSE for any grouping are aggregated from it on read. origin is the last month
+    of history and horizon h is the month h months after it.
+    """
+    _lock = threading.Lock()
+    # run_id -> progress of runs executing in this process
+    _active: Dict[str, Dict[str, Any]] = {}
+    
+    @staticmethod
+    def bootstrap() -> None:
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {BACKTEST_RUNS_TABLE} (
+                    run_id VARCHAR(32) NOT NULL PRIMARY KEY,
+                    resource VARCHAR(32) NOT NULL,
+                    status VARCHAR(16) NOT NULL,
+                    config TEXT NOT NULL,
+                    started_at DATETIME NOT NULL,
+                    finished_at DATETIME NULL,
+                    buildings INT NOT NULL DEFAULT 0,
+                    origins_total INT NOT NULL DEFAULT 0,
+                    origins_done INT NOT NULL DEFAULT 0,
+                    origins_failed INT NOT NULL DEFAULT 0,
+                    result_rows INT NOT NULL DEFAULT 0,
+                    elapsed_seconds DOUBLE NULL,
+                    error TEXT NULL
+                )
+            """)
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {BACKTEST_RESULTS_TABLE} (
+                    run_id VARCHAR(32) NOT NULL,
+                    BuildingId CHAR(36) NOT NULL,
+                    model_type VARCHAR(16) NOT NULL,
+                    origin DATE NOT NULL,
+                    horizon SMALLINT NOT NULL,
+                    actual DOUBLE NOT NULL,
+                    predicted DOUBLE NOT NULL,
+                    PRIMARY KEY (run_id, model_type, horizon, origin, BuildingId)
+                )
+            """)
+            connection.commit()
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def origins(n_rows: int, origins: int, horizon: int, step: int, min_rows: int = 13) -> List[int]:
+        """History lengths to forecast from: the latest leaving a full horizon, then every step back"""
+        return sorted(range(n_rows - horizon, min_rows - 1, -step)[:origins])
+    
+    @staticmethod
+    def start(request: BacktestRequest) -> str:
+        """Validate the request and record a queued run; the caller schedules Backtester.run or enqueue"""
+        if request.resource_type not in RESOURCE_MAPPING:
+            raise HTTPException(status_code=400, detail=f"Invalid resource type: {request.resource_type}")
+        invalid = [m for m in request.model_types if m not in MODEL_TYPES and m not in ENSEMBLE_TYPES]
+        if invalid or not request.model_types:
+            raise HTTPException(status_code=400, detail=f"Invalid model types: {invalid}")
+        if request.origins < 1 or request.step < 1 or not 1 <= request.horizon <= 12:
+            raise HTTPException(status_code=400, detail="origins and step must be at least 1 and horizon between 1 and 12")
+        
+        run_id = uuid.uuid4().hex[:16]
+        # Distributed runs use the workers' cores, not this process's pool
+        if not request.distributed:
+            with Backtester._lock:
+                if Backtester._active:
+                    raise HTTPException(status_code=409, detail=f"Backtest {next(iter(Backtester._active))} is already running")
+                Backtester._active[run_id] = {'origins_total': 0, 'origins_done': 0}
+        
+        try:
+            Backtester.bootstrap()
+            connection = get_db_connection()
+            try:
+                connection.cursor().execute(
+                    f"INSERT INTO {BACKTEST_RUNS_TABLE} (run_id, resource, status, config, started_at) VALUES (%s, %s, %s, %s, %s)",
+                    (run_id, request.resource_type, 'queued', json.dumps(request.model_dump()),
+                     datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                )
+                connection.commit()
+            finally:
+                connection.close()
+        except Exception:
+            Backtester._active.pop(run_id, None)
+            raise
+        return run_id
+    
+    @staticmethod
+    def store(connection, run_id: str, rows: List[tuple], lease: Optional[tuple] = None) -> None:
+        cursor = connection.cursor()
+        # Multi-row inserts; 100 rows stay under SQLite's bound-parameter limit
+        for i in range(0, len(rows), 100):
+            batch = rows[i:i + 100]
+            cursor.execute(
+                f"INSERT INTO {BACKTEST_RESULTS_TABLE} (run_id, BuildingId, model_type, origin, horizon, actual, predicted) VALUES "
+                + ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(batch)),
+                tuple(value for row in batch for value in (run_id, *row))
+            )
+        WorkQueue.commit_under_lease(connection, lease)
+    
+    @staticmethod
+    def run(run_id: str, request: BacktestRequest) -> None:
+        """Featurize each building once, then fan its origins out over a process pool"""
+        started = time.perf_counter()
+        deadline = time.monotonic() + BACKTEST_DEADLINE_SECONDS
+        progress = Backtester._active[run_id]
+        counts = {'buildings': 0, 'origins_failed': 0, 'result_rows': 0}
+        status, error = 'completed', None
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            panel = DataLoader.load_panel(request.resource_type)
+            if request.building_ids:
+                panel = panel[panel['BuildingId'].isin([str(b) for b in request.building_ids])]
+            
+            tasks = deque()
+            for building_id, group in panel.groupby('BuildingId', sort=True):
+                origins = Backtester.origins(len(group), request.origins, request.horizon, request.step)
+                if not origins:
+                    continue
+                featured = FeatureStore.features(group.reset_index(drop=True), request.resource_type, str(building_id))
+                counts['buildings'] += 1
+                tasks.extend((featured, request.resource_type, str(building_id), origin, request.horizon, request.model_types)
+                             for origin in origins)
+            
+            progress['origins_total'] = len(tasks)
+            cursor.execute(
+                f"UPDATE {BACKTEST_RUNS_TABLE} SET status = %s, buildings = %s, origins_total = %s WHERE run_id = %s",
+                ('running', counts['buildings'], len(tasks), run_id)
+            )
+            connection.commit()
+            logger.info(f"Backtest {run_id}: {len(tasks)} origins over {counts['buildings']} {request.resource_type} buildings")
+            
+            workers = max(1, min(BACKTEST_WORKERS, len(tasks)))
+            # spawn: forking a process that runs event-loop and pool threads can inherit held locks
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                pending = set()
+                while tasks or pending:
+                    # Keep a short queue per worker so the deadline can stop further origins
+                    while tasks and len(pending) < 2 * workers and time.monotonic() < deadline:
+                        pending.add(pool.submit(backtest_origin, *tasks.popleft()))
+                    if not pending:
+                        break
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            rows = future.result()
+                            Backtester.store(connection, run_id, rows)
+                            counts['result_rows'] += len(rows)
+                        except Exception as e:
+                            counts['origins_failed'] += 1
+                            logger.warning(f"Backtest {run_id} origin failed: {e}")
+                        progress['origins_done'] += 1
+            if tasks:
+                status = 'partial'
+                logger.warning(f"Backtest {run_id} hit its {BACKTEST_DEADLINE_SECONDS:.0f}s deadline with {len(tasks)} origins left")
+        except Exception as e:
+            status, error = 'failed', str(e)
+            logger.error(f"Backtest {run_id} failed: {e}")
+        finally:
+            elapsed = time.perf_counter() - started
+            try:
+                connection.cursor().execute(
+                    f"""UPDATE {BACKTEST_RUNS_TABLE} SET status = %s, finished_at = %s, buildings = %s, origins_done = %s,
+                        origins_failed = %s, result_rows = %s, elapsed_seconds = %s, error = %s WHERE run_id = %s""",
+                    (status, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), counts['buildings'], progress['origins_done'],
+                     counts['origins_failed'], counts['result_rows'], elapsed, error, run_id)
+                )
+                connection.commit()
+            finally:
+                connection.close()
+                Backtester._active.pop(run_id, None)
+            logger.info(f"Backtest {run_id} {status} in {elapsed:.1f}s: {counts['result_rows']} result rows")
+    
+    @staticmethod
+    def enqueue(run_id: str, request: BacktestRequest) -> int:
+        """One work queue task per building of a distributed run; returns how many"""
+        building_ids = request.building_ids
+        if not building_ids:
+            query, params = DataLoader.build_buildings_query(request.resource_type)
+            connection = get_db_connection()
+            try:
+                cursor = connection.cursor()
+                cursor.execute(query, params)
+                building_ids = [str(row['BuildingId']) for row in cursor.fetchall()]
+            finally:
+                connection.close()
+        for building_id in building_ids:
+            WorkQueue.enqueue('backtest', {'run_id': run_id, 'request': request.model_dump(), 'building_id': str(building_id)},
+                              group_id=run_id)
+        if not building_ids:
+            Backtester.finalize(run_id)
+        logger.info(f"Backtest {run_id}: enqueued {len(building_ids)} building tasks")
+        return len(building_ids)
+    
+    @staticmethod
+    def run_building(run_id: str, request: BacktestRequest, building_id: str,
+                     lease: Optional[tuple] = None) -> Dict[str, int]:
+        """Replay one building's origins in this process and add its counts to the run (a queue task).
+        
+        Every write commits only while lease (task_id, token) still holds the task, so an
+        attempt that was taken over stops at its next write instead of duplicating rows.
+        """
+        df = DataLoader.load_data(request.resource_type, building_id)
+        origins = Backtester.origins(len(df), request.origins, request.horizon, request.step)
+        counts = {'origins_total': len(origins), 'origins_done': 0, 'origins_failed': 0, 'result_rows': 0}
+        if not origins:
+            return counts
+        featured = FeatureStore.features(df, request.resource_type, building_id)
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            # A retried task replaces what an earlier attempt stored
+            cursor.execute(f"DELETE FROM {BACKTEST_RESULTS_TABLE} WHERE run_id = %s AND BuildingId = %s", (run_id, building_id))
+            WorkQueue.commit_under_lease(connection, lease)
+            for origin in origins:
+                try:
+                    rows = backtest_origin(featured, request.resource_type, building_id, origin, request.horizon,
+                                           request.model_types)
+                    Backtester.store(connection, run_id, rows, lease)
+                    counts['result_rows'] += len(rows)
+                except LeaseLost:
+                    raise
+                except Exception as e:
+                    counts['origins_failed'] += 1
+                    logger.warning(f"Backtest {run_id} origin {origin} of {building_id} failed: {e}")
+                counts['origins_done'] += 1
+            cursor.execute(
+                f"""UPDATE {BACKTEST_RUNS_TABLE} SET status = %s, buildings = buildings + 1, origins_total = origins_total + %s,
+                    origins_done = origins_done + %s, origins_failed = origins_failed + %s WHERE run_id = %s""",
+                ('running', counts['origins_total'], counts['origins_done'], counts['origins_failed'], run_id)
+            )
+            WorkQueue.commit_under_lease(connection, lease)
+        finally:
+            connection.close()
+        return counts
+    
+    @staticmethod
+    def finalize(run_id: str) -> bool:
+        """Close a distributed run once none of its tasks is queued or running; True if this call closed it.
+        
+        The run's counts are re-added from the results of its done tasks, which replaces
+        anything an attempt added to the running totals before its lease was taken over.
+        """
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT status, COUNT(*) as n FROM {WORK_QUEUE_TABLE} WHERE group_id = %s GROUP BY status", (run_id,))
+            statuses = {row['status']: int(row['n']) for row in cursor.fetchall()}
+            if statuses.get('queued') or statuses.get('running'):
+                return False
+            cursor.execute(f"SELECT COUNT(*) as n FROM {BACKTEST_RESULTS_TABLE} WHERE run_id = %s", (run_id,))
+            result_rows = int(cursor.fetchone()['n'])
+            cursor.execute(f"SELECT result FROM {WORK_QUEUE_TABLE} WHERE group_id = %s AND status = 'done'", (run_id,))
+            totals = {'buildings': 0, 'origins_total': 0, 'origins_done': 0, 'origins_failed': 0}
+            for row in cursor.fetchall():
+                counts = json.loads(row['result'])
+                # run_building only counts a building that had origins to replay
+                totals['buildings'] += bool(counts['origins_total'])
+                for key in ('origins_total', 'origins_done', 'origins_failed'):
+                    totals[key] += counts[key]
+            cursor.execute(f"SELECT started_at FROM {BACKTEST_RUNS_TABLE} WHERE run_id = %s", (run_id,))
+            started_at = pd.Timestamp(str(cursor.fetchone()['started_at']))
+            status = 'partial' if statuses.get('failed') else 'completed'
+            error = f"{statuses['failed']} building tasks failed" if statuses.get('failed') else None
+            # Conditional so that of two workers finishing last at once only one closes the run
+            closed = cursor.execute(
+                f"""UPDATE {BACKTEST_RUNS_TABLE} SET status = %s, finished_at = %s, buildings = %s, origins_total = %s,
+                    origins_done = %s, origins_failed = %s, result_rows = %s, elapsed_seconds = %s, error = %s
+                    WHERE run_id = %s AND status IN ('queued', 'running')""",
+                (status, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), totals['buildings'], totals['origins_total'],
+                 totals['origins_done'], totals['origins_failed'], result_rows,
+                 (pd.Timestamp.now() - started_at).total_seconds(), error, run_id)
+            )
+            connection.commit()
+        finally:
+            connection.close()
+        if closed:
+            logger.info(f"Backtest {run_id} {status}: {result_rows} result rows")
+        return bool(closed)
+    
+    @staticmethod
+    def summary_query(run_id: str, group_by: List[str], building_id: Optional[str] = None,
+                      model_type: Optional[str] = None) -> tuple:
+        columns = [BACKTEST_GROUP_COLUMNS[g] for g in group_by]
+        filters, params = ["run_id = %s"], [run_id]
+        if building_id:
+            filters.append("BuildingId = %s")
+            params.append(building_id)
+        if model_type:
+            filters.append("model_type = %s")
+            params.append(model_type)
+        select = "".join(f"{col}, " for col in columns)
+        grouping = f"GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}" if columns else ""
+        query = f"""
+            SELECT {select}COUNT(*) as n,
+                   AVG(ABS(actual - predicted) / NULLIF(actual, 0)) * 100 as mape,
+                   AVG((actual - predicted) * (actual - predicted)) as mse
+            FROM {BACKTEST_RESULTS_TABLE}
+            WHERE {' AND '.join(filters)}
+            {grouping}
+        """
+        return query, tuple(params)
+    
+    @staticmethod
+    def summary_rows(rows: List[Dict], group_by: List[str]) -> List[Dict]:
+        """MAPE/RMSE per group; RMSE is taken here since SQLite builds may lack SQRT"""
+        summary = []
+        for row in rows:
+            entry = {g: row[BACKTEST_GROUP_COLUMNS[g]] for g in group_by}
+            entry.update({
+                'n': int(row['n']),
+                'MAPE': safe_float_conversion(row['mape']),
+                'RMSE': safe_float_conversion(math.sqrt(row['mse'])) if row['mse'] is not None else None
+            })
+            summary.append(entry)
+        return summary
+
+# Shared work queue
+WORK_QUEUE_TABLE = 'ai_work_queue'
+WORK_QUEUE_STATUSES = ('queued', 'running', 'done', 'failed')
+
+class LeaseLost(Exception):
+    """The task's lease passed to another worker; this attempt's writes must not land"""
+
+class WorkQueue:
+    """Durable task table in the service database, consumed cooperatively by every worker.
+    
+    Claiming is a conditional UPDATE that only matches a task that is queued and due, or
+    running under an expired lease, so of several workers racing for a task exactly one
+    wins. The winner's heartbeat keeps extending the lease; if the worker dies, another
+    worker steals the task once the lease runs out. Failed attempts are retried with
+    exponential backoff until max_attempts. Lease times come from the database clock, so
+    skew between worker hosts cannot expire a live lease. A task with a dedupe_key (one
+    training target) copies it into pending_key while queued or running; a unique index
+    on pending_key makes enqueueing a second pending task for the key fail atomically.
+    """
+    
+    @staticmethod
+    def bootstrap() -> None:
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {WORK_QUEUE_TABLE} (
+                    task_id VARCHAR(32) NOT NULL PRIMARY KEY,
+                    kind VARCHAR(16) NOT NULL,
+                    payload TEXT NOT NULL,
+                    dedupe_key VARCHAR(191) NULL,
+                    pending_key VARCHAR(191) NULL,
+                    group_id VARCHAR(32) NULL,
+                    status VARCHAR(16) NOT NULL,
+                    priority INT NOT NULL DEFAULT 0,
+                    attempts INT NOT NULL DEFAULT 0,
+                    max_attempts INT NOT NULL,
+                    available_at DOUBLE NOT NULL,
+                    enqueued_at DOUBLE NOT NULL,
+                    lease_owner VARCHAR(128) NULL,
+                    lease_token VARCHAR(32) NULL,
+                    lease_expires DOUBLE NULL,
+                    started_at DOUBLE NULL,
+                    finished_at DOUBLE NULL,
+                    result TEXT NULL,
+                    error TEXT NULL
+                )
+            """)
+            connection.commit()
+            indexes = RollupManager._index_columns(connection, WORK_QUEUE_TABLE)
+            if not any([column.lower() for column in columns[:1]] == ['status'] for columns in indexes.values()):
+                cursor.execute(f"CREATE INDEX IX_{WORK_QUEUE_TABLE}_status ON {WORK_QUEUE_TABLE} (status, available_at)")
+                connection.commit()
+            # NULLs never collide, so only queued and running tasks take part
+            if not any([column.lower() for column in columns] == ['pending_key'] for columns in indexes.values()):
+                cursor.execute(f"CREATE UNIQUE INDEX UX_{WORK_QUEUE_TABLE}_pending ON {WORK_QUEUE_TABLE} (pending_key)")
+                connection.commit()
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def db_time(cursor) -> float:
+        """Seconds since the epoch on the database clock, the one clock every worker shares"""
+        if DB_ENGINE == 'sqlite':
+            cursor.execute("SELECT (julianday('now') - 2440587.5) * 86400.0 as now")
+        else:
+            cursor.execute("SELECT UNIX_TIMESTAMP(NOW(6)) as now")
+        return float(cursor.fetchone()['now'])
+    
+    @staticmethod
+    def commit_under_lease(connection, lease: Optional[tuple]) -> None:
+        """Commit the connection's writes only if lease (task_id, token) still holds the task.
+        
+        The check runs inside the writing transaction: MySQL locks the task row with FOR
+        UPDATE and SQLite already holds the write lock, so a takeover cannot commit in between.
+        """
+        if lease is not None:
+            cursor = connection.cursor()
+            lock = "" if DB_ENGINE == 'sqlite' else " FOR UPDATE"
+            cursor.execute(f"SELECT status, lease_token FROM {WORK_QUEUE_TABLE} WHERE task_id = %s{lock}", (lease[0],))
+            task = cursor.fetchone()
+            if task is None or task['status'] != 'running' or task['lease_token'] != lease[1]:
+                connection.rollback()
+                raise LeaseLost(f"Task {lease[0]} was taken over by another worker")
+        connection.commit()
+    
+    @staticmethod
+    def enqueue(kind: str, payload: Dict, dedupe_key: Optional[str] = None, group_id: Optional[str] = None,
+                priority: int = 0, max_attempts: int = WORK_MAX_ATTEMPTS) -> Dict[str, Any]:
+        """Add a task, or return the pending one with the same dedupe_key"""
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            # A pending task can finish between a failed insert and the lookup; the retry then inserts
+            for _ in range(3):
+                task_id = uuid.uuid4().hex
+                now = WorkQueue.db_time(cursor)
+                try:
+                    cursor.execute(
+                        f"""INSERT INTO {WORK_QUEUE_TABLE} (task_id, kind, payload, dedupe_key, pending_key, group_id, status,
+                            priority, max_attempts, available_at, enqueued_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                        (task_id, kind, json.dumps(payload, default=str), dedupe_key, dedupe_key, group_id, 'queued',
+                         priority, max_attempts, now, now)
+                    )
+                    connection.commit()
+                    return {'task_id': task_id, 'status': 'queued', 'deduplicated': False}
+                except (sqlite3.IntegrityError, pymysql.err.IntegrityError):
+                    connection.rollback()
+                cursor.execute(f"SELECT task_id, status FROM {WORK_QUEUE_TABLE} WHERE pending_key = %s", (dedupe_key,))
+                pending = cursor.fetchone()
+                if pending:
+                    return {'task_id': pending['task_id'], 'status': pending['status'], 'deduplicated': True}
+            raise HTTPException(status_code=503, detail=f"Could not enqueue {kind} task for {dedupe_key}, try again")
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def claim(worker_id: str, candidates: int = 8) -> Optional[Dict[str, Any]]:
+        """Lease the most urgent claimable task to worker_id; None when there is nothing to do"""
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            now = WorkQueue.db_time(cursor)
+            claimable = "((status = 'queued' AND available_at <= %s) OR (status = 'running' AND lease_expires < %s))"
+            cursor.execute(f"""
+                SELECT task_id, kind, group_id, status, lease_owner, attempts, max_attempts FROM {WORK_QUEUE_TABLE}
+                WHERE {claimable}
+                ORDER BY priority DESC, available_at, enqueued_at
+                LIMIT {int(candidates)}
+            """, (now, now))
+            for candidate in cursor.fetchall():
+                if candidate['status'] == 'running' and candidate['attempts'] >= candidate['max_attempts']:
+                    # Its last attempt died with the worker; fail it rather than run it again
+                    expired = cursor.execute(
+                        f"""UPDATE {WORK_QUEUE_TABLE} SET status = 'failed', finished_at = %s, lease_token = NULL,
+                            pending_key = NULL, error = %s WHERE task_id = %s AND status = 'running' AND lease_expires < %s""",
+                        (now, f"Lease of {candidate['lease_owner']} expired on attempt {candidate['attempts']}",
+                         candidate['task_id'], now)
+                    )
+                    connection.commit()
+                    # It may have been the last task of its backtest run, which nobody else would close
+                    if expired and candidate['kind'] == 'backtest':
+                        Backtester.finalize(candidate['group_id'])
+                    continue
+                token = uuid.uuid4().hex
+                claimed = cursor.execute(
+                    f"""UPDATE {WORK_QUEUE_TABLE} SET status = 'running', lease_owner = %s, lease_token = %s,
+                        lease_expires = %s, attempts = attempts + 1, started_at = %s
+                        WHERE task_id = %s AND {claimable}""",
+                    (worker_id, token, now + WORK_LEASE_SECONDS, now, candidate['task_id'], now, now)
+                )
+                connection.commit()
+                if claimed != 1:
+                    continue
+                if candidate['status'] == 'running':
+                    logger.warning(f"{worker_id} took over task {candidate['task_id']} from {candidate['lease_owner']}")
+                cursor.execute(f"SELECT * FROM {WORK_QUEUE_TABLE} WHERE task_id = %s", (candidate['task_id'],))
+                task = cursor.fetchone()
+                task['payload'] = json.loads(task['payload'])
+                return task
+            return None
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def _finish(task_id: str, token: str, assignments: str, params: tuple) -> bool:
+        """Apply an update to a task only while token still holds its lease; params(now) fills assignments"""
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            updated = cursor.execute(
+                f"UPDATE {WORK_QUEUE_TABLE} SET {assignments} WHERE task_id = %s AND lease_token = %s AND status = 'running'",
+                params(WorkQueue.db_time(cursor)) + (task_id, token)
+            )
+            connection.commit()
+            return updated == 1
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def heartbeat(task_id: str, token: str) -> bool:
+        """Extend the lease; False once another worker has taken the task over"""
+        return WorkQueue._finish(task_id, token, "lease_expires = %s", lambda now: (now + WORK_LEASE_SECONDS,))
+    
+    @staticmethod
+    def complete(task_id: str, token: str, result: Any) -> bool:
+        return WorkQueue._finish(
+            task_id, token,
+            "status = 'done', finished_at = %s, lease_expires = NULL, pending_key = NULL, result = %s, error = NULL",
+            lambda now: (now, json.dumps(result, default=str))
+        )
+    
+    @staticmethod
+    def fail(task: Dict[str, Any], error: str, retry: bool = True) -> Optional[str]:
+        """Requeue with backoff while attempts remain, else mark failed; returns the new status"""
+        if retry and task['attempts'] < task['max_attempts']:
+            delay = WORK_RETRY_BACKOFF_SECONDS * 2 ** (task['attempts'] - 1)
+            requeued = WorkQueue._finish(
+                task['task_id'], task['lease_token'],
+                "status = 'queued', available_at = %s, lease_owner = NULL, lease_token = NULL, lease_expires = NULL, error = %s",
+                lambda now: (now + delay, error)
+            )
+            return 'queued' if requeued else None
+        failed = WorkQueue._finish(
+            task['task_id'], task['lease_token'],
+            "status = 'failed', finished_at = %s, lease_expires = NULL, pending_key = NULL, error = %s",
+            lambda now: (now, error)
+        )
+        return 'failed' if failed else None
+    
+    @staticmethod
+    def row(task: Dict[str, Any]) -> Dict[str, Any]:
+        """API view of a task row"""
+        view = dict(task)
+        for key in ('payload', 'result'):
+            if isinstance(view.get(key), str):
+                view[key] = json.loads(view[key])
+        view.pop('lease_token', None)
+        return view
+    
+    @staticmethod
+    def get(task_id: str) -> Optional[Dict[str, Any]]:
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT * FROM {WORK_QUEUE_TABLE} WHERE task_id = %s", (task_id,))
+            task = cursor.fetchone()
+            return WorkQueue.row(task) if task else None
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def list_tasks(status: Optional[str] = None, kind: Optional[str] = None, group_id: Optional[str] = None,
+             limit: int = 50) -> Dict[str, Any]:
+        """Counts per status plus the most recently enqueued matching tasks"""
+        filters, params = [], []
+        for column, value in (('status', status), ('kind', kind), ('group_id', group_id)):
+            if value:
+                filters.append(f"{column} = %s")
+                params.append(value)
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT status, COUNT(*) as n FROM {WORK_QUEUE_TABLE} {where} GROUP BY status", tuple(params))
+            counts = {row['status']: int(row['n']) for row in cursor.fetchall()}
+            cursor.execute(f"SELECT * FROM {WORK_QUEUE_TABLE} {where} ORDER BY enqueued_at DESC LIMIT {int(limit)}",
+                           tuple(params))
+            tasks = [WorkQueue.row(task) for task in cursor.fetchall()]
+        finally:
+            connection.close()
+        return {'counts': {status: counts.get(status, 0) for status in WORK_QUEUE_STATUSES}, 'tasks': tasks}
+
+def run_train_task(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Work queue handler for 'train': one /train request, artifacts published to the shared MODELS_DIR.
+    
+    run_training takes the cross-process lock on the target, so a task never trains
+    alongside /train, another replica, or an attempt whose lease it took over.
+    """
+    response = run_training(TrainRequest(**task['payload']))
+    return {'models_trained': response.models_trained, 'message': response.message}
+
+def run_backtest_task(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Work queue handler for 'backtest': one building of a distributed run, written under the task's lease"""
+    payload = task['payload']
+    return Backtester.run_building(payload['run_id'], BacktestRequest(**payload['request']), payload['building_id'],
+                                   lease=(task['task_id'], task['lease_token']))
+
+class Worker:
+    """Claims and runs work queue tasks one at a time until stopped.
+    
+    worker.py runs one per process; WORK_QUEUE_WORKERS > 0 also runs them on threads of
+    the API process. While a task runs, a heartbeat thread extends its lease.
+    """
+    HANDLERS = {'train': run_train_task, 'backtest': run_backtest_task}
+    # Workers running on threads of this process
+    local: List['Worker'] = []
+    
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.stopping = threading.Event()
+        self.counters = {'done': 0, 'retried': 0, 'failed': 0, 'lost': 0}
+    
+    def stop(self) -> None:
+        self.stopping.set()
+    
+    def heartbeat(self, task: Dict[str, Any], finished: threading.Event, lost: threading.Event) -> None:
+        while not finished.wait(WORK_HEARTBEAT_SECONDS):
+            try:
+                if not WorkQueue.heartbeat(task['task_id'], task['lease_token']):
+                    lost.set()
+                    return
+            except Exception as e:
+                # Keep trying; the lease only lapses if heartbeats stay down for WORK_LEASE_SECONDS
+                logger.warning(f"Heartbeat for task {task['task_id']} failed: {e}")
+    
+    def run_once(self) -> bool:
+        """Claim and run one task; False when none was claimable"""
+        task = WorkQueue.claim(self.worker_id)
+        if task is None:
+            return False
+        
+        finished, lost = threading.Event(), threading.Event()
+        beat = threading.Thread(target=self.heartbeat, args=(task, finished, lost), daemon=True)
+        beat.start()
+        started = time.perf_counter()
+        logger.info(f"{self.worker_id} running {task['kind']} task {task['task_id']} (attempt {task['attempts']})")
+        try:
+            handler = Worker.HANDLERS.get(task['kind'])
+            if handler is None:
+                raise HTTPException(status_code=400, detail=f"Unknown task kind: {task['kind']}")
+            result = handler(task)
+            finished.set()
+            if WorkQueue.complete(task['task_id'], task['lease_token'], result):
+                self.counters['done'] += 1
+            else:
+                self.counters['lost'] += 1
+                logger.warning(f"Task {task['task_id']} finished after its lease was taken over; result dropped")
+        except LeaseLost as e:
+            finished.set()
+            self.counters['lost'] += 1
+            logger.warning(f"{e}; attempt {task['attempts']} stopped")
+        except Exception as e:
+            finished.set()
+            # Client errors (bad building, too little data) fail the same way on every attempt
+            retry = not (isinstance(e, HTTPException) and e.status_code < 500)
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            status = WorkQueue.fail(task, str(error), retry=retry)
+            self.counters['retried' if status == 'queued' else 'failed' if status == 'failed' else 'lost'] += 1
+            logger.error(f"Task {task['task_id']} failed on attempt {task['attempts']} ({status}): {error}")
+        finally:
+            finished.set()
+            beat.join()
+        
+        if task['kind'] == 'backtest':
+            Backtester.finalize(task['payload']['run_id'])
+        logger.info(f"{self.worker_id} finished task {task['task_id']} in {time.perf_counter() - started:.1f}s")
+        return True
+    
+    def run(self) -> None:
+        logger.info(f"Worker {self.worker_id} polling {WORK_QUEUE_TABLE}")
+        while not self.stopping.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Worker {self.worker_id} could not poll the queue: {e}")
+            self.stopping.wait(WORK_POLL_SECONDS)
+        logger.info(f"Worker {self.worker_id} stopped: {self.counters}")
+
+# Admission control and lanes
+class Lane:
+    """Bounded-concurrency execution lane with a bounded wait queue"""
+    
+    def __init__(self, name: str, concurrency: int, max_queue: int):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f'{name}-lane')
+        self._wait_seconds = deque(maxlen=1024)
+        self._service_seconds = deque(maxlen=1024)
+    
+    def busy(self) -> bool:
+        return self.waiting > 0 or self.running > 0
+    
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free, from recent service times"""
+        service = float(np.mean(self._service_seconds)) if self._service_seconds else 1.0
+        return max(1, int(math.ceil(service * (self.waiting + 1) / self.concurrency)))
+    
+    async def run(self, fn, *args, guard=None) -> Any:
+        """Run fn(*args) on this lane's threads.
+        
+        guard is entered before a slot is requested, so a call waiting on another run's
+        per-target lock counts as queued and holds no slot.
+        """
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=LANE_REJECT_STATUS,
+                detail=f"{self.name} queue is full ({self.waiting} waiting), retry later",
+                headers={'Retry-After': str(self.retry_after())}
+            )
+        
+        self.waiting += 1
+        queued = True
+        enqueued = time.perf_counter()
+        try:
+            async with (guard or nullcontext()):
+                try:
+                    await self._semaphore.acquire()
+                finally:
+                    queued = False
+                    self.waiting -= 1
+                self._wait_seconds.append(time.perf_counter() - enqueued)
+                
+                self.running += 1
+                started = time.perf_counter()
+                try:
+                    context = contextvars.copy_context()
+                    return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, fn, *args)
+                finally:
+                    self.running -= 1
+                    self.completed += 1
+                    self._service_seconds.append(time.perf_counter() - started)
+                    self._semaphore.release()
+        finally:
+            if queued:
+                self.waiting -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        waits = np.array(self._wait_seconds) * 1000 if self._wait_seconds else np.zeros(1)
+        return {
+            'concurrency': self.concurrency,
+            'max_queue': self.max_queue,
+            'queue_depth': self.waiting,
+            'running': self.running,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'wait_ms': {
+                'mean': float(waits.mean()),
+                'p95': float(np.percentile(waits, 95)),
+                'max': float(waits.max())
+            }
+        }
+
+class Scheduler:
+    """Separate lanes so batch training cannot starve interactive predictions"""
+    inference = Lane('inference', INFERENCE_CONCURRENCY, INFERENCE_MAX_QUEUE)
+    training = Lane('training', TRAINING_CONCURRENCY, TRAINING_MAX_QUEUE)
+    
+    @staticmethod
+    def training_n_jobs() -> int:
+        """Cores a training fit may use right now: one while inference work is pending"""
+        if Scheduler.inference.busy():
+            return 1
+        return max(1, (os.cpu_count() or 1) // Scheduler.training.concurrency)
+    
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        return {
+            'inference': Scheduler.inference.stats(),
+            'training': {**Scheduler.training.stats(), 'n_jobs_now': Scheduler.training_n_jobs()}
+        }
+
+# Request coalescing and per-key training locks
+class SingleFlight:
+    """Share one in-flight computation between concurrent identical requests"""
+    _inflight: Dict[tuple, asyncio.Task] = {}
+    _counters = {'leaders': 0, 'coalesced': 0, 'errors': 0}
+    
+    @staticmethod
+    async def do(key: tuple, work) -> Any:
+        task = SingleFlight._inflight.get(key)
+        if task is not None:
+            SingleFlight._counters['coalesced'] += 1
+        else:
+            SingleFlight._counters['leaders'] += 1
+            task = asyncio.ensure_future(work())
+            SingleFlight._inflight[key] = task
+            
+            def finished(done_task: asyncio.Task, key=key) -> None:
+                if SingleFlight._inflight.get(key) is done_task:
+                    del SingleFlight._inflight[key]
+                if not done_task.cancelled() and done_task.exception() is not None:
+                    SingleFlight._counters['errors'] += 1
+            task.add_done_callback(finished)
+        
+        # Shield so a disconnecting caller does not cancel work other callers are waiting on
+        return await asyncio.shield(task)
+    
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        return {**SingleFlight._counters, 'in_flight': len(SingleFlight._inflight)}
+
+class TrainingLocks:
+    """Serialize training per (resource_type, building) so artifacts are never written concurrently"""
+    _locks: Dict[tuple, list] = {}  # key -> [asyncio.Lock, holders + waiters]
+    _counters = {'acquired': 0, 'contended': 0, 'wait_seconds': 0.0}
+    
+    @staticmethod
+    @asynccontextmanager
+    async def hold(key: tuple):
+        entry = TrainingLocks._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        lock = entry[0]
+        if lock.locked():
+            TrainingLocks._counters['contended'] += 1
+        wait_started = time.perf_counter()
+        try:
+            async with lock:
+                TrainingLocks._counters['acquired'] += 1
+                TrainingLocks._counters['wait_seconds'] += time.perf_counter() - wait_started
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del TrainingLocks._locks[key]
+    
+    @staticmethod
+    @asynccontextmanager
+    async def hold_many(keys: List[tuple]):
+        """Hold several keys, taken in sorted order so overlapping batches cannot deadlock"""
+        async with AsyncExitStack() as stack:
+            for key in sorted(set(keys)):
+                await stack.enter_async_context(TrainingLocks.hold(key))
+            yield
+    
+    @staticmethod
+    @contextmanager
+    def across_processes(keys: List[tuple], timeout: float = TRAINING_LOCK_TIMEOUT):
+        """Hold keys against every process sharing the database: API replicas and queue workers.
+        
+        MySQL takes GET_LOCK on a connection kept open for the duration, and the server
+        releases it if the process dies. The SQLite stand-in lives on one host, so it
+        flocks a file per key beside the database instead. Keys are taken in sorted order.
+        """
+        names = [hashlib.sha1('/'.join(key).encode()).hexdigest()[:32] for key in sorted(set(keys))]
+        deadline = time.monotonic() + timeout
+        
+        def timed_out():
+            raise HTTPException(status_code=503, detail=f"Another process kept {', '.join('/'.join(k) for k in keys)} "
+                                                        f"locked for {timeout:.0f}s")
+        
+        with ExitStack() as stack:
+            if DB_ENGINE == 'sqlite':
+                lock_dir = Path(f"{SQLITE_PATH}.locks")
+                lock_dir.mkdir(parents=True, exist_ok=True)
+                for name in names:
+                    # Closing the file drops the lock
+                    handle = stack.enter_context(open(lock_dir / f"{name}.lock", 'a'))
+                    while True:
+                        try:
+                            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                            break
+                        except BlockingIOError:
+                            if time.monotonic() >= deadline:
+                                timed_out()
+                            time.sleep(0.2)
+            elif names:
+                connection = get_db_connection()
+                stack.callback(connection.close)
+                cursor = connection.cursor()
+                for name in names:
+                    cursor.execute("SELECT GET_LOCK(%s, %s) as acquired",
+                                   (f"ai-train:{name}", max(0.0, deadline - time.monotonic())))
+                    if cursor.fetchone()['acquired'] != 1:
+                        timed_out()
+                    stack.callback(cursor.execute, "SELECT RELEASE_LOCK(%s)", (f"ai-train:{name}",))
+            yield
+    
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        return {
+            **TrainingLocks._counters,
+            'held_or_waiting': {'/'.join(key): entry[1] for key, entry in TrainingLocks._locks.items()}
+        }
+
+# Conditional requests for polled read routes
+class ConditionalGet:
+    """Strong ETags and Last-Modified for /models, /data-info and /predict.
+    
+    A validator hashes what the response is computed from: the code version, the
+    registry version, the versions of the artifact files read, and the data watermark.
+    A matching If-None-Match (or a fresh enough If-Modified-Since) is therefore
+    answered with 304 before any directory walk, aggregation or inference runs.
+    """
+    CODE_VERSION = hashlib.sha1(Path(__file__).read_bytes()).hexdigest()[:12]
+    # (route, key) -> (watermark, wall-clock time this process first saw it)
+    _observed: "OrderedDict[tuple, tuple]" = OrderedDict()
+    # (resource_type, building_id, source, rollup refresh time) -> (watermark, monotonic time it was read)
+    _watermarks: "OrderedDict[tuple, tuple]" = OrderedDict()
+    
+    @staticmethod
+    def etag(*parts: Any) -> str:
+        return '"' + hashlib.sha1(repr((ConditionalGet.CODE_VERSION,) + parts).encode()).hexdigest()[:32] + '"'
+    
+    @staticmethod
+    def observed_at(key: tuple, watermark: tuple) -> float:
+        """When this process first saw the data at watermark; a restart only makes it later (safe)"""
+        entry = ConditionalGet._observed.get(key)
+        if entry is None or entry[0] != watermark:
+            entry = (watermark, time.time())
+            ConditionalGet._observed[key] = entry
+        ConditionalGet._observed.move_to_end(key)
+        while len(ConditionalGet._observed) > 4 * DATA_INFO_CACHE_SIZE:
+            ConditionalGet._observed.popitem(last=False)
+        return entry[1]
+    
+    @staticmethod
+    def headers(etag: str, last_modified: Optional[float] = None) -> Dict[str, str]:
+        # no-cache: clients may store the response but must revalidate, which is what makes polls cheap
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if last_modified:
+            headers['Last-Modified'] = email.utils.formatdate(last_modified, usegmt=True)
+        return headers
+    
+    @staticmethod
+    def not_modified(request: Request, etag: str, last_modified: Optional[float] = None) -> bool:
+        """RFC 9110 precedence: If-None-Match (weak comparison) decides when present, else If-Modified-Since"""
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match is not None:
+            if if_none_match.strip() == '*':
+                # '*' matches any current representation; only GET/HEAD turn that into a 304
+                return request.method in ('GET', 'HEAD')
+            return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+        if_modified_since = request.headers.get('if-modified-since')
+        if if_modified_since and last_modified:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            # HTTP dates have one-second resolution
+            return int(last_modified) <= since
+        return False
+    
+    @staticmethod
+    def response_304(etag: str, last_modified: Optional[float] = None) -> Response:
+        return Response(status_code=304, headers=ConditionalGet.headers(etag, last_modified))
+    
+    @staticmethod
+    def precondition_failed(request: Request) -> bool:
+        """If-None-Match: * on another method fails when a representation exists (RFC 9110 13.1.2)"""
+        if_none_match = request.headers.get('if-none-match')
+        return (if_none_match is not None and if_none_match.strip() == '*'
+                and request.method not in ('GET', 'HEAD'))
+    
+    @staticmethod
+    def response_412(etag: str, last_modified: Optional[float] = None) -> Response:
+        return Response(status_code=412, headers=ConditionalGet.headers(etag, last_modified))
+    
+    @staticmethod
+    def artifact_versions(resource_type: str, building_id: str, model_type: str, scope: str) -> tuple:
+        """Versions of the artifacts a prediction with model_type reads, and when they last changed.
+        
+        A published version directory is identified by its name; legacy directories
+        contribute (file, size, mtime_ns) of every file read.
+        """
+        if model_type == AUTO_MODEL_TYPE:
+            selection = ModelIndex.select(resource_type, building_id, scope)
+            if selection is None:
+                return (), 0.0
+            model_type = selection['model_type']
+        building_dir = ModelManager.get_model_dir(resource_type, building_id, scope)
+        if ModelManager.is_version_dir(building_dir):
+            marker = f'{model_type}_metadata.json' if model_type in ENSEMBLE_TYPES else f'{model_type}_model.pkl'
+            if not (building_dir / marker).exists():
+                return (), 0.0
+            return ((building_dir.name, model_type),), int(building_dir.name[1:]) / 1e9
+        names = [model_type] + ENSEMBLE_COMPONENTS.get(model_type, [])
+        files = [f"{name}_{suffix}" for name in names for suffix in ('model.pkl', 'metadata.json', 'scaler.pkl')]
+        versions, newest = [], 0.0
+        for file_name in files + ['metadata.json']:
+            try:
+                stat = (building_dir / file_name).stat()
+            except FileNotFoundError:
+                continue
+            versions.append((file_name, stat.st_size, stat.st_mtime_ns))
+            newest = max(newest, stat.st_mtime)
+        return tuple(versions), newest
+    
+    @staticmethod
+    async def data_watermark(resource_type: str, building_id: str, request: Request, source: str) -> tuple:
+        """Version of the data a response reads from source ('rollup' or 'raw'), tagged with the source.
+        
+        A rollup-sourced response is keyed on the rollup rows it reads, not the raw table, so
+        rows the rollups have not picked up yet change neither the payload nor its ETag. The
+        key includes the last refresh, so a refresh in this process is seen at once; the
+        raw-table aggregate is read at most once per DATA_WATERMARK_TTL.
+        """
+        stamp = RollupManager._refreshed_at.get(resource_type) if source == 'rollup' else None
+        key = (resource_type, building_id, source, stamp)
+        entry = ConditionalGet._watermarks.get(key)
+        if entry is not None and time.monotonic() - entry[1] < DATA_WATERMARK_TTL:
+            return entry[0]
+        
+        query, params = DataLoader.build_watermark_query(resource_type, building_id, source)
+        watermark_row = await AsyncDB.query(query, params, fetch='one', request=request)
+        watermark = (source,) + tuple(str(value) for value in watermark_row.values())
+        ConditionalGet._watermarks[key] = (watermark, time.monotonic())
+        ConditionalGet._watermarks.move_to_end(key)
+        while len(ConditionalGet._watermarks) > 4 * DATA_INFO_CACHE_SIZE:
+            ConditionalGet._watermarks.popitem(last=False)
+        return watermark
+    
+    @staticmethod
+    async def predict_validators(body: PredictRequest, request: Request) -> Optional[tuple]:
+        """(etag, last_modified) for a /predict body, or None when it cannot be answered from cache"""
+        if body.resource_type not in RESOURCE_MAPPING:
+            return None
+        try:
+            artifacts, artifacts_modified = await asyncio.get_running_loop().run_in_executor(
+                None, ConditionalGet.artifact_versions, ModelManager.model_resource(body.resource_type, body.granularity),
+                body.building_id, body.model_type, body.scope
+            )
+            if not artifacts:
+                return None
+            # Monthly predictions load through the rollups while they are fresh; other granularities read raw rows
+            source = RollupManager.source_for(body.resource_type) if body.granularity == 'month' else 'raw'
+            watermark = await ConditionalGet.data_watermark(body.resource_type, body.building_id, request, source)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.warning(f"Could not compute /predict validators: {e}")
+            return None
+        data_modified = ConditionalGet.observed_at(('data', body.resource_type, body.building_id), watermark)
+        etag = ConditionalGet.etag('predict', body.model_dump_json(), artifacts, watermark)
+        return etag, max(artifacts_modified, data_modified)
+
+# Streaming anomaly detection
+class AnomalyState:
+    """Online statistics of one building's readings and of its monthly forecast residuals.
+    
+    Each reading is scored against a Welford mean and variance of the building's readings,
+    then folded into them in O(1). Readings of a month add up to a running total checked
+    against that month's forecast; when the month closes, its relative residual is scored
+    against, then folded into, a second Welford accumulator.
+    """
+    __slots__ = ('count', 'mean', 'm2', 'period', 'period_total', 'flagged_period',
+                 'residual_count', 'residual_mean', 'residual_m2', 'forecast')
+    
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0, period: Optional[int] = None,
+                 period_total: float = 0.0, forecast: Optional[Dict[int, float]] = None):
+        self.count, self.mean, self.m2 = count, mean, m2
+        self.period, self.period_total, self.flagged_period = period, period_total, None
+        self.residual_count, self.residual_mean, self.residual_m2 = 0, 0.0, 0.0
+        # year * 12 + month - 1 -> forecast monthly total
+        self.forecast = forecast or {}
+    
+    @staticmethod
+    def welford(count: int, mean: float, m2: float, value: float) -> tuple:
+        count += 1
+        delta = value - mean
+        mean += delta / count
+        return count, mean, m2 + delta * (value - mean)
+    
+    @staticmethod
+    def zscore(count: int, mean: float, m2: float, value: float, min_count: int) -> Optional[float]:
+        """value's z-score, or None until min_count values with a nonzero spread were seen"""
+        if count < max(min_count, 2) or m2 <= 0:
+            return None
+        return (value - mean) / math.sqrt(m2 / (count - 1))
+    
+    @staticmethod
+    def period_label(period: int) -> str:
+        return f"{period // 12}-{period % 12 + 1:02d}"
+    
+    def observe(self, when: datetime, usage: float) -> List[Dict[str, Any]]:
+        """Score one reading, fold it in, and return the anomalies it raised"""
+        anomalies = []
+        z = AnomalyState.zscore(self.count, self.mean, self.m2, usage, ANOMALY_MIN_READINGS)
+        if z is not None and abs(z) > ANOMALY_Z_THRESHOLD:
+            anomalies.append({'kind': 'reading', 'usage': usage, 'expected': self.mean,
+                              'deviation': usage / self.mean - 1 if self.mean else None, 'z': z})
+        self.count, self.mean, self.m2 = AnomalyState.welford(self.count, self.mean, self.m2, usage)
+        
+        # Late readings of an already closed month only feed the reading statistics
+        period = when.year * 12 + when.month - 1
+        if self.period is None or period > self.period:
+            if self.period is not None:
+                anomalies.extend(self.close_period())
+            self.period, self.period_total = period, 0.0
+        if period == self.period:
+            self.period_total += usage
+            expected = self.forecast.get(period)
+            if (expected and self.flagged_period != period
+                    and self.period_total > expected * (1 + ANOMALY_FORECAST_TOLERANCE)):
+                self.flagged_period = period
+                anomalies.append({'kind': 'over_forecast', 'period': AnomalyState.period_label(period),
+                                  'usage': self.period_total, 'expected': expected,
+                                  'deviation': self.period_total / expected - 1, 'z': None})
+        return anomalies
+    
+    def close_period(self) -> List[Dict[str, Any]]:
+        """Score the finished month's total against its forecast; the forecast entry is dropped"""
+        expected = self.forecast.pop(self.period, None)
+        if not expected:
+            return []
+        residual = self.period_total / expected - 1
+        z = AnomalyState.zscore(self.residual_count, self.residual_mean, self.residual_m2, residual,
+                                ANOMALY_MIN_RESIDUALS)
+        self.residual_count, self.residual_mean, self.residual_m2 = AnomalyState.welford(
+            self.residual_count, self.residual_mean, self.residual_m2, residual
+        )
+        if (abs(z) > ANOMALY_Z_THRESHOLD) if z is not None else (abs(residual) > ANOMALY_FORECAST_TOLERANCE):
+            return [{'kind': 'period', 'period': AnomalyState.period_label(self.period), 'usage': self.period_total,
+                     'expected': expected, 'deviation': residual, 'z': z}]
+        return []
+
+class AnomalyService:
+    """Per-building AnomalyState in memory, fed by POST /anomalies/ingest and by pulls of new table rows.
+    
+    A building is primed the first time it is seen, from two aggregate queries over its
+    readings and its latest forecast (the last building-scope monthly /predict). When there
+    is none, an 'auto' prediction is requested on a background thread and its forecast
+    joins the state when it lands. After that a reading costs O(1) and no query.
+    Ingest and pull score whatever they are given, so feed each reading through one of them.
+    """
+    _lock = threading.Lock()
+    # One pull per resource at a time, so the loop and POST /anomalies/pull never read the same rows
+    _pull_locks: Dict[str, threading.Lock] = {resource_type: threading.Lock() for resource_type in RESOURCE_MAPPING}
+    # Forecasts requested by prime run here, off the scoring path
+    _forecast_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='anomaly-forecast')
+    _forecasts_pending: set = set()
+    # (resource_type, building_id) -> AnomalyState
+    _states: Dict[tuple, AnomalyState] = {}
+    # (resource_type, building_id) -> {period: forecast monthly total} from the latest /predict
+    _forecasts: Dict[tuple, Dict[int, float]] = {}
+    # resource_type -> (Date, Id) of the last row pulled
+    _watermarks: Dict[str, tuple] = {}
+    _recent: deque = deque(maxlen=ANOMALY_HISTORY)
+    _counters = {'readings': 0, 'flagged': 0, 'primed': 0, 'pulled': 0}
+    
+    @staticmethod
+    def as_datetime(value: Any) -> datetime:
+        return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    
+    @staticmethod
+    def record_forecast(resource_type: str, building_id: str, predictions: List[Dict[str, Any]]) -> None:
+        """Keep a building's latest monthly forecast ({'year', 'month', 'predicted_usage'} rows)"""
+        forecast = {p['year'] * 12 + p['month'] - 1: p['predicted_usage'] for p in predictions if p.get('predicted_usage')}
+        key = (resource_type, building_id)
+        with AnomalyService._lock:
+            AnomalyService._forecasts[key] = forecast
+            if key in AnomalyService._states:
+                AnomalyService._states[key].forecast = dict(forecast)
+    
+    @staticmethod
+    def request_forecast(resource_type: str, building_id: str) -> None:
+        """Predict the building's next months in the background; run_prediction records the forecast"""
+        key = (resource_type, building_id)
+        with AnomalyService._lock:
+            if key in AnomalyService._forecasts_pending:
+                return
+            AnomalyService._forecasts_pending.add(key)
+        
+        def predict():
+            try:
+                run_prediction(PredictRequest(resource_type=resource_type, building_id=building_id,
+                                              model_type=AUTO_MODEL_TYPE, months_ahead=ANOMALY_FORECAST_MONTHS))
+            except Exception as e:
+                logger.warning(f"No forecast for anomaly scoring of {resource_type}/{building_id}: {e}")
+            finally:
+                with AnomalyService._lock:
+                    AnomalyService._forecasts_pending.discard(key)
+        AnomalyService._forecast_executor.submit(contextvars.copy_context().run, predict)
+    
+    @staticmethod
+    def prime(resource_type: str, building_id: str, until: Optional[tuple] = None) -> AnomalyState:
+        """Initial state from the building's stored readings: count, mean and M2, and the latest month's total.
+        
+        until is the (Date, Id) of the last row already pulled; rows after it are the ones being
+        scored, so they are left out, including rows that share its Date.
+        """
+        table_name = RESOURCE_MAPPING[resource_type]
+        bound, params = "", (building_id,)
+        if until is not None:
+            # (None, None): nothing was in the table when pulling started
+            bound, params = "AND (`Date` < %s OR (`Date` = %s AND Id <= %s))", (building_id, until[0], until[0], until[1])
+            if until[0] is None:
+                bound, params = "AND 1 = 0", (building_id,)
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"""
+                SELECT COUNT(*) as readings, SUM(`Usage`) as usage_sum, SUM(`Usage` * `Usage`) as usage_sum_sq,
+                       MAX(`Date`) as last_date
+                FROM {table_name}
+                WHERE BuildingId = %s AND `Date` IS NOT NULL AND `Usage` IS NOT NULL {bound}
+            """, params)
+            totals = cursor.fetchone() or {}
+            state = AnomalyState()
+            count = int(totals.get('readings') or 0)
+            if count:
+                usage_sum, usage_sum_sq = float(totals['usage_sum']), float(totals['usage_sum_sq'])
+                state.count, state.mean = count, usage_sum / count
+                state.m2 = max(usage_sum_sq - usage_sum * usage_sum / count, 0.0)
+                last_date = AnomalyService.as_datetime(totals['last_date'])
+                month_start = last_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+                cursor.execute(f"""
+                    SELECT SUM(`Usage`) as usage_sum
+                    FROM {table_name}
+                    WHERE BuildingId = %s AND `Date` >= %s AND `Usage` IS NOT NULL {bound}
+                """, (building_id, month_start.strftime('%Y-%m-%d %H:%M:%S'), *params[1:]))
+                state.period = last_date.year * 12 + last_date.month - 1
+                state.period_total = float((cursor.fetchone() or {}).get('usage_sum') or 0.0)
+        finally:
+            connection.close()
+        
+        key = (resource_type, building_id)
+        if key not in AnomalyService._forecasts and ModelIndex.select(resource_type, building_id) is not None:
+            AnomalyService.request_forecast(resource_type, building_id)
+        state.forecast = dict(AnomalyService._forecasts.get(key, {}))
+        AnomalyService._counters['primed'] += 1
+        return state
+    
+    @staticmethod
+    def score(resource_type: str, readings: List[tuple], until: Optional[tuple] = None) -> Dict[str, Any]:
+        """Score (building_id, datetime, usage) readings in order; unseen buildings are primed first,
+        from rows up to the (Date, Id) until when the readings are already in the table"""
+        unseen = {building_id for building_id, _, _ in readings
+                  if (resource_type, building_id) not in AnomalyService._states}
+        primed = {building_id: AnomalyService.prime(resource_type, building_id, until) for building_id in sorted(unseen)}
+        
+        anomalies = []
+        with AnomalyService._lock:
+            for building_id, state in primed.items():
+                AnomalyService._states.setdefault((resource_type, building_id), state)
+            states = AnomalyService._states
+            for building_id, when, usage in readings:
+                for anomaly in states[(resource_type, building_id)].observe(when, usage):
+                    anomalies.append({'resource_type': resource_type, 'building_id': building_id,
+                                      'date': when.isoformat(), **anomaly})
+            AnomalyService._recent.extend(anomalies)
+            AnomalyService._counters['readings'] += len(readings)
+            AnomalyService._counters['flagged'] += len(anomalies)
+        return {'resource_type': resource_type, 'readings': len(readings), 'primed': len(primed),
+                'anomalies': anomalies}
+    
+    @staticmethod
+    def ingest(request: AnomalyIngestRequest) -> Dict[str, Any]:
+        if request.resource_type not in RESOURCE_MAPPING:
+            raise HTTPException(status_code=400, detail=f"Invalid resource type: {request.resource_type}")
+        return AnomalyService.score(request.resource_type,
+                                    [(r.building_id, r.date, r.usage) for r in request.readings])
+    
+    @staticmethod
+    def pull(resource_type: str) -> Dict[str, Any]:
+        """Score table rows added since the watermark; the first pull only sets it at the newest row"""
+        with AnomalyService._pull_locks[resource_type]:
+            return AnomalyService._pull(resource_type)
+    
+    @staticmethod
+    def _pull(resource_type: str) -> Dict[str, Any]:
+        table_name = RESOURCE_MAPPING[resource_type]
+        watermark = AnomalyService._watermarks.get(resource_type)
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+            if watermark is None:
+                cursor.execute(f"""
+                    SELECT `Date`, Id FROM {table_name}
+                    WHERE `Date` IS NOT NULL
+                    ORDER BY `Date` DESC, Id DESC
+                    LIMIT 1
+                """)
+                newest = cursor.fetchone()
+                AnomalyService._watermarks[resource_type] = (newest['Date'], newest['Id']) if newest else (None, None)
+                return {'resource_type': resource_type, 'readings': 0, 'primed': 0, 'anomalies': []}
             
-        except Exception as e:
-            logger.error(f"Error making predictions with {model_type}: {e}")
-            raise
+            last_date, last_id = watermark
+            where = "`Date` IS NOT NULL AND `Usage` IS NOT NULL"
+            params: tuple = ()
+            if last_date is not None:
+                where += " AND (`Date` > %s OR (`Date` = %s AND Id > %s))"
+                params = (last_date, last_date, last_id)
+            cursor.execute(f"""
+                SELECT Id, BuildingId, `Date`, `Usage` FROM {table_name}
+                WHERE {where}
+                ORDER BY `Date`, Id
+                LIMIT {ANOMALY_PULL_BATCH}
+            """, params)
+            rows = cursor.fetchall()
+        finally:
+            connection.close()
+        
+        if not rows:
+            return {'resource_type': resource_type, 'readings': 0, 'primed': 0, 'anomalies': []}
+        result = AnomalyService.score(resource_type, [
+            (str(row['BuildingId']), AnomalyService.as_datetime(row['Date']), float(row['Usage'])) for row in rows
+        ], until=watermark)
+        AnomalyService._watermarks[resource_type] = (rows[-1]['Date'], rows[-1]['Id'])
+        AnomalyService._counters['pulled'] += len(rows)
+        return result
+    
+    @staticmethod
+    async def pull_loop() -> None:
+        """Periodic pulls of every resource table, run off the event loop"""
+        loop = asyncio.get_running_loop()
+        while True:
+            for resource_type in RESOURCE_MAPPING:
+                try:
+                    await loop.run_in_executor(None, AnomalyService.pull, resource_type)
+                except Exception as e:
+                    logger.warning(f"Anomaly pull of {resource_type} failed: {e}")
+            await asyncio.sleep(ANOMALY_PULL_INTERVAL)
+    
+    @staticmethod
+    def recent(resource_type: Optional[str] = None, building_id: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Newest first"""
+        with AnomalyService._lock:
+            recent = list(AnomalyService._recent)
+        matching = [a for a in reversed(recent)
+                    if (resource_type is None or a['resource_type'] == resource_type)
+                    and (building_id is None or a['building_id'] == building_id)]
+        return matching[:limit]
+    
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        return {
+            **AnomalyService._counters,
+            'buildings': len(AnomalyService._states),
+            'forecasts': len(AnomalyService._forecasts),
+            'watermarks': {resource: str(mark[0]) for resource, mark in AnomalyService._watermarks.items()}
+        }
 
 # API Routes
 @app.get("/")
@@ -1091,11 +5144,7 @@ async def root():
 async def health_check():
     """Health check endpoint"""
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT 1")
-        result = cursor.fetchone()
-        connection.close()
+        await AsyncDB.query("SELECT 1", fetch='one', timeout=HEALTH_CHECK_TIMEOUT)
         
         return {
             "status": "healthy",
@@ -1117,146 +5166,216 @@ async def health_check():
             "timestamp": datetime.now().isoformat()
         }
 
-@app.post("/train", response_model=TrainResponse)
-async def train_models(request: TrainRequest, background_tasks: BackgroundTasks):
-    """Train models for specified resource type and building"""
+def prepare_training(df: pd.DataFrame, resource_type: str, building_id: str, granularity: str = 'month') -> Dict[str, Any]:
+    """Featurize a building's monthly (or weekly/daily) frame and split it chronologically into float32 matrices.
+    
+    'fit' holds (X_train, y_train, X_test, y_test), the leading arguments of fit_model.
+    """
+    logger.info("Creating features...")
+    df = FeatureStore.features(df, resource_type, building_id, granularity)
+    feature_cols = FeatureEngineer.get_feature_columns(df, resource_type)
+    
+    logger.info(f"Created {len(feature_cols)} features")
+    
+    # Data splitting strategy
+    train_data, test_data = ModelTrainer.split_train_test(df, granularity)
+    
+    # One float32 matrix for every estimator; the chronological split is a pair of row views
+    X = FeatureEngineer.to_matrix(df, feature_cols)
+    X_train, X_test = X[:len(train_data)], X[len(train_data):]
+    
+    logger.info(f"Training: {len(train_data)} records, Test: {len(test_data)} records")
+    logger.info(f"Features: {X_train.shape}")
+    return {
+        'df': df,
+        'feature_cols': feature_cols,
+        'train_data': train_data,
+        'test_data': test_data,
+        'fit': (X_train, train_data['Usage'], X_test, test_data['Usage'])
+    }
+
+def fit_types_for(model_types: List[str], granularity: str) -> List[str]:
+    """Requested model types fit_model trains at granularity; state models are monthly only"""
+    fit_types = [model_type for model_type in model_types if model_type in MODEL_TYPES]
+    if granularity == 'month':
+        return fit_types
+    for model_type in fit_types:
+        if model_type in STATE_MODEL_TYPES:
+            logger.warning(f"Skipping {model_type}: state models carry twelve monthly seasonal terms")
+    return [model_type for model_type in fit_types if model_type not in STATE_MODEL_TYPES]
+
+def store_trained_models(request: TrainRequest, prepared: Dict[str, Any], model_types: List[str],
+                         results: List[Any], version_dir: Path) -> tuple:
+    """Write fitted models (FitPlanner results for model_types) and the requested ensembles into version_dir.
+    
+    Returns (models_trained, metrics by model type); failed fits and ensembles are logged and skipped.
+    """
+    df, train_data, test_data = prepared['df'], prepared['train_data'], prepared['test_data']
+    feature_cols = prepared['feature_cols']
+    y_test = test_data['Usage']
+    models_trained = []
+    all_metrics = {}
+    component_predictions = {}
+    
+    for model_type, result in zip(model_types, results):
+        try:
+            if isinstance(result, Exception):
+                raise result
+            metrics, y_pred = result['metrics'], result['y_pred']
+            
+            # Save model
+            model_path = version_dir / f"{model_type}_model.pkl"
+            metadata = {
+                'resource_type': request.resource_type,
+                'building_id': request.building_id,
+                'model_type': model_type,
+                'scope': 'building',
+                'granularity': request.granularity,
+                'trained_at': datetime.now().isoformat(),
+                'metrics': metrics,
+                'data_points': len(df),
+                'feature_columns': feature_cols,
+                'feature_dtype': FEATURE_DTYPE,
+                'train_size': len(train_data),
+                'test_size': len(test_data),
+                'fit_seconds': result['fit_seconds'],
+                'holdout_residuals': (y_test.values - np.asarray(y_pred)).tolist(),
+                'holdout_relative_residuals': ModelTrainer.relative_residuals(y_test.values, y_pred)
+            }
+            
+            # Save scaler if exists
+            if result['scaler'] is not None:
+                with ModelManager.open_atomic(version_dir / f"{model_type}_scaler.pkl") as f:
+                    pickle.dump(result['scaler'], f)
+                metadata['has_scaler'] = True
+            
+            if result['compaction'] is not None:
+                metadata['compaction'] = result['compaction']
+            
+            ModelManager.save_model(result['model'], model_path, metadata)
+            models_trained.append(model_type)
+            all_metrics[model_type] = metrics
+            component_predictions[model_type] = y_pred
+            
+            logger.info(f"✓ {model_type} trained: R2={metrics['R2']:.3f}")
+            
+        except Exception as e:
+            logger.error(f"✗ Failed to train {model_type}: {e}")
+            continue
+    
+    # Create ensembles; nnls weights come from refits that hold out the last training rows
+    validation = None
+    if request.ensemble_weighting == 'nnls':
+        components = sorted({c for e in request.ensemble_types if e in ENSEMBLE_TYPES for c in ENSEMBLE_COMPONENTS[e]}
+                            & set(component_predictions))
+        if components:
+            X_train, y_train = prepared['fit'][:2]
+            validation = ModelTrainer().validation_predictions(X_train, y_train, components, feature_cols,
+                                                               len(test_data))
+    for ensemble_type in request.ensemble_types:
+        if ensemble_type in ENSEMBLE_TYPES:
+            try:
+                logger.info(f"Creating {ensemble_type} ensemble...")
+                ensemble_pred, ensemble_metrics, ensemble_weights = ModelTrainer.create_ensemble(
+                    component_predictions, y_test, ensemble_type, request.ensemble_weighting, validation
+                )
+                
+                # Save ensemble metadata
+                ensemble_metadata = {
+                    'resource_type': request.resource_type,
+                    'building_id': request.building_id,
+                    'model_type': ensemble_type,
+                    'ensemble_components': list(ensemble_weights),
+                    'ensemble_weights': ensemble_weights,
+                    'ensemble_weighting': request.ensemble_weighting,
+                    'granularity': request.granularity,
+                    'trained_at': datetime.now().isoformat(),
+                    'metrics': ensemble_metrics,
+                    'data_points': len(df),
+                    'feature_columns': feature_cols,
+                    'train_size': len(train_data),
+                    'test_size': len(test_data)
+                }
+                
+                with ModelManager.open_atomic(version_dir / f'{ensemble_type}_metadata.json', 'w') as f:
+                    json.dump(safe_dict_conversion(ensemble_metadata), f, indent=2, default=str)
+                
+                models_trained.append(ensemble_type)
+                all_metrics[ensemble_type] = ensemble_metrics
+                
+                logger.info(f"✓ {ensemble_type} ensemble: R2={ensemble_metrics['R2']:.3f}")
+                
+            except Exception as e:
+                logger.warning(f"✗ Failed to create {ensemble_type} ensemble: {e}")
+    
+    return models_trained, all_metrics
+
+def run_training(request: TrainRequest) -> TrainResponse:
+    """Train models for specified resource type and building (blocking, runs off the event loop)
+    
+    Artifacts are written into a staged version directory that becomes current only
+    once the run has produced at least one model. The target stays locked across
+    processes from loading data until the version is published or dropped.
+    """
+    version_dir = None
+    target_lock = ExitStack()
     try:
         # Validate inputs
         if request.resource_type not in RESOURCE_MAPPING:
             raise HTTPException(status_code=400, detail=f"Invalid resource type: {request.resource_type}")
         
-        logger.info(f"Training request: {request.resource_type}, building {request.building_id}")
+        if request.scope not in MODEL_SCOPES:
+            raise HTTPException(status_code=400, detail=f"Invalid scope: {request.scope}")
+        
+        if request.ensemble_weighting not in ENSEMBLE_WEIGHTING:
+            raise HTTPException(status_code=400, detail=f"Invalid ensemble weighting: {request.ensemble_weighting}")
+        
+        if request.granularity not in GRANULARITIES:
+            raise HTTPException(status_code=400, detail=f"Invalid granularity: {request.granularity}")
+        
+        if request.scope == 'global' and request.granularity != 'month':
+            raise HTTPException(status_code=400, detail="Global scope models are monthly only")
+        
+        target = GLOBAL_BUILDING_ID if request.scope == 'global' else request.building_id
+        target_lock.enter_context(TrainingLocks.across_processes(
+            [(ModelManager.model_resource(request.resource_type, request.granularity), target)]
+        ))
+        
+        logger.info(f"Training request: {request.resource_type}, building {request.building_id}, scope {request.scope}, "
+                    f"granularity {request.granularity}")
         logger.info(f"Model types: {request.model_types}")
         logger.info(f"Ensemble types: {request.ensemble_types}")
         
+        if request.scope == 'global':
+            version_dir = ModelManager.stage(request.resource_type, GLOBAL_BUILDING_ID)
+            return train_global_models(request, version_dir)
+        
         # Load data
-        df = DataLoader.load_data(request.resource_type, request.building_id)
+        df = DataLoader.load_data(request.resource_type, request.building_id, request.granularity)
         
         # Check minimum data requirement
-        if len(df) < 13:
+        min_rows = FeatureEngineer.min_rows(request.granularity)
+        if len(df) < min_rows:
             raise HTTPException(
                 status_code=400,
-                detail=f"Insufficient data. Found {len(df)} records, minimum 13 required."
+                detail=f"Insufficient data. Found {len(df)} records, minimum {min_rows} required."
             )
         
-        # Feature engineering
-        logger.info("Creating features...")
-        df = FeatureEngineer.create_features(df, request.resource_type)
-        feature_cols = FeatureEngineer.get_feature_columns(df, request.resource_type)
-        
-        logger.info(f"Created {len(feature_cols)} features")
-        
-        # Data splitting strategy
-        if len(df) >= 36:  # 3+ years
-            train_data = df.iloc[:-12].copy()
-            test_data = df.iloc[-12:].copy()
-        elif len(df) >= 24:  # 2+ years
-            train_data = df.iloc[:-6].copy()
-            test_data = df.iloc[-6:].copy()
-        else:
-            test_size = max(1, min(6, len(df) // 5))
-            train_data = df.iloc[:-test_size].copy()
-            test_data = df.iloc[-test_size:].copy()
-        
-        X_train = train_data[feature_cols]
-        y_train = train_data['Usage']
-        X_test = test_data[feature_cols]
-        y_test = test_data['Usage']
-        
-        logger.info(f"Training: {len(train_data)} records, Test: {len(test_data)} records")
-        logger.info(f"Features: {X_train.shape}")
+        prepared = prepare_training(df, request.resource_type, request.building_id, request.granularity)
+        df, train_data, test_data = prepared['df'], prepared['train_data'], prepared['test_data']
+        feature_cols = prepared['feature_cols']
         
         # Train models
-        trainer = ModelTrainer()
-        models_trained = []
-        all_metrics = {}
-        trained_models = {}
-        
-        # Train individual models
-        for model_type in request.model_types:
-            if model_type in MODEL_TYPES:
-                try:
-                    logger.info(f"Training {model_type} model...")
-                    model, metrics, y_pred = trainer.train_single_model(
-                        X_train, y_train, X_test, y_test, model_type
-                    )
-                    
-                    # Save model
-                    model_path = ModelManager.get_model_path(
-                        request.resource_type, request.building_id, model_type
-                    )
-                    metadata = {
-                        'resource_type': request.resource_type,
-                        'building_id': request.building_id,
-                        'model_type': model_type,
-                        'trained_at': datetime.now().isoformat(),
-                        'metrics': metrics,
-                        'data_points': len(df),
-                        'feature_columns': feature_cols,
-                        'train_size': len(train_data),
-                        'test_size': len(test_data)
-                    }
-                    
-                    # Save scaler if exists
-                    if model_type in trainer.scalers:
-                        scaler_path = model_path.parent / f"{model_type}_scaler.pkl"
-                        scaler_path.parent.mkdir(parents=True, exist_ok=True)
-                        with open(scaler_path, 'wb') as f:
-                            pickle.dump(trainer.scalers[model_type], f)
-                        metadata['has_scaler'] = True
-                    
-                    ModelManager.save_model(model, model_path, metadata)
-                    models_trained.append(model_type)
-                    all_metrics[model_type] = metrics
-                    trained_models[model_type] = model
-                    
-                    logger.info(f"✓ {model_type} trained: R2={metrics['R2']:.3f}")
-                    
-                except Exception as e:
-                    logger.error(f"✗ Failed to train {model_type}: {e}")
-                    continue
-        
-        # Create ensembles
-        for ensemble_type in request.ensemble_types:
-            if ensemble_type in ENSEMBLE_TYPES:
-                try:
-                    logger.info(f"Creating {ensemble_type} ensemble...")
-                    ensemble_pred, ensemble_metrics = trainer.create_ensemble(
-                        trained_models, X_test, y_test, ensemble_type
-                    )
-                    
-                    # Save ensemble metadata
-                    ensemble_path = ModelManager.get_model_path(
-                        request.resource_type, request.building_id, ensemble_type
-                    )
-                    ensemble_metadata = {
-                        'resource_type': request.resource_type,
-                        'building_id': request.building_id,
-                        'model_type': ensemble_type,
-                        'ensemble_components': ensemble_type.split('_'),
-                        'trained_at': datetime.now().isoformat(),
-                        'metrics': ensemble_metrics,
-                        'data_points': len(df),
-                        'feature_columns': feature_cols,
-                        'train_size': len(train_data),
-                        'test_size': len(test_data)
-                    }
-                    
-                    ensemble_path.parent.mkdir(parents=True, exist_ok=True)
-                    metadata_path = ensemble_path.parent / f'{ensemble_type}_metadata.json'
-                    with open(metadata_path, 'w') as f:
-                        json.dump(safe_dict_conversion(ensemble_metadata), f, indent=2, default=str)
-                    
-                    models_trained.append(ensemble_type)
-                    all_metrics[ensemble_type] = ensemble_metrics
-                    
-                    logger.info(f"✓ {ensemble_type} ensemble: R2={ensemble_metrics['R2']:.3f}")
-                    
-                except Exception as e:
-                    logger.warning(f"✗ Failed to create {ensemble_type} ensemble: {e}")
+        version_dir = ModelManager.stage(ModelManager.model_resource(request.resource_type, request.granularity),
+                                         request.building_id)
+        fit_types = fit_types_for(request.model_types, request.granularity)
+        logger.info(f"Training {', '.join(fit_types)} models...")
+        results, _ = FitPlanner.run([prepared['fit'] + (model_type, feature_cols) for model_type in fit_types])
+        models_trained, all_metrics = store_trained_models(request, prepared, fit_types, results, version_dir)
         
         if not models_trained:
             raise HTTPException(status_code=500, detail="No models were successfully trained")
+        ModelManager.publish(version_dir)
         
         return TrainResponse(
             success=True,
@@ -1268,6 +5387,7 @@ async def train_models(request: TrainRequest, background_tasks: BackgroundTasks)
                 'training_records': len(train_data),
                 'test_records': len(test_data),
                 'features_count': len(feature_cols),
+                'granularity': request.granularity,
                 'date_range': f"{df['Date'].min()} to {df['Date'].max()}"
             })
         )
@@ -1277,18 +5397,161 @@ async def train_models(request: TrainRequest, background_tasks: BackgroundTasks)
     except Exception as e:
         logger.error(f"Training error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # A published version is current and stays; anything else staged by the run is dropped
+        if version_dir is not None:
+            ModelManager.discard(version_dir)
+        if request.resource_type in RESOURCE_MAPPING and request.granularity in GRANULARITIES:
+            ModelIndex.refresh(ModelManager.model_resource(request.resource_type, request.granularity),
+                               GLOBAL_BUILDING_ID if request.scope == 'global' else request.building_id)
+        target_lock.close()
 
-@app.post("/predict", response_model=PredictResponse)
-async def predict_consumption(request: PredictRequest):
-    """Predict future consumption using trained models"""
+def run_batch_training(request: TrainBatchRequest) -> Dict[str, Any]:
+    """Train many buildings in this process with all of their fits planned as one FitPlanner batch.
+    
+    Each building still gets its own staged version, published once it has a model, so
+    one building failing leaves the others' results in place. Each building's target is
+    locked across processes while its version is written and published.
+    """
+    if request.resource_type not in RESOURCE_MAPPING:
+        raise HTTPException(status_code=400, detail=f"Invalid resource type: {request.resource_type}")
+    if request.ensemble_weighting not in ENSEMBLE_WEIGHTING:
+        raise HTTPException(status_code=400, detail=f"Invalid ensemble weighting: {request.ensemble_weighting}")
+    if request.granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Invalid granularity: {request.granularity}")
+    
+    model_resource = ModelManager.model_resource(request.resource_type, request.granularity)
+    fit_types = fit_types_for(request.model_types, request.granularity)
+    min_rows = FeatureEngineer.min_rows(request.granularity)
+    panel = DataLoader.load_panel(request.resource_type, request.granularity)
+    if request.building_ids:
+        panel = panel[panel['BuildingId'].isin([str(b) for b in request.building_ids])]
+    
+    buildings: Dict[str, Dict[str, Any]] = {str(b): {'success': False, 'error': 'No data found'}
+                                            for b in request.building_ids or []}
+    prepared: Dict[str, Dict[str, Any]] = {}
+    fits = []
+    for building_id, group in panel.groupby('BuildingId', sort=True):
+        building_id = str(building_id)
+        if len(group) < min_rows:
+            buildings[building_id] = {'success': False,
+                                      'error': f"Insufficient data. Found {len(group)} records, minimum {min_rows} required."}
+            continue
+        try:
+            prepared[building_id] = prepare_training(group.reset_index(drop=True), request.resource_type, building_id,
+                                                     request.granularity)
+        except Exception as e:
+            buildings[building_id] = {'success': False, 'error': str(e)}
+            continue
+        fits.extend(prepared[building_id]['fit'] + (model_type, prepared[building_id]['feature_cols'])
+                    for model_type in fit_types)
+    
+    logger.info(f"Batch training: {len(fits)} fits over {len(prepared)} {request.resource_type} buildings")
+    results, fit_report = FitPlanner.run(fits)
+    
+    for i, (building_id, building) in enumerate(prepared.items()):
+        body = TrainRequest(resource_type=request.resource_type, building_id=building_id,
+                            model_types=request.model_types, ensemble_types=request.ensemble_types,
+                            ensemble_weighting=request.ensemble_weighting, granularity=request.granularity)
+        version_dir = None
+        target_lock = ExitStack()
+        try:
+            target_lock.enter_context(TrainingLocks.across_processes([(model_resource, building_id)]))
+            version_dir = ModelManager.stage(model_resource, building_id)
+            models_trained, metrics = store_trained_models(
+                body, building, fit_types, results[i * len(fit_types):(i + 1) * len(fit_types)], version_dir
+            )
+            if not models_trained:
+                raise ValueError("No models were successfully trained")
+            ModelManager.publish(version_dir)
+            buildings[building_id] = {'success': True, 'models_trained': models_trained,
+                                      'metrics': safe_dict_conversion(metrics)}
+        except Exception as e:
+            logger.error(f"Batch training failed for {building_id}: {e}")
+            buildings[building_id] = {'success': False, 'error': str(e)}
+        finally:
+            if version_dir is not None:
+                ModelManager.discard(version_dir)
+            ModelIndex.refresh(model_resource, building_id)
+            target_lock.close()
+    
+    trained = sum(building['success'] for building in buildings.values())
+    return {
+        'resource_type': request.resource_type,
+        'granularity': request.granularity,
+        'buildings_trained': trained,
+        'buildings_failed': len(buildings) - trained,
+        'fit_plan': fit_report,
+        'buildings': dict(sorted(buildings.items()))
+    }
+
+@app.post("/train", response_model=TrainResponse)
+async def train_models(request: TrainRequest, background_tasks: BackgroundTasks):
+    """Train models for specified resource type and building"""
+    # Identical requests attach to the in-flight run; different runs for the same target queue up
+    target = GLOBAL_BUILDING_ID if request.scope == 'global' else request.building_id
+    model_resource = ModelManager.model_resource(request.resource_type, request.granularity)
+    flight_key = ('train', model_resource, target, request.scope,
+                  tuple(request.model_types or []), tuple(request.ensemble_types or []),
+                  request.ensemble_weighting)
+    
+    async def train_in_lane():
+        return await Scheduler.training.run(
+            run_training, request, guard=TrainingLocks.hold((model_resource, target))
+        )
+    
+    return FastJSONResponse(response_content(await SingleFlight.do(flight_key, train_in_lane)))
+
+@app.post("/train/batch")
+async def train_batch(request: TrainBatchRequest):
+    """Train many buildings in this process, fits spread over the cores by the fit planner"""
+    if request.resource_type not in RESOURCE_MAPPING:
+        raise HTTPException(status_code=400, detail=f"Invalid resource type: {request.resource_type}")
+    
+    building_ids = request.building_ids
+    if not building_ids:
+        query, params = DataLoader.build_buildings_query(request.resource_type)
+        building_ids = [str(row['BuildingId']) for row in await AsyncDB.query(query, params)]
+    request = request.model_copy(update={'building_ids': building_ids})
+    model_resource = ModelManager.model_resource(request.resource_type, request.granularity)
+    
+    return await Scheduler.training.run(
+        run_batch_training, request,
+        guard=TrainingLocks.hold_many([(model_resource, building_id) for building_id in building_ids])
+    )
+
+def run_prediction(request: PredictRequest) -> PredictResponse:
+    """Predict future consumption using trained models (blocking, runs off the event loop)"""
     try:
         # Validate inputs
         if request.resource_type not in RESOURCE_MAPPING:
             raise HTTPException(status_code=400, detail=f"Invalid resource type: {request.resource_type}")
+        if request.scope not in MODEL_SCOPES:
+            raise HTTPException(status_code=400, detail=f"Invalid scope: {request.scope}")
+        if request.granularity not in GRANULARITIES:
+            raise HTTPException(status_code=400, detail=f"Invalid granularity: {request.granularity}")
+        if request.scope == 'global' and request.granularity != 'month':
+            raise HTTPException(status_code=400, detail="Global scope models are monthly only")
+        model_resource = ModelManager.model_resource(request.resource_type, request.granularity)
+        
+        quantiles = sorted(set(request.quantiles or [])) if request.intervals else []
+        if any(not 0 < q < 1 for q in quantiles):
+            raise HTTPException(status_code=400, detail=f"Quantiles must be between 0 and 1: {request.quantiles}")
+        
+        # 'auto' resolves from the in-memory index, then predicts like an explicit model_type
+        selection = None
+        if request.model_type == AUTO_MODEL_TYPE:
+            selection = ModelIndex.select(model_resource, request.building_id, request.scope)
+            if selection is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"No trained models with holdout metrics for {request.resource_type}, building {request.building_id}"
+                )
+            request = request.model_copy(update={'model_type': selection['model_type']})
         
-        # Check if model exists
+        # Check if model exists; components are read from the same pinned version directory
         model_path = ModelManager.get_model_path(
-            request.resource_type, request.building_id, request.model_type
+            model_resource, request.building_id, request.model_type, scope=request.scope
         )
         
         # For ensemble models, check metadata file
@@ -1307,19 +5570,22 @@ async def predict_consumption(request: PredictRequest):
                 )
         
         # Load historical data
-        df = DataLoader.load_data(request.resource_type, request.building_id)
-        if len(df) < 13:
+        df = DataLoader.load_data(request.resource_type, request.building_id, request.granularity)
+        if len(df) < FeatureEngineer.min_rows(request.granularity):
             raise HTTPException(
                 status_code=400,
                 detail="Insufficient historical data for predictions"
             )
         
         # Create features for historical data
-        df = FeatureEngineer.create_features(df, request.resource_type)
+        df = FeatureStore.features(df, request.resource_type, request.building_id, request.granularity)
+        # State models and the seasonal-naive fallback read the history as a monthly series
+        history = df if request.granularity == 'month' else None
         
         # Create future features
         try:
-            future_df = Predictor.create_future_features(df, request.months_ahead, request.resource_type)
+            future_df = Predictor.create_future_features(df, request.months_ahead, request.resource_type,
+                                                         request.granularity)
             logger.info(f"Successfully created future features. Shape: {future_df.shape}")
         except Exception as e:
             logger.error(f"Error creating future features: {e}")
@@ -1336,18 +5602,27 @@ async def predict_consumption(request: PredictRequest):
                 # Get from component model
                 component_models = ensemble_metadata['ensemble_components']
                 for component in component_models:
-                    component_path = ModelManager.get_model_path(
-                        request.resource_type, request.building_id, component
-                    )
+                    component_path = model_path.parent / f"{component}_model.pkl"
                     if component_path.exists():
-                        _, comp_metadata = ModelManager.load_model(component_path)
+                        comp_metadata = ModelManager.load_metadata(component_path)
                         trained_features = comp_metadata.get('feature_columns', [])
                         if trained_features:
                             break
         else:
-            _, metadata = ModelManager.load_model(model_path)
+            metadata = ModelManager.load_metadata(model_path)
             trained_features = metadata.get('feature_columns', [])
         
+        # Global models see buildings through their code and scale; unseen buildings use their own history
+        building_scale = 1.0
+        if request.scope == 'global':
+            global_metadata = ensemble_metadata if request.model_type in ENSEMBLE_TYPES else metadata
+            stats = global_metadata.get('building_stats', {}).get(request.building_id)
+            if stats is None:
+                stats = {'code': -1, 'scale': float(df['Usage'].mean())}
+                logger.info(f"Building {request.building_id} not in global training set, using its own scale")
+            building_scale = stats['scale']
+            future_df = FeatureEngineer.add_building_features(future_df, stats['code'], building_scale)
+        
         # Prepare features
         if trained_features:
             # CRITICAL FIX: Ensure Date column is preserved
@@ -1373,16 +5648,14 @@ async def predict_consumption(request: PredictRequest):
             feature_columns = [col for col in future_df.columns if col != 'Date']
             X_future = future_df[feature_columns]
         
-        # Clean data
-        X_future = X_future.replace([np.inf, -np.inf], 0)
-        X_future = X_future.fillna(0)
-        X_future = X_future.astype(float)
-        
+        # Non-finite values are zeroed when each model builds its float32 input matrix
         logger.info(f"Prediction features shape: {X_future.shape}")
         
         # Make predictions
         predictions = []
         model_info = {}
+        # Where each model's interval offsets came from, or why it has none
+        band_methods = {}
         
         if request.model_type in ENSEMBLE_TYPES:
             # Handle ensemble predictions
@@ -1391,12 +5664,12 @@ async def predict_consumption(request: PredictRequest):
                 ensemble_metadata = json.load(f)
             
             ensemble_predictions = []
+            ensemble_offsets = []
+            available_components = []
             component_models = ensemble_metadata['ensemble_components']
             
             for component in component_models:
-                component_path = ModelManager.get_model_path(
-                    request.resource_type, request.building_id, component
-                )
+                component_path = model_path.parent / f"{component}_model.pkl"
                 if component_path.exists():
                     # Load scaler if needed
                     scaler = None
@@ -1406,10 +5679,13 @@ async def predict_consumption(request: PredictRequest):
                             with open(scaler_path, 'rb') as f:
                                 scaler = pickle.load(f)
                     
-                    component_pred = Predictor.predict_with_model(
-                        component_path, X_future, component, scaler
+                    component_pred, component_offsets, band_methods[component] = Predictor.predict_with_bands(
+                        component_path, X_future, component, scaler, scale=building_scale, quantiles=quantiles,
+                        history=history
                     )
                     ensemble_predictions.append(component_pred)
+                    ensemble_offsets.append(component_offsets)
+                    available_components.append(component)
                     logger.info(f"Component {component}: {component_pred.mean():.2f}")
             
             if not ensemble_predictions:
@@ -1418,12 +5694,30 @@ async def predict_consumption(request: PredictRequest):
                     detail=f"No component models found for ensemble {request.model_type}"
                 )
             
-            # Weighted average
-            weights = [0.4, 0.3, 0.3] if len(ensemble_predictions) == 3 else [0.5, 0.5]
-            weights = weights[:len(ensemble_predictions)]
-            weights = np.array(weights) / np.sum(weights)
+            # Apply the weights fitted at training time; rescale if a component artifact is missing
+            stored_weights = ensemble_metadata.get('ensemble_weights')
+            if stored_weights is None:
+                # Ensembles trained before weights were persisted used the preset weights
+                stored_weights = dict(zip(ENSEMBLE_COMPONENTS[request.model_type], ENSEMBLE_WEIGHTS[request.model_type]))
+            weights = np.array([stored_weights.get(c, 0.0) for c in available_components])
+            if weights.sum() <= 0:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"No weighted component models found for ensemble {request.model_type}"
+                )
+            weights = weights * (sum(stored_weights.values()) / weights.sum())
+            
+            final_predictions = np.column_stack(ensemble_predictions) @ weights
             
-            final_predictions = np.average(ensemble_predictions, axis=0, weights=weights)
+            # Combine component bands with the same weights, over the components that have them
+            banded = [i for i, component_offsets in enumerate(ensemble_offsets) if component_offsets is not None]
+            offsets = None
+            if quantiles and banded and weights[banded].sum() > 0:
+                banded_weights = weights[banded] * (weights.sum() / weights[banded].sum())
+                offsets = {
+                    q: np.column_stack([ensemble_offsets[i][q] for i in banded]) @ banded_weights
+                    for q in quantiles
+                }
             model_info = ensemble_metadata
             
             logger.info(f"Ensemble predictions: {final_predictions.mean():.2f}")
@@ -1437,84 +5731,101 @@ async def predict_consumption(request: PredictRequest):
                     with open(scaler_path, 'rb') as f:
                         scaler = pickle.load(f)
             
-            final_predictions = Predictor.predict_with_model(
-                model_path, X_future, request.model_type, scaler
+            final_predictions, offsets, band_methods[request.model_type] = Predictor.predict_with_bands(
+                model_path, X_future, request.model_type, scaler, scale=building_scale, quantiles=quantiles,
+                history=history
             )
             
-            _, metadata = ModelManager.load_model(model_path)
+            metadata = ModelManager.load_metadata(model_path)
             model_info = metadata
         
         # Ensure reasonable predictions
         final_predictions = np.maximum(final_predictions, 0)
         
+        # Bands around the final point forecast, kept non-negative and ordered across quantiles
+        bands = None
+        if offsets is not None:
+            bands = np.maximum.accumulate(
+                np.maximum(np.vstack([final_predictions + offsets[q] for q in quantiles]), 0), axis=0
+            )
+        
         # Format predictions with better error handling
         try:
-            logger.info(f"Starting prediction formatting...")
-            logger.info(f"Final predictions shape: {final_predictions.shape if hasattr(final_predictions, 'shape') else len(final_predictions)}")
-            logger.info(f"Future df shape: {future_df.shape}")
-            logger.info(f"Future df columns: {future_df.columns.tolist()}")
-            
-            # Check if Date column exists
-            if 'Date' not in future_df.columns:
-                logger.error("Date column missing from future_df")
-                logger.error(f"Available columns: {future_df.columns.tolist()}")
-                raise ValueError("Date column missing from future dataframe")
-            
-            logger.info(f"Date column type: {type(future_df['Date'].iloc[0])}")
-            logger.info(f"First few dates: {future_df['Date'].head().tolist()}")
-            
-            for i, pred in enumerate(final_predictions):
-                if i < len(future_df):
-                    try:
-                        future_date = future_df.iloc[i]['Date']
-                        logger.info(f"Processing prediction {i}: date={future_date}, pred={pred}")
+            with Tracer.span('format', rows=len(final_predictions)):
+                logger.info(f"Starting prediction formatting...")
+                logger.info(f"Final predictions shape: {final_predictions.shape if hasattr(final_predictions, 'shape') else len(final_predictions)}")
+                logger.info(f"Future df shape: {future_df.shape}")
+                logger.info(f"Future df columns: {future_df.columns.tolist()}")
+            
+                # Check if Date column exists
+                if 'Date' not in future_df.columns:
+                    logger.error("Date column missing from future_df")
+                    logger.error(f"Available columns: {future_df.columns.tolist()}")
+                    raise ValueError("Date column missing from future dataframe")
+            
+                logger.info(f"Date column type: {type(future_df['Date'].iloc[0])}")
+                logger.info(f"First few dates: {future_df['Date'].head().tolist()}")
+                date_format = '%Y-%m' if request.granularity == 'month' else '%Y-%m-%d'
+            
+                # Sanitized in bulk; the loop only picks plain floats out of these lists
+                safe_predictions = safe_float_array(final_predictions).tolist()
+                safe_bands = safe_float_array(bands).tolist() if bands is not None else None
+                for i, pred in enumerate(final_predictions):
+                    if i < len(future_df):
+                        try:
+                            future_date = future_df.iloc[i]['Date']
+                            logger.debug(f"Processing prediction {i}: date={future_date}, pred={pred}")
                         
-                        # Ensure future_date is a valid datetime
-                        if pd.isna(future_date):
-                            logger.warning(f"NaT date at index {i}, skipping")
-                            continue
+                            # Ensure future_date is a valid datetime
+                            if pd.isna(future_date):
+                                logger.warning(f"NaT date at index {i}, skipping")
+                                continue
                             
-                        predictions.append({
-                            'date': future_date.strftime('%Y-%m'),
-                            'predicted_usage': safe_float_conversion(pred),
-                            'month': int(future_date.month),
-                            'year': int(future_date.year)
-                        })
-                    except Exception as date_error:
-                        logger.error(f"Error processing date at index {i}: {date_error}")
-                        logger.error(f"Date value: {future_df.iloc[i]['Date']}")
-                        logger.error(f"Date type: {type(future_df.iloc[i]['Date'])}")
-                        raise
-                else:
-                    # Fallback if future_df is shorter than predictions
-                    logger.warning(f"Prediction index {i} exceeds future_df length, creating fallback date")
-                    try:
-                        if 'Date' in future_df.columns and len(future_df) > 0:
-                            last_date = future_df.iloc[-1]['Date']
-                            next_month = last_date.month + (i - len(future_df) + 1)
-                            next_year = last_date.year
-                            while next_month > 12:
-                                next_month -= 12
-                                next_year += 1
-                        else:
-                            # Ultimate fallback - use current date
-                            from datetime import datetime
-                            current_date = datetime.now()
-                            next_month = current_date.month + i
-                            next_year = current_date.year
-                            while next_month > 12:
-                                next_month -= 12
-                                next_year += 1
+                            predictions.append({
+                                'date': future_date.strftime(date_format),
+                                'predicted_usage': safe_predictions[i],
+                                'month': int(future_date.month),
+                                'year': int(future_date.year)
+                            })
+                            if bands is not None:
+                                predictions[-1]['intervals'] = {
+                                    f"p{q * 100:g}": safe_bands[j][i] for j, q in enumerate(quantiles)
+                                }
+                        except Exception as date_error:
+                            logger.error(f"Error processing date at index {i}: {date_error}")
+                            logger.error(f"Date value: {future_df.iloc[i]['Date']}")
+                            logger.error(f"Date type: {type(future_df.iloc[i]['Date'])}")
+                            raise
+                    else:
+                        # Fallback if future_df is shorter than predictions
+                        logger.warning(f"Prediction index {i} exceeds future_df length, creating fallback date")
+                        try:
+                            if 'Date' in future_df.columns and len(future_df) > 0:
+                                last_date = future_df.iloc[-1]['Date']
+                                next_month = last_date.month + (i - len(future_df) + 1)
+                                next_year = last_date.year
+                                while next_month > 12:
+                                    next_month -= 12
+                                    next_year += 1
+                            else:
+                                # Ultimate fallback - use current date
+                                from datetime import datetime
+                                current_date = datetime.now()
+                                next_month = current_date.month + i
+                                next_year = current_date.year
+                                while next_month > 12:
+                                    next_month -= 12
+                                    next_year += 1
                         
-                        predictions.append({
-                            'date': f"{next_year}-{next_month:02d}",
-                            'predicted_usage': safe_float_conversion(pred),
-                            'month': next_month,
-                            'year': next_year
-                        })
-                    except Exception as fallback_error:
-                        logger.error(f"Error in fallback date creation: {fallback_error}")
-                        raise
+                            predictions.append({
+                                'date': f"{next_year}-{next_month:02d}",
+                                'predicted_usage': safe_predictions[i],
+                                'month': next_month,
+                                'year': next_year
+                            })
+                        except Exception as fallback_error:
+                            logger.error(f"Error in fallback date creation: {fallback_error}")
+                            raise
                         
         except Exception as e:
             logger.error(f"Error formatting predictions: {e}")
@@ -1528,6 +5839,9 @@ async def predict_consumption(request: PredictRequest):
             raise HTTPException(status_code=500, detail=f"Error formatting predictions: {str(e)}")
         
         logger.info(f"Generated {len(predictions)} predictions successfully")
+        # Monthly totals of the building's latest forecast are what anomaly scoring compares against
+        if request.scope == 'building' and request.granularity == 'month':
+            AnomalyService.record_forecast(request.resource_type, request.building_id, predictions)
         
         return PredictResponse(
             success=True,
@@ -1536,11 +5850,17 @@ async def predict_consumption(request: PredictRequest):
                 'model_type': request.model_type,
                 'resource_type': request.resource_type,
                 'building_id': request.building_id,
+                'scope': request.scope,
+                'granularity': request.granularity,
                 'trained_at': model_info.get('trained_at', 'Unknown'),
                 'metrics': model_info.get('metrics', {}),
                 'months_predicted': request.months_ahead,
                 'feature_count': len(trained_features) if trained_features else 0,
-                'prediction_range': f"{final_predictions.min():.2f} - {final_predictions.max():.2f}"
+                'prediction_range': f"{final_predictions.min():.2f} - {final_predictions.max():.2f}",
+                # Only present when intervals were requested; empty if the artifacts cannot provide them
+                **({'interval_quantiles': quantiles if bands is not None else [],
+                    'interval_methods': band_methods} if quantiles else {}),
+                **({'selection': selection} if selection else {})
             })
         )
         
@@ -1550,13 +5870,328 @@ async def predict_consumption(request: PredictRequest):
         logger.error(f"Prediction error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/predict", response_model=PredictResponse)
+async def predict_consumption(request: PredictRequest, http_request: Request):
+    """Predict future consumption using trained models
+    
+    Predictions are side-effect free, so an If-None-Match matching the current models and
+    data is answered with 304 even though this is a POST.
+    """
+    validators = await ConditionalGet.predict_validators(request, http_request)
+    if validators is not None and ConditionalGet.precondition_failed(http_request):
+        return ConditionalGet.response_412(*validators)
+    if validators is not None and ConditionalGet.not_modified(http_request, *validators):
+        return ConditionalGet.response_304(*validators)
+    
+    flight_key = ('predict', request.resource_type, request.building_id, request.model_type,
+                  request.months_ahead, request.scope, request.granularity, request.intervals,
+                  tuple(request.quantiles or []))
+    result = await SingleFlight.do(flight_key, lambda: Scheduler.inference.run(run_prediction, request))
+    # Starlette renders the body when the response is built, so the span covers the JSON encoding
+    with Tracer.span('serialize', rows=len(result.predictions)) as attributes:
+        response = FastJSONResponse(response_content(result),
+                                    headers=ConditionalGet.headers(*validators) if validators is not None else None)
+        attributes['bytes'] = len(response.body)
+    return response
+
+@app.post("/anomalies/ingest")
+async def ingest_anomaly_readings(request: AnomalyIngestRequest):
+    """Score pushed readings against each building's running statistics and latest forecast"""
+    return await Scheduler.inference.run(AnomalyService.ingest, request)
+
+@app.post("/anomalies/pull")
+async def pull_anomaly_readings(resource_type: Optional[str] = None):
+    """Score rows added to the resource tables since the last pull (the first pull only sets the watermark)"""
+    if resource_type is not None and resource_type not in RESOURCE_MAPPING:
+        raise HTTPException(status_code=400, detail=f"Invalid resource type: {resource_type}")
+    results = {}
+    for resource in [resource_type] if resource_type else RESOURCE_MAPPING:
+        results[resource] = await Scheduler.inference.run(AnomalyService.pull, resource)
+    return results
+
+@app.get("/anomalies")
+async def list_anomalies(resource_type: Optional[str] = None, building_id: Optional[str] = None, limit: int = 100):
+    """Most recent anomalies, newest first"""
+    return {'anomalies': AnomalyService.recent(resource_type, building_id, limit), **AnomalyService.stats()}
+
+def run_batch_forecast(request: BatchForecastRequest) -> Dict[str, Any]:
+    """Forecast many buildings' state models in one vectorized pass (blocking, runs off the event loop)"""
+    if request.resource_type not in RESOURCE_MAPPING:
+        raise HTTPException(status_code=400, detail=f"Invalid resource type: {request.resource_type}")
+    if request.model_type not in STATE_MODEL_TYPES:
+        raise HTTPException(status_code=400, detail=f"Batch forecasts need a state model type: {STATE_MODEL_TYPES}")
+    if request.months_ahead < 1:
+        raise HTTPException(status_code=400, detail="months_ahead must be at least 1")
+    
+    building_ids = request.building_ids or ModelIndex.buildings(request.resource_type, request.model_type)
+    states, found, missing = [], [], []
+    for building_id in building_ids:
+        model_path = ModelManager.get_model_path(request.resource_type, str(building_id), request.model_type)
+        if not model_path.exists():
+            missing.append(str(building_id))
+            continue
+        state, _ = ModelManager.load_model(model_path, cache=False)
+        states.append(state)
+        found.append(str(building_id))
+    
+    if request.catch_up and states:
+        # One panel read; each building folds in only the months after its state
+        panel = DataLoader.load_panel(request.resource_type)
+        periods, values = SeasonalState.series(panel)
+        rows = panel.groupby('BuildingId', sort=False).indices
+        for i, building_id in enumerate(found):
+            if building_id in rows:
+                states[i] = states[i].update(periods[rows[building_id]], values[rows[building_id]])
+    
+    forecasts = np.maximum(SeasonalState.forecast_many(states, request.months_ahead), 0) if states else np.zeros((0, 0))
+    buildings = {}
+    for building_id, state, forecast in zip(found, states, safe_float_array(forecasts).tolist()):
+        start = state.period + 1
+        buildings[building_id] = {'start': f"{start // 12}-{start % 12 + 1:02d}", 'predictions': forecast}
+    return {
+        'resource_type': request.resource_type,
+        'model_type': request.model_type,
+        'months_ahead': request.months_ahead,
+        'buildings': buildings,
+        'missing': missing
+    }
+
+@app.post("/forecast/batch")
+async def forecast_batch(request: BatchForecastRequest):
+    """Monthly forecasts for many buildings from their snaive or Holt-Winters states"""
+    return await Scheduler.inference.run(run_batch_forecast, request)
+
+def run_carbon_forecast(request: CarbonForecastRequest) -> Dict[str, Any]:
+    """Monthly emission projections for many buildings and resources (blocking, runs off the event loop)
+    
+    Each resource is one panel read. A building's stored state model is caught up on the
+    panel, or fitted from it when there is none, and every state is forecast onto one
+    month axis shared by all resources (the month after the newest data) in a single
+    vectorized pass. Emissions are (usage / 1000) * factor over the whole forecast matrix;
+    the report names each factor's source, as only the electricity default is the backend's.
+    A building whose data ends more than max_stale_months before the newest would be
+    extrapolated across the gap, so it is left out and reported as missing instead.
+    """
+    resource_types = request.resource_types or list(RESOURCE_MAPPING)
+    unknown = [r for r in resource_types + list(request.emission_factors or {}) if r not in RESOURCE_MAPPING]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Invalid resource type: {unknown}")
+    if request.model_type not in STATE_MODEL_TYPES:
+        raise HTTPException(status_code=400, detail=f"Carbon forecasts need a state model type: {STATE_MODEL_TYPES}")
+    if request.months_ahead is None or request.months_ahead < 1:
+        raise HTTPException(status_code=400, detail="months_ahead must be at least 1")
+    if request.max_stale_months is None or request.max_stale_months < 0:
+        raise HTTPException(status_code=400, detail="max_stale_months must not be negative")
+    factors = {**EMISSION_FACTORS, **(request.emission_factors or {})}
+    if any(factors[r] < 0 for r in resource_types):
+        raise HTTPException(status_code=400, detail="Emission factors must not be negative")
+    requested = {str(b) for b in request.building_ids} if request.building_ids else None
+    
+    # resource -> (building ids, states); buildings without enough history are reported as missing
+    series, missing, sources = {}, {}, {}
+    for resource_type in resource_types:
+        try:
+            panel = DataLoader.load_panel(resource_type)
+        except ValueError:
+            series[resource_type], missing[resource_type] = ([], []), sorted(requested or [])
+            continue
+        periods, values = SeasonalState.series(panel)
+        rows = panel.groupby('BuildingId', sort=True).indices
+        building_ids, states, counts = [], [], {'stored': 0, 'fitted': 0}
+        missing[resource_type] = sorted((requested or set()) - set(rows))
+        for building_id, index in rows.items():
+            if requested is not None and building_id not in requested:
+                continue
+            model_path = ModelManager.get_model_path(resource_type, building_id, request.model_type)
+            if model_path.exists():
+                state, _ = ModelManager.load_model(model_path, cache=False)
+                states.append(state.update(periods[index], values[index]))
+                counts['stored'] += 1
+            elif len(index) >= FeatureEngineer.min_rows('month'):
+                states.append(SeasonalState.fit(request.model_type, periods[index], values[index]))
+                counts['fitted'] += 1
+            else:
+                missing[resource_type].append(building_id)
+                continue
+            building_ids.append(building_id)
+        series[resource_type], sources[resource_type] = (building_ids, states), counts
+    
+    # One calendar for every resource; buildings whose data ends earlier forecast further ahead, up to the cap
+    latest = [s.period for _, states in series.values() for s in states]
+    if latest:
+        oldest_allowed = max(latest) - request.max_stale_months
+        for resource_type, (building_ids, states) in series.items():
+            stale = [b for b, state in zip(building_ids, states) if state.period < oldest_allowed]
+            if stale:
+                missing[resource_type] = sorted(missing[resource_type] + stale)
+                current = [(b, state) for b, state in zip(building_ids, states) if state.period >= oldest_allowed]
+                series[resource_type] = ([b for b, _ in current], [state for _, state in current])
+    start = max(latest) + 1 if latest else None
+    axis = np.arange(start, start + request.months_ahead) if latest else np.zeros(0, dtype=np.int64)
+    months = [f"{p // 12}-{p % 12 + 1:02d}" for p in axis.tolist()]
+    
+    buildings: Dict[str, Dict[str, Any]] = {}
+    campus = {'total': np.zeros(len(axis)), 'by_resource': {}, 'usage': {}}
+    for resource_type, (building_ids, states) in series.items():
+        if not states:
+            campus['by_resource'][resource_type] = campus['usage'][resource_type] = [0.0] * len(axis)
+            continue
+        usage = np.maximum(SeasonalState.forecast_periods(states, axis), 0)
+        emissions = usage / 1000 * factors[resource_type]
+        campus['total'] += emissions.sum(axis=0)
+        campus['by_resource'][resource_type] = safe_float_array(emissions.sum(axis=0)).tolist()
+        campus['usage'][resource_type] = safe_float_array(usage.sum(axis=0)).tolist()
+        for building_id, building_emissions, building_usage in zip(
+                building_ids, safe_float_array(emissions).tolist(), safe_float_array(usage).tolist()):
+            entry = buildings.setdefault(building_id, {'total': np.zeros(len(axis)), 'by_resource': {}, 'usage': {}})
+            entry['total'] += building_emissions
+            entry['by_resource'][resource_type] = building_emissions
+            entry['usage'][resource_type] = building_usage
+    for entry in buildings.values():
+        entry['total'] = safe_float_array(entry['total']).tolist()
+    campus['total'] = safe_float_array(campus['total']).tolist()
+    
+    return {
+        'model_type': request.model_type,
+        'unit': 'tCO2e',
+        'months': months,
+        'emission_factors': {r: factors[r] for r in resource_types},
+        # 'request' overrides, 'environment' settings, the 'backend' electricity factor, or unsourced 'placeholder' defaults
+        'emission_factor_sources': {r: 'request' if r in (request.emission_factors or {}) else EMISSION_FACTOR_SOURCES[r]
+                                    for r in resource_types},
+        'campus': campus,
+        'buildings': buildings,
+        'sources': sources,
+        'missing': {r: b for r, b in missing.items() if b}
+    }
+
+@app.post("/forecast/carbon")
+async def forecast_carbon(request: CarbonForecastRequest):
+    """Projected monthly emissions per building and for the campus, from every resource's state models"""
+    return await Scheduler.inference.run(run_carbon_forecast, request)
+
+@app.post("/backtest")
+async def start_backtest(request: BacktestRequest, background_tasks: BackgroundTasks):
+    """Start a rolling-origin backtest over every building of a resource; poll GET /backtest/{run_id}
+    
+    distributed runs are split into one work queue task per building for the shared workers.
+    """
+    run_id = await asyncio.get_running_loop().run_in_executor(None, Backtester.start, request)
+    if request.distributed:
+        tasks = await asyncio.get_running_loop().run_in_executor(None, Backtester.enqueue, run_id, request)
+        return {'run_id': run_id, 'status': 'queued', 'resource_type': request.resource_type, 'tasks': tasks}
+    background_tasks.add_task(Backtester.run, run_id, request)
+    return {'run_id': run_id, 'status': 'queued', 'resource_type': request.resource_type}
+
+@app.get("/backtest")
+async def list_backtests(request: Request, resource_type: Optional[str] = None, limit: int = 20):
+    """Most recent backtest runs"""
+    where, params = ("WHERE resource = %s", (resource_type, max(1, limit))) if resource_type else ("", (max(1, limit),))
+    rows = await AsyncDB.query(
+        f"SELECT * FROM {BACKTEST_RUNS_TABLE} {where} ORDER BY started_at DESC LIMIT %s", params, request=request
+    )
+    return [{**row, 'config': json.loads(row['config'])} for row in rows]
+
+@app.get("/backtest/{run_id}")
+async def get_backtest(run_id: str, request: Request, group_by: Optional[str] = "model_type,horizon",
+                       building_id: Optional[str] = None, model_type: Optional[str] = None):
+    """Run status plus MAPE/RMSE grouped by any of model_type, horizon, origin, building"""
+    groups = [g.strip() for g in (group_by or "").split(",") if g.strip()]
+    unknown = [g for g in groups if g not in BACKTEST_GROUP_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by fields: {unknown}")
+    
+    run = await AsyncDB.query(f"SELECT * FROM {BACKTEST_RUNS_TABLE} WHERE run_id = %s", (run_id,),
+                              fetch='one', request=request)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Backtest {run_id} not found")
+    run['config'] = json.loads(run['config'])
+    if run_id in Backtester._active:
+        run.update(Backtester._active[run_id])
+    
+    query, params = Backtester.summary_query(run_id, groups, building_id, model_type)
+    rows = await AsyncDB.query(query, params, request=request)
+    return {'run': run, 'group_by': groups, 'results': Backtester.summary_rows(rows, groups)}
+
+@app.post("/tasks/train")
+async def enqueue_training(request: TrainBatchRequest):
+    """Queue one training task per building for the shared workers; poll GET /tasks"""
+    if request.resource_type not in RESOURCE_MAPPING:
+        raise HTTPException(status_code=400, detail=f"Invalid resource type: {request.resource_type}")
+    if request.ensemble_weighting not in ENSEMBLE_WEIGHTING:
+        raise HTTPException(status_code=400, detail=f"Invalid ensemble weighting: {request.ensemble_weighting}")
+    if request.granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Invalid granularity: {request.granularity}")
+    
+    building_ids = request.building_ids
+    if not building_ids:
+        query, params = DataLoader.build_buildings_query(request.resource_type)
+        building_ids = [str(row['BuildingId']) for row in await AsyncDB.query(query, params)]
+    
+    def enqueue_all() -> List[Dict[str, Any]]:
+        queued = []
+        for building_id in building_ids:
+            body = TrainRequest(resource_type=request.resource_type, building_id=building_id,
+                                model_types=request.model_types, ensemble_types=request.ensemble_types,
+                                ensemble_weighting=request.ensemble_weighting, granularity=request.granularity)
+            model_resource = ModelManager.model_resource(request.resource_type, request.granularity)
+            task = WorkQueue.enqueue('train', body.model_dump(), dedupe_key=f"train:{model_resource}:{building_id}",
+                                     priority=request.priority)
+            queued.append({'building_id': building_id, **task})
+        return queued
+    
+    tasks = await asyncio.get_running_loop().run_in_executor(None, enqueue_all)
+    deduplicated = sum(task['deduplicated'] for task in tasks)
+    return {
+        'resource_type': request.resource_type,
+        'enqueued': len(tasks) - deduplicated,
+        'deduplicated': deduplicated,
+        'tasks': tasks
+    }
+
+@app.get("/tasks")
+async def list_tasks(status: Optional[str] = None, kind: Optional[str] = None, group_id: Optional[str] = None,
+                     limit: int = 50):
+    """Work queue counts per status and the latest matching tasks"""
+    if status and status not in WORK_QUEUE_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status: {status}")
+    return await asyncio.get_running_loop().run_in_executor(
+        None, WorkQueue.list_tasks, status, kind, group_id, max(1, min(limit, 500))
+    )
+
+@app.get("/tasks/{task_id}")
+async def get_task(task_id: str):
+    task = await asyncio.get_running_loop().run_in_executor(None, WorkQueue.get, task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    return task
+
+@app.get("/stats")
+async def get_stats():
+    """Concurrency counters for request coalescing, training locks, scheduler lanes, queue workers and the fit planner, plus model index, cache and anomaly state size"""
+    return {
+        'singleflight': SingleFlight.stats(),
+        'training_locks': TrainingLocks.stats(),
+        'lanes': Scheduler.stats(),
+        'model_index': ModelIndex.stats(),
+        'model_cache': ModelCache.stats(),
+        'queue_workers': {worker.worker_id: worker.counters for worker in Worker.local},
+        'fit_planner': FitPlanner.stats(),
+        'anomalies': AnomalyService.stats()
+    }
+
 @app.get("/models", response_model=List[ModelInfo])
-async def list_models():
+async def list_models(request: Request):
     """List all trained models"""
+    version, changed_at = ModelIndex.registry_version()
+    etag = ConditionalGet.etag('models', version)
+    if ConditionalGet.not_modified(request, etag, changed_at):
+        return ConditionalGet.response_304(etag, changed_at)
+    
     models = []
     try:
-        for resource_type in RESOURCE_MAPPING.keys():
-            resource_dir = MODELS_DIR / resource_type
+        for resource_type, granularity in [(r, g) for r in RESOURCE_MAPPING.keys() for g in GRANULARITIES]:
+            resource_dir = MODELS_DIR / ModelManager.model_resource(resource_type, granularity)
             if not resource_dir.exists():
                 continue
             
@@ -1565,36 +6200,34 @@ async def list_models():
                     continue
                 
                 # Extract building_id from directory name
-                dir_name = building_dir.name
-                if dir_name.startswith('building_'):
-                    building_id_part = dir_name[9:]
-                    if building_id_part == "0":
-                        building_id = "0"
-                    else:
-                        building_id = building_id_part.replace("_", "-")
-                else:
+                building_id = ModelManager.building_id_of(building_dir.name)
+                if building_id is None:
                     continue
+                scope = 'global' if building_id == GLOBAL_BUILDING_ID else 'building'
+                model_dir = ModelManager.resolve(building_dir)
                 
                 # Check individual models
                 for model_type in MODEL_TYPES:
-                    model_path = building_dir / f"{model_type}_model.pkl"
+                    model_path = model_dir / f"{model_type}_model.pkl"
                     if model_path.exists():
                         try:
-                            _, metadata = ModelManager.load_model(model_path)
+                            metadata = ModelManager.load_metadata(model_path)
                             models.append(ModelInfo(
                                 resource_type=resource_type,
                                 building_id=building_id,
                                 model_type=model_type,
                                 trained_at=metadata.get('trained_at', 'Unknown'),
                                 metrics=safe_dict_conversion(metadata.get('metrics', {})),
-                                data_points=metadata.get('data_points', 0)
+                                data_points=metadata.get('data_points', 0),
+                                scope=scope,
+                                granularity=granularity
                             ))
                         except Exception as e:
                             logger.warning(f"Error loading model metadata: {e}")
                 
                 # Check ensemble models
                 for ensemble_type in ENSEMBLE_TYPES:
-                    metadata_path = building_dir / f'{ensemble_type}_metadata.json'
+                    metadata_path = model_dir / f'{ensemble_type}_metadata.json'
                     if metadata_path.exists():
                         try:
                             with open(metadata_path, 'r') as f:
@@ -1605,7 +6238,9 @@ async def list_models():
                                 model_type=ensemble_type,
                                 trained_at=metadata.get('trained_at', 'Unknown'),
                                 metrics=safe_dict_conversion(metadata.get('metrics', {})),
-                                data_points=metadata.get('data_points', 0)
+                                data_points=metadata.get('data_points', 0),
+                                scope=scope,
+                                granularity=granularity
                             ))
                         except Exception as e:
                             logger.warning(f"Error loading ensemble metadata: {e}")
@@ -1614,17 +6249,103 @@ async def list_models():
         logger.error(f"Error listing models: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
-    return models
+    return FastJSONResponse(response_content(models), headers=ConditionalGet.headers(etag, changed_at))
+
+@app.get("/models/{resource_type}/global/report")
+async def get_global_scope_report(resource_type: str):
+    """Compare the global panel models against per-building models for a resource"""
+    if resource_type not in RESOURCE_MAPPING:
+        raise HTTPException(status_code=400, detail=f"Invalid resource type: {resource_type}")
+    
+    global_dir = ModelManager.get_model_dir(resource_type, GLOBAL_BUILDING_ID)
+    if not global_dir.exists():
+        raise HTTPException(status_code=404, detail=f"No global models found for {resource_type}")
+    
+    def read_metadata(building_dir: Path, model_type: str) -> Optional[Dict]:
+        if model_type in ENSEMBLE_TYPES:
+            metadata_path = building_dir / f'{model_type}_metadata.json'
+            if not metadata_path.exists():
+                return None
+            with open(metadata_path, 'r') as f:
+                return json.load(f)
+        model_path = building_dir / f"{model_type}_model.pkl"
+        return ModelManager.load_metadata(model_path) if model_path.exists() else None
+    
+    try:
+        comparisons = {}
+        for model_type in MODEL_TYPES + ENSEMBLE_TYPES:
+            global_metadata = read_metadata(global_dir, model_type)
+            if global_metadata is None:
+                continue
+            
+            global_mapes, building_mapes = [], []
+            building_fit_seconds, building_bytes = 0.0, 0
+            for building_id, metrics in global_metadata.get('per_building_metrics', {}).items():
+                building_metadata = read_metadata(ModelManager.get_model_dir(resource_type, building_id), model_type)
+                if building_metadata is None:
+                    continue
+                global_mapes.append(metrics['MAPE'])
+                building_mapes.append(building_metadata.get('metrics', {}).get('MAPE', 0.0))
+                building_fit_seconds += building_metadata.get('fit_seconds', 0.0)
+                building_bytes += building_metadata.get('artifact_bytes', 0)
+            
+            entry = {
+                'global': {
+                    'mape': global_metadata.get('metrics', {}).get('MAPE'),
+                    'mean_building_mape': float(np.mean(global_mapes)) if global_mapes else None,
+                    'fit_seconds': global_metadata.get('fit_seconds'),
+                    'artifact_bytes': global_metadata.get('artifact_bytes'),
+                    'buildings': global_metadata.get('buildings', 0)
+                },
+                'building': {
+                    'mean_building_mape': float(np.mean(building_mapes)) if building_mapes else None,
+                    'fit_seconds': building_fit_seconds,
+                    'artifact_bytes': building_bytes,
+                    'buildings': len(building_mapes)
+                }
+            }
+            if building_mapes:
+                gap = entry['global']['mean_building_mape'] - entry['building']['mean_building_mape']
+                entry['mape_gap'] = gap
+                entry['recommendation'] = 'global' if gap <= GLOBAL_SCOPE_MAPE_TOLERANCE else 'building'
+            else:
+                entry['recommendation'] = 'global'
+            comparisons[model_type] = entry
+        
+        if not comparisons:
+            raise HTTPException(status_code=404, detail=f"No global models found for {resource_type}")
+        
+        # Pick per resource by the best model each scope can offer on the shared buildings
+        compared = {mt: c for mt, c in comparisons.items() if c['building']['buildings'] > 0}
+        recommended_scope = 'global'
+        if compared:
+            best_global = min(c['global']['mean_building_mape'] for c in compared.values())
+            best_building = min(c['building']['mean_building_mape'] for c in compared.values())
+            recommended_scope = 'global' if best_global - best_building <= GLOBAL_SCOPE_MAPE_TOLERANCE else 'building'
+        
+        return safe_dict_conversion({
+            'resource_type': resource_type,
+            'mape_tolerance': GLOBAL_SCOPE_MAPE_TOLERANCE,
+            'recommended_scope': recommended_scope,
+            'models': comparisons
+        })
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error building global scope report: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/models/{resource_type}/{building_id}")
-async def get_building_models(resource_type: str, building_id: str):
+async def get_building_models(resource_type: str, building_id: str, granularity: str = 'month'):
     """Get all models for a specific resource type and building"""
     if resource_type not in RESOURCE_MAPPING:
         raise HTTPException(status_code=400, detail=f"Invalid resource type: {resource_type}")
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Invalid granularity: {granularity}")
     
     models = []
-    safe_building_id = building_id.replace("-", "_") if building_id != "0" else "0"
-    building_dir = MODELS_DIR / resource_type / f"building_{safe_building_id}"
+    building_dir = ModelManager.get_model_dir(ModelManager.model_resource(resource_type, granularity), building_id)
     
     if not building_dir.exists():
         raise HTTPException(
@@ -1637,7 +6358,7 @@ async def get_building_models(resource_type: str, building_id: str):
         for model_type in MODEL_TYPES:
             model_path = building_dir / f"{model_type}_model.pkl"
             if model_path.exists():
-                _, metadata = ModelManager.load_model(model_path)
+                metadata = ModelManager.load_metadata(model_path)
                 models.append({
                     'model_type': model_type,
                     'type': 'individual',
@@ -1670,6 +6391,7 @@ async def get_building_models(resource_type: str, building_id: str):
         return {
             'resource_type': resource_type,
             'building_id': building_id,
+            'granularity': granularity,
             'models': models,
             'total_models': len(models)
         }
@@ -1681,23 +6403,29 @@ async def get_building_models(resource_type: str, building_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/models/{resource_type}/{building_id}")
-async def delete_building_models(resource_type: str, building_id: str):
-    """Delete all models for a specific resource type and building"""
+async def delete_building_models(resource_type: str, building_id: str, granularity: str = 'month'):
+    """Delete all models for a specific resource type, building and granularity
+    
+    Publishes an empty version: predictions that already pinned the old one finish
+    against it, and its files are removed after MODEL_VERSION_GRACE_SECONDS.
+    """
     if resource_type not in RESOURCE_MAPPING:
         raise HTTPException(status_code=400, detail=f"Invalid resource type: {resource_type}")
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Invalid granularity: {granularity}")
+    model_resource = ModelManager.model_resource(resource_type, granularity)
     
-    safe_building_id = building_id.replace("-", "_") if building_id != "0" else "0"
-    building_dir = MODELS_DIR / resource_type / f"building_{safe_building_id}"
-    
-    if not building_dir.exists():
+    if not ModelManager.artifacts(ModelManager.get_model_dir(model_resource, building_id)):
         raise HTTPException(
             status_code=404,
             detail=f"No models found for {resource_type}, building {building_id}"
         )
     
     try:
-        import shutil
-        shutil.rmtree(building_dir)
+        # Wait out a training run for the same target rather than racing its publish
+        async with TrainingLocks.hold((model_resource, building_id)):
+            await asyncio.get_running_loop().run_in_executor(None, ModelManager.retire, model_resource, building_id)
+        ModelIndex.refresh(model_resource, building_id)
         return {
             'success': True,
             'message': f"Successfully deleted all models for {resource_type}, building {building_id}"
@@ -1706,71 +6434,165 @@ async def delete_building_models(resource_type: str, building_id: str):
         logger.error(f"Error deleting models: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+class DataInfoCache:
+    """LRU of /data-info payloads, valid for as long as the data watermark is unchanged"""
+    _entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+    
+    @staticmethod
+    def get(key: tuple, watermark: tuple) -> Optional[Dict]:
+        entry = DataInfoCache._entries.get(key)
+        if entry is None or entry[0] != watermark:
+            return None
+        DataInfoCache._entries.move_to_end(key)
+        return entry[1]
+    
+    @staticmethod
+    def put(key: tuple, watermark: tuple, payload: Dict) -> None:
+        DataInfoCache._entries[key] = (watermark, payload)
+        DataInfoCache._entries.move_to_end(key)
+        while len(DataInfoCache._entries) > DATA_INFO_CACHE_SIZE:
+            DataInfoCache._entries.popitem(last=False)
+
+def parse_data_info_fields(fields: Optional[str]) -> List[str]:
+    """Validate the comma-separated ?fields= selector for /data-info"""
+    if not fields:
+        return list(DATA_INFO_FIELDS)
+    selected = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in selected if field not in DATA_INFO_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Valid fields: {', '.join(DATA_INFO_FIELDS)}"
+        )
+    return [field for field in DATA_INFO_FIELDS if field in selected]
+
+def period_to_date(period: int) -> str:
+    """Convert a YYYYMM period computed in SQL to the first day of that month"""
+    period = int(period)
+    return f"{period // 100:04d}-{period % 100:02d}-01"
+
 @app.get("/data-info/{resource_type}")
-async def get_data_info(resource_type: str, building_id: Optional[str] = "0"):
+async def get_data_info(resource_type: str, request: Request, response: Response,
+                        building_id: Optional[str] = "0", fields: Optional[str] = None):
     """Get data information for a resource type and building"""
     if resource_type not in RESOURCE_MAPPING:
         raise HTTPException(status_code=400, detail=f"Invalid resource type: {resource_type}")
     
+    selected_fields = parse_data_info_fields(fields)
+    
     try:
-        df = DataLoader.load_data(resource_type, building_id)
+        # One source for the watermark and the payload, so a cached payload is keyed on what it was built from
+        source = RollupManager.source_for(resource_type)
+        watermark = await ConditionalGet.data_watermark(resource_type, building_id, request, source)
+        etag = ConditionalGet.etag('data-info', resource_type, building_id, tuple(selected_fields), watermark)
+        data_modified = ConditionalGet.observed_at(('data', resource_type, building_id), watermark)
+        if ConditionalGet.not_modified(request, etag, data_modified):
+            return ConditionalGet.response_304(etag, data_modified)
+        response.headers.update(ConditionalGet.headers(etag, data_modified))
         
-        usage_stats = {
-            'min': safe_float_conversion(df['Usage'].min()),
-            'max': safe_float_conversion(df['Usage'].max()),
-            'mean': safe_float_conversion(df['Usage'].mean()),
-            'std': safe_float_conversion(df['Usage'].std())
-        }
+        cache_key = (resource_type, building_id, tuple(selected_fields))
+        cached = DataInfoCache.get(cache_key, watermark)
+        if cached is not None:
+            return cached
         
-        # Create monthly data safely
-        monthly_data = {}
-        for date, usage in df.groupby(df['Date'].dt.strftime('%Y-%m'))['Usage'].sum().items():
-            monthly_data[date] = safe_float_conversion(usage)
+        query, params = DataLoader.build_summary_query(resource_type, building_id, source)
+        pending = [AsyncDB.query(query, params, fetch='one', request=request)]
+        if 'monthly_data' in selected_fields:
+            query, params = DataLoader.build_query(resource_type, building_id, source)
+            pending.append(AsyncDB.query(query, params, request=request))
+        results = await asyncio.gather(*pending)
+        summary = results[0]
         
-        return {
+        months = int(summary['months'] or 0)
+        if months == 0:
+            raise ValueError(f"No data found for resource_type: {resource_type}, building_id: {building_id}")
+        
+        # Sample standard deviation from the SQL sums, in exact decimal arithmetic
+        usage_std = float('nan')
+        if months > 1:
+            total = Decimal(str(summary['usage_sum']))
+            total_sq = Decimal(str(summary['usage_sum_sq']))
+            variance = (total_sq - total * total / months) / (months - 1)
+            usage_std = math.sqrt(max(float(variance), 0.0))
+        
+        payload = {
             'resource_type': resource_type,
-            'building_id': building_id,
-            'total_records': len(df),
-            'date_range': {
-                'start': df['Date'].min().strftime('%Y-%m-%d'),
-                'end': df['Date'].max().strftime('%Y-%m-%d')
-            },
-            'usage_stats': usage_stats,
-            'sufficient_for_training': len(df) >= 13,
-            'monthly_data': monthly_data
+            'building_id': building_id
         }
+        if 'total_records' in selected_fields:
+            payload['total_records'] = months
+        if 'date_range' in selected_fields:
+            payload['date_range'] = {
+                'start': period_to_date(summary['first_period']),
+                'end': period_to_date(summary['last_period'])
+            }
+        if 'usage_stats' in selected_fields:
+            payload['usage_stats'] = {
+                'min': safe_float_conversion(summary['usage_min']),
+                'max': safe_float_conversion(summary['usage_max']),
+                'mean': safe_float_conversion(Decimal(str(summary['usage_sum'])) / months),
+                'std': safe_float_conversion(usage_std)
+            }
+        if 'sufficient_for_training' in selected_fields:
+            payload['sufficient_for_training'] = months >= 13
+        if 'monthly_data' in selected_fields:
+            # Rows are already one per month, so no regrouping is needed
+            payload['monthly_data'] = {
+                f"{int(row['Year']):04d}-{int(row['Month']):02d}": safe_float_conversion(row['Usage'])
+                for row in results[1]
+            }
         
+        DataInfoCache.put(cache_key, watermark, payload)
+        return payload
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting data info: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/rollups/refresh")
+async def refresh_rollups(resource_type: Optional[str] = None, full: bool = False):
+    """Refresh monthly rollups now (incrementally unless full=true)"""
+    if resource_type is not None and resource_type not in RESOURCE_MAPPING:
+        raise HTTPException(status_code=400, detail=f"Invalid resource type: {resource_type}")
+    
+    loop = asyncio.get_running_loop()
+    try:
+        results = []
+        for resource in ([resource_type] if resource_type else RESOURCE_MAPPING):
+            results.append(await loop.run_in_executor(None, RollupManager.refresh, resource, full))
+        return {'success': True, 'results': results}
+    except Exception as e:
+        logger.error(f"Error refreshing rollups: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/rollups/status")
+async def get_rollup_status():
+    """Report rollup age and whether loaders currently read from them"""
+    now = time.time()
+    return {
+        'enabled': ROLLUPS_ENABLED,
+        'max_age_seconds': ROLLUP_MAX_AGE,
+        'resources': {
+            resource_type: {
+                'source': RollupManager.source_for(resource_type),
+                'age_seconds': safe_float_conversion(now - RollupManager._refreshed_at[resource_type])
+                if resource_type in RollupManager._refreshed_at else None
+            }
+            for resource_type in RESOURCE_MAPPING
+        }
+    }
+
 @app.get("/available-buildings/{resource_type}")
-async def get_available_buildings(resource_type: str):
+async def get_available_buildings(resource_type: str, request: Request):
     """Get available buildings with sufficient data for training"""
     if resource_type not in RESOURCE_MAPPING:
         raise HTTPException(status_code=400, detail=f"Invalid resource type: {resource_type}")
     
-    table_name = RESOURCE_MAPPING[resource_type]
-    connection = get_db_connection()
-    
     try:
-        cursor = connection.cursor()
-        query = f"""
-            SELECT
-                BuildingId,
-                COUNT(DISTINCT YEAR(`Date`), MONTH(`Date`)) as monthly_records,
-                SUM(CASE WHEN `Usage` > 0 THEN 1 ELSE 0 END) as non_zero_records,
-                AVG(CASE WHEN `Usage` > 0 THEN `Usage` ELSE NULL END) as avg_usage,
-                MIN(`Date`) as min_date,
-                MAX(`Date`) as max_date
-            FROM {table_name}
-            WHERE `Usage` > 0 AND `Date` IS NOT NULL
-            GROUP BY BuildingId
-            HAVING COUNT(DISTINCT YEAR(`Date`), MONTH(`Date`)) >= 13
-            ORDER BY COUNT(DISTINCT YEAR(`Date`), MONTH(`Date`)) DESC
-        """
-        cursor.execute(query)
-        buildings = cursor.fetchall()
+        query, params = DataLoader.build_buildings_query(resource_type)
+        buildings = await AsyncDB.query(query, params, request=request)
         
         # Safe conversion for buildings data
         safe_buildings = []
@@ -1789,11 +6611,11 @@ async def get_available_buildings(resource_type: str):
             'total_buildings': len(safe_buildings)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting available buildings: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        connection.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,47 @@
+"""Shared setup: main against a fresh SQLite stand-in per test"""
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# main reads its settings at import time
+_workdir = tempfile.mkdtemp(prefix='carbonwise-tests-')
+os.environ.update({
+    'DB_ENGINE': 'sqlite',
+    'SQLITE_PATH': os.path.join(_workdir, 'unused.sqlite3'),
+    'MODELS_DIR': os.path.join(_workdir, 'models'),
+    'LOGS_DIR': os.path.join(_workdir, 'logs'),
+    'ROLLUPS_ENABLED': 'false',
+    'TRACE_EXPORTER': 'none'
+})
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import main  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Empty resource tables in a database of their own; yields a sqlite3 connection for seeding"""
+    path = tmp_path / 'campus.sqlite3'
+    monkeypatch.setattr(main, 'SQLITE_PATH', str(path))
+    connection = sqlite3.connect(path)
+    for table_name in main.RESOURCE_MAPPING.values():
+        connection.execute(f"CREATE TABLE {table_name} (Id TEXT PRIMARY KEY, BuildingId TEXT NOT NULL, "
+                           f"`Date` TEXT, `Usage` REAL)")
+    connection.commit()
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def models(tmp_path, monkeypatch):
+    """Empty MODELS_DIR of its own with a fresh model index; yields the directory"""
+    models_dir = tmp_path / 'models'
+    models_dir.mkdir()
+    monkeypatch.setattr(main, 'MODELS_DIR', models_dir)
+    monkeypatch.setattr(main, 'REGISTRY_VERSION_FILE', models_dir / '.registry_version')
+    for name, value in (('_entries', {}), ('_pooled', {}), ('_built', False), ('_version', None)):
+        monkeypatch.setattr(main.ModelIndex, name, value)
+    yield models_dir
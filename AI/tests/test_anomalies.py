@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+import main
+from main import AnomalyService
+
+BUILDINGS = ['00000000-0000-0000-0000-00000000000a', '00000000-0000-0000-0000-00000000000b']
+
+
+@pytest.fixture
+def anomalies(db, monkeypatch):
+    for name, value in (('_states', {}), ('_forecasts', {}), ('_watermarks', {}), ('_forecasts_pending', set()),
+                        ('_counters', {'readings': 0, 'flagged': 0, 'primed': 0, 'pulled': 0})):
+        monkeypatch.setattr(AnomalyService, name, value)
+    db.executemany("INSERT INTO Electrics VALUES (?, ?, ?, ?)",
+                   [(f'a{day:02d}', BUILDINGS[0], f'2024-01-{day:02d} 00:00:00', 10.0) for day in range(1, 21)])
+    db.commit()
+    AnomalyService.pull('electricity')
+    return db
+
+
+def test_rows_sharing_the_watermark_date_are_not_primed_twice(anomalies):
+    # b's row has the watermark's Date but sorts after its Id, so it is new and must be scored exactly once
+    anomalies.execute("INSERT INTO Electrics VALUES ('b01', ?, '2024-01-20 00:00:00', 7.0)", (BUILDINGS[1],))
+    anomalies.commit()
+
+    assert AnomalyService.pull('electricity')['readings'] == 1
+    state = AnomalyService._states[('electricity', BUILDINGS[1])]
+    assert (state.count, state.mean) == (1, 7.0)
+
+
+def test_concurrent_pulls_read_each_row_once(anomalies, monkeypatch):
+    anomalies.executemany("INSERT INTO Electrics VALUES (?, ?, ?, ?)",
+                          [(f'a{day:02d}', BUILDINGS[0], f'2024-01-{day:02d} 00:00:00', 10.0) for day in range(21, 31)])
+    anomalies.commit()
+    score = AnomalyService.score
+
+    def slow_score(*args, **kwargs):
+        time.sleep(0.2)
+        return score(*args, **kwargs)
+    monkeypatch.setattr(AnomalyService, 'score', slow_score)
+
+    threads = [threading.Thread(target=AnomalyService.pull, args=('electricity',)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert AnomalyService._counters['pulled'] == 10
+    assert AnomalyService._states[('electricity', BUILDINGS[0])].count == 30
+
+
+def test_forecast_for_a_new_building_is_requested_off_the_scoring_path(anomalies, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_prediction(request):
+        started.set()
+        release.wait(5)
+        AnomalyService.record_forecast(request.resource_type, request.building_id,
+                                       [{'year': 2024, 'month': 2, 'predicted_usage': 300.0}])
+    monkeypatch.setattr(main, 'run_prediction', slow_prediction)
+    monkeypatch.setattr(main.ModelIndex, 'select', lambda resource_type, building_id, scope='building': {})
+
+    result = AnomalyService.score('electricity', [(BUILDINGS[1], main.datetime(2024, 2, 1), 9.0)])
+    assert result['primed'] == 1 and started.wait(5)
+    state = AnomalyService._states[('electricity', BUILDINGS[1])]
+    assert state.forecast == {}
+
+    release.set()
+    AnomalyService._forecast_executor.submit(lambda: None).result(5)
+    assert state.forecast == {2024 * 12 + 1: 300.0}
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import main
+from main import ModelIndex, Predictor
+
+
+def test_conformal_quantile_needs_enough_residuals_for_the_tail():
+    residuals = np.arange(1, 10, dtype=float)  # 9 residuals
+    assert Predictor.conformal_quantile(residuals, 0.9) == 9.0
+    assert Predictor.conformal_quantile(residuals, 0.1) == 1.0
+    # (n + 1) * 0.95 = 9.5 rounds past the largest residual
+    assert Predictor.conformal_quantile(residuals, 0.95) is None
+
+
+def test_own_relative_residuals_scale_with_the_forecast(monkeypatch):
+    monkeypatch.setattr(main, 'BAND_MIN_RESIDUALS', 9)
+    metadata = {'holdout_relative_residuals': np.linspace(-0.2, 0.2, 9).tolist()}
+    offsets, method = Predictor.residual_offsets(np.array([100.0, 200.0]), metadata, 'xgb', [0.1, 0.9])
+    assert method == 'conformal'
+    assert np.allclose(offsets[0.1], [-20.0, -40.0]) and np.allclose(offsets[0.9], [20.0, 40.0])
+
+
+def test_few_residuals_borrow_the_pooled_ones(monkeypatch):
+    monkeypatch.setattr(main, 'BAND_MIN_RESIDUALS', 20)
+    monkeypatch.setattr(ModelIndex, 'pooled_residuals', staticmethod(
+        lambda resource, model_type: np.arange(-49, 50) / 500 if (resource, model_type) == ('water', 'gb') else np.zeros(0)))
+    metadata = {'resource_type': 'water', 'scope': 'building', 'holdout_relative_residuals': [0.5, -0.5, 0.4]}
+
+    offsets, method = Predictor.residual_offsets(np.array([50.0]), metadata, 'gb', [0.1, 0.9])
+    assert method == 'conformal_pooled'
+    assert offsets[0.1][0] == pytest.approx(-4.0) and offsets[0.9][0] == pytest.approx(4.0)
+
+    assert Predictor.residual_offsets(np.array([50.0]), metadata, 'xgb', [0.1, 0.9]) == (None, 'insufficient_residuals')
+
+
+def test_index_pools_every_buildings_residuals(monkeypatch):
+    monkeypatch.setattr(ModelIndex, 'ensure_current', staticmethod(lambda: None))
+    monkeypatch.setattr(ModelIndex, '_pooled', {})
+    monkeypatch.setattr(ModelIndex, '_entries', {
+        ('electricity', 'a'): {'xgb': {'MAPE': 1.0, 'cost': 1, 'relative_residuals': np.array([0.1, 0.2])}},
+        ('electricity', 'b'): {'xgb': {'MAPE': 1.0, 'cost': 1, 'relative_residuals': np.array([0.3])}},
+        ('electricity', main.GLOBAL_BUILDING_ID): {'xgb': {'MAPE': 1.0, 'cost': 1, 'relative_residuals': np.array([9.0])}},
+        ('water', 'a'): {'xgb': {'MAPE': 1.0, 'cost': 1, 'relative_residuals': np.array([5.0])}}
+    })
+    assert sorted(ModelIndex.pooled_residuals('electricity', 'xgb').tolist()) == pytest.approx([0.1, 0.2, 0.3])
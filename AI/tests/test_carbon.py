@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+import main
+
+CURRENT, STALE = '00000000-0000-0000-0000-00000000000a', '00000000-0000-0000-0000-00000000000b'
+
+
+@pytest.fixture
+def campus(db):
+    # three years of monthly readings; the stale building stops reporting half a year early
+    for building_id, end in ((CURRENT, '2024-12-01'), (STALE, '2024-06-01')):
+        months = pd.date_range('2022-01-01', end, freq='MS')
+        db.executemany("INSERT INTO Electrics VALUES (?, ?, ?, ?)",
+                       [(f'{building_id}-{i}', building_id, month.strftime('%Y-%m-%d 00:00:00'), 1000.0 + 100 * (i % 12))
+                        for i, month in enumerate(months)])
+    db.commit()
+    return db
+
+
+def test_stale_buildings_are_reported_missing_not_extrapolated(campus):
+    report = main.run_carbon_forecast(main.CarbonForecastRequest(resource_types=['electricity'], months_ahead=3))
+
+    assert report['months'][0] == '2025-01'
+    assert report['missing']['electricity'] == [STALE]
+    assert STALE not in report['buildings']
+    assert report['campus']['total'] == pytest.approx(report['buildings'][CURRENT]['total'])
+
+
+def test_a_wider_staleness_cap_keeps_the_building(campus):
+    report = main.run_carbon_forecast(main.CarbonForecastRequest(
+        resource_types=['electricity'], months_ahead=3, max_stale_months=6))
+
+    assert 'electricity' not in report['missing']
+    assert set(report['buildings']) == {CURRENT, STALE}
+
+
+@pytest.mark.parametrize('field', [{'months_ahead': None}, {'months_ahead': 0}, {'max_stale_months': None}])
+def test_invalid_horizons_are_rejected(db, field):
+    with pytest.raises(HTTPException) as error:
+        main.run_carbon_forecast(main.CarbonForecastRequest(resource_types=['electricity'], **field))
+    assert error.value.status_code == 400
+
+
+def test_report_names_where_each_emission_factor_comes_from(campus):
+    report = main.run_carbon_forecast(main.CarbonForecastRequest(
+        resource_types=['electricity', 'water', 'paper'], months_ahead=1, emission_factors={'water': 0.5}))
+
+    assert report['emission_factors']['water'] == 0.5
+    assert report['emission_factor_sources'] == {'electricity': 'backend', 'water': 'request', 'paper': 'placeholder'}
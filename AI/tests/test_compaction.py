@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from main import CompactForest, ModelTrainer
+
+
+@pytest.fixture(scope='module')
+def forest():
+    rng = np.random.RandomState(0)
+    X = rng.normal(size=(400, 5)).astype(np.float32)
+    y = 1000 + 200 * X[:, 0] + 50 * X[:, 1] ** 2 + rng.normal(0, 5, 400)
+    model = RandomForestRegressor(n_estimators=30, max_depth=8, random_state=0).fit(X[:300], y[:300])
+    return model, X[300:], y[300:]
+
+
+def test_lossless_compaction_matches_the_forest(forest):
+    model, X_test, _ = forest
+    compact = CompactForest.from_forest(model)
+    # Leaves are stored as float32; thresholds are exact for float32 inputs
+    assert np.allclose(compact.predict(X_test), model.predict(X_test), rtol=1e-6)
+
+
+@pytest.mark.parametrize('tolerance', [0.5, 5.0, 50.0])
+def test_merged_leaves_stay_within_tolerance(forest, tolerance):
+    model, X_test, _ = forest
+    compact = CompactForest.from_forest(model, tolerance=tolerance)
+    lossless = CompactForest.from_forest(model)
+
+    assert len(compact.value) < len(lossless.value)
+    # Every merged leaf moves by at most the span of the leaves it replaced
+    change = np.abs(compact.predict(X_test) - model.predict(X_test))
+    assert change.max() <= tolerance + 1e-3
+
+
+def test_compact_forest_reports_the_prediction_change(forest):
+    model, X_test, y_test = forest
+    compact, report = ModelTrainer(n_jobs=1).compact_forest(model, X_test, pd.Series(y_test))
+
+    change = np.abs(compact.predict(X_test) - model.predict(X_test)).max()
+    assert report['max_abs_prediction_change'] == pytest.approx(change, abs=1e-3)
+    assert change <= report['leaf_tolerance'] + 1e-3
+    assert report['trees_kept'] == report['trees_total']
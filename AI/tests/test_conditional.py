@@ -0,0 +1,75 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+import main
+from main import ConditionalGet, RollupManager
+
+BUILDING = '00000000-0000-0000-0000-000000000001'
+
+
+def request(method, if_none_match):
+    return Request({'type': 'http', 'method': method, 'path': '/', 'query_string': b'',
+                    'headers': [(b'if-none-match', if_none_match.encode())]})
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    monkeypatch.setattr(main, 'ROLLUPS_ENABLED', True)
+    monkeypatch.setattr(RollupManager, '_refreshed_at', {})
+    monkeypatch.setattr(main.DataInfoCache, '_entries', main.OrderedDict())
+    monkeypatch.setattr(ConditionalGet, '_watermarks', main.OrderedDict())
+    db.executemany("INSERT INTO Electrics VALUES (?, ?, ?, ?)",
+                   [(f'r{month}', BUILDING, f'2024-{month:02d}-01 00:00:00', 10.0 + month) for month in range(1, 13)])
+    db.commit()
+    RollupManager.bootstrap()
+    return TestClient(main.app)
+
+
+def test_data_info_etag_survives_rollup_refreshes(client, db):
+    RollupManager.refresh('electricity')
+    etag = client.get(f'/data-info/electricity?building_id={BUILDING}').headers['etag']
+
+    RollupManager.refresh('electricity')
+    response = client.get(f'/data-info/electricity?building_id={BUILDING}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+def test_rollup_sourced_data_info_changes_with_the_rollup_not_the_raw_table(client, db):
+    RollupManager.refresh('electricity', True)
+    first = client.get(f'/data-info/electricity?building_id={BUILDING}')
+    assert first.json()['total_records'] == 12
+
+    # Not rolled up yet: the payload still comes from the rollups, and so does its ETag
+    db.execute("INSERT INTO Electrics VALUES ('late', ?, '2025-01-10 00:00:00', 3.0)", (BUILDING,))
+    db.commit()
+    response = client.get(f'/data-info/electricity?building_id={BUILDING}', headers={'If-None-Match': first.headers['etag']})
+    assert response.status_code == 304
+
+    RollupManager.refresh('electricity', True)
+    response = client.get(f'/data-info/electricity?building_id={BUILDING}', headers={'If-None-Match': first.headers['etag']})
+    assert response.status_code == 200 and response.headers['etag'] != first.headers['etag']
+    assert response.json()['total_records'] == 13
+
+
+def test_raw_watermark_is_reused_for_its_ttl(client, db, monkeypatch):
+    monkeypatch.setattr(main, 'ROLLUPS_ENABLED', False)
+    etag = client.get(f'/data-info/electricity?building_id={BUILDING}').headers['etag']
+    db.execute("INSERT INTO Electrics VALUES ('late', ?, '2025-01-10 00:00:00', 3.0)", (BUILDING,))
+    db.commit()
+
+    response = client.get(f'/data-info/electricity?building_id={BUILDING}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    monkeypatch.setattr(main, 'DATA_WATERMARK_TTL', 0)
+    response = client.get(f'/data-info/electricity?building_id={BUILDING}', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.json()['total_records'] == 13
+
+
+def test_star_is_not_modified_only_for_get_and_head():
+    assert ConditionalGet.not_modified(request('GET', '*'), '"a"')
+    assert ConditionalGet.not_modified(request('HEAD', '*'), '"a"')
+    assert not ConditionalGet.not_modified(request('POST', '*'), '"a"')
+    assert ConditionalGet.precondition_failed(request('POST', '*'))
+    assert not ConditionalGet.precondition_failed(request('GET', '*'))
+    assert not ConditionalGet.precondition_failed(request('POST', '"a"'))
@@ -0,0 +1,71 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+from threadpoolctl import ThreadpoolController
+
+import main
+from main import ENSEMBLE_WEIGHTS, ModelTrainer
+
+
+def test_nnls_weights_come_from_validation_not_holdout():
+    y_test = pd.Series([10.0, 20.0, 30.0])
+    # rf is perfect on the holdout, xgb on the validation rows
+    holdout = {'rf': np.array([10.0, 20.0, 30.0]), 'xgb': np.array([0.0, 0.0, 0.0])}
+    validation = ({'rf': np.array([0.0, 0.0]), 'xgb': np.array([5.0, 7.0])}, np.array([5.0, 7.0]))
+
+    pred, metrics, weights = ModelTrainer.create_ensemble(holdout, y_test, 'rf_xgb', 'nnls', validation)
+    assert weights['rf'] == 0 and np.isclose(weights['xgb'], 1.0)
+    # Scored on the untouched holdout, where these weights are poor
+    assert metrics['MAPE'] > 90
+
+
+def test_nnls_without_validation_uses_fixed_weights():
+    holdout = {'rf': np.array([10.0, 20.0]), 'xgb': np.array([12.0, 18.0])}
+    _, _, weights = ModelTrainer.create_ensemble(holdout, pd.Series([11.0, 19.0]), 'rf_xgb', 'nnls')
+    assert np.allclose(list(weights.values()), np.array(ENSEMBLE_WEIGHTS['rf_xgb']) / sum(ENSEMBLE_WEIGHTS['rf_xgb']))
+
+
+def test_validation_predictions_hold_out_last_training_rows_per_group():
+    rng = np.random.RandomState(0)
+    X = rng.normal(size=(30, 3)).astype(np.float32)
+    y = pd.Series(X[:, 0] * 10 + 50)
+    groups = np.repeat(['a', 'b'], 15)
+
+    predictions, y_validation = ModelTrainer(n_jobs=1).validation_predictions(
+        X, y, ['rf'], ['f0', 'f1', 'f2'], validation_rows=2, groups=groups)
+    assert np.allclose(y_validation, y.values[[13, 14, 28, 29]])
+    assert predictions['rf'].shape == (4,)
+
+
+def test_xgb_hist_ensembles_train(db):
+    building = '00000000-0000-0000-0000-000000000001'
+    rng = np.random.RandomState(1)
+    db.executemany("INSERT INTO Electrics VALUES (?, ?, ?, ?)",
+                   [(f'r{i}', building, f'{2021 + i // 12}-{i % 12 + 1:02d}-01 00:00:00',
+                     1000 + 200 * np.sin(i / 12 * 2 * np.pi) + rng.normal(0, 20)) for i in range(40)])
+    db.commit()
+
+    response = main.run_training(main.TrainRequest(
+        resource_type='electricity', building_id=building, model_types=['rf', 'hgb', 'xgb_hist'],
+        ensemble_types=['rf_xgb_hist', 'hgb_xgb_hist'], ensemble_weighting='nnls'))
+    assert {'rf_xgb_hist', 'hgb_xgb_hist'} <= set(response.models_trained)
+
+
+def test_concurrent_openmp_limits_leave_the_runtime_as_found():
+    before = [lib['num_threads'] for lib in ThreadpoolController().select(user_api='openmp').info()]
+    rng = np.random.RandomState(0)
+    X, y = rng.normal(size=(200, 4)), pd.Series(rng.normal(size=200))
+
+    def fit(n_jobs):
+        trainer = ModelTrainer(n_jobs=n_jobs)
+        with trainer.openmp_limit():
+            HistGradientBoostingRegressor(max_iter=20).fit(X, y)
+
+    threads = [threading.Thread(target=fit, args=(n,)) for n in (1, 2, 1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [lib['num_threads'] for lib in ThreadpoolController().select(user_api='openmp').info()] == before
@@ -0,0 +1,16 @@
+from main import FitPlanner
+
+
+def test_batches_of_small_fits_spread_over_processes():
+    plan = FitPlanner.plan([60] * 40, cores=8)
+    assert (plan['mode'], plan['processes'], plan['threads_per_fit']) == ('processes', 8, 1)
+
+
+def test_processes_leave_the_inference_cores_free(monkeypatch):
+    monkeypatch.setattr(FitPlanner, 'reserved_cores', 6)
+    plan = FitPlanner.plan([60] * 40, cores=8)
+    assert (plan['mode'], plan['processes'], plan['reserved_cores']) == ('processes', 2, 6)
+
+    # With every core reserved the batch stays in process, where fits yield to inference between chunks
+    monkeypatch.setattr(FitPlanner, 'reserved_cores', 8)
+    assert FitPlanner.plan([60] * 40, cores=8)['mode'] == 'in_process'
@@ -0,0 +1,31 @@
+import pandas as pd
+
+from main import DataLoader, FeatureEngineer
+
+BUILDING = '00000000-0000-0000-0000-000000000001'
+
+
+def seed_days(db, days, usage_of=lambda i: 100.0 + i):
+    db.executemany("INSERT INTO Electrics VALUES (?, ?, ?, ?)",
+                   [(f'r{i}', BUILDING, f'{day:%Y-%m-%d} 09:00:00', usage_of(i))
+                    for i, day in enumerate(pd.date_range('2024-01-01', '2024-03-31')) if i in days])
+    db.commit()
+
+
+def test_day_lags_count_calendar_days_across_a_gap(db):
+    seed_days(db, set(range(91)) - {40, 41})
+    df = DataLoader.load_data('electricity', BUILDING, 'day')
+    assert len(df) == 91 and df['Date'].diff().dropna().eq(pd.Timedelta(days=1)).all()
+    # The missing days are interpolated between their neighbours
+    assert df['Usage'].iloc[40] == 140.0
+
+    features = FeatureEngineer.create_features(df, 'electricity', 'day').set_index('Date')
+    assert features.loc['2024-02-20', 'Usage_Lag7'] == features.loc['2024-02-13', 'Usage']
+
+
+def test_every_partial_week_is_scaled_to_seven_days(db):
+    # 2024-01-01 is a Monday; the week of 2024-02-05 is missing Saturday and Sunday, the last week is cut short
+    seed_days(db, set(range(88)) - {40, 41}, usage_of=lambda i: 10.0)
+    df = DataLoader.load_data('electricity', BUILDING, 'week').set_index('Date')
+    assert (df['Usage'] == 70.0).all()
+    assert len(df) == 13
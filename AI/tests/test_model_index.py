@@ -0,0 +1,60 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from main import ModelIndex, ModelManager
+
+BUILDING = '00000000-0000-0000-0000-00000000000a'
+
+
+def publish(mapes, seed=False):
+    """Publish a version holding a stub artifact and holdout MAPE per model type"""
+    version_dir = ModelManager.stage('electricity', BUILDING, seed=seed)
+    for model_type, mape in mapes.items():
+        if model_type not in main.ENSEMBLE_TYPES:
+            (version_dir / f'{model_type}_model.pkl').write_bytes(b'')
+        metrics = {} if mape is None else {'MAPE': mape}
+        (version_dir / f'{model_type}_metadata.json').write_text(json.dumps({'metrics': metrics}))
+    ModelManager.publish(version_dir)
+    ModelIndex.refresh('electricity', BUILDING)
+
+
+def test_ties_go_to_the_cheapest_model(models):
+    # xgb is best, but hw is within AUTO_MAPE_TIE and runs no estimators
+    publish({'xgb': 5.0, 'hw': 5.0 + main.AUTO_MAPE_TIE / 2, 'rf': 5.05, 'rf_xgb': 4.99})
+
+    selection = ModelIndex.select('electricity', BUILDING)
+    assert selection['model_type'] == 'hw'
+    assert selection['tied'] == ['hw', 'rf', 'xgb', 'rf_xgb']
+
+
+def test_equal_cost_ties_follow_model_type_order(models):
+    publish({'xgb': 5.0, 'rf': 5.05, 'gb': 9.0})
+
+    assert ModelIndex.select('electricity', BUILDING)['model_type'] == 'rf'
+
+
+def test_selection_follows_retraining_and_deletion(models):
+    publish({'rf': 5.0, 'xgb': 6.0})
+    assert ModelIndex.select('electricity', BUILDING)['model_type'] == 'rf'
+
+    # The next version keeps rf and adds a clearly better xgb
+    publish({'xgb': 2.0}, seed=True)
+    selection = ModelIndex.select('electricity', BUILDING)
+    assert (selection['model_type'], selection['candidates']) == ('xgb', 2)
+
+    ModelManager.retire('electricity', BUILDING)
+    ModelIndex.refresh('electricity', BUILDING)
+    assert ModelIndex.select('electricity', BUILDING) is None
+
+
+def test_auto_without_holdout_metrics_is_404(models):
+    publish({'rf': None})
+
+    assert ModelIndex.select('electricity', BUILDING) is None
+    with pytest.raises(HTTPException) as error:
+        main.run_prediction(main.PredictRequest(resource_type='electricity', building_id=BUILDING,
+                                                model_type=main.AUTO_MODEL_TYPE))
+    assert error.value.status_code == 404
@@ -0,0 +1,76 @@
+import os
+import time
+
+import main
+from main import ModelManager
+
+BUILDING = '00000000-0000-0000-0000-00000000000a'
+
+
+def train(model, seed=True):
+    """Stage a version holding an rf artifact and publish it, like one /train run"""
+    version_dir = ModelManager.stage('electricity', BUILDING, seed=seed)
+    ModelManager.save_model(model, version_dir / 'rf_model.pkl', {'metrics': {'MAPE': 1.0}})
+    ModelManager.publish(version_dir)
+    return version_dir
+
+
+def age(directory, seconds):
+    past = time.time() - seconds
+    os.utime(directory, (past, past))
+
+
+def test_publish_switches_current(models):
+    first = train({'trees': 1})
+    building_dir = first.parent.parent
+    assert ModelManager.current_version(building_dir) == first.name
+
+    second = train({'trees': 2})
+    assert ModelManager.current_version(building_dir) == second.name
+    assert ModelManager.get_model_dir('electricity', BUILDING) == second
+    assert ModelManager.load_model(ModelManager.get_model_path('electricity', BUILDING, 'rf'))[0] == {'trees': 2}
+
+
+def test_discarded_stage_leaves_current_untouched(models):
+    published = train({'trees': 1})
+    staged = ModelManager.stage('electricity', BUILDING)
+    # Seeded from the live version by links, then abandoned (a failed training run)
+    assert (staged / 'rf_model.pkl').exists()
+
+    ModelManager.discard(staged)
+    assert not staged.exists()
+    assert ModelManager.current_version(published.parent.parent) == published.name
+    # Discarding the version that is current is a no-op
+    ModelManager.discard(published)
+    assert ModelManager.load_model(published / 'rf_model.pkl')[0] == {'trees': 1}
+
+
+def test_pinned_reader_survives_retire_until_the_grace_period(models, monkeypatch):
+    monkeypatch.setattr(main, 'MODEL_VERSION_GRACE_SECONDS', 60)
+    first = train({'trees': 1})
+    pinned = ModelManager.get_model_path('electricity', BUILDING, 'rf')
+
+    ModelManager.retire('electricity', BUILDING)
+    assert not ModelManager.get_model_path('electricity', BUILDING, 'rf').exists()
+    # Still inside the grace period: the reader that resolved before the delete keeps its version
+    assert ModelManager.gc(first.parent.parent) == 0
+    assert ModelManager.load_model(pinned, cache=False)[0] == {'trees': 1}
+
+    age(first, 120)
+    assert ModelManager.gc(first.parent.parent) == 1
+    assert not first.exists()
+
+
+def test_legacy_artifacts_are_removed_after_the_grace_period(models, monkeypatch):
+    monkeypatch.setattr(main, 'MODEL_VERSION_GRACE_SECONDS', 60)
+    building_dir = ModelManager.get_building_dir('electricity', BUILDING)
+    ModelManager.save_model({'trees': 0}, building_dir / 'rf_model.pkl', {})
+    assert ModelManager.get_model_dir('electricity', BUILDING) == building_dir
+
+    train({'trees': 1})
+    assert (building_dir / 'rf_model.pkl').exists()
+
+    age(building_dir / ModelManager.LEGACY_RETIRED, 120)
+    ModelManager.gc(building_dir)
+    assert not (building_dir / 'rf_model.pkl').exists()
+    assert ModelManager.load_model(ModelManager.get_model_path('electricity', BUILDING, 'rf'))[0] == {'trees': 1}
@@ -0,0 +1,77 @@
+import pytest
+
+import main
+from main import RollupManager
+
+RESOURCE = 'electricity'
+BUILDINGS = ['00000000-0000-0000-0000-000000000001', '00000000-0000-0000-0000-000000000002']
+
+
+@pytest.fixture
+def rollups(db, monkeypatch):
+    monkeypatch.setattr(main, 'ROLLUPS_ENABLED', True)
+    monkeypatch.setattr(RollupManager, '_refreshed_at', {})
+    monkeypatch.setattr(RollupManager, '_verify_cursor', {})
+    rows = [(f'{b}-{year}-{month}-{day}', building_id, f'{year}-{month:02d}-{day:02d} 00:00:00', 10.0 * (b + 1) + month)
+            for b, building_id in enumerate(BUILDINGS)
+            for year in (2023, 2024) for month in range(1, 13) for day in (1, 15)]
+    db.executemany("INSERT INTO Electrics VALUES (?, ?, ?, ?)", rows)
+    db.commit()
+    RollupManager.bootstrap()
+    return db
+
+
+def rollup_rows(db):
+    return sorted(db.execute(f"SELECT BuildingId, year, month, usage_sum, row_count FROM {main.ROLLUP_TABLE} "
+                             f"WHERE resource = ?", (RESOURCE,)).fetchall())
+
+
+def source_rows(db):
+    return sorted(db.execute("SELECT BuildingId, CAST(substr(`Date`, 1, 4) AS INT), CAST(substr(`Date`, 6, 2) AS INT), "
+                             "SUM(`Usage`), COUNT(*) FROM Electrics WHERE `Usage` > 0 "
+                             "GROUP BY 1, 2, 3").fetchall())
+
+
+def test_full_then_incremental_refresh_matches_source(rollups):
+    assert RollupManager.refresh(RESOURCE)['mode'] == 'full'
+    assert rollup_rows(rollups) == source_rows(rollups)
+
+    rollups.execute("INSERT INTO Electrics VALUES ('new', ?, '2024-12-20 00:00:00', 5.0)", (BUILDINGS[0],))
+    rollups.commit()
+    result = RollupManager.refresh(RESOURCE)
+    assert result['mode'] == 'incremental'
+    assert result['from'] == '2024-10-01 00:00:00'
+    assert rollup_rows(rollups) == source_rows(rollups)
+
+
+def test_prefix_is_verified_in_bounded_chunks(rollups, monkeypatch):
+    monkeypatch.setattr(main, 'ROLLUP_VERIFY_MONTHS', 2)
+    RollupManager.refresh(RESOURCE)
+    # An edit to an old month is found by the chunk that covers it, not by a whole-table scan
+    rollups.execute("UPDATE Electrics SET `Usage` = 500 WHERE `Date` = '2023-03-15 00:00:00'")
+    rollups.commit()
+
+    assert RollupManager.refresh(RESOURCE)['stale_months'] == []
+    assert RollupManager.refresh(RESOURCE)['stale_months'] == ['2023-03']
+    assert rollup_rows(rollups) == source_rows(rollups)
+
+
+def test_backfilled_month_inside_prefix_is_added(rollups, monkeypatch):
+    monkeypatch.setattr(main, 'ROLLUP_VERIFY_MONTHS', 24)
+    rollups.execute("DELETE FROM Electrics WHERE `Date` LIKE '2023-06-%'")
+    rollups.commit()
+    RollupManager.refresh(RESOURCE)
+    rollups.execute("INSERT INTO Electrics VALUES ('backfill', ?, '2023-06-10 00:00:00', 42.0)", (BUILDINGS[1],))
+    rollups.commit()
+
+    assert RollupManager.refresh(RESOURCE)['stale_months'] == ['2023-06']
+    assert rollup_rows(rollups) == source_rows(rollups)
+
+
+def test_other_processes_refresh_is_adopted(rollups, monkeypatch):
+    RollupManager.refresh(RESOURCE)
+    monkeypatch.setattr(RollupManager, '_refreshed_at', {})
+    assert RollupManager.source_for(RESOURCE) == 'raw'
+
+    RollupManager.sync_state()
+    assert RollupManager.source_for(RESOURCE) == 'rollup'
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from main import Lane, TrainingLocks
+
+
+def test_call_waiting_on_guard_holds_no_slot():
+    async def scenario():
+        lane = Lane('test', concurrency=2, max_queue=10)
+        finished = {}
+
+        async def call(name, key, seconds):
+            await lane.run(time.sleep, seconds, guard=TrainingLocks.hold(key))
+            finished[name] = time.perf_counter()
+
+        started = time.perf_counter()
+        first = asyncio.create_task(call('a1', ('electricity', 'a'), 0.3))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(call('a2', ('electricity', 'a'), 0.05))
+        await asyncio.sleep(0.05)
+        # a2 waits for a1's lock; with only a1 holding a slot, b gets the other one at once
+        assert lane.waiting == 1 and lane.running == 1
+        await call('b', ('electricity', 'b'), 0.05)
+        await asyncio.gather(first, second)
+        return {name: at - started for name, at in finished.items()}
+
+    finished = asyncio.run(scenario())
+    assert finished['b'] < finished['a1'] < finished['a2']
+
+
+def test_queue_bound_counts_guard_waiters():
+    async def scenario():
+        lane = Lane('test', concurrency=1, max_queue=1)
+        holder = asyncio.create_task(lane.run(time.sleep, 0.2, guard=TrainingLocks.hold(('water', 'x'))))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.create_task(lane.run(time.sleep, 0.01, guard=TrainingLocks.hold(('water', 'x'))))
+        await asyncio.sleep(0.05)
+        try:
+            await lane.run(time.sleep, 0.01)
+            rejected = False
+        except Exception as e:
+            rejected = getattr(e, 'status_code', None) is not None
+        await asyncio.gather(holder, waiter)
+        return rejected, lane.waiting, lane.running
+
+    assert asyncio.run(scenario()) == (True, 0, 0)
+
+
+def test_training_target_is_locked_across_processes(db):
+    # A second open of the lock file stands in for another process
+    with TrainingLocks.across_processes([('electricity', 'a')]):
+        with pytest.raises(HTTPException) as excinfo:
+            with TrainingLocks.across_processes([('electricity', 'a')], timeout=0.3):
+                pass
+        assert excinfo.value.status_code == 503
+        with TrainingLocks.across_processes([('electricity', 'b')], timeout=0.3):
+            pass
+    with TrainingLocks.across_processes([('electricity', 'a')], timeout=0.3):
+        pass
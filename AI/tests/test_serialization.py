@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from fastapi.responses import JSONResponse
+
+from main import FastJSONResponse
+
+CONTENT = [
+    [1e-05, 1e16, -2.5e-07, 1.00001, 1.5e+300, 0.0001, 123456789012345.6, -0.0, 0.1 + 0.2],
+    {'1e-05': 'e1.0000', 'value': 2.0e-5, 'flags': [True, False, None], 'note': 'true false 1e16 -2.5e-07'},
+    {'quoted': 'say "1e-05" and \\"1.00001\\"', 'number': 3e-06},
+    {'nested': [[1.00001, [2e-08, ['e', 1e17]]], {'deep': [{'x': -7.25e-09}]}], 'count': 12},
+    {'unicode': 'CO₂ été \U0001f331', 'big': 2 ** 70, 'small': -(2 ** 63)},
+    {'predictions': [{'date': '2025-01-01', 'predicted_usage': 1412.0000001, 'lower': 9.999e-05}]},
+    [],
+    'plain string with 1e-05',
+    4.0e-05,
+]
+
+
+@pytest.mark.parametrize('content', CONTENT, ids=range(len(CONTENT)))
+def test_body_matches_starlette(content):
+    assert FastJSONResponse(content).body == JSONResponse(content).body
+
+
+def test_random_magnitudes_match_starlette():
+    rng = np.random.RandomState(0)
+    values = (rng.uniform(-10, 10, 2000) * 10.0 ** rng.randint(-12, 20, 2000)).tolist()
+    content = {'values': values, 'rounded': [round(v, 5) for v in values], 'text': [f'{v!r}' for v in values[:50]]}
+    assert FastJSONResponse(content).body == JSONResponse(content).body
@@ -0,0 +1,27 @@
+import json
+
+import main
+from main import Tracer
+
+
+def test_trace_file_rolls_over_at_its_size_cap(tmp_path, monkeypatch):
+    trace_file = tmp_path / 'traces.jsonl'
+    monkeypatch.setattr(main, 'TRACE_EXPORTER', 'file')
+    monkeypatch.setattr(main, 'TRACE_FILE', trace_file)
+    monkeypatch.setattr(main, 'TRACE_FILE_MAX_BYTES', 2000)
+    monkeypatch.setattr(main, 'TRACE_FILE_BACKUPS', 2)
+    monkeypatch.setattr(Tracer, '_file', None)
+    try:
+        for i in range(100):
+            with Tracer.span('work', i=i):
+                pass
+    finally:
+        Tracer._file.close()
+
+    files = sorted(tmp_path.iterdir())
+    assert [f.name for f in files] == ['traces.jsonl', 'traces.jsonl.1', 'traces.jsonl.2']
+    assert all(f.stat().st_size <= 2000 for f in files)
+    # Every line is still a whole OTLP record, the newest last
+    last = json.loads(trace_file.read_text().splitlines()[-1])
+    span = last['resourceSpans'][0]['scopeSpans'][0]['spans'][0]
+    assert span['name'] == 'work' and span['attributes'][0]['value']['intValue'] in (99, '99')
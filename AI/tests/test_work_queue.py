@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+import main
+from main import Backtester, BacktestRequest, LeaseLost, WorkQueue
+
+BUILDING = '00000000-0000-0000-0000-000000000001'
+
+
+@pytest.fixture
+def queue(db):
+    db.executemany("INSERT INTO Electrics VALUES (?, ?, ?, ?)",
+                   [(f'r{i}', BUILDING, f'{2022 + i // 12}-{i % 12 + 1:02d}-01 00:00:00', 100.0 + i) for i in range(30)])
+    db.commit()
+    WorkQueue.bootstrap()
+    Backtester.bootstrap()
+    return db
+
+
+def task_row(db, task_id):
+    db.row_factory = main.sqlite3.Row
+    return dict(db.execute(f"SELECT * FROM {main.WORK_QUEUE_TABLE} WHERE task_id = ?", (task_id,)).fetchone())
+
+
+def run_row(db, run_id):
+    db.row_factory = main.sqlite3.Row
+    return dict(db.execute(f"SELECT * FROM {main.BACKTEST_RUNS_TABLE} WHERE run_id = ?", (run_id,)).fetchone())
+
+
+def test_pending_dedupe_key_is_unique(queue):
+    first = WorkQueue.enqueue('train', {}, dedupe_key='train:electricity:a')
+    second = WorkQueue.enqueue('train', {}, dedupe_key='train:electricity:a')
+    assert second == {'task_id': first['task_id'], 'status': 'queued', 'deduplicated': True}
+    # The index, not a prior lookup, is what rejects a second pending task
+    with pytest.raises(main.sqlite3.IntegrityError):
+        queue.execute(f"INSERT INTO {main.WORK_QUEUE_TABLE} (task_id, kind, payload, pending_key, status, max_attempts, "
+                      f"available_at, enqueued_at) VALUES ('x', 'train', '{{}}', 'train:electricity:a', 'queued', 1, 0, 0)")
+    queue.rollback()
+
+    task = WorkQueue.claim('w1')
+    assert WorkQueue.complete(task['task_id'], task['lease_token'], {})
+    assert not WorkQueue.enqueue('train', {}, dedupe_key='train:electricity:a')['deduplicated']
+
+
+def test_leases_follow_the_database_clock(queue, monkeypatch):
+    WorkQueue.enqueue('train', {})
+    assert WorkQueue.claim('w1') is not None
+    # A worker whose clock runs an hour ahead still sees the lease as live
+    skewed = time.time() + 3600
+    monkeypatch.setattr(main.time, 'time', lambda: skewed)
+    assert WorkQueue.claim('w2') is None
+
+
+def test_expired_last_attempt_closes_its_backtest_run(queue):
+    run_id = Backtester.start(BacktestRequest(resource_type='electricity', model_types=['hw'], distributed=True))
+    WorkQueue.enqueue('backtest', {'run_id': run_id}, group_id=run_id, max_attempts=1)
+    task = WorkQueue.claim('w1')
+    queue.execute(f"UPDATE {main.WORK_QUEUE_TABLE} SET lease_expires = 0 WHERE task_id = ?", (task['task_id'],))
+    queue.commit()
+
+    assert WorkQueue.claim('w2') is None
+    assert task_row(queue, task['task_id'])['status'] == 'failed'
+    assert run_row(queue, run_id)['status'] == 'partial'
+
+
+def test_taken_over_attempt_writes_nothing(queue, monkeypatch):
+    request = BacktestRequest(resource_type='electricity', model_types=['hw'], origins=3, horizon=1, distributed=True)
+    run_id = Backtester.start(request)
+    WorkQueue.enqueue('backtest', {'run_id': run_id}, group_id=run_id)
+    task = WorkQueue.claim('w1')
+    lease = (task['task_id'], task['lease_token'])
+
+    def origin_then_takeover(featured, resource_type, building_id, origin, horizon, model_types):
+        if origin == 28:
+            queue.execute(f"UPDATE {main.WORK_QUEUE_TABLE} SET lease_token = 'w2' WHERE task_id = ?", (task['task_id'],))
+            queue.commit()
+        return [(building_id, 'hw', origin, 1, 1.0, 1.0)]
+    monkeypatch.setattr(main, 'backtest_origin', origin_then_takeover)
+
+    with pytest.raises(LeaseLost):
+        Backtester.run_building(run_id, request, BUILDING, lease=lease)
+    # Origins 27 and 28 ran; only 27 was stored under the lease, and the run's counts were never added to
+    stored = queue.execute(f"SELECT origin FROM {main.BACKTEST_RESULTS_TABLE} WHERE run_id = ?", (run_id,)).fetchall()
+    assert [tuple(row) for row in stored] == [(27,)]
+    assert run_row(queue, run_id)['origins_done'] == 0
+
+
+def test_finalize_counts_come_from_done_tasks(queue, monkeypatch):
+    request = BacktestRequest(resource_type='electricity', model_types=['hw'], origins=3, horizon=1, distributed=True)
+    run_id = Backtester.start(request)
+    Backtester.enqueue(run_id, request.model_copy(update={'building_ids': [BUILDING]}))
+    monkeypatch.setattr(main, 'backtest_origin',
+                        lambda featured, resource_type, building_id, origin, horizon, model_types:
+                        [(building_id, 'hw', origin, 1, 1.0, 1.0)])
+    worker = main.Worker('w1')
+    assert worker.run_once()
+    # A stale attempt that double-counted before losing its lease does not survive finalize
+    queue.execute(f"UPDATE {main.BACKTEST_RUNS_TABLE} SET status = 'running', origins_done = 99 WHERE run_id = ?", (run_id,))
+    queue.commit()
+    Backtester.finalize(run_id)
+
+    run = run_row(queue, run_id)
+    assert (run['status'], run['buildings'], run['origins_total'], run['origins_done'], run['result_rows']) == \
+        ('completed', 1, 3, 3, 3)
@@ -0,0 +1,59 @@
+"""Work queue consumer: runs training and backtest tasks from the shared queue table.
+
+Start any number of these, on any number of hosts, against the same database and
+MODELS_DIR volume and they split the queue between them. Settings come from the
+environment exactly as for the API (DB_* or DB_ENGINE=sqlite/SQLITE_PATH, MODELS_DIR,
+WORK_*). SIGTERM lets the running task finish; a worker that is killed instead has its
+task taken over by another worker once the lease expires. With --processes N each
+process pins its OpenMP/BLAS pools to its share of the cores.
+
+Usage: python worker.py [--processes 4]
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+
+
+def serve(threads=None):
+    # main reads its settings at import time
+    import main as service
+
+    if threads:
+        service.FitPlanner.pin_threads(threads)
+    service.WorkQueue.bootstrap()
+    service.Backtester.bootstrap()
+    worker = service.Worker()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: worker.stop())
+    worker.run()
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=1, help='worker processes to run on this host')
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        serve()
+        return
+
+    context = multiprocessing.get_context('spawn')
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    threads = max(1, cores // args.processes)
+    processes = [context.Process(target=serve, args=(threads,), name=f'worker-{i}') for i in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, forward)
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    run()